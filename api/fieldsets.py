@@ -0,0 +1,76 @@
+"""
+Campos dispersos (?fields=a,b,c) para las respuestas de la API.
+
+SparseFieldsetSerializerMixin quita de la salida los campos no pedidos y
+SparseFieldsetMixin (para vistas genéricas) recorta el SELECT a las columnas
+que usan los campos que quedan, con select_related para los que leen un
+modelo relacionado (p. ej. source='usuario.get_full_name'). Solo se aplica
+a peticiones GET: las escrituras validan siempre el serializer completo.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+
+def requested_fields(request):
+    """Campos de ?fields= o None si no se pidió un subconjunto"""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()}
+
+
+def select_columns(queryset, serializer, extra=()):
+    """
+    Limita el queryset a las columnas que lee el serializer (más `extra`).
+    Si algún campo depende de una propiedad o método del modelo no se sabe
+    qué columnas usa y el queryset se deja completo.
+    """
+    model = queryset.model
+    columns = {model._meta.pk.name, *extra}
+    related = set()
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return queryset
+        path = field.source.split('.')
+        try:
+            model_field = model._meta.get_field(path[0])
+        except FieldDoesNotExist:
+            return queryset
+        if model_field.many_to_many or model_field.one_to_many:
+            continue
+        if not model_field.concrete:
+            return queryset
+        columns.add(path[0])
+        if len(path) > 1 and model_field.is_relation:
+            related.add(path[0])
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns)
+
+
+class SparseFieldsetSerializerMixin:
+    """Serializer que solo emite los campos de ?fields= (o de `fields=` al instanciarlo)"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            fields = requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsetMixin:
+    """Vista genérica que consulta solo las columnas de los campos que va a serializar"""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        ordering = [name.lstrip('-') for name in getattr(self, 'cursor_ordering', ())]
+        return select_columns(queryset, self.get_serializer(), extra=ordering)
@@ -0,0 +1,23 @@
+"""
+Paginación por cursor de la API.
+
+FechaCursorPagination reemplaza a PageNumberPagination como paginación por
+defecto: en lugar de OFFSET (que recorre y descarta todas las filas
+anteriores) filtra por la posición del último elemento entregado, así que
+pedir la página 1000 cuesta lo mismo que la primera. Cada vista declara en
+`cursor_ordering` el par (fecha, id) indexado por el que se pagina; las que
+no lo hacen se paginan por -pk.
+
+El tamaño de página es PAGE_SIZE y el cliente puede pedir hasta
+max_page_size con ?limit=.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class FechaCursorPagination(CursorPagination):
+    ordering = ('-pk',)
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
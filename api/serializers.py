@@ -4,9 +4,10 @@ from core.models import (
     Ruta, Alerta, Recompensa, Categoria, Logro, 
     Notificacion, SesionUsuario
 )
+from .fieldsets import SparseFieldsetSerializerMixin
 
 
-class UsuarioSerializer(serializers.ModelSerializer):
+class UsuarioSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Usuario"""
     password = serializers.CharField(write_only=True)
     
@@ -15,7 +16,7 @@ class UsuarioSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
             'role', 'puntos', 'telefono', 'direccion', 'testimonio',
-            'notificaciones_email', 'notificaciones_sms', 'date_joined',
+            'notificaciones_email', 'date_joined',
             'password'
         ]
         extra_kwargs = {
@@ -31,7 +32,7 @@ class UsuarioSerializer(serializers.ModelSerializer):
         return user
 
 
-class MaterialTasaSerializer(serializers.ModelSerializer):
+class MaterialTasaSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo MaterialTasa"""
     
     class Meta:
@@ -39,7 +40,7 @@ class MaterialTasaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class CanjeSerializer(serializers.ModelSerializer):
+class CanjeSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Canje"""
     usuario_nombre = serializers.CharField(source='usuario.get_full_name', read_only=True)
     material_nombre = serializers.CharField(source='material.nombre', read_only=True)
@@ -53,7 +54,7 @@ class CanjeSerializer(serializers.ModelSerializer):
         read_only_fields = ['puntos_ganados', 'fecha']
 
 
-class RedencionPuntosSerializer(serializers.ModelSerializer):
+class RedencionPuntosSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo RedencionPuntos"""
     usuario_nombre = serializers.CharField(source='usuario.get_full_name', read_only=True)
     
@@ -67,7 +68,7 @@ class RedencionPuntosSerializer(serializers.ModelSerializer):
         read_only_fields = ['fecha_solicitud', 'fecha_procesamiento']
 
 
-class RutaSerializer(serializers.ModelSerializer):
+class RutaSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Ruta"""
     materiales_nombres = serializers.StringRelatedField(source='materiales', many=True, read_only=True)
     
@@ -80,7 +81,7 @@ class RutaSerializer(serializers.ModelSerializer):
         ]
 
 
-class AlertaSerializer(serializers.ModelSerializer):
+class AlertaSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Alerta"""
     
     class Meta:
@@ -88,7 +89,7 @@ class AlertaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class RecompensaSerializer(serializers.ModelSerializer):
+class RecompensaSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Recompensa"""
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
     
@@ -101,7 +102,7 @@ class RecompensaSerializer(serializers.ModelSerializer):
         ]
 
 
-class CategoriaSerializer(serializers.ModelSerializer):
+class CategoriaSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Categoria"""
     
     class Meta:
@@ -109,7 +110,7 @@ class CategoriaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class LogroSerializer(serializers.ModelSerializer):
+class LogroSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Logro"""
     usuario_nombre = serializers.CharField(source='usuario.get_full_name', read_only=True)
     
@@ -121,7 +122,7 @@ class LogroSerializer(serializers.ModelSerializer):
         ]
 
 
-class NotificacionSerializer(serializers.ModelSerializer):
+class NotificacionSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Notificacion"""
     usuario_nombre = serializers.CharField(source='usuario.get_full_name', read_only=True)
     
@@ -133,7 +134,7 @@ class NotificacionSerializer(serializers.ModelSerializer):
         ]
 
 
-class SesionUsuarioSerializer(serializers.ModelSerializer):
+class SesionUsuarioSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo SesionUsuario"""
     usuario_nombre = serializers.CharField(source='usuario.get_full_name', read_only=True)
     
@@ -415,4 +415,45 @@ class IntegrationTest(APITestCase):
         # 4. Verificar estado del canje
         canje = Canje.objects.get(id=canje_id)
         self.assertEqual(canje.estado, 'aprobado')
-        self.assertEqual(canje.puntos_ganados, 50)
\ No newline at end of file
+        self.assertEqual(canje.puntos_ganados, 50)
+
+class CursorPaginationTest(APITestCase):
+    """Tests para la paginación por cursor y los campos dispersos"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='cursoruser',
+            email='cursor@example.com',
+            password='cursorpass123'
+        )
+        for i in range(5):
+            Notificacion.objects.create(usuario=self.user, titulo=f'Notificación {i}', mensaje='Mensaje', tipo='info')
+        self.client.force_authenticate(user=self.user)
+    
+    def test_cursor_pagination_walks_all_pages(self):
+        """Las páginas siguen el cursor sin repetir ni saltar notificaciones"""
+        url = reverse('api:notificacion-list')
+        titulos = []
+        response = self.client.get(url, {'limit': 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            titulos += [n['titulo'] for n in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(titulos, [f'Notificación {i}' for i in reversed(range(5))])
+    
+    def test_sparse_fieldset(self):
+        """?fields= recorta la respuesta y las columnas consultadas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse('api:notificacion-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,titulo'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'titulo'})
+        select = next(q['sql'] for q in queries.captured_queries if 'FROM "core_notificacion"' in q['sql'])
+        self.assertNotIn('"mensaje"', select)
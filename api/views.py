@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import authenticate
+from django.db import transaction
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
 from datetime import timedelta
@@ -12,9 +13,16 @@ from django.core.cache import cache
 from core.models import (
     Usuario, MaterialTasa, Canje, RedencionPuntos, 
     Ruta, Alerta, Recompensa, Categoria, Logro, 
-    Notificacion, SesionUsuario
+    Notificacion, SesionUsuario, RollupCanjeDiario, RollupUsuarioDiario
 )
+from core.email_digest import queue_or_send
+from core.notification_counter import mark_read
+from core.notification_push import publish_cleared
+from core.leaderboard import BOARDS as LEADERBOARD_BOARDS, get_leaderboard
+from core.points_ledger import credit_canje
 from core.statistics import StatisticsManager
+from .fieldsets import SparseFieldsetMixin, requested_fields
+from .pagination import FechaCursorPagination
 from .serializers import (
     UsuarioSerializer, MaterialTasaSerializer, CanjeSerializer,
     RedencionPuntosSerializer, RutaSerializer, AlertaSerializer,
@@ -24,7 +32,7 @@ from .serializers import (
 )
 
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar usuarios"""
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
@@ -76,7 +84,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
                     .values_list('material__nombre', 'total')
                 ),
                 'logros_obtenidos': Logro.objects.filter(usuario=usuario).count(),
-                'ranking_posicion': Usuario.objects.filter(puntos__gt=usuario.puntos).count() + 1
+                'ranking_posicion': get_leaderboard().rank('puntos', usuario.id, score=usuario.puntos)
             }
             cache.set(cache_key, stats, 300)  # Cache por 5 minutos
         
@@ -84,7 +92,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class MaterialTasaViewSet(viewsets.ModelViewSet):
+class MaterialTasaViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar materiales y tasas"""
     queryset = MaterialTasa.objects.all()
     serializer_class = MaterialTasaSerializer
@@ -99,11 +107,12 @@ class MaterialTasaViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class CanjeViewSet(viewsets.ModelViewSet):
+class CanjeViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar canjes de materiales"""
     queryset = Canje.objects.all()
     serializer_class = CanjeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-fecha_solicitud', '-id')
     
     def get_queryset(self):
         """Filtrar canjes según el rol del usuario"""
@@ -120,6 +129,7 @@ class CanjeViewSet(viewsets.ModelViewSet):
         serializer.save(usuario=self.request.user)
     
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def aprobar(self, request, pk=None):
         """Aprobar un canje (solo recolectores y admins)"""
         if request.user.role not in ['recolector', 'admin']:
@@ -159,13 +169,11 @@ class CanjeViewSet(viewsets.ModelViewSet):
                 puntos_ganados = int(peso_real * canje.material.puntos_por_kilo)
             
             canje.puntos = puntos_ganados
-            canje.usuario.puntos += puntos_ganados
-            canje.usuario.save()
             canje.save()
+            credit_canje(canje, realizado_por=request.user)
             
             # Enviar correo de confirmación de canje aprobado
             try:
-                from django.core.mail import send_mail
                 from django.conf import settings
                 
                 subject = f'¡Canje Aprobado! +{puntos_ganados} puntos - EcoPuntos'
@@ -186,12 +194,10 @@ Los puntos han sido agregados automáticamente a tu cuenta.
 Equipo EcoPuntos
 """
                 
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [canje.usuario.email],
-                    fail_silently=False,
+                queue_or_send(
+                    canje.usuario, subject,
+                    f"Tu canje de {canje.material.nombre} ({peso_real} kg) fue aprobado: +{puntos_ganados} puntos.",
+                    lambda: (message, None)
                 )
                 print(f"✅ Email de canje aprobado enviado exitosamente a {canje.usuario.email}")
             except Exception as e:
@@ -246,11 +252,12 @@ Equipo EcoPuntos
         return Response({'message': 'Canje rechazado exitosamente'})
 
 
-class RedencionPuntosViewSet(viewsets.ModelViewSet):
+class RedencionPuntosViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar redenciones de puntos"""
     queryset = RedencionPuntos.objects.all()
     serializer_class = RedencionPuntosSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-fecha_solicitud', '-id')
     
     def get_queryset(self):
         """Filtrar redenciones según el rol del usuario"""
@@ -265,7 +272,7 @@ class RedencionPuntosViewSet(viewsets.ModelViewSet):
         serializer.save(usuario=self.request.user)
 
 
-class RutaViewSet(viewsets.ModelViewSet):
+class RutaViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar rutas de recolección"""
     queryset = Ruta.objects.all()
     serializer_class = RutaSerializer
@@ -294,20 +301,12 @@ class RutaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class NotificacionViewSet(viewsets.ModelViewSet):
+class NotificacionViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar notificaciones"""
     queryset = Notificacion.objects.all()
     serializer_class = NotificacionSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
-    def list(self, request, *args, **kwargs):
-        """Obtener todas las notificaciones del usuario"""
-        notificaciones = self.get_queryset()
-        serializer = self.get_serializer(notificaciones, many=True)
-        return Response({
-            'success': True,
-            'notifications': serializer.data
-        })
+    cursor_ordering = ('-fecha_creacion', '-id')
     
     def get_queryset(self):
         """Filtrar notificaciones del usuario autenticado"""
@@ -331,8 +330,7 @@ class NotificacionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def marcar_todas_leidas(self, request):
         """Marcar todas las notificaciones como leídas"""
-        count = self.get_queryset().filter(leida=False).count()
-        self.get_queryset().update(leida=True)
+        count = mark_read(request.user.id)
         return Response({
             'success': True,
             'message': f'Se marcaron {count} notificaciones como leídas'
@@ -342,7 +340,7 @@ class NotificacionViewSet(viewsets.ModelViewSet):
     def dashboard(self, request):
         """Obtener notificaciones para el dashboard con contador de no leídas"""
         notificaciones = self.get_queryset()[:10]  # Últimas 10 notificaciones
-        unread_count = self.get_queryset().filter(leida=False).count()
+        unread_count = request.user.notificaciones_no_leidas
         
         serializer = self.get_serializer(notificaciones, many=True)
         return Response({
@@ -353,7 +351,7 @@ class NotificacionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def marcar_leidas(self, request):
         """Marcar notificaciones no leídas como leídas (para cuando se abre el modal)"""
-        self.get_queryset().filter(leida=False).update(leida=True)
+        mark_read(request.user.id)
         return Response({'message': 'Notificaciones marcadas como leídas'})
     
     @action(detail=False, methods=['post'])
@@ -361,6 +359,7 @@ class NotificacionViewSet(viewsets.ModelViewSet):
         """Eliminar todas las notificaciones del usuario"""
         count = self.get_queryset().count()
         self.get_queryset().delete()
+        publish_cleared(request.user.id)
         return Response({
             'success': True,
             'message': f'Se eliminaron {count} notificaciones'
@@ -378,19 +377,25 @@ class EstadisticasAPIView(APIView):
         stats = cache.get(cache_key)
         
         if not stats:
-            stats_manager = StatisticsManager()
+            # Cifras agregadas desde los rollups diarios (core/rollups.py)
+            inicio_mes = timezone.localdate().replace(day=1)
+            usuarios = RollupUsuarioDiario.objects.aggregate(
+                activos_hoy=Sum('usuarios_con_sesion', filter=Q(fecha=timezone.localdate())),
+                nuevos_mes=Sum('nuevos_usuarios', filter=Q(fecha__gte=inicio_mes))
+            )
+            material_top = RollupCanjeDiario.objects.filter(estado='aprobado').values(
+                'material__nombre'
+            ).annotate(total_peso=Sum('peso_total')).order_by('-total_peso').first()
             stats = {
-                'usuarios_activos': stats_manager.get_daily_active_users(),
-                'total_canjes_mes': Canje.objects.filter(
-                    fecha__gte=timezone.now().replace(day=1)
-                ).count(),
+                'usuarios_activos': usuarios['activos_hoy'] or 0,
+                'total_canjes_mes': RollupCanjeDiario.objects.filter(
+                    fecha__gte=inicio_mes
+                ).aggregate(total=Sum('cantidad'))['total'] or 0,
                 'total_puntos_otorgados': Usuario.objects.aggregate(
                     total=Sum('puntos')
                 )['total'] or 0,
-                'material_mas_reciclado': stats_manager.get_recycling_stats_by_material().get('most_recycled', 'N/A'),
-                'usuarios_nuevos_mes': Usuario.objects.filter(
-                    date_joined__gte=timezone.now().replace(day=1)
-                ).count()
+                'material_mas_reciclado': material_top['material__nombre'] if material_top else 'N/A',
+                'usuarios_nuevos_mes': usuarios['nuevos_mes'] or 0
             }
             cache.set(cache_key, stats, 600)  # Cache por 10 minutos
         
@@ -403,19 +408,41 @@ class RankingAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        """Obtener ranking de usuarios por puntos"""
-        limit = int(request.query_params.get('limit', 10))
+        """
+        Obtener ranking de usuarios por puntos (o por otro tablero con
+        ?tablero=kg|semana|mes|juego_*). Con ?alrededor=1 retorna la posición
+        del usuario autenticado con sus vecinos en lugar del top.
+        """
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, FechaCursorPagination.max_page_size))
+        tablero = request.query_params.get('tablero', 'puntos')
+        if tablero not in LEADERBOARD_BOARDS:
+            return Response({'error': f'Tablero desconocido: {tablero}'}, status=status.HTTP_400_BAD_REQUEST)
         
-        usuarios = Usuario.objects.filter(
-            role='usuario'
-        ).order_by('-puntos')[:limit]
+        leaderboard = get_leaderboard()
+        if request.query_params.get('alrededor'):
+            entries = leaderboard.around(tablero, request.user.id, k=max(1, min(limit, 10)))
+        else:
+            entries = leaderboard.top(tablero, limit)
+        # ?fields= se aplica al usuario anidado y recorta las columnas leídas
+        campos = requested_fields(request)
+        usuario_serializer = UsuarioSerializer(fields=campos)
+        usuarios = Usuario.objects.only(
+            *[name for name, field in usuario_serializer.fields.items() if not field.write_only] or ['id']
+        ).in_bulk([entry['usuario_id'] for entry in entries])
         
         ranking_data = []
-        for i, usuario in enumerate(usuarios, 1):
+        for entry in entries:
+            usuario = usuarios.get(entry['usuario_id'])
+            if usuario is None:
+                continue
             ranking_data.append({
-                'posicion': i,
-                'usuario': UsuarioSerializer(usuario).data,
-                'puntos': usuario.puntos
+                'posicion': entry['posicion'],
+                'usuario': UsuarioSerializer(usuario, fields=campos).data,
+                'puntos': entry['puntaje']
             })
         
         return Response(ranking_data)
@@ -431,12 +458,12 @@ class DashboardAPIView(APIView):
         
         if user.role == 'admin':
             # Dashboard de administrador
-            stats_manager = StatisticsManager()
+            estadisticas = StatisticsManager.get_comprehensive_dashboard_stats()
             dashboard_data = {
-                'estadisticas_generales': stats_manager.get_dashboard_stats(),
+                'estadisticas_generales': estadisticas,
                 'canjes_pendientes': Canje.objects.filter(estado='pendiente').count(),
                 'redenciones_pendientes': RedencionPuntos.objects.filter(estado='pendiente').count(),
-                'usuarios_activos_hoy': stats_manager.get_daily_active_users(),
+                'usuarios_activos_hoy': estadisticas['users']['active_today'],
                 'alertas_activas': Alerta.objects.filter(activa=True).count()
             }
         else:
@@ -447,12 +474,8 @@ class DashboardAPIView(APIView):
                     usuario=user,
                     fecha__gte=timezone.now().replace(day=1)
                 ).count(),
-                'notificaciones_no_leidas': Notificacion.objects.filter(
-                    usuario=user, leida=False
-                ).count(),
-                'ranking_posicion': Usuario.objects.filter(
-                    puntos__gt=user.puntos
-                ).count() + 1,
+                'notificaciones_no_leidas': user.notificaciones_no_leidas,
+                'ranking_posicion': get_leaderboard().rank('puntos', user.id, score=user.puntos),
                 'rutas_disponibles': Ruta.objects.filter(
                     fecha__gte=timezone.now().date(),
                     estado='programada'
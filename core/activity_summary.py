@@ -0,0 +1,285 @@
+"""
+Resumen de actividad por usuario mantenido de forma incremental.
+
+En lugar de recalcular en cada visita al dashboard la racha (una consulta
+por día), los puntos de la semana y los totales sobre todos los canjes del
+usuario, se mantiene una fila de ResumenActividad que se actualiza cuando:
+
+- se crea un Canje o cambia de estado (señales en core/signals.py)
+- un juego otorga EcoPuntos (record_game_points desde las vistas de juegos)
+- se crea o rechaza una RedencionPuntos (señales en core/signals.py)
+
+Si un usuario aún no tiene resumen se reconstruye desde la base de datos
+la primera vez que se necesita (rebuild_summary).
+"""
+from datetime import timedelta
+from decimal import Decimal
+import logging
+
+from django.db import transaction
+from django.db.models import Count, DateTimeField, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Estados en los que un canje ya otorgó sus puntos
+ESTADOS_APROBADOS = ('aprobado', 'completado')
+
+# Niveles y puntos requeridos
+LEVELS = {
+    'guardian_verde': 0,
+    'defensor_planeta': 100,
+    'heroe_eco': 500,
+    'embajador_ambiental': 1000,
+    'leyenda_sustentable': 2000,
+}
+
+# Días hacia atrás que se revisan al reconstruir la racha
+MAX_STREAK_DAYS = 30
+
+
+def level_progress(puntos):
+    """Nivel actual, siguiente nivel y porcentaje de progreso para unos puntos"""
+    current_level = 'guardian_verde'
+    next_level_points = 0
+    next_level_name = 'N/A'
+
+    sorted_levels = sorted(LEVELS.items(), key=lambda item: item[1])
+
+    for i, (name, points_needed) in enumerate(sorted_levels):
+        if puntos >= points_needed:
+            current_level = name
+            if i + 1 < len(sorted_levels):
+                next_level_name = sorted_levels[i + 1][0]
+                next_level_points = sorted_levels[i + 1][1]
+            else:
+                next_level_name = 'Máximo Nivel'
+                next_level_points = puntos
+        else:
+            if i > 0:
+                next_level_name = name
+                next_level_points = points_needed
+            break
+
+    progress_from = LEVELS[current_level]
+
+    # Evitar división por cero si el siguiente nivel es 0 puntos
+    if next_level_points - progress_from > 0:
+        progress_percentage = ((puntos - progress_from) / (next_level_points - progress_from)) * 100
+    else:
+        progress_percentage = 100
+
+    return {
+        'current_level': current_level,
+        'next_level_name': next_level_name,
+        'next_level_points': next_level_points,
+        'progress_from': progress_from,
+        'progress_percentage': min(100, progress_percentage),
+        'points_needed': max(0, next_level_points - puntos) if next_level_name != 'Máximo Nivel' else 0,
+        'levels': LEVELS,
+    }
+
+
+def _week_start(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def _month_start(fecha):
+    return fecha.replace(day=1)
+
+
+def current_streak(resumen, hoy=None):
+    """
+    Racha mostrada en el dashboard: el día de hoy más los días consecutivos
+    anteriores con canjes (igual que el cálculo día por día anterior).
+    """
+    hoy = hoy or timezone.localdate()
+    if resumen.ultima_actividad == hoy:
+        return max(1, resumen.racha_actual)
+    if resumen.ultima_actividad == hoy - timedelta(days=1):
+        return resumen.racha_actual + 1
+    return 1
+
+
+def weekly_points(resumen, hoy=None):
+    """Puntos ganados en la semana en curso"""
+    hoy = hoy or timezone.localdate()
+    return resumen.puntos_semana if resumen.semana_inicio == _week_start(hoy) else 0
+
+
+def monthly_points(resumen, hoy=None):
+    """Puntos ganados en el mes en curso"""
+    hoy = hoy or timezone.localdate()
+    return resumen.puntos_mes if resumen.mes_inicio == _month_start(hoy) else 0
+
+
+def _roll_periods(resumen, hoy):
+    """Reinicia los acumulados de semana y mes si cambió el periodo"""
+    if resumen.semana_inicio != _week_start(hoy):
+        resumen.semana_inicio = _week_start(hoy)
+        resumen.puntos_semana = 0
+    if resumen.mes_inicio != _month_start(hoy):
+        resumen.mes_inicio = _month_start(hoy)
+        resumen.puntos_mes = 0
+
+
+def rebuild_summary(usuario_id, hoy=None):
+    """
+    Reconstruye el resumen de un usuario desde la base de datos.
+    Los puntos de juegos no quedan registrados por fecha, así que al
+    reconstruir solo se cuentan los canjes aprobados.
+    """
+    from .models import Canje, RedencionPuntos, ResumenActividad
+
+    hoy = hoy or timezone.localdate()
+    canjes = Canje.objects.filter(usuario_id=usuario_id)
+
+    aprobados = Q(estado__in=ESTADOS_APROBADOS)
+    totales = canjes.annotate(
+        fecha_aprobacion=Coalesce('fecha_procesamiento', 'fecha_solicitud', output_field=DateTimeField()),
+        puntos_otorgados=Coalesce('puntos_finales', 'puntos'),
+        peso_otorgado=Coalesce('peso_real', 'peso'),
+    ).aggregate(
+        total_canjes=Count('id'),
+        canjes_aprobados=Count('id', filter=aprobados),
+        total_kg=Sum('peso_otorgado', filter=aprobados),
+        puntos_semana=Sum('puntos_otorgados', filter=aprobados & Q(fecha_aprobacion__date__gte=_week_start(hoy))),
+        puntos_mes=Sum('puntos_otorgados', filter=aprobados & Q(fecha_aprobacion__date__gte=_month_start(hoy))),
+    )
+
+    # Racha: días distintos con canjes en la ventana reciente, en una sola consulta
+    dias = set(
+        canjes.filter(fecha_solicitud__date__gte=hoy - timedelta(days=MAX_STREAK_DAYS))
+        .annotate(dia=TruncDate('fecha_solicitud'))
+        .values_list('dia', flat=True)
+        .distinct()
+    )
+    ultima_actividad = max(dias) if dias else None
+    racha = 0
+    if ultima_actividad:
+        dia = ultima_actividad
+        while dia in dias:
+            racha += 1
+            dia -= timedelta(days=1)
+    else:
+        ultima_actividad = canjes.order_by('-fecha_solicitud').values_list('fecha_solicitud', flat=True).first()
+        ultima_actividad = timezone.localdate(ultima_actividad) if ultima_actividad else None
+        racha = 1 if ultima_actividad else 0
+
+    puntos_redimidos = RedencionPuntos.objects.filter(usuario_id=usuario_id).exclude(
+        estado='rechazado'
+    ).aggregate(total=Sum('puntos'))['total'] or 0
+
+    resumen, _ = ResumenActividad.objects.update_or_create(
+        usuario_id=usuario_id,
+        defaults={
+            'racha_actual': racha,
+            'ultima_actividad': ultima_actividad,
+            'semana_inicio': _week_start(hoy),
+            'puntos_semana': totales['puntos_semana'] or 0,
+            'mes_inicio': _month_start(hoy),
+            'puntos_mes': totales['puntos_mes'] or 0,
+            'total_kg': totales['total_kg'] or Decimal('0'),
+            'total_canjes': totales['total_canjes'],
+            'canjes_aprobados': totales['canjes_aprobados'],
+            'puntos_redimidos': puntos_redimidos,
+        }
+    )
+    return resumen
+
+
+def get_summary(usuario):
+    """Resumen de actividad del usuario (lo reconstruye si aún no existe)"""
+    from .models import ResumenActividad
+
+    try:
+        return ResumenActividad.objects.get(usuario_id=usuario.pk)
+    except ResumenActividad.DoesNotExist:
+        return rebuild_summary(usuario.pk)
+
+
+def _update(usuario_id, apply):
+    """
+    Aplica un cambio incremental al resumen bloqueando la fila. Si el
+    usuario aún no tiene resumen se reconstruye completo, lo que ya
+    incluye el cambio recién guardado.
+    """
+    from .models import ResumenActividad
+
+    with transaction.atomic():
+        resumen = ResumenActividad.objects.select_for_update().filter(usuario_id=usuario_id).first()
+        if resumen is None:
+            rebuild_summary(usuario_id)
+            return
+        hoy = timezone.localdate()
+        _roll_periods(resumen, hoy)
+        apply(resumen, hoy)
+        resumen.save()
+
+
+def _add_points(resumen, puntos):
+    resumen.puntos_semana += puntos
+    resumen.puntos_mes += puntos
+
+
+def record_canje_created(canje):
+    """Un canje nuevo cuenta como actividad del día y suma al total de canjes"""
+    def apply(resumen, hoy):
+        fecha = timezone.localdate(canje.fecha_solicitud) if canje.fecha_solicitud else hoy
+        if resumen.ultima_actividad != fecha:
+            if resumen.ultima_actividad == fecha - timedelta(days=1):
+                resumen.racha_actual += 1
+            elif resumen.ultima_actividad is None or resumen.ultima_actividad < fecha:
+                resumen.racha_actual = 1
+            resumen.ultima_actividad = max(fecha, resumen.ultima_actividad or fecha)
+        resumen.total_canjes += 1
+        if canje.estado in ESTADOS_APROBADOS:
+            _apply_approval(resumen, canje, 1)
+
+    _update(canje.usuario_id, apply)
+
+
+def _apply_approval(resumen, canje, signo):
+    puntos = canje.puntos_finales or canje.puntos or 0
+    peso = canje.peso_real or canje.peso or Decimal('0')
+    _add_points(resumen, signo * puntos)
+    resumen.total_kg = max(Decimal('0'), resumen.total_kg + signo * Decimal(peso))
+    resumen.canjes_aprobados = max(0, resumen.canjes_aprobados + signo)
+
+
+def record_canje_estado(canje, estado_anterior):
+    """Suma o resta los puntos y kg de un canje que entra o sale de un estado aprobado"""
+    era_aprobado = estado_anterior in ESTADOS_APROBADOS
+    es_aprobado = canje.estado in ESTADOS_APROBADOS
+    if era_aprobado == es_aprobado:
+        return
+
+    _update(canje.usuario_id, lambda resumen, hoy: _apply_approval(resumen, canje, 1 if es_aprobado else -1))
+
+
+def record_game_points(usuario, puntos):
+    """EcoPuntos otorgados por un juego"""
+    if puntos <= 0:
+        return
+    try:
+        _update(usuario.pk, lambda resumen, hoy: _add_points(resumen, puntos))
+    except Exception as e:
+        logger.error(f'Error actualizando resumen de actividad: {e}')
+
+
+def record_redencion(redencion, estado_anterior, created):
+    """Puntos redimidos: se suman al crear la redención y se devuelven si se rechaza"""
+    if created:
+        delta = 0 if redencion.estado == 'rechazado' else redencion.puntos
+    elif estado_anterior != 'rechazado' and redencion.estado == 'rechazado':
+        delta = -redencion.puntos
+    elif estado_anterior == 'rechazado' and redencion.estado != 'rechazado':
+        delta = redencion.puntos
+    else:
+        return
+
+    def apply(resumen, hoy):
+        resumen.puntos_redimidos += delta
+
+    _update(redencion.usuario_id, apply)
@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Usuario, Canje, MaterialTasa, RedencionPuntos, Recompensa, Categoria, FavoritoRecompensa, Logro, Notificacion
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.utils.html import format_html, format_html_join
+from .models import Usuario, Canje, MaterialTasa, RedencionPuntos, Recompensa, Categoria, FavoritoRecompensa, Logro, Notificacion, NotificacionArchivada, CorreoSaliente, DifusionPendiente, PerfilVista, ArchivoSeguridad
+from .points_ledger import credit_canje
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'role', 'puntos', 'fecha_registro')
@@ -62,8 +66,7 @@ class CanjeAdmin(admin.ModelAdmin):
                 canje.save()
                 
                 # Agregar puntos al usuario
-                canje.usuario.puntos += canje.puntos
-                canje.usuario.save()
+                credit_canje(canje, realizado_por=request.user)
                 
                 # Enviar notificación
                 try:
@@ -77,12 +80,26 @@ class CanjeAdmin(admin.ModelAdmin):
         self.message_user(request, f"{updated} canjes aprobados exitosamente.")
     aprobar_canjes.short_description = "Aprobar canjes seleccionados"
     
+    def _cambiar_estado(self, queryset, estado):
+        """
+        Guarda el nuevo estado canje por canje: un queryset.update() no dispara
+        post_save y dejaría desactualizados el resumen de actividad, los
+        fragmentos cacheados, los rankings y la lista de canjes pendientes.
+        """
+        cambiados = []
+        for canje in queryset.exclude(estado=estado).select_related('usuario', 'material'):
+            canje.estado = estado
+            canje.save(update_fields=['estado', 'fecha_actualizacion'])
+            cambiados.append(canje)
+        return cambiados
+    
     def rechazar_canjes(self, request, queryset):
         """Acción personalizada para rechazar canjes en lote"""
-        updated = queryset.update(estado='rechazado')
+        cambiados = self._cambiar_estado(queryset, 'rechazado')
+        updated = len(cambiados)
         
         # Enviar notificaciones
-        for canje in queryset:
+        for canje in cambiados:
             try:
                 from .notifications import NotificacionEmail
                 NotificacionEmail.notificar_canje_rechazado(canje)
@@ -94,10 +111,11 @@ class CanjeAdmin(admin.ModelAdmin):
     
     def marcar_en_revision(self, request, queryset):
         """Acción personalizada para marcar canjes en revisión"""
-        updated = queryset.update(estado='en_revision')
+        cambiados = self._cambiar_estado(queryset, 'en_revision')
+        updated = len(cambiados)
         
         # Enviar notificaciones
-        for canje in queryset:
+        for canje in cambiados:
             try:
                 from .notifications import NotificacionEmail
                 NotificacionEmail.notificar_canje_en_revision(canje)
@@ -150,7 +168,7 @@ class LogroAdmin(admin.ModelAdmin):
     search_fields = ('usuario__username', 'tipo', 'descripcion')
 
 class NotificacionAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'titulo', 'tipo', 'leida', 'fecha_creacion')
+    list_display = ('usuario', 'titulo', 'tipo', 'leida', 'repeticiones', 'fecha_creacion')
     list_filter = ('tipo', 'leida', 'fecha_creacion')
     search_fields = ('usuario__username', 'titulo', 'mensaje')
 
@@ -163,3 +181,105 @@ admin.site.register(Recompensa, RecompensaAdmin)
 admin.site.register(FavoritoRecompensa, FavoritoRecompensaAdmin)
 admin.site.register(Logro, LogroAdmin)
 admin.site.register(Notificacion, NotificacionAdmin)
+
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    list_display = ('asunto', 'estado', 'intentos', 'proximo_intento', 'fecha_creacion', 'fecha_envio')
+    list_filter = ('estado', 'fecha_creacion')
+    search_fields = ('asunto', 'destinatarios', 'ultimo_error')
+    readonly_fields = ('fecha_creacion', 'fecha_envio', 'ultimo_error')
+    actions = ['reintentar_correos']
+    
+    def reintentar_correos(self, request, queryset):
+        """Vuelve a poner en cola los correos fallidos seleccionados"""
+        from .email_outbox import requeue_failed
+        updated = requeue_failed(ids=list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f"{updated} correos puestos en cola de nuevo.")
+    reintentar_correos.short_description = "Reintentar correos fallidos"
+
+admin.site.register(CorreoSaliente, CorreoSalienteAdmin)
+
+class DifusionPendienteAdmin(admin.ModelAdmin):
+    list_display = ('titulo', 'estado', 'usuarios', 'fecha_creacion', 'fecha_envio')
+    list_filter = ('estado', 'fecha_creacion')
+    search_fields = ('titulo', 'ultimo_error')
+
+admin.site.register(DifusionPendiente, DifusionPendienteAdmin)
+
+class NotificacionArchivadaAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'titulo', 'tipo', 'leida', 'repeticiones', 'fecha_creacion', 'fecha_archivo')
+    list_filter = ('tipo', 'fecha_creacion')
+    search_fields = ('usuario__username', 'titulo', 'mensaje')
+    readonly_fields = ('fecha_creacion', 'fecha_archivo')
+
+admin.site.register(NotificacionArchivada, NotificacionArchivadaAdmin)
+
+class ArchivoSeguridadAdmin(admin.ModelAdmin):
+    list_display = ('tabla', 'primer_id', 'ultimo_id', 'filas', 'fecha_desde', 'fecha_hasta', 'fecha_archivo')
+    list_filter = ('tabla', 'fecha_archivo')
+    exclude = ('datos',)
+    readonly_fields = ('tabla', 'primer_id', 'ultimo_id', 'filas', 'fecha_desde', 'fecha_hasta', 'fecha_archivo')
+
+admin.site.register(ArchivoSeguridad, ArchivoSeguridadAdmin)
+
+class PerfilVistaAdmin(admin.ModelAdmin):
+    """Vistas más lentas o con más consultas según core.profiler"""
+    list_display = ('vista', 'fecha', 'peticiones', 'latencia_media', 'latencia_max', 'consultas_media',
+                    'consultas_max', 'db_media', 'plantillas_media', 'huellas_repetidas')
+    list_filter = ('fecha',)
+    search_fields = ('vista',)
+    readonly_fields = [f.name for f in PerfilVista._meta.fields] + ['consultas_repetidas']
+    exclude = ('duplicadas',)
+
+    def get_queryset(self, request):
+        peticiones = Cast(F('peticiones'), FloatField())
+        return super().get_queryset(request).annotate(
+            latencia_promedio=F('latencia') / peticiones,
+            consultas_promedio=Cast(F('consultas'), FloatField()) / peticiones,
+            db_promedio=F('tiempo_db') / peticiones,
+            plantillas_promedio=F('tiempo_plantillas') / peticiones,
+        ).order_by('-fecha', '-latencia_promedio')
+
+    def has_add_permission(self, request):
+        return False
+
+    def latencia_media(self, obj):
+        return f'{obj.latencia_promedio:.1f} ms'
+    latencia_media.short_description = 'Latencia media'
+    latencia_media.admin_order_field = 'latencia_promedio'
+
+    def consultas_media(self, obj):
+        return f'{obj.consultas_promedio:.1f}'
+    consultas_media.short_description = 'Consultas por petición'
+    consultas_media.admin_order_field = 'consultas_promedio'
+
+    def db_media(self, obj):
+        return f'{obj.db_promedio:.1f} ms'
+    db_media.short_description = 'BD media'
+    db_media.admin_order_field = 'db_promedio'
+
+    def plantillas_media(self, obj):
+        return f'{obj.plantillas_promedio:.1f} ms'
+    plantillas_media.short_description = 'Plantillas media'
+    plantillas_media.admin_order_field = 'plantillas_promedio'
+
+    def huellas_repetidas(self, obj):
+        return len(obj.duplicadas)
+    huellas_repetidas.short_description = 'SQL repetidos'
+
+    def consultas_repetidas(self, obj):
+        """Consultas ejecutadas más de una vez en la misma petición (posible N+1)"""
+        if not obj.duplicadas:
+            return '-'
+        filas = format_html_join(
+            '',
+            '<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((datos['veces'], datos['peticiones'], huella) for huella, datos in obj.duplicadas.items()),
+        )
+        return format_html(
+            '<table><thead><tr><th>Ejecuciones</th><th>Peticiones</th><th>SQL</th></tr></thead>'
+            '<tbody>{}</tbody></table>',
+            filas,
+        )
+    consultas_repetidas.short_description = 'Consultas repetidas'
+
+admin.site.register(PerfilVista, PerfilVistaAdmin)
@@ -13,6 +13,7 @@ from django.utils import timezone
 from django.conf import settings
 
 from core.models import ConversacionChatbot, MensajeChatbot, ContextoChatbot
+from core.ws_ratelimit import WebSocketRateLimiter, slow_down_frame
 from .services import get_ai_service
 
 User = get_user_model()
@@ -21,6 +22,8 @@ logger = logging.getLogger(__name__)
 class ChatbotConsumer(AsyncWebsocketConsumer):
     """Consumer para el chatbot IA en tiempo real"""
     
+    rate_limiter = WebSocketRateLimiter('chatbot')
+    
     async def connect(self):
         """Maneja la conexión WebSocket"""
         logger.info(f"=== INTENTO DE CONEXIÓN WEBSOCKET ===")
@@ -120,9 +123,8 @@ class ChatbotConsumer(AsyncWebsocketConsumer):
             await self._send_error_message("El mensaje es demasiado largo. Máximo 1000 caracteres.")
             return
         
-        # Verificar rate limiting básico
+        # Verificar rate limiting compartido (por usuario e IP)
         if not await self._check_rate_limit():
-            await self._send_error_message("Estás enviando mensajes muy rápido. Por favor, espera un momento.")
             return
         
         # Enviar indicador de que el bot está procesando
@@ -329,17 +331,16 @@ class ChatbotConsumer(AsyncWebsocketConsumer):
         }))
     
     async def _check_rate_limit(self) -> bool:
-        """Verifica límites de velocidad de mensajes"""
-        # Implementación básica - podría mejorarse con Redis
-        if not hasattr(self, '_last_message_time'):
-            self._last_message_time = timezone.now()
+        """
+        Verifica límites de velocidad de mensajes compartidos entre conexiones.
+        Si se excede, envía al cliente un frame 'rate_limited' con el tiempo de espera.
+        """
+        result = await self.rate_limiter.acheck(self.scope)
+        if result is None or result.allowed:
             return True
         
-        time_diff = (timezone.now() - self._last_message_time).total_seconds()
-        self._last_message_time = timezone.now()
-        
-        # Mínimo 1 segundo entre mensajes
-        return time_diff >= 1.0
+        await self.send(text_data=json.dumps(slow_down_frame(result, self.rate_limiter.name)))
+        return False
     
     async def _is_first_connection_today(self) -> bool:
         """Verifica si es la primera conexión del usuario hoy"""
@@ -7,12 +7,13 @@ from django.views.decorators.http import require_POST, require_http_methods
 from django.http import JsonResponse
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Count, Avg
+from django.db.models import Count, Sum
 from django.conf import settings
 
-from core.models import ConversacionChatbot, MensajeChatbot, ContextoChatbot, EstadisticasChatbot, Usuario, SolicitudSoporte
+from core.models import ConversacionChatbot, MensajeChatbot, ContextoChatbot, EstadisticasChatbot, Usuario, SolicitudSoporte, RollupChatbotDiario
 from core.ratelimit import smart_ratelimit
 from core.views import is_admin
+from core.resource_versions import conditional_get
 
 @login_required
 @smart_ratelimit(key='user', rate='60/m', method='GET')
@@ -86,11 +87,12 @@ def admin_chatbot_stats(request):
     conversaciones_hoy = ConversacionChatbot.objects.filter(fecha_inicio__date=hoy).count()
     mensajes_hoy = MensajeChatbot.objects.filter(timestamp__date=hoy).count()
     
-    # Promedio de confianza
-    promedio_confianza = MensajeChatbot.objects.filter(
-        es_usuario=False,
-        confidence_score__isnull=False
-    ).aggregate(avg_confidence=Avg('confidence_score'))['avg_confidence'] or 0
+    # Promedio de confianza desde los rollups diarios (suma de puntajes / respuestas)
+    confianza = RollupChatbotDiario.objects.aggregate(
+        total=Sum('confianza_total'),
+        respuestas=Sum('respuestas_con_confianza')
+    )
+    promedio_confianza = (confianza['total'] or 0) / max(confianza['respuestas'] or 0, 1)
     
     # Usuarios más activos
     usuarios_activos = Usuario.objects.annotate(
@@ -400,6 +402,7 @@ def enviar_mensaje_usuario_a_chat(request):
 
 @login_required
 @require_http_methods(["GET"])
+@conditional_get(lambda request: [f'chat_directo:{request.user.pk}'])
 def obtener_mensajes_chat_directo(request):
     """API para obtener mensajes del chat directo del usuario"""
     from core.models import SolicitudSoporte, MensajeDirecto
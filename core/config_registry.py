@@ -0,0 +1,151 @@
+"""
+Registro de configuración con caché en memoria por proceso.
+
+Carga todas las filas de Configuracion una sola vez por proceso, las
+convierte a valores tipados (enteros, decimales, booleanos y listas/objetos
+JSON como dias_recoleccion) y sirve las consultas desde memoria.
+
+La invalidación entre workers se hace con una clave de versión en la caché
+compartida que se incrementa en post_save/post_delete de Configuracion.
+Cada proceso revisa esa clave como máximo una vez por segundo
+(CONFIG_REGISTRY_CHECK_INTERVAL), por lo que los cambios se propagan a todos
+los workers en ese plazo sin consultar la base de datos en cada lectura.
+"""
+import json
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'config_registry:version'
+
+_INT_RE = re.compile(r'^[-+]?\d+$')
+_FLOAT_RE = re.compile(r'^[-+]?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?$')
+_BOOLEANOS = {'true': True, 'false': False}
+
+
+def parse_value(valor):
+    """Convierte el texto guardado en Configuracion.valor a su tipo natural"""
+    if valor is None:
+        return None
+    texto = valor.strip()
+    if texto.lower() in _BOOLEANOS:
+        return _BOOLEANOS[texto.lower()]
+    if _INT_RE.match(texto):
+        return int(texto)
+    if _FLOAT_RE.match(texto):
+        return float(texto)
+    if texto[:1] in ('[', '{'):
+        try:
+            return json.loads(texto)
+        except ValueError:
+            return valor
+    return valor
+
+
+class ConfigRegistry:
+    """Valores de Configuracion tipados y cacheados en memoria del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'CONFIG_REGISTRY_CHECK_INTERVAL', 1.0)
+
+    def _load(self):
+        from .models import Configuracion
+
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = self._bump_version()
+        values = {
+            nombre: parse_value(valor)
+            for nombre, valor in Configuracion.objects.values_list('nombre', 'valor')
+        }
+        self._values = values
+        self._version = version
+        self._checked_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._values is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._values is not None and now - self._checked_at < self.check_interval:
+                return
+            if self._values is None or cache.get(VERSION_KEY) != self._version:
+                self._load()
+            else:
+                self._checked_at = now
+
+    def all(self):
+        """Diccionario con todas las configuraciones tipadas"""
+        try:
+            self._ensure_fresh()
+        except DatabaseError as e:
+            logger.error(f'Error cargando configuraciones: {e}')
+            return {}
+        return dict(self._values)
+
+    def get(self, nombre, default=None):
+        """Valor tipado de una configuración o default si no existe"""
+        try:
+            self._ensure_fresh()
+        except DatabaseError as e:
+            logger.error(f'Error cargando configuraciones: {e}')
+            return default
+        return self._values.get(nombre, default)
+
+    def get_int(self, nombre, default=None):
+        """Valor de una configuración como entero (default si no es numérico)"""
+        valor = self.get(nombre, default)
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, nombre, default=False):
+        """Valor de una configuración como booleano"""
+        valor = self.get(nombre, default)
+        if isinstance(valor, str):
+            return valor.strip().lower() in ('true', '1', 'si', 'sí', 'on')
+        return bool(valor)
+
+    def get_list(self, nombre, default=None):
+        """Valor de una configuración como lista (JSON o separada por comas)"""
+        valor = self.get(nombre, None)
+        if valor is None:
+            return list(default or [])
+        if isinstance(valor, list):
+            return valor
+        return [item.strip() for item in str(valor).split(',') if item.strip()]
+
+    def _bump_version(self):
+        version = time.time_ns()
+        cache.set(VERSION_KEY, version, None)
+        return version
+
+    def invalidate(self):
+        """Descarta la copia local y avisa a los demás workers"""
+        with self._lock:
+            self._values = None
+            self._version = None
+            self._bump_version()
+
+
+config_registry = ConfigRegistry()
+
+
+def invalidate_config_registry(sender=None, **kwargs):
+    """Receptor de post_save/post_delete de Configuracion"""
+    config_registry.invalidate()
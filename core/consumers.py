@@ -3,6 +3,11 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from .models import Notificacion, Canje, Usuario
+from .leaderboard import get_leaderboard
+from .notification_counter import mark_read
+from .notification_push import group_name, notification_payload
+from .session_monitor import MONITOR_GROUP
+from .ws_ratelimit import WebSocketRateLimiter, slow_down_frame
 from django.core.serializers import serialize
 from django.forms.models import model_to_dict
 import logging
@@ -14,6 +19,8 @@ logger = logging.getLogger(__name__)
 class ChatConsumer(AsyncWebsocketConsumer):
     """Consumer para chat global en tiempo real"""
     
+    rate_limiter = WebSocketRateLimiter('chat')
+    
     async def connect(self):
         # Verificar que el usuario esté autenticado
         if self.scope["user"].is_anonymous:
@@ -51,6 +58,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
             if not message:
                 return
             
+            # Limitar mensajes por usuario e IP antes de difundirlos al grupo
+            result = await self.rate_limiter.acheck(self.scope)
+            if result is not None and not result.allowed:
+                await self.send(text_data=json.dumps(slow_down_frame(result, self.rate_limiter.name)))
+                return
+            
             # Enviar mensaje al grupo
             await self.channel_layer.group_send(
                 self.room_group_name,
@@ -77,7 +90,14 @@ class NotificacionConsumer(AsyncWebsocketConsumer):
     
     async def connect(self):
         self.user_id = self.scope['url_route']['kwargs']['user_id']
-        self.room_group_name = f'notificaciones_{self.user_id}'
+        
+        # Solo el propio usuario puede escuchar su grupo de notificaciones
+        user = self.scope.get('user')
+        if user is None or user.is_anonymous or str(user.id) != self.user_id:
+            await self.close()
+            return
+        
+        self.room_group_name = group_name(self.user_id)
         
         # Unirse al grupo de notificaciones del usuario
         await self.channel_layer.group_add(
@@ -91,7 +111,9 @@ class NotificacionConsumer(AsyncWebsocketConsumer):
         await self.send_unread_notifications()
     
     async def disconnect(self, close_code):
-        # Salir del grupo
+        # Salir del grupo (no existe si la conexión fue rechazada)
+        if not hasattr(self, 'room_group_name'):
+            return
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -120,6 +142,19 @@ class NotificacionConsumer(AsyncWebsocketConsumer):
             'notification': event['notification']
         }))
     
+    async def notification_read(self, event):
+        """Avisar que se leyeron notificaciones (ids None = todas)"""
+        await self.send(text_data=json.dumps({
+            'type': 'notifications_read',
+            'ids': event['ids']
+        }))
+    
+    async def notification_cleared(self, event):
+        """Avisar que el usuario vació sus notificaciones"""
+        await self.send(text_data=json.dumps({
+            'type': 'notifications_cleared'
+        }))
+    
     @database_sync_to_async
     def get_unread_notifications(self):
         """Obtener notificaciones no leídas del usuario"""
@@ -129,16 +164,9 @@ class NotificacionConsumer(AsyncWebsocketConsumer):
                 usuario=user, leida=False
             ).order_by('-fecha_creacion')[:10]
             
-            return [{
-                'id': notif.id,
-                'titulo': notif.titulo,
-                'mensaje': notif.mensaje,
-                'tipo': notif.tipo,
-                'fecha_creacion': notif.fecha_creacion.isoformat(),
-                'leida': notif.leida
-            } for notif in notifications]
+            return [notification_payload(notif) for notif in notifications], user.notificaciones_no_leidas
         except User.DoesNotExist:
-            return []
+            return [], 0
     
     @database_sync_to_async
     def mark_notification_read(self, notification_id):
@@ -157,20 +185,50 @@ class NotificacionConsumer(AsyncWebsocketConsumer):
     def mark_all_notifications_read(self):
         """Marcar todas las notificaciones como leídas"""
         try:
-            Notificacion.objects.filter(
-                usuario_id=self.user_id, leida=False
-            ).update(leida=True)
+            mark_read(self.user_id)
             return True
         except:
             return False
     
     async def send_unread_notifications(self):
         """Enviar notificaciones no leídas al conectarse"""
-        notifications = await self.get_unread_notifications()
+        notifications, count = await self.get_unread_notifications()
         await self.send(text_data=json.dumps({
             'type': 'unread_notifications',
             'notifications': notifications,
-            'count': len(notifications)
+            'count': count
+        }))
+
+
+class SessionMonitorConsumer(AsyncWebsocketConsumer):
+    """Avisa al monitor de sesiones de los administradores cuando cambia alguna sesión"""
+    
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_staff:
+            await self.close()
+            return
+        
+        self.room_group_name = MONITOR_GROUP
+        await self.channel_layer.group_add(
+            self.room_group_name,
+            self.channel_name
+        )
+        await self.accept()
+    
+    async def disconnect(self, close_code):
+        # Salir del grupo (no existe si la conexión fue rechazada)
+        if not hasattr(self, 'room_group_name'):
+            return
+        await self.channel_layer.group_discard(
+            self.room_group_name,
+            self.channel_name
+        )
+    
+    async def sessions_changed(self, event):
+        """El cliente pide los cambios con su cursor (monitor_sesiones_refresh?desde=)"""
+        await self.send(text_data=json.dumps({
+            'type': 'sessions_changed'
         }))
 
 
@@ -193,7 +251,9 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         await self.send_dashboard_data()
     
     async def disconnect(self, close_code):
-        # Salir del grupo
+        # Salir del grupo (no existe si la conexión fue rechazada)
+        if not hasattr(self, 'room_group_name'):
+            return
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -229,12 +289,8 @@ class DashboardConsumer(AsyncWebsocketConsumer):
             data = {
                 'puntos_totales': user.puntos,
                 'canjes_totales': Canje.objects.filter(usuario=user).count(),
-                'notificaciones_no_leidas': Notificacion.objects.filter(
-                    usuario=user, leida=False
-                ).count(),
-                'ranking_posicion': Usuario.objects.filter(
-                    puntos__gt=user.puntos
-                ).count() + 1
+                'notificaciones_no_leidas': user.notificaciones_no_leidas,
+                'ranking_posicion': get_leaderboard().rank('puntos', user.id, score=user.puntos)
             }
             
             return data
@@ -266,7 +322,9 @@ class CanjeConsumer(AsyncWebsocketConsumer):
         await self.accept()
     
     async def disconnect(self, close_code):
-        # Salir del grupo
+        # Salir del grupo (no existe si la conexión fue rechazada)
+        if not hasattr(self, 'room_group_name'):
+            return
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
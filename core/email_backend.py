@@ -1,11 +1,63 @@
 """
 Backend SMTP personalizado con manejo robusto de SSL/TLS.
 Soluciona problemas de verificación de certificados SSL.
+
+Las conexiones autenticadas se reutilizan desde un pool por servidor:
+close() devuelve la conexión al pool en lugar de cerrarla, y open() toma
+una conexión libre (comprobándola con NOOP si estuvo inactiva) antes de
+pagar otro handshake TLS. Cada conexión envía como máximo
+EMAIL_POOL_MAX_MESSAGES correos y se reabre si el servidor la cortó.
 """
 import ssl
 import smtplib
+import threading
+import time
+from django.conf import settings
 from django.core.mail.backends.smtp import EmailBackend as DjangoSMTPBackend
 
+# Conexiones libres por (host, puerto, usuario, ssl, tls): [(conexión, enviados, último uso)]
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def get_pool_size():
+    """Conexiones libres que se conservan por servidor (EMAIL_POOL_SIZE, 0 desactiva el pool)"""
+    return getattr(settings, 'EMAIL_POOL_SIZE', 2)
+
+
+def get_max_messages():
+    """Correos por conexión antes de reabrirla (EMAIL_POOL_MAX_MESSAGES)"""
+    return getattr(settings, 'EMAIL_POOL_MAX_MESSAGES', 100)
+
+
+def get_keepalive():
+    """Segundos de inactividad tras los que se verifica la conexión con NOOP"""
+    return getattr(settings, 'EMAIL_POOL_KEEPALIVE_SECONDS', 30)
+
+
+def get_max_idle():
+    """Segundos de inactividad tras los que la conexión se descarta sin probarla"""
+    return getattr(settings, 'EMAIL_POOL_MAX_IDLE_SECONDS', 300)
+
+
+def _quit(connection):
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, ssl.SSLError, OSError):
+        try:
+            connection.close()
+        except OSError:
+            pass
+
+
+def close_pool():
+    """Cierra todas las conexiones libres del pool"""
+    with _pool_lock:
+        libres = [entry[0] for entries in _pool.values() for entry in entries]
+        _pool.clear()
+    for connection in libres:
+        _quit(connection)
+
 
 class SSLEmailBackend(DjangoSMTPBackend):
     """
@@ -38,13 +90,97 @@ class SSLEmailBackend(DjangoSMTPBackend):
         
         return context
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sent = 0
+    
+    def _pool_key(self):
+        return (self.host, self.port, self.username, self.use_ssl, self.use_tls)
+    
+    def _checkout(self):
+        """Conexión libre del pool que sigue respondiendo, o None"""
+        while True:
+            with _pool_lock:
+                libres = _pool.get(self._pool_key())
+                if not libres:
+                    return None
+                connection, sent, last_used = libres.pop()
+            
+            idle = time.monotonic() - last_used
+            if idle > get_max_idle():
+                _quit(connection)
+                continue
+            if idle > get_keepalive():
+                try:
+                    if connection.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected('NOOP rechazado')
+                except (smtplib.SMTPException, OSError):
+                    _quit(connection)
+                    continue
+            return connection, sent
+    
+    def _checkin(self):
+        """Devuelve la conexión actual al pool; False si no hay lugar"""
+        if self._sent >= get_max_messages():
+            return False
+        with _pool_lock:
+            libres = _pool.setdefault(self._pool_key(), [])
+            if len(libres) >= get_pool_size():
+                return False
+            libres.append((self.connection, self._sent, time.monotonic()))
+        return True
+    
     def open(self):
         """
-        Abre conexión SMTP con manejo robusto de SSL/TLS.
+        Toma una conexión del pool o abre una nueva. Retorna True si el
+        llamador debe liberarla con close(), igual que el backend de Django.
         """
         if self.connection:
             return False
         
+        pooled = self._checkout()
+        if pooled:
+            self.connection, self._sent = pooled
+            return True
+        
+        self._sent = 0
+        return self._connect()
+    
+    def close(self):
+        """Devuelve la conexión al pool o la cierra si está llena o agotada."""
+        if self.connection is None:
+            return
+        if get_pool_size() > 0 and self._checkin():
+            self.connection = None
+            return
+        super().close()
+    
+    def _reconnect(self):
+        _quit(self.connection)
+        self.connection = None
+        self._sent = 0
+        self._connect()
+        return self.connection is not None
+    
+    def _send(self, email_message):
+        """Envía por la conexión actual, rotándola o reabriéndola si hace falta."""
+        if self._sent >= get_max_messages() and not self._reconnect():
+            return False
+        try:
+            sent = super()._send(email_message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # El servidor cerró una conexión reutilizada: reintentar una vez con otra
+            if not self._reconnect():
+                return False
+            sent = super()._send(email_message)
+        if sent:
+            self._sent += 1
+        return sent
+    
+    def _connect(self):
+        """
+        Abre conexión SMTP con manejo robusto de SSL/TLS.
+        """
         connection_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
         
         try:
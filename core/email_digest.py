@@ -0,0 +1,104 @@
+"""
+Resumen periódico de los correos de notificaciones.
+
+Los usuarios con resumen_correos activo no reciben un correo por cada
+cambio de estado de un canje o de una ruta: queue_or_send() guarda una
+línea en ResumenCorreoPendiente y send_digests() (comando
+send_email_digests, cada pocos minutos) envía un único correo con todas
+las líneas cuando la más antigua cumple EMAIL_DIGEST_WINDOW_MINUTES.
+
+El contenido de cada notificación se pasa como una función que renderiza
+el correo completo; solo se llama cuando el correo sale de inmediato, así
+que las notificaciones que van al resumen no renderizan su plantilla. Los
+mensajes críticos (seguridad, bienvenida) usan urgente=True y nunca se
+agrupan. Los usuarios con notificaciones_email desactivado no reciben
+ninguno de los dos.
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Min
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+
+def get_window():
+    """Ventana del resumen (EMAIL_DIGEST_WINDOW_MINUTES, 0 desactiva los resúmenes)"""
+    return timedelta(minutes=getattr(settings, 'EMAIL_DIGEST_WINDOW_MINUTES', 60))
+
+
+def uses_digest(usuario):
+    return bool(get_window()) and getattr(usuario, 'resumen_correos', False)
+
+
+def queue_or_send(usuario, asunto, resumen, render, urgente=False):
+    """
+    Agrega la notificación al resumen del usuario o la envía de inmediato.
+    `render()` retorna (texto, html o None) y solo se llama al enviar.
+    Retorna True si el correo quedó en el resumen o en la bandeja de salida.
+    """
+    from .models import ResumenCorreoPendiente
+
+    if not usuario.email or not usuario.notificaciones_email:
+        return False
+    if not urgente and uses_digest(usuario):
+        ResumenCorreoPendiente.objects.create(usuario=usuario, asunto=asunto[:255], resumen=resumen)
+        return True
+
+    texto, html = render()
+    message = EmailMultiAlternatives(asunto, texto, settings.DEFAULT_FROM_EMAIL, [usuario.email])
+    if html:
+        message.attach_alternative(html, 'text/html')
+    return bool(message.send())
+
+
+def _send_digest(usuario, items):
+    html = render_to_string('emails/resumen.html', {'usuario': usuario, 'items': items})
+    asunto = items[0].asunto if len(items) == 1 else f'Tienes {len(items)} novedades en Eco Puntos'
+    message = EmailMultiAlternatives(asunto, strip_tags(html), settings.DEFAULT_FROM_EMAIL, [usuario.email])
+    message.attach_alternative(html, 'text/html')
+    message.send()
+
+
+def send_digests(now=None):
+    """
+    Envía el resumen de cada usuario cuya notificación pendiente más antigua
+    ya cumplió la ventana. Retorna (resúmenes enviados, notificaciones incluidas).
+    """
+    from .models import ResumenCorreoPendiente, Usuario
+
+    now = now or timezone.now()
+    vencidos = (
+        ResumenCorreoPendiente.objects.values('usuario_id')
+        .annotate(primera=Min('fecha'))
+        .filter(primera__lte=now - get_window())
+        .values_list('usuario_id', flat=True)
+        .order_by()
+    )
+
+    resumenes = incluidas = 0
+    for usuario in Usuario.objects.filter(id__in=list(vencidos)):
+        try:
+            with transaction.atomic():
+                items = list(ResumenCorreoPendiente.objects.select_for_update().filter(usuario=usuario))
+                if not items:
+                    continue
+                if usuario.email and usuario.notificaciones_email:
+                    # El correo se guarda en la bandeja de salida en esta misma transacción
+                    _send_digest(usuario, items)
+                    resumenes += 1
+                    incluidas += len(items)
+                else:
+                    logger.info(f'Resumen de {usuario.username} descartado ({len(items)} notificaciones): correos desactivados')
+                ResumenCorreoPendiente.objects.filter(pk__in=[item.pk for item in items]).delete()
+        except Exception as e:
+            # La transacción se revierte: las líneas siguen pendientes para el próximo envío
+            logger.error(f'Error enviando el resumen de {usuario.username}, sus notificaciones siguen pendientes: {e}')
+    logger.info(f'{resumenes} resúmenes enviados con {incluidas} notificaciones')
+    return resumenes, incluidas
@@ -0,0 +1,193 @@
+"""
+Bandeja de salida transaccional para los correos de la aplicación.
+
+EMAIL_BACKEND apunta a OutboxEmailBackend, así que send_mail(),
+EmailMultiAlternatives.send() y demás no abren una conexión SMTP durante la
+petición: guardan el mensaje en CorreoSaliente usando la conexión de base
+de datos por defecto. Dentro de transaction.atomic() el correo se confirma
+o se descarta junto con el cambio de negocio que lo originó.
+
+El comando send_queued_emails entrega la bandeja con el backend real
+(EMAIL_OUTBOX_BACKEND):
+
+- toma lotes de correos pendientes cuyo próximo intento ya llegó, y los
+  reserva por EMAIL_OUTBOX_LEASE_SECONDS para que dos workers no envíen el
+  mismo correo;
+- si un envío falla lo reprograma con backoff exponencial
+  (EMAIL_OUTBOX_BACKOFF_SECONDS × 2^(intentos - 1), hasta una hora);
+- tras EMAIL_OUTBOX_MAX_ATTEMPTS intentos lo deja como 'fallido' (dead
+  letter) para revisarlo desde el admin o con --reintentar-fallidos.
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Correos que se entregan por lote
+BATCH_SIZE = 50
+
+# Máximo de espera entre reintentos
+MAX_BACKOFF_SECONDS = 3600
+
+
+def get_max_attempts():
+    """Intentos antes de mover el correo a fallidos (EMAIL_OUTBOX_MAX_ATTEMPTS)"""
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6)
+
+
+def backoff(intentos):
+    """Espera antes del siguiente intento tras `intentos` fallos"""
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_SECONDS', 30)
+    return timedelta(seconds=min(base * 2 ** max(intentos - 1, 0), MAX_BACKOFF_SECONDS))
+
+
+def _lease():
+    return timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE_SECONDS', 300))
+
+
+def _html_alternative(message):
+    for content, mimetype in getattr(message, 'alternatives', None) or []:
+        if mimetype == 'text/html':
+            return content
+    return ''
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Backend de correo que encola los mensajes en CorreoSaliente"""
+
+    def send_messages(self, email_messages):
+        from .models import CorreoSaliente
+
+        correos = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            if message.attachments:
+                logger.warning(f'Los adjuntos del correo "{message.subject}" no se guardan en la bandeja de salida')
+            correos.append(CorreoSaliente(
+                asunto=str(message.subject)[:255],
+                cuerpo=message.body or '',
+                html=_html_alternative(message),
+                remitente=message.from_email or settings.DEFAULT_FROM_EMAIL,
+                destinatarios=list(message.to),
+                cc=list(message.cc),
+                bcc=list(message.bcc),
+                responder_a=list(message.reply_to),
+                cabeceras=dict(message.extra_headers),
+            ))
+        CorreoSaliente.objects.bulk_create(correos)
+        return len(correos)
+
+
+def get_delivery_connection():
+    """Conexión del backend que realmente entrega los correos (EMAIL_OUTBOX_BACKEND)"""
+    return get_connection(
+        getattr(settings, 'EMAIL_OUTBOX_BACKEND', 'core.email_backend.SSLEmailBackend'),
+        fail_silently=False,
+    )
+
+
+def build_message(correo, connection=None):
+    """EmailMultiAlternatives equivalente a una fila de la bandeja"""
+    message = EmailMultiAlternatives(
+        subject=correo.asunto,
+        body=correo.cuerpo,
+        from_email=correo.remitente,
+        to=correo.destinatarios,
+        cc=correo.cc,
+        bcc=correo.bcc,
+        reply_to=correo.responder_a,
+        headers=correo.cabeceras,
+        connection=connection,
+    )
+    if correo.html:
+        message.attach_alternative(correo.html, 'text/html')
+    return message
+
+
+def claim_batch(limit=BATCH_SIZE, now=None):
+    """
+    Reserva hasta `limit` correos pendientes y vencidos. La reserva es un
+    UPDATE condicionado al próximo intento leído, así que si otro worker
+    tomó la fila primero simplemente no se cuenta.
+    """
+    from .models import CorreoSaliente
+
+    now = now or timezone.now()
+    reservados = []
+    candidatos = CorreoSaliente.objects.filter(estado='pendiente', proximo_intento__lte=now).order_by('proximo_intento', 'id')
+    for correo in candidatos[:limit]:
+        reservado = CorreoSaliente.objects.filter(
+            pk=correo.pk, estado='pendiente', proximo_intento=correo.proximo_intento
+        ).update(proximo_intento=now + _lease())
+        if reservado:
+            reservados.append(correo)
+    return reservados
+
+
+def _failed(correo, error, now):
+    correo.intentos += 1
+    correo.ultimo_error = str(error)[:2000]
+    if correo.intentos >= get_max_attempts():
+        correo.estado = 'fallido'
+        logger.error(f'Correo {correo.pk} movido a fallidos tras {correo.intentos} intentos: {error}')
+    else:
+        correo.proximo_intento = now + backoff(correo.intentos)
+        logger.warning(f'Correo {correo.pk} falló (intento {correo.intentos}), se reintenta a las {correo.proximo_intento}: {error}')
+    correo.save(update_fields=['intentos', 'ultimo_error', 'estado', 'proximo_intento'])
+
+
+def dispatch_outbox(limit=BATCH_SIZE, now=None):
+    """
+    Entrega un lote de la bandeja por una sola conexión.
+    Retorna {'enviados': n, 'reintentos': n, 'fallidos': n}.
+    """
+    now = now or timezone.now()
+    resultado = {'enviados': 0, 'reintentos': 0, 'fallidos': 0}
+    correos = claim_batch(limit, now)
+    if not correos:
+        return resultado
+
+    def registrar_fallo(correo, error):
+        _failed(correo, error, now)
+        resultado['fallidos' if correo.estado == 'fallido' else 'reintentos'] += 1
+
+    connection = get_delivery_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for correo in correos:
+            registrar_fallo(correo, e)
+        return resultado
+
+    try:
+        for correo in correos:
+            try:
+                connection.send_messages([build_message(correo, connection)])
+            except Exception as e:
+                registrar_fallo(correo, e)
+                continue
+            correo.estado = 'enviado'
+            correo.intentos += 1
+            correo.fecha_envio = timezone.now()
+            correo.ultimo_error = ''
+            correo.save(update_fields=['estado', 'intentos', 'fecha_envio', 'ultimo_error'])
+            resultado['enviados'] += 1
+    finally:
+        connection.close()
+    return resultado
+
+
+def requeue_failed(ids=None):
+    """Vuelve a poner en cola los correos fallidos (todos o los indicados)"""
+    from .models import CorreoSaliente
+
+    fallidos = CorreoSaliente.objects.filter(estado='fallido')
+    if ids is not None:
+        fallidos = fallidos.filter(pk__in=ids)
+    return fallidos.update(estado='pendiente', intentos=0, proximo_intento=timezone.now())
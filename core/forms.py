@@ -39,7 +39,7 @@ class ProfileForm(forms.ModelForm):
         model = Usuario
         fields = [
             'username', 'email', 'telefono', 'direccion', 'testimonio',
-            'notificaciones_email', 'notificaciones_push', 'perfil_publico', 'mostrar_puntos',
+            'notificaciones_email', 'resumen_correos', 'notificaciones_push', 'perfil_publico', 'mostrar_puntos',
             'foto_perfil',
         ]
         widgets = {
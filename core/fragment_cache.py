@@ -0,0 +1,92 @@
+"""
+Caché de fragmentos por usuario para las páginas personales.
+
+Cada bloque costoso (tarjetas de estadísticas, canjes recientes,
+recompensas recomendadas...) se guarda con una clave explícita que incluye
+el id del usuario y una versión de sus datos:
+
+    fragment:<bloque>:<usuario_id>:<versión usuario>:<versión global>[:extra]
+
+Las señales de dominio (canjes, redenciones, resumen de actividad, logros,
+favoritos, cambios del usuario) cambian la versión del usuario y los
+cambios del catálogo de recompensas cambian la versión global, de modo que
+los fragmentos anteriores dejan de leerse sin tener que borrarlos. Como la
+clave siempre incluye el id del usuario, un fragmento nunca se sirve a otro.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'fragment'
+USER_VERSION_PREFIX = f'{KEY_PREFIX}:version:user'
+GLOBAL_VERSION_KEY = f'{KEY_PREFIX}:version:global'
+
+
+def get_fragment_timeout():
+    """Segundos que se conserva cada fragmento (FRAGMENT_CACHE_TIMEOUT)"""
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 300)
+
+
+def _user_version_key(usuario_id):
+    return f'{USER_VERSION_PREFIX}:{usuario_id}'
+
+
+def _new_version():
+    # Basada en tiempo para no repetir versiones si la caché pierde la clave
+    return time.time_ns()
+
+
+def bump_user_version(usuario_id):
+    """Invalida todos los fragmentos de un usuario"""
+    cache.set(_user_version_key(usuario_id), _new_version(), None)
+
+
+def bump_global_version():
+    """Invalida los fragmentos que dependen de datos compartidos (catálogo)"""
+    cache.set(GLOBAL_VERSION_KEY, _new_version(), None)
+
+
+class UserFragmentCache:
+    """Fragmentos cacheados de un usuario; lee las versiones una vez por instancia"""
+
+    def __init__(self, usuario):
+        self.usuario_id = usuario.pk
+        self._versions = None
+
+    @property
+    def versions(self):
+        if self._versions is None:
+            user_key = _user_version_key(self.usuario_id)
+            values = cache.get_many([user_key, GLOBAL_VERSION_KEY])
+            missing = {}
+            if user_key not in values:
+                missing[user_key] = _new_version()
+            if GLOBAL_VERSION_KEY not in values:
+                missing[GLOBAL_VERSION_KEY] = _new_version()
+            if missing:
+                cache.set_many(missing, None)
+                values.update(missing)
+            self._versions = (values[user_key], values[GLOBAL_VERSION_KEY])
+        return self._versions
+
+    def key(self, name, *extra):
+        user_version, global_version = self.versions
+        parts = [KEY_PREFIX, name, self.usuario_id, user_version, global_version, *extra]
+        return ':'.join(str(part) for part in parts)
+
+    def get_or_set(self, name, builder, *extra, timeout=None):
+        """
+        Retorna el fragmento `name` del usuario o lo construye con `builder()`.
+        `extra` permite variar la clave con datos que no cambian la versión
+        (por ejemplo los puntos actuales).
+        """
+        key = self.key(name, *extra)
+        value = cache.get(key)
+        if value is None:
+            value = builder()
+            cache.set(key, value, timeout or get_fragment_timeout())
+        return value
@@ -0,0 +1,121 @@
+"""
+Analítica del historial de reciclaje de un usuario con agregados en la BD.
+
+historial y perfil cargaban todos los Canje y RedencionPuntos del usuario y
+sumaban en Python (accediendo a canje.material fila por fila). Aquí cada
+bloque es una consulta agrupada de tamaño fijo:
+
+- history_totals(): canjes aprobados, puntos, kg y dinero redimido;
+- profile_totals(): los totales de la tarjeta del perfil;
+- material_breakdown(): canjes, puntos y kg por material;
+- monthly_history(): puntos, canjes y dinero de los últimos meses
+  (bucketed_series, un TruncMonth por serie);
+- canjes_page(): la lista de canjes paginada por (fecha_solicitud, id)
+  sobre el índice canje_usuario_fecha_idx en lugar de OFFSET.
+
+Los puntos de un canje aprobado son puntos_finales si el administrador los
+ajustó, y si no los puntos estimados; igual con peso_real y peso.
+"""
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .timeseries import bucket_labels, bucket_values, bucketed_series, last_months
+
+PAGE_SIZE = 20
+MONTHS = 12
+
+PUNTOS = Coalesce('puntos_finales', 'puntos')
+PESO = Coalesce('peso_real', 'peso')
+
+
+def _approved(usuario):
+    from .models import Canje
+
+    return Canje.objects.filter(usuario_id=usuario.pk, estado='aprobado')
+
+
+def _completed_redemptions(usuario):
+    from .models import RedencionPuntos
+
+    return RedencionPuntos.objects.filter(usuario_id=usuario.pk, estado='completado')
+
+
+def _redeemed_money(usuario):
+    return _completed_redemptions(usuario).aggregate(total=Sum('valor_cop'))['total'] or 0
+
+
+def history_totals(usuario):
+    """{'canjes', 'puntos', 'peso', 'dinero'} de los canjes aprobados y redenciones completadas"""
+    totales = _approved(usuario).aggregate(
+        canjes=Count('id'),
+        puntos=Coalesce(Sum(PUNTOS), 0),
+        peso=Coalesce(Sum(PESO), 0, output_field=DecimalField()),
+    )
+    totales['dinero'] = _redeemed_money(usuario)
+    return totales
+
+
+def profile_totals(usuario):
+    """{'canjes', 'puntos', 'dinero'} del perfil: todos los canjes y los puntos de los aprobados o completados"""
+    from .models import Canje
+
+    totales = Canje.objects.filter(usuario_id=usuario.pk).aggregate(
+        canjes=Count('id'),
+        puntos=Coalesce(Sum('puntos', filter=Q(estado__in=['aprobado', 'completado'])), 0),
+    )
+    totales['dinero'] = _redeemed_money(usuario)
+    return totales
+
+
+def material_breakdown(usuario):
+    """[{'material', 'canjes', 'puntos', 'peso'}] de los canjes aprobados, por material"""
+    filas = (
+        _approved(usuario)
+        .values('material__nombre')
+        .annotate(canjes=Count('id'), puntos=Sum(PUNTOS), peso=Sum(PESO))
+        .order_by('material__nombre')
+    )
+    return [
+        {
+            'material': fila['material__nombre'],
+            'canjes': fila['canjes'],
+            'puntos': fila['puntos'] or 0,
+            'peso': round(float(fila['peso'] or 0), 2),
+        }
+        for fila in filas
+    ]
+
+
+def monthly_history(usuario, months=MONTHS, today=None):
+    """Series mensuales de los últimos `months` meses: {'meses', 'puntos', 'canjes', 'dinero'}"""
+    start, end = last_months(months, today)
+    canjes = bucketed_series(
+        _approved(usuario), 'fecha_solicitud', start, end, 'month', puntos=Sum(PUNTOS), canjes=Count('id')
+    )
+    dinero = bucketed_series(
+        _completed_redemptions(usuario), 'fecha_solicitud', start, end, 'month', dinero=Sum('valor_cop')
+    )
+    return {
+        'meses': bucket_labels(canjes, '%b %Y'),
+        'puntos': bucket_values(canjes, 'puntos'),
+        'canjes': bucket_values(canjes, 'canjes'),
+        'dinero': bucket_values(dinero, 'dinero', float),
+    }
+
+
+def canjes_page(usuario, before_id=None, limit=PAGE_SIZE):
+    """
+    Página de canjes del usuario, del más reciente al más antiguo, paginada
+    por (fecha_solicitud, id). Retorna (canjes, id para pedir la página
+    siguiente o None).
+    """
+    from .models import Canje
+
+    canjes = Canje.objects.filter(usuario_id=usuario.pk).select_related('material')
+    if before_id:
+        ancla = Canje.objects.filter(usuario_id=usuario.pk, pk=before_id).values_list('fecha_solicitud', flat=True).first()
+        if ancla is not None:
+            canjes = canjes.filter(Q(fecha_solicitud__lt=ancla) | Q(fecha_solicitud=ancla, id__lt=before_id))
+    canjes = list(canjes.order_by('-fecha_solicitud', '-id')[:limit + 1])
+    siguiente = canjes[limit - 1].id if len(canjes) > limit else None
+    return canjes[:limit], siguiente
@@ -0,0 +1,367 @@
+"""
+Rankings ordenados (leaderboards) con consultas de posición logarítmicas.
+
+Tableros disponibles:
+
+- 'puntos': EcoPuntos actuales de todos los usuarios
+- 'kg': kg reciclados aprobados (ResumenActividad.total_kg)
+- 'semana' y 'mes': puntos ganados en la semana o el mes en curso; cada
+  periodo es un tablero propio ('semana:2025-06-02', 'mes:2025-06') que
+  caduca solo
+- 'juego_plasticos', 'juego_vidrios', 'juego_papel', 'juego_metales':
+  puntajes acumulados de cada juego
+
+Los puntajes se actualizan de forma incremental desde las señales de
+Usuario y ResumenActividad (core/signals.py). La posición de un usuario es
+1 + el número de usuarios con puntaje estrictamente mayor, igual que el
+conteo puntos__gt anterior, pero se resuelve con ZCOUNT sobre un sorted set
+de Redis o con un rango sobre el índice (tablero, puntaje) en la base de
+datos en lugar de recorrer toda la tabla de usuarios.
+
+El backend se elige con el setting LEADERBOARD_BACKEND. Si un tablero aún
+no está construido (Redis vacío, despliegue nuevo) se reconstruye desde la
+base de datos la primera vez que se lee; también se puede reconstruir con
+`manage.py rebuild_leaderboards`.
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Tablero de cada juego y el campo de Usuario que guarda su puntaje
+GAME_FIELDS = {
+    'juego_plasticos': 'puntos_juego',
+    'juego_vidrios': 'puntos_juego_vidrios',
+    'juego_papel': 'puntos_juego_papel',
+    'juego_metales': 'puntos_juego_metales',
+}
+
+WINDOW_BOARDS = ('semana', 'mes')
+
+BOARDS = ('puntos', 'kg') + WINDOW_BOARDS + tuple(GAME_FIELDS)
+
+# Días que se conserva un tablero de periodo después de crearse
+WINDOW_TTL_DAYS = {
+    'semana': 14,
+    'mes': 62,
+}
+
+
+def board_key(board, fecha=None):
+    """Clave del tablero; los de periodo dependen de la fecha (hoy por defecto)"""
+    if board not in BOARDS:
+        raise ValueError(f'Tablero de ranking desconocido: {board}')
+    if board in WINDOW_BOARDS:
+        fecha = fecha or timezone.localdate()
+        if board == 'semana':
+            return f'semana:{fecha - timedelta(days=fecha.weekday())}'
+        return f'mes:{fecha:%Y-%m}'
+    return board
+
+
+def _value(board, score):
+    """Los backends guardan floats; solo el tablero de kg tiene decimales"""
+    return round(score, 2) if board == 'kg' else int(score)
+
+
+def _ttl(board):
+    days = WINDOW_TTL_DAYS.get(board)
+    return days * 86400 if days else None
+
+
+class RedisLeaderboardBackend:
+    """Tableros como sorted sets de Redis (ZADD/ZCOUNT/ZREVRANGE son O(log n))"""
+
+    def __init__(self, alias=None):
+        self.alias = alias or getattr(settings, 'LEADERBOARD_CACHE', 'default')
+
+    @property
+    def client(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def _key(self, key):
+        # Mismo prefijo que el resto de claves de la caché
+        return caches[self.alias].make_key(f'leaderboard:{key}')
+
+    def _marker(self, key):
+        return f'{self._key(key)}:construido'
+
+    def is_built(self, key):
+        return bool(self.client.exists(self._marker(key)))
+
+    def set_score(self, key, usuario_id, score, ttl=None):
+        pipe = self.client.pipeline()
+        if score is None:
+            pipe.zrem(self._key(key), usuario_id)
+        else:
+            pipe.zadd(self._key(key), {usuario_id: score})
+            if ttl:
+                pipe.expire(self._key(key), ttl)
+        pipe.execute()
+
+    def remove_user(self, keys, usuario_id):
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.zrem(self._key(key), usuario_id)
+        pipe.execute()
+
+    def replace(self, key, scores, ttl=None):
+        redis_key = self._key(key)
+        temp_key = f'{redis_key}:tmp'
+        pipe = self.client.pipeline()
+        pipe.delete(temp_key)
+        if scores:
+            pipe.zadd(temp_key, scores)
+            pipe.rename(temp_key, redis_key)
+            if ttl:
+                pipe.expire(redis_key, ttl)
+        else:
+            pipe.delete(redis_key)
+        pipe.set(self._marker(key), 1, ex=ttl)
+        pipe.execute()
+
+    def top(self, key, n):
+        return [(int(member), score) for member, score in self.client.zrevrange(self._key(key), 0, n - 1, withscores=True)]
+
+    def scores(self, key, usuario_ids):
+        pipe = self.client.pipeline()
+        for usuario_id in usuario_ids:
+            pipe.zscore(self._key(key), usuario_id)
+        return {
+            usuario_id: score
+            for usuario_id, score in zip(usuario_ids, pipe.execute())
+            if score is not None
+        }
+
+    def count_above(self, key, score):
+        return self.client.zcount(self._key(key), f'({score}', '+inf')
+
+    def neighbours(self, key, usuario_id, score, k):
+        redis_key = self._key(key)
+        index = self.client.zrevrank(redis_key, usuario_id)
+        if index is None:
+            return [], []
+        above = self.client.zrevrange(redis_key, max(0, index - k), index - 1, withscores=True) if index else []
+        below = self.client.zrevrange(redis_key, index + 1, index + k, withscores=True)
+        parse = lambda rows: [(int(member), value) for member, value in rows]
+        return parse(above), parse(below)
+
+
+class DatabaseLeaderboardBackend:
+    """Tableros en PuntajeRanking; las consultas usan el índice (tablero, -puntaje, usuario)"""
+
+    def _rows(self, key):
+        from .models import PuntajeRanking
+        return PuntajeRanking.objects.filter(tablero=key)
+
+    def is_built(self, key):
+        from .models import TableroRanking
+        return TableroRanking.objects.filter(clave=key).exists()
+
+    def set_score(self, key, usuario_id, score, ttl=None):
+        from .models import PuntajeRanking
+
+        if score is None:
+            self._rows(key).filter(usuario_id=usuario_id).delete()
+        else:
+            PuntajeRanking.objects.update_or_create(tablero=key, usuario_id=usuario_id, defaults={'puntaje': score})
+
+    def remove_user(self, keys, usuario_id):
+        from .models import PuntajeRanking
+        PuntajeRanking.objects.filter(tablero__in=keys, usuario_id=usuario_id).delete()
+
+    def replace(self, key, scores, ttl=None):
+        from .models import PuntajeRanking, TableroRanking
+
+        with transaction.atomic():
+            self._rows(key).delete()
+            PuntajeRanking.objects.bulk_create(
+                [PuntajeRanking(tablero=key, usuario_id=usuario_id, puntaje=score) for usuario_id, score in scores.items()],
+                batch_size=1000
+            )
+            TableroRanking.objects.update_or_create(clave=key)
+
+    def top(self, key, n):
+        return list(self._rows(key).order_by('-puntaje', 'usuario_id').values_list('usuario_id', 'puntaje')[:n])
+
+    def scores(self, key, usuario_ids):
+        return dict(self._rows(key).filter(usuario_id__in=usuario_ids).values_list('usuario_id', 'puntaje'))
+
+    def count_above(self, key, score):
+        return self._rows(key).filter(puntaje__gt=score).count()
+
+    def neighbours(self, key, usuario_id, score, k):
+        from django.db.models import Q
+
+        rows = self._rows(key).exclude(usuario_id=usuario_id)
+        above = rows.filter(
+            Q(puntaje__gt=score) | Q(puntaje=score, usuario_id__lt=usuario_id)
+        ).order_by('puntaje', '-usuario_id').values_list('usuario_id', 'puntaje')[:k]
+        below = rows.filter(
+            Q(puntaje__lt=score) | Q(puntaje=score, usuario_id__gt=usuario_id)
+        ).order_by('-puntaje', 'usuario_id').values_list('usuario_id', 'puntaje')[:k]
+        return list(reversed(above)), list(below)
+
+    def prune(self, keep_keys):
+        """Borra los tableros de periodos anteriores (en Redis expiran solos)"""
+        from .models import PuntajeRanking, TableroRanking
+
+        deleted = 0
+        for board in WINDOW_BOARDS:
+            deleted += PuntajeRanking.objects.filter(tablero__startswith=f'{board}:').exclude(tablero__in=keep_keys).delete()[0]
+            TableroRanking.objects.filter(clave__startswith=f'{board}:').exclude(clave__in=keep_keys).delete()
+        return deleted
+
+
+def _source_scores(board, fecha=None):
+    """Puntajes de un tablero calculados desde la base de datos"""
+    from .activity_summary import _month_start, _week_start
+    from .models import ResumenActividad, Usuario
+
+    if board == 'puntos':
+        return dict(Usuario.objects.values_list('id', 'puntos'))
+    if board == 'kg':
+        return {
+            usuario_id: float(total_kg)
+            for usuario_id, total_kg in ResumenActividad.objects.filter(total_kg__gt=0).values_list('usuario_id', 'total_kg')
+        }
+    if board in GAME_FIELDS:
+        field = GAME_FIELDS[board]
+        return dict(Usuario.objects.filter(**{f'{field}__gt': 0}).values_list('id', field))
+
+    fecha = fecha or timezone.localdate()
+    if board == 'semana':
+        filtro = {'semana_inicio': _week_start(fecha), 'puntos_semana__gt': 0}
+        campo = 'puntos_semana'
+    else:
+        filtro = {'mes_inicio': _month_start(fecha), 'puntos_mes__gt': 0}
+        campo = 'puntos_mes'
+    return dict(ResumenActividad.objects.filter(**filtro).values_list('usuario_id', campo))
+
+
+class Leaderboard:
+    """Operaciones de ranking sobre el backend configurado"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def rebuild(self, board, fecha=None):
+        """Reconstruye un tablero desde la base de datos; retorna el número de usuarios"""
+        scores = _source_scores(board, fecha)
+        self.backend.replace(board_key(board, fecha), scores, _ttl(board))
+        return len(scores)
+
+    def _ready_key(self, board, fecha=None):
+        key = board_key(board, fecha)
+        if not self.backend.is_built(key):
+            self.rebuild(board, fecha)
+        return key
+
+    def update(self, board, usuario_id, score, fecha=None):
+        """
+        Fija el puntaje de un usuario. En los tableros distintos de 'puntos'
+        los usuarios sin puntaje no se guardan para mantenerlos pequeños.
+        """
+        if board != 'puntos' and not score:
+            score = None
+        self.backend.set_score(board_key(board, fecha), usuario_id, score, _ttl(board))
+
+    def remove(self, usuario_id):
+        """Quita al usuario de los tableros actuales"""
+        self.backend.remove_user([board_key(board) for board in BOARDS], usuario_id)
+
+    def _with_positions(self, board, key, rows):
+        """Agrega la posición (1 + usuarios con más puntaje) a filas ordenadas"""
+        positions = {}
+        entries = []
+        for usuario_id, score in rows:
+            if score not in positions:
+                positions[score] = self.backend.count_above(key, score) + 1
+            entries.append({'usuario_id': usuario_id, 'puntaje': _value(board, score), 'posicion': positions[score]})
+        return entries
+
+    def top(self, board, n=10, fecha=None):
+        """Los n primeros del tablero: [{'usuario_id', 'puntaje', 'posicion'}, ...]"""
+        key = self._ready_key(board, fecha)
+        rows = self.backend.top(key, n)
+        entries = []
+        for index, (usuario_id, score) in enumerate(rows):
+            score = _value(board, score)
+            # En un top ordenado la posición es la del primero con el mismo puntaje
+            posicion = entries[-1]['posicion'] if entries and entries[-1]['puntaje'] == score else index + 1
+            entries.append({'usuario_id': usuario_id, 'puntaje': score, 'posicion': posicion})
+        return entries
+
+    def score(self, board, usuario_id, fecha=None):
+        key = self._ready_key(board, fecha)
+        return _value(board, self.backend.scores(key, [usuario_id]).get(usuario_id, 0))
+
+    def scores(self, board, usuario_ids, fecha=None):
+        """Puntajes de varios usuarios ({usuario_id: puntaje}; 0 si no figuran)"""
+        key = self._ready_key(board, fecha)
+        found = self.backend.scores(key, list(usuario_ids))
+        return {usuario_id: _value(board, found.get(usuario_id, 0)) for usuario_id in usuario_ids}
+
+    def rank(self, board, usuario_id, score=None, fecha=None):
+        """Posición del usuario; `score` evita leer su puntaje si ya se conoce"""
+        key = self._ready_key(board, fecha)
+        if score is None:
+            score = self.backend.scores(key, [usuario_id]).get(usuario_id, 0)
+        return self.backend.count_above(key, score) + 1
+
+    def around(self, board, usuario_id, k=2, fecha=None):
+        """El usuario con hasta k vecinos por encima y por debajo, en orden"""
+        key = self._ready_key(board, fecha)
+        score = self.backend.scores(key, [usuario_id]).get(usuario_id)
+        if score is None:
+            return []
+        above, below = self.backend.neighbours(key, usuario_id, score, k)
+        return self._with_positions(board, key, above + [(usuario_id, score)] + below)
+
+
+_leaderboard = None
+
+
+def get_leaderboard():
+    """Leaderboard con el backend configurado (LEADERBOARD_BACKEND) para este proceso"""
+    global _leaderboard
+    if _leaderboard is None:
+        backend_path = getattr(settings, 'LEADERBOARD_BACKEND', 'core.leaderboard.DatabaseLeaderboardBackend')
+        _leaderboard = Leaderboard(import_string(backend_path)())
+    return _leaderboard
+
+
+def reset_leaderboard():
+    """Descarta el leaderboard del proceso (usado al cambiar settings en pruebas)"""
+    global _leaderboard
+    _leaderboard = None
+
+
+def ranking_fields(usuario):
+    """Valores de Usuario que alimentan tableros, para detectar cambios al guardar"""
+    return (usuario.__dict__.get('puntos'),) + tuple(usuario.__dict__.get(field) for field in GAME_FIELDS.values())
+
+
+def sync_usuario(usuario):
+    """Actualiza los tableros de puntos y de juegos de un usuario"""
+    leaderboard = get_leaderboard()
+    leaderboard.update('puntos', usuario.pk, usuario.puntos)
+    for board, field in GAME_FIELDS.items():
+        leaderboard.update(board, usuario.pk, getattr(usuario, field))
+
+
+def sync_resumen(resumen):
+    """Actualiza los tableros de kg y de la semana/mes en curso desde el resumen de actividad"""
+    from .activity_summary import monthly_points, weekly_points
+
+    leaderboard = get_leaderboard()
+    leaderboard.update('kg', resumen.usuario_id, float(resumen.total_kg or 0))
+    leaderboard.update('semana', resumen.usuario_id, weekly_points(resumen))
+    leaderboard.update('mes', resumen.usuario_id, monthly_points(resumen))
@@ -0,0 +1,64 @@
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.email_backend import close_pool
+from core.smtp_stub import SMTPStub
+
+class Command(BaseCommand):
+    help = (
+        'Mide correos por segundo de SSLEmailBackend contra un servidor SMTP local de prueba, '
+        'con y sin pool de conexiones'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mensajes', type=int, default=200, help='Correos por escenario')
+        parser.add_argument(
+            '--latencia',
+            type=float,
+            default=0.05,
+            help='Segundos que tarda el servidor en saludar (simula el handshake TLS)',
+        )
+
+    def _backend(self, stub):
+        return get_connection(
+            'core.email_backend.SSLEmailBackend',
+            host='127.0.0.1', port=stub.port, username='', password='',
+            use_tls=False, use_ssl=False, fail_silently=False,
+        )
+
+    def _message(self, n):
+        return EmailMessage(f'Benchmark {n}', 'cuerpo', 'bench@ecopuntos.local', ['destino@ecopuntos.local'])
+
+    def _run(self, nombre, stub, enviar):
+        close_pool()
+        conexiones = stub.conexiones
+        inicio = time.perf_counter()
+        enviados = enviar()
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(
+            f'{nombre}: {enviados} correos en {duracion:.2f}s '
+            f'({enviados / max(duracion, 1e-9):.0f} correos/s, {stub.conexiones - conexiones} conexiones)'
+        )
+
+    def handle(self, *args, **options):
+        total = options['mensajes']
+        stub = SMTPStub(latencia=options['latencia']).start()
+        try:
+            def uno_por_llamada():
+                return sum(self._backend(stub).send_messages([self._message(n)]) for n in range(total))
+
+            def un_lote():
+                return self._backend(stub).send_messages([self._message(n) for n in range(total)])
+
+            with override_settings(EMAIL_POOL_SIZE=0):
+                self._run('Sin pool, una conexión por correo', stub, uno_por_llamada)
+            self._run('Con pool, un send_messages por correo', stub, uno_por_llamada)
+            self._run('Con pool, un lote', stub, un_lote)
+        finally:
+            close_pool()
+            stub.stop()
+
+        self.stdout.write(self.style.SUCCESS('Benchmark completado'))
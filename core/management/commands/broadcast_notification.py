@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from core.models import Usuario
+from core.notification_broadcast import broadcast, target_users
+
+class Command(BaseCommand):
+    help = 'Envía una notificación a todos los usuarios o a los de un rol, una zona o con actividad reciente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('titulo', help='Título de la notificación')
+        parser.add_argument('mensaje', help='Texto de la notificación')
+        parser.add_argument('--tipo', default='sistema', help='Tipo de notificación')
+        parser.add_argument(
+            '--rol',
+            action='append',
+            choices=[rol for rol, _ in Usuario.ROLES],
+            help='Rol destinatario (se puede repetir; por defecto todos)',
+        )
+        parser.add_argument('--zona', help='Zona de recolección o barrio de los destinatarios')
+        parser.add_argument('--activos-dias', type=int, help='Solo usuarios que iniciaron sesión en los últimos N días')
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Solo contar los destinatarios sin crear notificaciones',
+        )
+
+    def handle(self, *args, **options):
+        usuarios = target_users(
+            roles=options['rol'], zona=options['zona'], activos_dias=options['activos_dias']
+        )
+
+        if options['simular']:
+            self.stdout.write(f'Destinatarios: {usuarios.count()}')
+            return
+
+        def progreso(enviadas, total, segundos):
+            self.stdout.write(f'{enviadas}/{total} notificaciones ({enviadas / max(segundos, 1e-9):.0f}/s)')
+
+        resultado = broadcast(
+            options['titulo'], options['mensaje'], tipo=options['tipo'], usuarios=usuarios, progress=progreso
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Difusión enviada a {resultado['usuarios']} usuarios en {resultado['lotes']} lotes, "
+                f"{resultado['segundos']:.2f}s ({resultado['por_segundo']:.0f} notificaciones/s)."
+            )
+        )
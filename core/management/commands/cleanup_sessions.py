@@ -1,38 +1,81 @@
 from django.core.management.base import BaseCommand
+from core.models import ArchivoSeguridad, IntentoAcceso, SesionUsuario
+from core.notification_retention import table_stats
 from core.security import SecurityManager
+from core.security_retention import archive_security_rows
 from django.utils import timezone
 
+def _formato(filas, tamano):
+    if tamano is None:
+        return f'{filas} filas'
+    return f'{filas} filas, {tamano / 1024:.0f} KiB'
+
+def _ritmo(resultado):
+    if not resultado.segundos:
+        return f'{resultado.filas} filas en {resultado.lotes} lotes'
+    return (
+        f'{resultado.filas} filas en {resultado.lotes} lotes, {resultado.segundos:.2f} s '
+        f'({resultado.filas / resultado.segundos:.0f} filas/s)'
+    )
+
 class Command(BaseCommand):
-    help = 'Limpia sesiones expiradas e inactivas del sistema'
-    
+    help = 'Limpia sesiones expiradas e inactivas del sistema y archiva sesiones e intentos de acceso antiguos'
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--verbose',
             action='store_true',
             help='Muestra información detallada del proceso',
         )
-    
+        parser.add_argument(
+            '--sin-archivar',
+            action='store_true',
+            help='Solo marcar las sesiones vencidas, sin aplicar la retención',
+        )
+        parser.add_argument(
+            '--pausa',
+            type=float,
+            default=0,
+            help='Segundos de espera entre lotes de archivo para repartir la carga',
+        )
+
     def handle(self, *args, **options):
         verbose = options['verbose']
-        
+
         if verbose:
             self.stdout.write(f'Iniciando limpieza de sesiones - {timezone.now()}')
-        
+
         # Limpiar sesiones expiradas
         expired_count = SecurityManager.cleanup_expired_sessions()
-        
+
         # Limpiar sesiones inactivas
         inactive_count = SecurityManager.cleanup_inactive_sessions()
-        
+
         total_cleaned = expired_count + inactive_count
-        
+
         if verbose:
             self.stdout.write(f'Sesiones expiradas limpiadas: {expired_count}')
             self.stdout.write(f'Sesiones inactivas limpiadas: {inactive_count}')
             self.stdout.write(f'Total de sesiones limpiadas: {total_cleaned}')
-        
+
+        archivadas = 0
+        if not options['sin_archivar']:
+            if verbose:
+                self.stdout.write(f'Sesiones antes: {_formato(*table_stats(SesionUsuario))}')
+                self.stdout.write(f'Intentos de acceso antes: {_formato(*table_stats(IntentoAcceso))}')
+
+            resultado = archive_security_rows(pausa=options['pausa'])
+            archivadas = resultado['sesiones'].filas + resultado['intentos'].filas
+
+            self.stdout.write(f"Sesiones archivadas: {_ritmo(resultado['sesiones'])}")
+            self.stdout.write(f"Intentos de acceso archivados: {_ritmo(resultado['intentos'])}")
+            if verbose:
+                self.stdout.write(f'Sesiones después: {_formato(*table_stats(SesionUsuario))}')
+                self.stdout.write(f'Intentos de acceso después: {_formato(*table_stats(IntentoAcceso))}')
+                self.stdout.write(f'Archivo: {_formato(*table_stats(ArchivoSeguridad))}')
+
         self.stdout.write(
             self.style.SUCCESS(
-                f'Limpieza completada exitosamente. {total_cleaned} sesiones eliminadas.'
+                f'Limpieza completada exitosamente. {total_cleaned} sesiones eliminadas, {archivadas} filas archivadas.'
             )
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.query_plans import explain, full_scans, hot_queries
+
+class Command(BaseCommand):
+    help = 'Muestra el plan de ejecución de las consultas frecuentes y falla si alguna recorre la tabla completa'
+
+    def handle(self, *args, **options):
+        regresiones = 0
+        for nombre, queryset in hot_queries().items():
+            plan = explain(queryset)
+            lineas = full_scans(plan, queryset.model._meta.db_table)
+            estilo = self.style.ERROR if lineas else self.style.SUCCESS
+            self.stdout.write(estilo(nombre))
+            for linea in plan.splitlines():
+                self.stdout.write(f'    {linea}')
+            regresiones += bool(lineas)
+
+        if regresiones:
+            raise CommandError(f'{regresiones} consultas recorren la tabla completa')
+        self.stdout.write(self.style.SUCCESS('Todas las consultas frecuentes usan un índice.'))
@@ -0,0 +1,72 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import Notificacion, Usuario
+from core.notification_broadcast import broadcast
+
+PREFIX = 'loadtest_difusion_'
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de la difusión: crea N usuarios de prueba, les envía una notificación '
+        'y compara el tiempo contra crearlas una por una'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20000, help='Usuarios de prueba')
+        parser.add_argument(
+            '--muestra',
+            type=int,
+            default=500,
+            help='Notificaciones a crear una por una para estimar el costo del método anterior',
+        )
+
+    def _limpiar(self):
+        # Borrado directo: las señales por fila harían la limpieza más lenta que la prueba
+        usuarios = Usuario.objects.filter(username__startswith=PREFIX)
+        Notificacion.objects.filter(usuario__in=usuarios)._raw_delete(connection.alias)
+        usuarios._raw_delete(connection.alias)
+
+    def handle(self, *args, **options):
+        self._limpiar()
+        password = make_password(None)
+        Usuario.objects.bulk_create([
+            Usuario(username=f'{PREFIX}{i}', email=f'{PREFIX}{i}@example.com', password=password)
+            for i in range(options['usuarios'])
+        ], batch_size=2000)
+        usuarios = Usuario.objects.filter(username__startswith=PREFIX)
+
+        try:
+            # Método anterior: una notificación (y sus señales) por usuario
+            muestra = list(usuarios.order_by('pk')[:options['muestra']])
+            inicio = time.perf_counter()
+            for usuario in muestra:
+                Notificacion.objects.create(usuario=usuario, titulo='Prueba', mensaje='Una por una')
+            por_fila = (time.perf_counter() - inicio) / max(len(muestra), 1)
+            Notificacion.objects.filter(usuario__in=usuarios)._raw_delete(connection.alias)
+            usuarios.update(notificaciones_no_leidas=0)
+
+            def progreso(enviadas, total, segundos):
+                self.stdout.write(f'{enviadas}/{total} ({enviadas / max(segundos, 1e-9):.0f}/s)')
+
+            resultado = broadcast('Prueba de difusión', 'Difusión masiva', usuarios=usuarios, progress=progreso)
+
+            creadas = Notificacion.objects.filter(usuario__in=usuarios).count()
+            contadores = usuarios.filter(notificaciones_no_leidas=1).count()
+        finally:
+            self._limpiar()
+
+        self.stdout.write(
+            f"Difusión: {resultado['usuarios']} notificaciones en {resultado['segundos']:.2f}s "
+            f"({resultado['por_segundo']:.0f}/s)"
+        )
+        self.stdout.write(
+            f'Una por una: {por_fila * 1000:.2f}ms por notificación, '
+            f'~{por_fila * options["usuarios"]:.1f}s para {options["usuarios"]} usuarios'
+        )
+        if creadas != options['usuarios'] or contadores != options['usuarios']:
+            raise CommandError(f'{creadas} notificaciones y {contadores} contadores para {options["usuarios"]} usuarios')
+        self.stdout.write(self.style.SUCCESS('Cada usuario recibió exactamente una notificación'))
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, RequestFactory
+
+from core.models import Notificacion, Usuario
+from core.routing import websocket_urlpatterns
+from core.security import SecurityManager
+
+USERNAME = 'loadtest_notificaciones'
+
+# Intervalo de consulta del cliente cuando no hay WebSocket
+POLL_SECONDS = 30
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de las notificaciones: abre N pestañas por WebSocket, crea notificaciones, '
+        'verifica que todas las reciban y compara las peticiones HTTP contra la consulta periódica'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pestanas', type=int, default=20, help='Pestañas abiertas del mismo usuario')
+        parser.add_argument('--notificaciones', type=int, default=10, help='Notificaciones a crear')
+        parser.add_argument('--minutos', type=int, default=10, help='Ventana para estimar las peticiones')
+
+    def handle(self, *args, **options):
+        Usuario.objects.filter(username=USERNAME).delete()
+        usuario = Usuario.objects.create_user(
+            username=USERNAME, email=f'{USERNAME}@example.com', password=None
+        )
+        try:
+            recibidas, latencias, duracion = async_to_sync(self.run)(
+                usuario, options['pestanas'], options['notificaciones']
+            )
+            costo_peticion = self.measure_request(usuario)
+        finally:
+            Usuario.objects.filter(username=USERNAME).delete()
+
+        pestanas, total = options['pestanas'], options['notificaciones']
+        esperadas = pestanas * total
+        self.stdout.write(
+            f'{total} notificaciones entregadas a {pestanas} pestañas en {duracion:.2f}s: '
+            f'{recibidas}/{esperadas} mensajes'
+        )
+        if latencias:
+            latencias.sort()
+            self.stdout.write(
+                f'Latencia creación → pestaña: mediana {latencias[len(latencias) // 2] * 1000:.1f}ms, '
+                f'máxima {latencias[-1] * 1000:.1f}ms'
+            )
+
+        # Peticiones HTTP en la ventana: con consulta periódica cada pestaña pide
+        # la lista cada POLL_SECONDS; con push solo la pide al cargar la página
+        ventana = options['minutos'] * 60
+        polling = pestanas * (ventana // POLL_SECONDS + 1)
+        push = pestanas
+        self.stdout.write(f'Costo de GET /api/notifications/ con todo el middleware: {costo_peticion * 1000:.1f}ms')
+        self.stdout.write(
+            f'En {options["minutos"]} min con {pestanas} pestañas: consulta periódica {polling} peticiones '
+            f'(~{polling * costo_peticion:.1f}s de servidor), push {push} peticiones '
+            f'(~{push * costo_peticion:.2f}s) y {pestanas} conexiones WebSocket'
+        )
+
+        if recibidas != esperadas:
+            raise CommandError(f'Se perdieron {esperadas - recibidas} mensajes')
+        self.stdout.write(self.style.SUCCESS('Todas las pestañas recibieron todas las notificaciones'))
+
+    async def run(self, usuario, pestanas, total):
+        application = URLRouter(websocket_urlpatterns)
+        tabs = []
+        for _ in range(pestanas):
+            communicator = WebsocketCommunicator(application, f'/ws/notificaciones/{usuario.id}/')
+            communicator.scope['user'] = usuario
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise CommandError('El consumer rechazó la conexión')
+            # Mensaje inicial con las no leídas
+            await communicator.receive_json_from()
+            tabs.append(communicator)
+
+        crear = database_sync_to_async(
+            lambda n: Notificacion.objects.create(usuario=usuario, titulo=f'Prueba {n}', mensaje='Prueba de carga')
+        )
+
+        async def escuchar(communicator):
+            tiempos = []
+            for _ in range(total):
+                try:
+                    mensaje = json.loads(await communicator.receive_from(timeout=5))
+                except asyncio.TimeoutError:
+                    break
+                if mensaje.get('type') == 'notification':
+                    tiempos.append(time.perf_counter())
+            return tiempos
+
+        inicio = time.perf_counter()
+        oyentes = [asyncio.ensure_future(escuchar(tab)) for tab in tabs]
+        enviados = []
+        for n in range(total):
+            enviados.append(time.perf_counter())
+            await crear(n)
+        resultados = await asyncio.gather(*oyentes)
+        duracion = time.perf_counter() - inicio
+
+        for tab in tabs:
+            await tab.disconnect()
+
+        latencias = [
+            recibido - enviados[i]
+            for tiempos in resultados
+            for i, recibido in enumerate(tiempos)
+        ]
+        return sum(len(tiempos) for tiempos in resultados), latencias, duracion
+
+    def measure_request(self, usuario, repeticiones=20):
+        """Tiempo promedio de una consulta de notificaciones atravesando el middleware"""
+        host = next((h for h in settings.ALLOWED_HOSTS if h and '*' not in h and not h.startswith('.')), 'localhost')
+        client = Client(HTTP_HOST=host)
+        client.force_login(usuario)
+
+        # Sesión segura como la del inicio de sesión, para que la guardia de sesión deje pasar
+        session = client.session
+        request = RequestFactory().get('/')
+        request.session = session
+        SecurityManager.create_secure_session(request, usuario)
+        session.save()
+
+        response = client.get('/api/notifications/')
+        if response.status_code != 200:
+            raise CommandError(f'GET /api/notifications/ respondió {response.status_code}')
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            client.get('/api/notifications/')
+        return (time.perf_counter() - inicio) / repeticiones
@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.models import Canje, MaterialTasa, MovimientoPuntos, Usuario
+from core.points_ledger import credit_canje, ledger_balance
+
+PREFIX = 'loadtest_'
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga del libro mayor: aprueba canjes en paralelo (cada uno dos veces) '
+        'y verifica que ningún punto se pierda ni se acredite dos veces'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=5, help='Usuarios de prueba')
+        parser.add_argument('--canjes', type=int, default=40, help='Canjes por usuario')
+        parser.add_argument('--hilos', type=int, default=8, help='Aprobaciones concurrentes')
+        parser.add_argument(
+            '--conservar',
+            action='store_true',
+            help='No borrar los usuarios de prueba al terminar',
+        )
+
+    def handle(self, *args, **options):
+        material = MaterialTasa.objects.first()
+        if material is None:
+            raise CommandError('Se necesita al menos un material para crear canjes de prueba')
+
+        # Limpiar restos de una ejecución anterior
+        Usuario.objects.filter(username__startswith=PREFIX).delete()
+
+        usuarios = [
+            Usuario.objects.create_user(
+                username=f'{PREFIX}{i}', email=f'{PREFIX}{i}@example.com', password=None, puntos=0
+            )
+            for i in range(options['usuarios'])
+        ]
+        canjes = Canje.objects.bulk_create([
+            Canje(usuario=usuario, material=material, peso=1, puntos=10 + n % 7)
+            for usuario in usuarios
+            for n in range(options['canjes'])
+        ])
+
+        # Cada canje se aprueba dos veces, como un doble clic o dos administradores a la vez
+        pendientes = queue.Queue()
+        for canje_id in [canje.id for canje in canjes] * 2:
+            pendientes.put(canje_id)
+
+        errores = []
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        canje_id = pendientes.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        with transaction.atomic():
+                            Canje.objects.filter(pk=canje_id).update(estado='aprobado', fecha_procesamiento=timezone.now())
+                            credit_canje(Canje.objects.select_related('usuario', 'material').get(pk=canje_id))
+                    except Exception as e:
+                        errores.append(f'Canje {canje_id}: {e}')
+            finally:
+                connection.close()
+
+        if connection.vendor == 'sqlite':
+            self.stdout.write('SQLite serializa las escrituras: el resultado mide corrección más que rendimiento')
+
+        close_old_connections()
+        hilos = [threading.Thread(target=worker) for _ in range(options['hilos'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        aprobaciones = len(canjes) * 2
+        self.stdout.write(
+            f'{aprobaciones} aprobaciones con {options["hilos"]} hilos en {duracion:.2f}s '
+            f'({aprobaciones / max(duracion, 1e-9):.0f} aprobaciones/s)'
+        )
+        for error in errores[:10]:
+            self.stdout.write(self.style.WARNING(error))
+
+        # Verificar: saldo = suma de los canjes = libro mayor, un movimiento por canje
+        fallos = 0
+        for usuario in usuarios:
+            usuario.refresh_from_db(fields=['puntos'])
+            esperado = Canje.objects.filter(usuario=usuario).aggregate(total=Sum('puntos'))['total'] or 0
+            movimientos = MovimientoPuntos.objects.filter(usuario=usuario, tipo='canje').count()
+            libro = ledger_balance(usuario.id)
+            if usuario.puntos != esperado or libro != esperado or movimientos != options['canjes']:
+                fallos += 1
+                self.stdout.write(self.style.ERROR(
+                    f'{usuario.username}: saldo {usuario.puntos}, libro mayor {libro}, '
+                    f'esperado {esperado}, movimientos {movimientos}'
+                ))
+
+        if not options['conservar']:
+            Usuario.objects.filter(username__startswith=PREFIX).delete()
+
+        if fallos or errores:
+            raise CommandError(f'{fallos} saldos incorrectos y {len(errores)} errores')
+        self.stdout.write(
+            self.style.SUCCESS('Todos los saldos coinciden con los canjes y el libro mayor')
+        )
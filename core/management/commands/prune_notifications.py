@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from core.models import Notificacion, NotificacionArchivada
+from core.notification_retention import compact_notifications, expire_notifications, table_stats
+
+def _formato(filas, tamano):
+    if tamano is None:
+        return f'{filas} filas'
+    return f'{filas} filas, {tamano / 1024:.0f} KiB'
+
+class Command(BaseCommand):
+    help = 'Agrupa las notificaciones repetidas y borra o archiva las vencidas según la política de retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pausa',
+            type=float,
+            default=0,
+            help='Segundos de espera entre lotes para repartir la carga',
+        )
+        parser.add_argument(
+            '--sin-compactar',
+            action='store_true',
+            help='Solo aplicar los TTL, sin agrupar repetidas',
+        )
+
+    def handle(self, *args, **options):
+        antes = table_stats(Notificacion)
+        self.stdout.write(f'Notificaciones antes: {_formato(*antes)}')
+
+        agrupadas = 0
+        if not options['sin_compactar']:
+            agrupadas = compact_notifications(pausa=options['pausa'])
+        resultado = expire_notifications(pausa=options['pausa'])
+
+        despues = table_stats(Notificacion)
+        self.stdout.write(f'Notificaciones después: {_formato(*despues)}')
+        self.stdout.write(f'Archivo: {_formato(*table_stats(NotificacionArchivada))}')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Retención aplicada. {agrupadas} agrupadas, {resultado['borradas']} borradas, "
+                f"{resultado['archivadas']} archivadas."
+            )
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from core.activity_summary import rebuild_summary
+from core.models import Usuario
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen de actividad de los usuarios desde sus canjes y redenciones'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--usuario',
+            type=int,
+            help='ID de un usuario concreto (por defecto todos los usuarios regulares)',
+        )
+    
+    def handle(self, *args, **options):
+        usuarios = Usuario.objects.filter(role='user')
+        if options['usuario']:
+            usuarios = Usuario.objects.filter(pk=options['usuario'])
+        
+        total = 0
+        for usuario_id in usuarios.values_list('id', flat=True).iterator():
+            rebuild_summary(usuario_id)
+            total += 1
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Resúmenes de actividad reconstruidos: {total}')
+        )
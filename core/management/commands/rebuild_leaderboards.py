@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from core.leaderboard import BOARDS, WINDOW_BOARDS, board_key, get_leaderboard
+
+class Command(BaseCommand):
+    help = 'Reconstruye los tableros de ranking desde la base de datos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tablero',
+            action='append',
+            choices=BOARDS,
+            help='Reconstruir solo este tablero (se puede repetir)',
+        )
+    
+    def handle(self, *args, **options):
+        leaderboard = get_leaderboard()
+        
+        for board in options['tablero'] or BOARDS:
+            total = leaderboard.rebuild(board)
+            self.stdout.write(f'{board_key(board)}: {total} usuarios')
+        
+        # Los tableros de periodos anteriores solo se acumulan en la base de datos
+        prune = getattr(leaderboard.backend, 'prune', None)
+        if prune:
+            borrados = prune([board_key(board) for board in WINDOW_BOARDS])
+            self.stdout.write(f'Puntajes de periodos anteriores eliminados: {borrados}')
+        
+        self.stdout.write(
+            self.style.SUCCESS('Rankings reconstruidos')
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from core.rollups import backfill_rollups, run_rollups
+
+class Command(BaseCommand):
+    help = 'Calcula por primera vez los rollups diarios de las fuentes que nunca se procesaron (paso del despliegue después de migrate)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Recalcular todas las fuentes y todos los días, aunque ya tengan watermark',
+        )
+    
+    def handle(self, *args, **options):
+        if options['completo']:
+            resultado = run_rollups(full=True)
+        else:
+            resultado = backfill_rollups()
+        
+        if not resultado:
+            self.stdout.write('Todas las fuentes ya tenían rollups calculados')
+        for nombre, dias in resultado.items():
+            self.stdout.write(f'{nombre}: {dias} días calculados')
+        
+        self.stdout.write(
+            self.style.SUCCESS('Rollups diarios reconstruidos')
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from core.notification_counter import reconcile_unread_counters
+
+class Command(BaseCommand):
+    help = 'Corrige el contador de notificaciones no leídas de los usuarios que se hayan desviado (ejecutar periódicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--usuario',
+            type=int,
+            action='append',
+            help='ID del usuario a revisar (por defecto, todos)',
+        )
+
+    def handle(self, *args, **options):
+        corregidos = reconcile_unread_counters(options['usuario'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Contadores revisados. {corregidos} corregidos.')
+        )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from core.rollups import FUENTES, run_rollups
+
+class Command(BaseCommand):
+    help = 'Actualiza las tablas de rollups diarios con las filas nuevas o modificadas desde la última ejecución'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fuente',
+            action='append',
+            choices=[fuente.nombre for fuente in FUENTES],
+            help='Procesar solo esta fuente (se puede repetir)',
+        )
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Ignorar los watermarks y recalcular todos los días con datos',
+        )
+    
+    def handle(self, *args, **options):
+        resultado = run_rollups(fuentes=options['fuente'], full=options['completo'])
+        
+        for nombre, dias in resultado.items():
+            self.stdout.write(f'{nombre}: {dias} días recalculados')
+        
+        self.stdout.write(
+            self.style.SUCCESS('Rollups diarios actualizados')
+        )
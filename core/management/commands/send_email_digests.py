@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from core.email_digest import send_digests
+
+class Command(BaseCommand):
+    help = 'Envía el resumen de notificaciones por correo de los usuarios cuya ventana ya venció'
+    
+    def handle(self, *args, **options):
+        resumenes, incluidas = send_digests()
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'{resumenes} resúmenes enviados con {incluidas} notificaciones.')
+        )
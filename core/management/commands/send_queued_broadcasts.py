@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.notification_broadcast import dispatch_queued_broadcasts
+
+class Command(BaseCommand):
+    help = 'Entrega las difusiones de notificaciones puestas en cola desde el panel de alertas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Seguir revisando la cola en lugar de terminar cuando quede vacía',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2,
+            help='Segundos de espera entre revisiones en modo continuo',
+        )
+
+    def handle(self, *args, **options):
+        totales = {'enviadas': 0, 'fallidas': 0}
+        try:
+            while True:
+                resultado = dispatch_queued_broadcasts()
+                for clave, valor in resultado.items():
+                    totales[clave] += valor
+
+                if any(resultado.values()):
+                    self.stdout.write(f"Enviadas: {resultado['enviadas']}, fallidas: {resultado['fallidas']}")
+                    continue
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Cola procesada. {totales['enviadas']} difusiones enviadas, {totales['fallidas']} fallidas.")
+        )
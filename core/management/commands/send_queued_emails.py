@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.email_outbox import BATCH_SIZE, dispatch_outbox, requeue_failed
+
+class Command(BaseCommand):
+    help = 'Entrega los correos de la bandeja de salida con reintentos y backoff exponencial'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=BATCH_SIZE,
+            help='Correos por lote',
+        )
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Seguir revisando la bandeja en lugar de terminar cuando quede vacía',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2,
+            help='Segundos de espera entre revisiones en modo continuo',
+        )
+        parser.add_argument(
+            '--reintentar-fallidos',
+            action='store_true',
+            help='Volver a poner en cola los correos fallidos antes de empezar',
+        )
+
+    def handle(self, *args, **options):
+        if options['reintentar_fallidos']:
+            self.stdout.write(f'Correos fallidos puestos en cola de nuevo: {requeue_failed()}')
+
+        totales = {'enviados': 0, 'reintentos': 0, 'fallidos': 0}
+        try:
+            while True:
+                resultado = dispatch_outbox(limit=options['lote'])
+                for clave, valor in resultado.items():
+                    totales[clave] += valor
+
+                if any(resultado.values()):
+                    self.stdout.write(
+                        f"Enviados: {resultado['enviados']}, reintentos: {resultado['reintentos']}, "
+                        f"fallidos: {resultado['fallidos']}"
+                    )
+                    # Puede haber más correos vencidos: no esperar
+                    continue
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Bandeja procesada. {totales['enviados']} enviados, {totales['reintentos']} reprogramados, "
+                f"{totales['fallidos']} fallidos."
+            )
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from core.points_ledger import snapshot_balances
+
+class Command(BaseCommand):
+    help = 'Guarda una foto del saldo de puntos de cada usuario y la compara con el libro mayor'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Tomar foto de todos los usuarios aunque no tengan movimientos nuevos',
+        )
+    
+    def handle(self, *args, **options):
+        tomadas, diferencias = snapshot_balances(todos=options['todos'])
+        
+        self.stdout.write(f'Fotos de saldo guardadas: {tomadas}')
+        for usuario_id, saldo, esperado in diferencias:
+            self.stdout.write(
+                self.style.WARNING(f'Usuario {usuario_id}: saldo {saldo}, libro mayor {esperado}')
+            )
+        
+        if diferencias:
+            self.stdout.write(
+                self.style.ERROR(f'{len(diferencias)} saldos no coinciden con el libro mayor')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS('Saldos verificados contra el libro mayor')
+            )
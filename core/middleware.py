@@ -2,6 +2,7 @@ from django.shortcuts import redirect
 from django.contrib.auth import logout
 from django.urls import reverse
 from .security import SecurityManager
+from .session_guard import get_session_guard, path_is_exempt
 import time
 from django.http import JsonResponse
 from django.contrib import messages
@@ -9,100 +10,118 @@ from django.http import HttpResponse
 
 class SecurityMiddleware:
     """Middleware para validar sesiones seguras con timeout de 15 minutos"""
-    
+
+    # URLs que no requieren validación de sesión
+    exempt_urls = [
+        '/',
+        '/iniciosesion/',
+        '/inicioadmin/',
+        '/logout/',
+        '/cerrar-sesion/',
+        '/registrate/',
+        '/recuperar-password/',
+        '/reset-password/',
+        '/static/',
+        '/media/',
+        '/admin/',
+        '/usuario-desactivado/',
+        '/usuario-suspendido/',
+    ]
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # URLs que no requieren validación de sesión
-        exempt_urls = [
-            '/',
-            '/iniciosesion/',
-            '/inicioadmin/',
-            '/logout/',
-            '/cerrar-sesion/',
-            '/registrate/',
-            '/recuperar-password/',
-            '/reset-password/',
-            '/static/',
-            '/media/',
-            '/admin/',
-            '/usuario-desactivado/',
-            '/usuario-suspendido/',
-        ]
-
-        # Verificar si la URL actual está exenta
-        is_exempt = any(request.path.startswith(url) for url in exempt_urls)
-
         if request.user.is_authenticated:
-            # La verificación de usuarios desactivados/suspendidos se maneja en UserStatusMiddleware
-            # para evitar duplicación de lógica
-            
-            # Solo validar sesión si la URL no está exenta y no es superuser en admin
-            if not is_exempt and not (request.path.startswith('/admin/') and request.user.is_superuser):
-                is_valid, message = SecurityManager.validate_session(request)
-                if not is_valid:
-                    # Invalidar sesión y redirigir al login
-                    SecurityManager.invalidate_session(request)
-                    logout(request)
-                    if 'inactividad' in message.lower() or 'expirada' in message.lower():
-                        messages.warning(request, 'Tu sesión ha expirado por inactividad. Por favor, inicia sesión nuevamente.')
-                        # Redirección diferenciada según tipo de usuario
-                        if hasattr(request.user, 'role') and request.user.role == 'admin':
-                            return redirect('inicioadmin')
-                        else:
-                            return redirect('iniciosesion')
-                    else:
-                        messages.error(request, f'Sesión inválida: {message}')
-                        # Redirección diferenciada según tipo de usuario
-                        if hasattr(request.user, 'role') and request.user.role == 'admin':
-                            return redirect('inicioadmin')
-                        else:
-                            return redirect('iniciosesion')
-        
+            response = self.check(request, get_session_guard(request))
+            if response is not None:
+                return response
+
         response = self.get_response(request)
         return response
 
+    def check(self, request, guard):
+        """Valida dispositivo, IP y expiración de la sesión segura"""
+        # Verificar si la URL actual está exenta
+        is_exempt = path_is_exempt(request.path, self.exempt_urls)
+
+        # La verificación de usuarios desactivados/suspendidos se maneja en UserStatusMiddleware
+        # para evitar duplicación de lógica
+
+        # Solo validar sesión si la URL no está exenta y no es superuser en admin
+        if is_exempt or (request.path.startswith('/admin/') and request.user.is_superuser):
+            return None
+
+        is_valid, message = SecurityManager.validate_session(request)
+        if is_valid:
+            return None
+
+        # Determinar la redirección antes de cerrar la sesión
+        is_admin = hasattr(request.user, 'role') and request.user.role == 'admin'
+
+        # Invalidar sesión y redirigir al login
+        SecurityManager.invalidate_session(request)
+        logout(request)
+        if 'inactividad' in message.lower() or 'expirada' in message.lower():
+            messages.warning(request, 'Tu sesión ha expirado por inactividad. Por favor, inicia sesión nuevamente.')
+        else:
+            messages.error(request, f'Sesión inválida: {message}')
+
+        # Redirección diferenciada según tipo de usuario
+        if is_admin:
+            return redirect('inicioadmin')
+        return redirect('iniciosesion')
+
 class UserStatusMiddleware:
     """Middleware para verificar el estado de usuarios desactivados o suspendidos"""
-    
+
+    # URLs que no requieren verificación de estado
+    exempt_urls = [
+        '/',
+        '/iniciosesion/',
+        '/inicioadmin/',
+        '/registrate/',
+        '/recuperar-password/',
+        '/reset-password/',
+        '/static/',
+        '/media/',
+        '/admin/',
+        '/usuario-desactivado/',
+        '/usuario-suspendido/',
+        '/cerrar-sesion/',
+        '/logout/',
+    ]
+
     def __init__(self, get_response):
         self.get_response = get_response
-    
+
     def __call__(self, request):
-        # URLs que no requieren verificación de estado
-        exempt_urls = [
-            '/',
-            '/iniciosesion/',
-            '/inicioadmin/',
-            '/registrate/',
-            '/recuperar-password/',
-            '/reset-password/',
-            '/static/',
-            '/media/',
-            '/admin/',
-            '/usuario-desactivado/',
-            '/usuario-suspendido/',
-            '/cerrar-sesion/',
-            '/logout/',
-        ]
-        
-        # Verificar si la URL actual está exenta
-        is_exempt = any(request.path.startswith(url) for url in exempt_urls)
-        
-        # Solo verificar si el usuario está autenticado y la URL no está exenta
-        if request.user.is_authenticated and not is_exempt and not (request.path.startswith('/admin/') and request.user.is_superuser):
-            # Verificar primero si el usuario está suspendido (prioridad sobre desactivado)
-            if hasattr(request.user, 'suspended') and request.user.suspended:
-                logout(request)
-                # Redirigir a la página de usuario suspendido
-                return redirect('usuario_suspendido')
-            
-            # Verificar si el usuario está desactivado
-            if not request.user.is_active:
-                logout(request)
-                # Redirigir a la página de usuario desactivado
-                return redirect('usuario_desactivado')
-        
+        if request.user.is_authenticated:
+            response = self.check(request, get_session_guard(request))
+            if response is not None:
+                return response
+
         response = self.get_response(request)
         return response
+
+    def check(self, request, guard):
+        """Redirige a usuarios suspendidos o desactivados"""
+        # Solo verificar si la URL no está exenta
+        if path_is_exempt(request.path, self.exempt_urls):
+            return None
+        if request.path.startswith('/admin/') and request.user.is_superuser:
+            return None
+
+        # Verificar primero si el usuario está suspendido (prioridad sobre desactivado)
+        if guard.is_suspended:
+            logout(request)
+            # Redirigir a la página de usuario suspendido
+            return redirect('usuario_suspendido')
+
+        # Verificar si el usuario está desactivado
+        if not guard.is_active:
+            logout(request)
+            # Redirigir a la página de usuario desactivado
+            return redirect('usuario_desactivado')
+
+        return None
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_conversaciondirecta_solicitudsoporte_admin_asignado_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenActividad',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen_actividad', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('racha_actual', models.PositiveIntegerField(default=0)),
+                ('ultima_actividad', models.DateField(blank=True, null=True)),
+                ('semana_inicio', models.DateField(blank=True, null=True)),
+                ('puntos_semana', models.IntegerField(default=0)),
+                ('mes_inicio', models.DateField(blank=True, null=True)),
+                ('puntos_mes', models.IntegerField(default=0)),
+                ('total_kg', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_canjes', models.PositiveIntegerField(default=0)),
+                ('canjes_aprobados', models.PositiveIntegerField(default=0)),
+                ('puntos_redimidos', models.IntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Actividad',
+                'verbose_name_plural': 'Resúmenes de Actividad',
+            },
+        ),
+    ]
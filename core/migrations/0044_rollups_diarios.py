@@ -0,0 +1,132 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_resumenactividad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupChatbotDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('conversaciones', models.PositiveIntegerField(default=0)),
+                ('mensajes_usuario', models.PositiveIntegerField(default=0)),
+                ('mensajes_bot', models.PositiveIntegerField(default=0)),
+                ('respuestas_con_confianza', models.PositiveIntegerField(default=0)),
+                ('confianza_total', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Rollup diario del chatbot',
+                'verbose_name_plural': 'Rollups diarios del chatbot',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('valor', models.DateTimeField(blank=True, null=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Watermark de rollup',
+                'verbose_name_plural': 'Watermarks de rollup',
+            },
+        ),
+        migrations.AddField(
+            model_name='canje',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='redencionpuntos',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='RollupDiaPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fuente', models.CharField(max_length=50)),
+                ('fecha', models.DateField()),
+            ],
+            options={
+                'unique_together': {('fuente', 'fecha')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupRedencionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=20)),
+                ('estado', models.CharField(max_length=20)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('puntos_total', models.BigIntegerField(default=0)),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Rollup diario de redenciones',
+                'verbose_name_plural': 'Rollups diarios de redenciones',
+                'indexes': [models.Index(fields=['estado', 'fecha'], name='core_rollup_estado_9299e5_idx')],
+                'unique_together': {('fecha', 'metodo_pago', 'estado')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupSeguridadDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('motivo', models.CharField(max_length=100)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('ips_distintas', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Rollup diario de seguridad',
+                'verbose_name_plural': 'Rollups diarios de seguridad',
+                'unique_together': {('fecha', 'motivo')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupUsuarioDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('rol', models.CharField(max_length=10)),
+                ('nuevos_usuarios', models.PositiveIntegerField(default=0)),
+                ('sesiones', models.PositiveIntegerField(default=0)),
+                ('usuarios_con_sesion', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Rollup diario de usuarios',
+                'verbose_name_plural': 'Rollups diarios de usuarios',
+                'unique_together': {('fecha', 'rol')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupCanjeDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('zona', models.CharField(blank=True, max_length=50)),
+                ('estado', models.CharField(max_length=25)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('peso_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('puntos_total', models.BigIntegerField(default=0)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.materialtasa')),
+            ],
+            options={
+                'verbose_name': 'Rollup diario de canjes',
+                'verbose_name_plural': 'Rollups diarios de canjes',
+                'indexes': [models.Index(fields=['estado', 'fecha'], name='core_rollup_estado_c0b1eb_idx')],
+                'unique_together': {('fecha', 'material', 'zona', 'estado')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_rollups_diarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableroRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=40, unique=True)),
+                ('fecha_construccion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Tablero de ranking',
+                'verbose_name_plural': 'Tableros de ranking',
+            },
+        ),
+        migrations.CreateModel(
+            name='PuntajeRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tablero', models.CharField(max_length=40)),
+                ('puntaje', models.FloatField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='puntajes_ranking', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Puntaje de ranking',
+                'verbose_name_plural': 'Puntajes de ranking',
+                'indexes': [models.Index(fields=['tablero', '-puntaje', 'usuario'], name='core_puntaj_tablero_d48ba6_idx')],
+                'unique_together': {('tablero', 'usuario')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_puntaje_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoPuntos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('canje', 'Canje aprobado'), ('juego', 'Puntos de juego'), ('recompensa', 'Canje de recompensa'), ('redencion', 'Redención de puntos'), ('devolucion_redencion', 'Devolución de redención'), ('ajuste', 'Ajuste administrativo')], max_length=25)),
+                ('delta', models.IntegerField()),
+                ('saldo_resultante', models.IntegerField()),
+                ('origen_tipo', models.CharField(blank=True, max_length=50)),
+                ('origen_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('descripcion', models.CharField(blank=True, max_length=255)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('realizado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_puntos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de puntos',
+                'verbose_name_plural': 'Movimientos de puntos',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['usuario', '-id'], name='core_movimi_usuario_6cff7e_idx'), models.Index(fields=['origen_tipo', 'origen_id'], name='core_movimi_origen__5a0079_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('tipo', 'canje')), fields=('tipo', 'origen_tipo', 'origen_id'), name='movimiento_unico_por_canje')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoPuntos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('saldo', models.IntegerField()),
+                ('ultimo_movimiento_id', models.BigIntegerField(default=0)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_puntos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Saldo de puntos',
+                'verbose_name_plural': 'Saldos de puntos',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['usuario', '-id'], name='core_saldop_usuario_78932e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_bandeja_correos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='resumen_correos',
+            field=models.BooleanField(default=True, help_text='Agrupar los correos de notificaciones en un resumen periódico'),
+        ),
+        migrations.CreateModel(
+            name='ResumenCorreoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asunto', models.CharField(max_length=255)),
+                ('resumen', models.TextField()),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_correos_pendientes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Notificación pendiente de resumen',
+                'verbose_name_plural': 'Notificaciones pendientes de resumen',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def calcular_no_leidas(apps, schema_editor):
+    Notificacion = apps.get_model('core', 'Notificacion')
+    Usuario = apps.get_model('core', 'Usuario')
+    reales = (
+        Notificacion.objects.filter(usuario=OuterRef('pk'), leida=False)
+        .order_by().values('usuario').annotate(total=Count('id')).values('total')
+    )
+    Usuario.objects.update(notificaciones_no_leidas=Coalesce(Subquery(reales), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_resumen_correos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='notificaciones_no_leidas',
+            field=models.IntegerField(default=0, editable=False, help_text='Contador desnormalizado de notificaciones no leídas'),
+        ),
+        migrations.RunPython(calcular_no_leidas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_contador_no_leidas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionArchivada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('tipo', models.CharField(choices=[('canje_pendiente', 'Canje Pendiente'), ('canje_aprobado', 'Canje Aprobado'), ('canje_rechazado', 'Canje Rechazado'), ('redencion_pendiente', 'Redención Pendiente'), ('redencion_aprobada', 'Redención Aprobada'), ('redencion_rechazada', 'Redención Rechazada'), ('recompensa_canjeada', 'Recompensa Canjeada'), ('retiro_enviado', 'Retiro Enviado'), ('perfil_actualizado', 'Perfil Actualizado'), ('password_cambiado', 'Contraseña Cambiada'), ('foto_actualizada', 'Foto Actualizada'), ('juego', 'Partida de Juego'), ('seguridad', 'Seguridad'), ('sistema', 'Sistema')], max_length=30)),
+                ('leida', models.BooleanField(default=False)),
+                ('repeticiones', models.PositiveIntegerField(default=1)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_archivo', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Notificación archivada',
+                'verbose_name_plural': 'Notificaciones archivadas',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notificacion',
+            name='repeticiones',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('canje_pendiente', 'Canje Pendiente'), ('canje_aprobado', 'Canje Aprobado'), ('canje_rechazado', 'Canje Rechazado'), ('redencion_pendiente', 'Redención Pendiente'), ('redencion_aprobada', 'Redención Aprobada'), ('redencion_rechazada', 'Redención Rechazada'), ('recompensa_canjeada', 'Recompensa Canjeada'), ('retiro_enviado', 'Retiro Enviado'), ('perfil_actualizado', 'Perfil Actualizado'), ('password_cambiado', 'Contraseña Cambiada'), ('foto_actualizada', 'Foto Actualizada'), ('juego', 'Partida de Juego'), ('seguridad', 'Seguridad'), ('sistema', 'Sistema')], default='sistema', max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['tipo', 'fecha_creacion'], name='core_notifi_tipo_6eace5_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificacionarchivada',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones_archivadas', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
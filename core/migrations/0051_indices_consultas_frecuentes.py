@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0050_retencion_notificaciones'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='canje',
+            index=models.Index(fields=['usuario', '-fecha_solicitud'], name='canje_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='canje',
+            index=models.Index(fields=['estado', '-fecha_solicitud'], name='canje_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='intentoacceso',
+            index=models.Index(fields=['ip_address', '-fecha_intento'], name='intento_ip_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensajechatbot',
+            index=models.Index(fields=['conversacion', 'timestamp'], name='mensaje_conversacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', '-fecha_creacion'], name='notif_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('leida', False)), fields=['usuario', '-fecha_creacion'], name='notif_no_leidas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recompensa',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['categoria', 'puntos_requeridos'], name='recompensa_catalogo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesionusuario',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['usuario'], name='sesion_usuario_activa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sesionusuario',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['-ultima_actividad'], name='sesion_activa_actividad_idx'),
+        ),
+    ]
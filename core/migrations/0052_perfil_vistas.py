@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0051_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilVista',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('vista', models.CharField(max_length=200)),
+                ('peticiones', models.PositiveIntegerField(default=0)),
+                ('consultas', models.PositiveIntegerField(default=0)),
+                ('consultas_max', models.PositiveIntegerField(default=0)),
+                ('tiempo_db', models.FloatField(default=0)),
+                ('tiempo_plantillas', models.FloatField(default=0)),
+                ('latencia', models.FloatField(default=0)),
+                ('latencia_max', models.FloatField(default=0)),
+                ('duplicadas', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'verbose_name': 'Perfil de vista',
+                'verbose_name_plural': 'Perfiles de vistas',
+                'unique_together': {('fecha', 'vista')},
+            },
+        ),
+    ]
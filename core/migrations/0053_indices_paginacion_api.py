@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0052_perfil_vistas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='canje',
+            index=models.Index(fields=['-fecha_solicitud', '-id'], name='canje_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='redencionpuntos',
+            index=models.Index(fields=['usuario', '-fecha_solicitud', '-id'], name='redencion_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='redencionpuntos',
+            index=models.Index(fields=['-fecha_solicitud', '-id'], name='redencion_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:30
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copiar_ultima_actividad(apps, schema_editor):
+    SesionUsuario = apps.get_model('core', 'SesionUsuario')
+    SesionUsuario.objects.update(fecha_actualizacion=F('ultima_actividad'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0053_indices_paginacion_api'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sesionusuario',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copiar_ultima_actividad, migrations.RunPython.noop),
+    ]
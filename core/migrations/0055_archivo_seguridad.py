@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0054_sesion_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoSeguridad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tabla', models.CharField(choices=[('sesiones', 'Sesiones de usuario'), ('intentos', 'Intentos de acceso')], max_length=20)),
+                ('primer_id', models.BigIntegerField()),
+                ('ultimo_id', models.BigIntegerField()),
+                ('fecha_desde', models.DateTimeField()),
+                ('fecha_hasta', models.DateTimeField()),
+                ('filas', models.PositiveIntegerField()),
+                ('datos', models.BinaryField()),
+                ('fecha_archivo', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archivo de seguridad',
+                'verbose_name_plural': 'Archivos de seguridad',
+                'ordering': ['tabla', 'primer_id'],
+                'indexes': [models.Index(fields=['tabla', 'fecha_desde'], name='archivo_seguridad_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:10
+
+from django.db import migrations
+
+# Títulos fijos de las notificaciones de partida de los juegos (antes tipo 'info')
+TITULOS_JUEGO = (
+    '¡Puntos de juego ganados!',
+    '¡Fábrica de vidrio en acción!',
+    '📄 ¡Fábrica de papel activa!',
+    '🔥 ¡Fundición magnética activa!',
+)
+
+# Las alertas de seguridad se creaban con el título y el tipo por defecto
+TITULO_SEGURIDAD_ANTERIOR = 'Notificación'
+TITULO_SEGURIDAD = 'Alerta de Seguridad'
+PREFIJO_SEGURIDAD = 'Intento de acceso detectado desde IP'
+
+
+def reclasificar(apps, schema_editor):
+    Notificacion = apps.get_model('core', 'Notificacion')
+    Notificacion.objects.filter(tipo='info', titulo__in=TITULOS_JUEGO).update(tipo='juego')
+    Notificacion.objects.filter(
+        tipo='sistema', titulo=TITULO_SEGURIDAD_ANTERIOR, mensaje__startswith=PREFIJO_SEGURIDAD
+    ).update(tipo='seguridad', titulo=TITULO_SEGURIDAD)
+
+
+def revertir(apps, schema_editor):
+    Notificacion = apps.get_model('core', 'Notificacion')
+    Notificacion.objects.filter(tipo='juego', titulo__in=TITULOS_JUEGO).update(tipo='info')
+    Notificacion.objects.filter(
+        tipo='seguridad', titulo=TITULO_SEGURIDAD, mensaje__startswith=PREFIJO_SEGURIDAD
+    ).update(tipo='sistema', titulo=TITULO_SEGURIDAD_ANTERIOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0055_archivo_seguridad'),
+    ]
+
+    operations = [
+        migrations.RunPython(reclasificar, revertir),
+    ]
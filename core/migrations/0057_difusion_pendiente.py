@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0056_reclasificar_notificaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DifusionPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('tipo', models.CharField(default='sistema', max_length=30)),
+                ('roles', models.JSONField(blank=True, default=list)),
+                ('zona', models.CharField(blank=True, max_length=100)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviando', 'Enviando'), ('enviada', 'Enviada'), ('fallida', 'Fallida')], db_index=True, default='pendiente', max_length=10)),
+                ('usuarios', models.PositiveIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Difusión pendiente',
+                'verbose_name_plural': 'Difusiones pendientes',
+                'ordering': ['id'],
+            },
+        ),
+    ]
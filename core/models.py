@@ -60,6 +60,8 @@ class Usuario(AbstractUser):
     testimonio = models.TextField("Testimonio", blank=True, null=True)
     notificaciones_email = models.BooleanField(default=True)
     notificaciones_push = models.BooleanField(default=False)
+    resumen_correos = models.BooleanField(default=True, help_text="Agrupar los correos de notificaciones en un resumen periódico")
+    notificaciones_no_leidas = models.IntegerField(default=0, editable=False, help_text="Contador desnormalizado de notificaciones no leídas")
     perfil_publico = models.BooleanField(default=True)
     mostrar_puntos = models.BooleanField(default=True)
     foto_perfil = models.ImageField(upload_to='fotos_perfil/', null=True, blank=True)
@@ -77,6 +79,10 @@ class Usuario(AbstractUser):
     # Configurar email como único
     email = models.EmailField(unique=True)
     
+    # Contadores que se mantienen con UPDATE atómicos (F()): un save() sin update_fields
+    # solo los escribe si esta instancia los cambió, para no pisarlos con el valor leído
+    CONTADORES_ATOMICOS = ('notificaciones_no_leidas', 'puntos')
+    
     class Meta:
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
@@ -84,6 +90,34 @@ class Usuario(AbstractUser):
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._contadores_leidos = {
+            campo: instance.__dict__[campo] for campo in cls.CONTADORES_ATOMICOS if campo in instance.__dict__
+        }
+        return instance
+
+    def sync_counter(self, campo, valor):
+        """Asigna el valor actual de un contador atómico sin marcarlo como cambiado"""
+        setattr(self, campo, valor)
+        if hasattr(self, '_contadores_leidos'):
+            self._contadores_leidos[campo] = valor
+
+    def save(self, *args, **kwargs):
+        leidos = getattr(self, '_contadores_leidos', None)
+        if leidos and not args and kwargs.get('update_fields') is None and not self._state.adding:
+            sin_cambios = {campo for campo, valor in leidos.items() if getattr(self, campo) == valor}
+            if sin_cambios:
+                # Los campos diferidos (.only()/.defer()) tampoco se escriben, como en un save() normal
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in sin_cambios and field.attname in self.__dict__
+                ]
+        super().save(*args, **kwargs)
+        if leidos is not None:
+            self._contadores_leidos = {campo: getattr(self, campo) for campo in leidos}
+
     def is_admin_user(self):
         return self.role == 'admin'
     
@@ -174,6 +208,16 @@ class Canje(models.Model):
     foto_material_inicial = models.ImageField(upload_to='materiales_iniciales/', null=True, blank=True)  # Campo de migración 0032
     foto_material_recolectado = models.ImageField(upload_to='materiales_recolectados/', null=True, blank=True)  # Campo de migración 0032
     ruta_asignada = models.ForeignKey('RutaRecoleccion', on_delete=models.SET_NULL, null=True, blank=True)  # Campo de migración 0032
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)  # Watermark de los rollups diarios
+
+    class Meta:
+        indexes = [
+            # Historial del usuario y colas de revisión por estado, más recientes primero
+            models.Index(fields=['usuario', '-fecha_solicitud'], name='canje_usuario_fecha_idx'),
+            models.Index(fields=['estado', '-fecha_solicitud'], name='canje_estado_fecha_idx'),
+            # Paginación por cursor de la API (fecha_solicitud, id)
+            models.Index(fields=['-fecha_solicitud', '-id'], name='canje_fecha_id_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.puntos:
@@ -206,8 +250,16 @@ class RedencionPuntos(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
     fecha_solicitud = models.DateTimeField(auto_now_add=True)
     fecha_procesamiento = models.DateTimeField(null=True, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)  # Watermark de los rollups diarios
     notas_admin = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            # Paginación por cursor de la API (fecha_solicitud, id), por usuario y para administradores
+            models.Index(fields=['usuario', '-fecha_solicitud', '-id'], name='redencion_usuario_fecha_idx'),
+            models.Index(fields=['-fecha_solicitud', '-id'], name='redencion_fecha_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.valor_cop:
             # Tasa de conversión: 1 punto = 0.5 COP
@@ -392,6 +444,14 @@ class Recompensa(models.Model):
     veces_canjeada = models.IntegerField(default=0)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        # Catálogo: recompensas activas por categoría ya ordenadas por costo
+        indexes = [
+            models.Index(
+                fields=['categoria', 'puntos_requeridos'], name='recompensa_catalogo_idx', condition=models.Q(activa=True)
+            ),
+        ]
+    
     @property
     def stock_bajo(self):
         return self.stock <= 5 and self.stock > 0
@@ -456,6 +516,8 @@ class Notificacion(models.Model):
         ('perfil_actualizado', 'Perfil Actualizado'),
         ('password_cambiado', 'Contraseña Cambiada'),
         ('foto_actualizada', 'Foto Actualizada'),
+        ('juego', 'Partida de Juego'),
+        ('seguridad', 'Seguridad'),
         ('sistema', 'Sistema'),
     ]
     
@@ -465,13 +527,46 @@ class Notificacion(models.Model):
     tipo = models.CharField(max_length=30, choices=TIPOS_NOTIFICACION, default='sistema')
     leida = models.BooleanField(default=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Notificaciones repetidas agrupadas en esta fila por la compactación
+    repeticiones = models.PositiveIntegerField(default=1)
     
     class Meta:
         ordering = ['-fecha_creacion']
+        indexes = [
+            # La retención recorre cada tipo por antigüedad
+            models.Index(fields=['tipo', 'fecha_creacion']),
+            # Últimas notificaciones del usuario (leídas o no)
+            models.Index(fields=['usuario', '-fecha_creacion'], name='notif_usuario_fecha_idx'),
+            # Las no leídas son pocas: índice parcial para marcarlas y contarlas
+            models.Index(
+                fields=['usuario', '-fecha_creacion'], name='notif_no_leidas_idx', condition=models.Q(leida=False)
+            ),
+        ]
         
     def __str__(self):
         return f"Notificación para {self.usuario.username}: {self.mensaje[:30]}..."
 
+
+class NotificacionArchivada(models.Model):
+    """Notificaciones vencidas que se conservan fuera de la tabla activa (core.notification_retention)"""
+    
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='notificaciones_archivadas')
+    titulo = models.CharField(max_length=200)
+    mensaje = models.TextField()
+    tipo = models.CharField(max_length=30, choices=Notificacion.TIPOS_NOTIFICACION)
+    leida = models.BooleanField(default=False)
+    repeticiones = models.PositiveIntegerField(default=1)
+    fecha_creacion = models.DateTimeField()
+    fecha_archivo = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Notificación archivada'
+        verbose_name_plural = 'Notificaciones archivadas'
+        ordering = ['-fecha_creacion']
+    
+    def __str__(self):
+        return f"Notificación archivada para {self.usuario_id}: {self.mensaje[:30]}..."
+
 class SesionUsuario(models.Model):
     """Modelo para manejar sesiones seguras con validación de dispositivos"""
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='sesiones')
@@ -483,11 +578,20 @@ class SesionUsuario(models.Model):
     fecha_expiracion = models.DateTimeField()
     activa = models.BooleanField(default=True)
     ultima_actividad = models.DateTimeField(auto_now=True)
+    # Cursor del feed de cambios del monitor de sesiones (core/session_monitor.py);
+    # las actualizaciones masivas deben asignarlo explícitamente
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         verbose_name = 'Sesión de Usuario'
         verbose_name_plural = 'Sesiones de Usuario'
         ordering = ['-fecha_creacion']
+        # Solo una fracción de las sesiones sigue activa: índices parciales
+        indexes = [
+            models.Index(fields=['usuario'], name='sesion_usuario_activa_idx', condition=models.Q(activa=True)),
+            # Monitor de sesiones activas
+            models.Index(fields=['-ultima_actividad'], name='sesion_activa_actividad_idx', condition=models.Q(activa=True)),
+        ]
     
     def __str__(self):
         return f"Sesión de {self.usuario.username} - {self.dispositivo_id}"
@@ -510,11 +614,42 @@ class IntentoAcceso(models.Model):
         verbose_name = 'Intento de Acceso'
         verbose_name_plural = 'Intentos de Acceso'
         ordering = ['-fecha_intento']
+        # Intentos recientes por IP (bloqueos y auditoría)
+        indexes = [models.Index(fields=['ip_address', '-fecha_intento'], name='intento_ip_fecha_idx')]
     
     def __str__(self):
         return f"Intento desde {self.ip_address} - {self.motivo}"
 
 
+class ArchivoSeguridad(models.Model):
+    """
+    Lote de sesiones o intentos de acceso retirados de la tabla activa
+    (core.security_retention): las filas van como JSON por línea comprimido con zlib.
+    """
+    TABLAS = [
+        ('sesiones', 'Sesiones de usuario'),
+        ('intentos', 'Intentos de acceso'),
+    ]
+
+    tabla = models.CharField(max_length=20, choices=TABLAS)
+    primer_id = models.BigIntegerField()
+    ultimo_id = models.BigIntegerField()
+    fecha_desde = models.DateTimeField()
+    fecha_hasta = models.DateTimeField()
+    filas = models.PositiveIntegerField()
+    datos = models.BinaryField()
+    fecha_archivo = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Archivo de seguridad'
+        verbose_name_plural = 'Archivos de seguridad'
+        ordering = ['tabla', 'primer_id']
+        indexes = [models.Index(fields=['tabla', 'fecha_desde'], name='archivo_seguridad_fecha_idx')]
+
+    def __str__(self):
+        return f"{self.get_tabla_display()} {self.primer_id}-{self.ultimo_id} ({self.filas} filas)"
+
+
 
 class MovimientoStock(models.Model):
     """Modelo para registrar movimientos de stock de recompensas"""
@@ -760,6 +895,7 @@ class MensajeChatbot(models.Model):
         verbose_name = 'Mensaje Chatbot'
         verbose_name_plural = 'Mensajes Chatbot'
         ordering = ['timestamp']
+        indexes = [models.Index(fields=['conversacion', 'timestamp'], name='mensaje_conversacion_idx')]
     
     def __str__(self):
         tipo = "Usuario" if self.es_usuario else "IA"
@@ -952,3 +1088,350 @@ class MensajeDirecto(models.Model):
         # Actualizar contador de mensajes
         self.conversacion.total_mensajes = self.conversacion.mensajes.count()
         self.conversacion.save()
+
+
+class ResumenActividad(models.Model):
+    """
+    Resumen de actividad por usuario mantenido de forma incremental
+    (ver core/activity_summary.py). El dashboard lee esta fila en lugar de
+    recalcular rachas y totales sobre todos los canjes del usuario.
+    """
+
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True, related_name='resumen_actividad')
+    racha_actual = models.PositiveIntegerField(default=0)  # Días consecutivos con canjes hasta ultima_actividad
+    ultima_actividad = models.DateField(null=True, blank=True)
+    semana_inicio = models.DateField(null=True, blank=True)  # Lunes de la semana de puntos_semana
+    puntos_semana = models.IntegerField(default=0)
+    mes_inicio = models.DateField(null=True, blank=True)  # Primer día del mes de puntos_mes
+    puntos_mes = models.IntegerField(default=0)
+    total_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_canjes = models.PositiveIntegerField(default=0)
+    canjes_aprobados = models.PositiveIntegerField(default=0)
+    puntos_redimidos = models.IntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Resumen de Actividad'
+        verbose_name_plural = 'Resúmenes de Actividad'
+
+    def __str__(self):
+        return f'Resumen de actividad de {self.usuario_id}'
+
+
+class RollupCanjeDiario(models.Model):
+    """Canjes agregados por día de solicitud × material × zona × estado (ver core/rollups.py)"""
+
+    fecha = models.DateField()
+    material = models.ForeignKey(MaterialTasa, on_delete=models.CASCADE, related_name='+')
+    zona = models.CharField(max_length=50, blank=True)  # Zona de la ruta asignada, vacía si no tiene
+    estado = models.CharField(max_length=25)
+    cantidad = models.PositiveIntegerField(default=0)
+    peso_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    puntos_total = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Rollup diario de canjes'
+        verbose_name_plural = 'Rollups diarios de canjes'
+        unique_together = ('fecha', 'material', 'zona', 'estado')
+        indexes = [models.Index(fields=['estado', 'fecha'])]
+
+
+class RollupRedencionDiaria(models.Model):
+    """Redenciones agregadas por día de solicitud × método de pago × estado"""
+
+    fecha = models.DateField()
+    metodo_pago = models.CharField(max_length=20)
+    estado = models.CharField(max_length=20)
+    cantidad = models.PositiveIntegerField(default=0)
+    puntos_total = models.BigIntegerField(default=0)
+    valor_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Rollup diario de redenciones'
+        verbose_name_plural = 'Rollups diarios de redenciones'
+        unique_together = ('fecha', 'metodo_pago', 'estado')
+        indexes = [models.Index(fields=['estado', 'fecha'])]
+
+
+class RollupUsuarioDiario(models.Model):
+    """Registros y sesiones iniciadas por día × rol de usuario"""
+
+    fecha = models.DateField()
+    rol = models.CharField(max_length=10)
+    nuevos_usuarios = models.PositiveIntegerField(default=0)
+    sesiones = models.PositiveIntegerField(default=0)
+    usuarios_con_sesion = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Rollup diario de usuarios'
+        verbose_name_plural = 'Rollups diarios de usuarios'
+        unique_together = ('fecha', 'rol')
+
+
+class RollupSeguridadDiaria(models.Model):
+    """Intentos de acceso no autorizado por día × motivo"""
+
+    fecha = models.DateField()
+    motivo = models.CharField(max_length=100)
+    intentos = models.PositiveIntegerField(default=0)
+    ips_distintas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Rollup diario de seguridad'
+        verbose_name_plural = 'Rollups diarios de seguridad'
+        unique_together = ('fecha', 'motivo')
+
+
+class RollupChatbotDiario(models.Model):
+    """Conversaciones y mensajes del chatbot por día"""
+
+    fecha = models.DateField(unique=True)
+    conversaciones = models.PositiveIntegerField(default=0)
+    mensajes_usuario = models.PositiveIntegerField(default=0)
+    mensajes_bot = models.PositiveIntegerField(default=0)
+    respuestas_con_confianza = models.PositiveIntegerField(default=0)
+    confianza_total = models.FloatField(default=0)  # Suma de confidence_score para calcular promedios
+
+    class Meta:
+        verbose_name = 'Rollup diario del chatbot'
+        verbose_name_plural = 'Rollups diarios del chatbot'
+
+
+class RollupWatermark(models.Model):
+    """Hasta dónde procesó el job de rollups cada fuente de datos"""
+
+    nombre = models.CharField(max_length=50, unique=True)
+    valor = models.DateTimeField(null=True, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Watermark de rollup'
+        verbose_name_plural = 'Watermarks de rollup'
+
+    def __str__(self):
+        return f'{self.nombre}: {self.valor}'
+
+
+class RollupDiaPendiente(models.Model):
+    """
+    Días que deben recalcularse aunque ninguna fila cambiada los delate
+    (por ejemplo, al borrar un canje).
+    """
+
+    fuente = models.CharField(max_length=50)
+    fecha = models.DateField()
+
+    class Meta:
+        unique_together = ('fuente', 'fecha')
+
+
+class TableroRanking(models.Model):
+    """Tablero de ranking ya construido en el backend de base de datos"""
+
+    clave = models.CharField(max_length=40, unique=True)
+    fecha_construccion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Tablero de ranking'
+        verbose_name_plural = 'Tableros de ranking'
+
+    def __str__(self):
+        return self.clave
+
+
+class PuntajeRanking(models.Model):
+    """
+    Puntaje de un usuario en un tablero de ranking para el backend de base de
+    datos de core/leaderboard.py (en producción se usan sorted sets de Redis).
+    """
+
+    tablero = models.CharField(max_length=40)  # 'puntos', 'kg', 'semana:2025-06-02', 'juego_papel'...
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='puntajes_ranking')
+    puntaje = models.FloatField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Puntaje de ranking'
+        verbose_name_plural = 'Puntajes de ranking'
+        unique_together = ('tablero', 'usuario')
+        indexes = [models.Index(fields=['tablero', '-puntaje', 'usuario'])]
+
+    def __str__(self):
+        return f'{self.tablero}: {self.usuario_id} = {self.puntaje}'
+
+
+class MovimientoPuntos(models.Model):
+    """
+    Libro mayor de EcoPuntos: una fila por cada cambio del saldo de un
+    usuario, nunca se modifica ni se borra (ver core/points_ledger.py).
+    """
+
+    TIPOS = (
+        ('canje', 'Canje aprobado'),
+        ('juego', 'Puntos de juego'),
+        ('recompensa', 'Canje de recompensa'),
+        ('redencion', 'Redención de puntos'),
+        ('devolucion_redencion', 'Devolución de redención'),
+        ('ajuste', 'Ajuste administrativo'),
+    )
+
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='movimientos_puntos')
+    tipo = models.CharField(max_length=25, choices=TIPOS)
+    delta = models.IntegerField()
+    saldo_resultante = models.IntegerField()
+    origen_tipo = models.CharField(max_length=50, blank=True)  # Etiqueta del modelo de origen, p. ej. 'core.canje'
+    origen_id = models.PositiveIntegerField(null=True, blank=True)
+    descripcion = models.CharField(max_length=255, blank=True)
+    realizado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Movimiento de puntos'
+        verbose_name_plural = 'Movimientos de puntos'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['usuario', '-id']),
+            models.Index(fields=['origen_tipo', 'origen_id']),
+        ]
+        constraints = [
+            # Un canje acredita sus puntos una sola vez aunque se apruebe dos veces en paralelo
+            models.UniqueConstraint(
+                fields=['tipo', 'origen_tipo', 'origen_id'],
+                condition=models.Q(tipo='canje'),
+                name='movimiento_unico_por_canje',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.usuario_id} {self.delta:+d} ({self.tipo}) = {self.saldo_resultante}'
+
+
+class SaldoPuntos(models.Model):
+    """Foto periódica del saldo de un usuario hasta un movimiento del libro mayor"""
+
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='saldos_puntos')
+    saldo = models.IntegerField()
+    ultimo_movimiento_id = models.BigIntegerField(default=0)  # Id del último MovimientoPuntos incluido
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Saldo de puntos'
+        verbose_name_plural = 'Saldos de puntos'
+        ordering = ['-id']
+        indexes = [models.Index(fields=['usuario', '-id'])]
+
+    def __str__(self):
+        return f'Saldo de {self.usuario_id}: {self.saldo}'
+
+
+class CorreoSaliente(models.Model):
+    """
+    Bandeja de salida transaccional: cada correo se guarda aquí en la misma
+    transacción que el cambio que lo origina y el comando send_queued_emails
+    lo entrega después (ver core/email_outbox.py).
+    """
+
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),  # Agotó los reintentos
+    )
+
+    asunto = models.CharField(max_length=255)
+    cuerpo = models.TextField(blank=True)
+    html = models.TextField(blank=True)
+    remitente = models.CharField(max_length=255)
+    destinatarios = models.JSONField(default=list)
+    cc = models.JSONField(default=list, blank=True)
+    bcc = models.JSONField(default=list, blank=True)
+    responder_a = models.JSONField(default=list, blank=True)
+    cabeceras = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Correo saliente'
+        verbose_name_plural = 'Correos salientes'
+        ordering = ['id']
+        indexes = [models.Index(fields=['estado', 'proximo_intento'])]
+
+    def __str__(self):
+        return f'{self.asunto} -> {", ".join(self.destinatarios)} ({self.estado})'
+
+
+class ResumenCorreoPendiente(models.Model):
+    """Notificación por correo que espera el próximo resumen del usuario (ver core/email_digest.py)"""
+
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='resumen_correos_pendientes')
+    asunto = models.CharField(max_length=255)
+    resumen = models.TextField()
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Notificación pendiente de resumen'
+        verbose_name_plural = 'Notificaciones pendientes de resumen'
+        ordering = ['id']
+
+    def __str__(self):
+        return f'{self.usuario_id}: {self.asunto}'
+
+
+class DifusionPendiente(models.Model):
+    """
+    Difusión de notificaciones en cola: la vista de alertas la guarda aquí y el
+    comando send_queued_broadcasts la entrega (ver core/notification_broadcast.py).
+    """
+
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('enviando', 'Enviando'),
+        ('enviada', 'Enviada'),
+        ('fallida', 'Fallida'),
+    )
+
+    titulo = models.CharField(max_length=200)
+    mensaje = models.TextField()
+    tipo = models.CharField(max_length=30, default='sistema')
+    roles = models.JSONField(default=list, blank=True)
+    zona = models.CharField(max_length=100, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente', db_index=True)
+    usuarios = models.PositiveIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Difusión pendiente'
+        verbose_name_plural = 'Difusiones pendientes'
+        ordering = ['id']
+
+    def __str__(self):
+        return f'{self.titulo} ({self.estado})'
+
+
+class PerfilVista(models.Model):
+    """Rollup diario del perfilador por vista (ver core/profiler.py); los tiempos están en milisegundos"""
+
+    fecha = models.DateField()
+    vista = models.CharField(max_length=200)
+    peticiones = models.PositiveIntegerField(default=0)
+    consultas = models.PositiveIntegerField(default=0)
+    consultas_max = models.PositiveIntegerField(default=0)
+    tiempo_db = models.FloatField(default=0)
+    tiempo_plantillas = models.FloatField(default=0)
+    latencia = models.FloatField(default=0)
+    latencia_max = models.FloatField(default=0)
+    # {huella SQL: {'veces': ejecuciones, 'peticiones': peticiones en que se repitió}}
+    duplicadas = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        verbose_name = 'Perfil de vista'
+        verbose_name_plural = 'Perfiles de vistas'
+        unique_together = ('fecha', 'vista')
+
+    def __str__(self):
+        return f'{self.fecha} {self.vista}'
@@ -0,0 +1,163 @@
+"""
+Difusión masiva de notificaciones (anuncios del sistema y alertas del admin).
+
+broadcast() recorre los usuarios destinatarios por lotes de
+NOTIFICATION_BROADCAST_CHUNK ids (paginación por id, sin OFFSET) y por cada
+lote, en una transacción corta:
+
+- inserta las notificaciones con un solo bulk_create;
+- suma 1 al contador de no leídas de todo el lote con un solo UPDATE (el
+  bulk_create no dispara las señales de Notificacion);
+- tras el commit, envía el evento a los grupos notificaciones_{id} del lote
+  concurrentemente en una sola llamada al channel layer.
+
+Los destinatarios se eligen por rol, zona (zona de las rutas de recolección
+de sus canjes o barrio de sus rutas) y actividad (último inicio de sesión).
+
+Las vistas no llaman a broadcast() durante la petición: queue_broadcast()
+guarda una DifusionPendiente en la misma transacción y el comando
+send_queued_broadcasts (dispatch_queued_broadcasts) la entrega después.
+"""
+import asyncio
+from datetime import timedelta
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .notification_push import group_name, notification_payload
+from .resource_versions import bump_now, user_resources
+
+logger = logging.getLogger(__name__)
+
+
+def get_chunk_size():
+    return getattr(settings, 'NOTIFICATION_BROADCAST_CHUNK', 2000)
+
+
+def target_users(roles=None, zona=None, activos_dias=None):
+    """Usuarios activos que reciben la difusión"""
+    from .models import Usuario
+
+    usuarios = Usuario.objects.filter(is_active=True, suspended=False)
+    if roles:
+        usuarios = usuarios.filter(role__in=roles)
+    if zona:
+        usuarios = usuarios.filter(
+            Q(canje__ruta_asignada__zona__iexact=zona) | Q(rutas__barrio__iexact=zona)
+        ).distinct()
+    if activos_dias:
+        usuarios = usuarios.filter(last_login__gte=timezone.now() - timedelta(days=activos_dias))
+    return usuarios
+
+
+def _fan_out(notificaciones):
+    """Envía las notificaciones del lote a los grupos de sus usuarios en una sola pasada"""
+    bump_now(*user_resources('notificaciones', [notif.usuario_id for notif in notificaciones]))
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    async def enviar():
+        resultados = await asyncio.gather(*[
+            channel_layer.group_send(
+                group_name(notif.usuario_id),
+                {'type': 'notification_message', 'notification': notification_payload(notif)},
+            )
+            for notif in notificaciones
+        ], return_exceptions=True)
+        errores = [r for r in resultados if isinstance(r, Exception)]
+        if errores:
+            logger.error(f'{len(errores)} envíos de la difusión fallaron: {errores[0]}')
+
+    try:
+        async_to_sync(enviar)()
+    except Exception as e:
+        logger.error(f'Error enviando la difusión por WebSocket: {e}')
+
+
+def broadcast(titulo, mensaje, tipo='sistema', usuarios=None, progress=None):
+    """
+    Crea la notificación para cada usuario de `usuarios` (por defecto, todos
+    los activos). `progress(enviadas, total, segundos)` se llama tras cada lote.
+    Retorna {'usuarios': n, 'lotes': n, 'segundos': s, 'por_segundo': n}.
+    """
+    from .models import Notificacion, Usuario
+
+    usuarios = (usuarios if usuarios is not None else target_users()).order_by('pk')
+    total = usuarios.count()
+    inicio = time.perf_counter()
+    enviadas = lotes = 0
+    ultimo_id = 0
+
+    while True:
+        ids = list(usuarios.filter(pk__gt=ultimo_id).values_list('pk', flat=True)[:get_chunk_size()])
+        if not ids:
+            break
+        ultimo_id = ids[-1]
+
+        with transaction.atomic():
+            notificaciones = Notificacion.objects.bulk_create([
+                Notificacion(usuario_id=usuario_id, titulo=titulo, mensaje=mensaje, tipo=tipo)
+                for usuario_id in ids
+            ])
+            Usuario.objects.filter(pk__in=ids).update(notificaciones_no_leidas=F('notificaciones_no_leidas') + 1)
+            transaction.on_commit(lambda lote=notificaciones: _fan_out(lote))
+
+        enviadas += len(ids)
+        lotes += 1
+        if progress:
+            progress(enviadas, total, time.perf_counter() - inicio)
+
+    segundos = time.perf_counter() - inicio
+    logger.info(f'Difusión "{titulo}" enviada a {enviadas} usuarios en {segundos:.2f}s')
+    return {
+        'usuarios': enviadas,
+        'lotes': lotes,
+        'segundos': segundos,
+        'por_segundo': enviadas / segundos if segundos else 0,
+    }
+
+
+def queue_broadcast(titulo, mensaje, tipo='sistema', roles=None, zona=None):
+    """Pone en cola una difusión; solo es visible para el worker tras el commit"""
+    from .models import DifusionPendiente
+
+    return DifusionPendiente.objects.create(
+        titulo=titulo, mensaje=mensaje, tipo=tipo, roles=list(roles or []), zona=zona or ''
+    )
+
+
+def dispatch_queued_broadcasts(limit=10):
+    """
+    Entrega hasta `limit` difusiones pendientes. Cada una se reserva con un
+    UPDATE condicionado al estado, así que dos workers no envían la misma.
+    Retorna {'enviadas': n, 'fallidas': n}.
+    """
+    from .models import DifusionPendiente
+
+    resultado = {'enviadas': 0, 'fallidas': 0}
+    for difusion in DifusionPendiente.objects.filter(estado='pendiente')[:limit]:
+        if not DifusionPendiente.objects.filter(pk=difusion.pk, estado='pendiente').update(estado='enviando'):
+            continue
+        try:
+            enviada = broadcast(
+                difusion.titulo, difusion.mensaje, tipo=difusion.tipo,
+                usuarios=target_users(roles=difusion.roles or None, zona=difusion.zona or None),
+            )
+        except Exception as e:
+            # No se reintenta: los lotes ya confirmados duplicarían notificaciones
+            logger.error(f'Difusión {difusion.pk} falló: {e}')
+            DifusionPendiente.objects.filter(pk=difusion.pk).update(estado='fallida', ultimo_error=str(e)[:2000])
+            resultado['fallidas'] += 1
+            continue
+        DifusionPendiente.objects.filter(pk=difusion.pk).update(
+            estado='enviada', usuarios=enviada['usuarios'], fecha_envio=timezone.now()
+        )
+        resultado['enviadas'] += 1
+    return resultado
@@ -0,0 +1,84 @@
+"""
+Contador desnormalizado de notificaciones no leídas.
+
+Usuario.notificaciones_no_leidas se actualiza con UPDATE atómicos (F()) en
+la misma transacción que el cambio de la notificación:
+
+- las señales de core lo incrementan al crear una notificación no leída, lo
+  ajustan cuando cambia `leida` en un save() y lo decrementan al borrar una
+  no leída;
+- las actualizaciones masivas pasan por mark_read(), que descuenta las filas
+  que realmente cambiaron.
+
+Así el badge es una lectura del usuario ya cargado por la autenticación, sin
+COUNT. Si el contador se desvía (ediciones desde el shell, .update() que no
+pasen por mark_read()), reconcile_unread_counters() lo corrige; el comando
+reconcile_unread_counters lo ejecuta de forma periódica.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .notification_push import publish_read
+
+logger = logging.getLogger(__name__)
+
+
+def adjust_unread(usuario_id, delta):
+    """Suma `delta` al contador del usuario sin bajar de cero"""
+    from .models import Usuario
+
+    if delta:
+        Usuario.objects.filter(pk=usuario_id).update(
+            notificaciones_no_leidas=Greatest(F('notificaciones_no_leidas') + delta, Value(0))
+        )
+
+
+def mark_read(usuario_id, queryset=None):
+    """
+    Marca como leídas las notificaciones no leídas del usuario (todas, o las
+    de `queryset`), descuenta el contador y avisa a sus pestañas abiertas.
+    Retorna cuántas cambiaron.
+    """
+    from .models import Notificacion
+
+    pendientes = queryset if queryset is not None else Notificacion.objects.all()
+    pendientes = pendientes.filter(usuario_id=usuario_id, leida=False)
+    with transaction.atomic():
+        if queryset is None:
+            ids = None
+            actualizadas = pendientes.update(leida=True)
+        else:
+            ids = list(pendientes.values_list('id', flat=True))
+            actualizadas = Notificacion.objects.filter(pk__in=ids, leida=False).update(leida=True)
+        if actualizadas:
+            adjust_unread(usuario_id, -actualizadas)
+            publish_read(usuario_id, ids)
+    return actualizadas
+
+
+def reconcile_unread_counters(usuario_ids=None):
+    """
+    Recalcula el contador de los usuarios cuyo valor no coincide con las
+    notificaciones no leídas reales. Retorna cuántos se corrigieron.
+    """
+    from .models import Notificacion, Usuario
+
+    reales = (
+        Notificacion.objects.filter(usuario=OuterRef('pk'), leida=False)
+        .order_by().values('usuario').annotate(total=Count('id')).values('total')
+    )
+    usuarios = Usuario.objects.annotate(real=Coalesce(Subquery(reales), 0))
+    if usuario_ids is not None:
+        usuarios = usuarios.filter(pk__in=usuario_ids)
+
+    corregidos = 0
+    for usuario_id, guardado, real in usuarios.exclude(notificaciones_no_leidas=F('real')).values_list(
+        'pk', 'notificaciones_no_leidas', 'real'
+    ):
+        Usuario.objects.filter(pk=usuario_id).update(notificaciones_no_leidas=real)
+        logger.warning(f'Contador de no leídas del usuario {usuario_id} corregido: {guardado} → {real}')
+        corregidos += 1
+    return corregidos
@@ -0,0 +1,88 @@
+"""
+Entrega de notificaciones por WebSocket.
+
+Cada pestaña abierta se conecta a NotificacionConsumer y queda en el grupo
+notificaciones_{user_id}. Cuando se crea una Notificacion o cambia su estado
+de lectura, las señales de core publican el evento en ese grupo después del
+commit (transaction.on_commit), así que nunca se anuncia una notificación que
+luego se revierte. Las actualizaciones masivas (.update()/.delete()) no
+disparan señales y deben llamar a publish_read() o publish_cleared().
+
+El cliente (notification_system.html) solo consulta /api/notifications/ al
+conectarse y mientras el WebSocket esté caído.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .resource_versions import bump_now
+
+logger = logging.getLogger(__name__)
+
+# Categorías que usa el cliente para elegir el ícono
+CATEGORIAS = {
+    'recompensa_canjeada': 'redencion',
+    'retiro_enviado': 'redencion',
+    'redencion_aprobada': 'redencion',
+    'redencion_pendiente': 'redencion',
+    'redencion_rechazada': 'redencion',
+    'perfil_actualizado': 'perfil',
+    'foto_actualizada': 'perfil',
+    'canje_aprobado': 'canje',
+    'canje_pendiente': 'canje',
+    'canje_rechazado': 'canje',
+}
+
+
+def group_name(user_id):
+    return f'notificaciones_{user_id}'
+
+
+def notification_payload(notif):
+    """Representación de una notificación para el cliente (HTTP y WebSocket)"""
+    return {
+        'id': notif.id,
+        'tipo': CATEGORIAS.get(notif.tipo, 'general'),
+        'titulo': notif.titulo,
+        'mensaje': notif.mensaje,
+        'fecha_creacion': notif.fecha_creacion.isoformat(),
+        'leida': notif.leida,
+        'unread': not notif.leida,
+        'repeticiones': notif.repeticiones,
+        'data': {
+            'notificacion_id': notif.id,
+            'tipo': notif.tipo,
+        },
+    }
+
+
+def publish(user_id, event):
+    """Envía un evento al grupo del usuario; un fallo del channel layer solo se registra"""
+    # Lo que se anuncia a las pestañas abiertas también invalida el ETag de get_notifications
+    bump_now(f'notificaciones:{user_id}')
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group_name(user_id), event)
+    except Exception as e:
+        logger.error(f'Error publicando {event.get("type")} al usuario {user_id}: {e}')
+
+
+def publish_created(notif):
+    """Publica una notificación nueva cuando se confirma la transacción"""
+    payload = notification_payload(notif)
+    transaction.on_commit(lambda: publish(notif.usuario_id, {'type': 'notification_message', 'notification': payload}))
+
+
+def publish_read(user_id, ids=None):
+    """Publica que las notificaciones `ids` (o todas si es None) quedaron leídas"""
+    ids = list(ids) if ids is not None else None
+    transaction.on_commit(lambda: publish(user_id, {'type': 'notification_read', 'ids': ids}))
+
+
+def publish_cleared(user_id):
+    """Publica que el usuario borró todas sus notificaciones"""
+    transaction.on_commit(lambda: publish(user_id, {'type': 'notification_cleared'}))
@@ -0,0 +1,191 @@
+"""
+Retención de la tabla de notificaciones.
+
+Cada partida de los juegos y cada alerta de seguridad crean una fila en
+Notificacion, pero el usuario solo ve las últimas 20. El comando
+prune_notifications (diario) mantiene la tabla acotada en dos pasos:
+
+1. compact_notifications(): las notificaciones repetidas de poco valor
+   (NOTIFICATION_COLLAPSIBLE_TYPES, por defecto las partidas de juego) de un
+   mismo usuario y título se agrupan en la más reciente, que acumula el total
+   en `repeticiones` ("¡Puntos de juego ganados!" ×50 queda en una fila).
+2. expire_notifications(): las filas más antiguas que el TTL de su tipo
+   (NOTIFICATION_RETENTION_DAYS, con NOTIFICATION_RETENTION_DEFAULT_DAYS para
+   los demás) se borran, o se mueven a NotificacionArchivada si el tipo está
+   en NOTIFICATION_ARCHIVE_TYPES.
+
+Todo se hace por lotes de NOTIFICATION_RETENTION_CHUNK filas, cada lote en su
+propia transacción corta, para no bloquear la tabla activa. Los borrados no
+pasan por las señales de Notificacion (serían una consulta por fila): el
+contador de no leídas se ajusta una vez por usuario y lote.
+"""
+from collections import Counter
+from datetime import timedelta
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from .notification_counter import adjust_unread
+from .resource_versions import bump, user_resources
+
+logger = logging.getLogger(__name__)
+
+# Días que se conserva cada tipo de notificación
+DEFAULT_RETENTION_DAYS = {
+    'juego': 7,
+    'perfil_actualizado': 30,
+    'foto_actualizada': 30,
+    'seguridad': 90,
+}
+
+# Tipos que se archivan en lugar de borrarse
+DEFAULT_ARCHIVE_TYPES = ('canje_aprobado', 'canje_rechazado', 'redencion_aprobada', 'redencion_rechazada', 'seguridad')
+
+
+def get_retention_days():
+    dias = dict(DEFAULT_RETENTION_DAYS)
+    dias.update(getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {}))
+    return dias
+
+
+def get_default_days():
+    return getattr(settings, 'NOTIFICATION_RETENTION_DEFAULT_DAYS', 180)
+
+
+def get_archive_types():
+    return set(getattr(settings, 'NOTIFICATION_ARCHIVE_TYPES', DEFAULT_ARCHIVE_TYPES))
+
+
+def get_collapsible_types():
+    return set(getattr(settings, 'NOTIFICATION_COLLAPSIBLE_TYPES', ('juego',)))
+
+
+def get_chunk_size():
+    return getattr(settings, 'NOTIFICATION_RETENTION_CHUNK', 1000)
+
+
+def _delete_chunk(notificaciones):
+    """Borra las filas del lote y descuenta las no leídas del contador de cada usuario"""
+    from .models import Notificacion
+
+    no_leidas = Counter(notif.usuario_id for notif in notificaciones if not notif.leida)
+    # _raw_delete evita cargar y señalizar fila por fila (Notificacion no tiene dependientes)
+    Notificacion.objects.filter(pk__in=[notif.pk for notif in notificaciones])._raw_delete(connection.alias)
+    for usuario_id, total in no_leidas.items():
+        adjust_unread(usuario_id, -total)
+    bump(*user_resources('notificaciones', [notif.usuario_id for notif in notificaciones]))
+
+
+def compact_notifications(pausa=0):
+    """
+    Agrupa las notificaciones repetidas de los tipos agrupables en la más
+    reciente de cada (usuario, tipo, título). Retorna las filas eliminadas.
+    """
+    from .models import Notificacion
+
+    grupos = (
+        Notificacion.objects.filter(tipo__in=get_collapsible_types())
+        .values('usuario_id', 'tipo', 'titulo')
+        .annotate(total=Count('id'), ultima=Max('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    eliminadas = 0
+    for grupo in grupos.iterator():
+        repetidas = Notificacion.objects.filter(
+            usuario_id=grupo['usuario_id'], tipo=grupo['tipo'], titulo=grupo['titulo'], id__lt=grupo['ultima']
+        ).only('id', 'usuario_id', 'leida', 'repeticiones').order_by('id')
+        while True:
+            with transaction.atomic():
+                lote = list(repetidas[:get_chunk_size()])
+                if not lote:
+                    break
+                # La fila que queda suma las repeticiones y sigue sin leer si alguna lo estaba
+                ultima = Notificacion.objects.filter(pk=grupo['ultima'])
+                if not ultima.update(repeticiones=F('repeticiones') + sum(notif.repeticiones for notif in lote)):
+                    # El usuario borró la más reciente: se agrupan en la próxima ejecución
+                    break
+                if any(not notif.leida for notif in lote) and ultima.filter(leida=True).update(leida=False):
+                    adjust_unread(grupo['usuario_id'], 1)
+                _delete_chunk(lote)
+            eliminadas += len(lote)
+            time.sleep(pausa)
+    return eliminadas
+
+
+def expire_notifications(now=None, pausa=0):
+    """
+    Borra o archiva las notificaciones vencidas según el TTL de su tipo.
+    Retorna {'borradas': n, 'archivadas': n}.
+    """
+    from .models import Notificacion, NotificacionArchivada
+
+    now = now or timezone.now()
+    archivables = get_archive_types()
+    politicas = get_retention_days()
+    consultas = [
+        Notificacion.objects.filter(tipo=tipo, fecha_creacion__lt=now - timedelta(days=dias))
+        for tipo, dias in politicas.items()
+    ]
+    # El resto de tipos usa el TTL por defecto
+    consultas.append(
+        Notificacion.objects.exclude(tipo__in=list(politicas))
+        .filter(fecha_creacion__lt=now - timedelta(days=get_default_days()))
+    )
+
+    resultado = {'borradas': 0, 'archivadas': 0}
+    for vencidas in consultas:
+        vencidas = vencidas.order_by('id')
+        while True:
+            with transaction.atomic():
+                lote = list(vencidas[:get_chunk_size()])
+                if not lote:
+                    break
+                archivar = [notif for notif in lote if notif.tipo in archivables]
+                NotificacionArchivada.objects.bulk_create([
+                    NotificacionArchivada(
+                        usuario_id=notif.usuario_id,
+                        titulo=notif.titulo,
+                        mensaje=notif.mensaje,
+                        tipo=notif.tipo,
+                        leida=notif.leida,
+                        repeticiones=notif.repeticiones,
+                        fecha_creacion=notif.fecha_creacion,
+                    )
+                    for notif in archivar
+                ])
+                _delete_chunk(lote)
+            resultado['archivadas'] += len(archivar)
+            resultado['borradas'] += len(lote) - len(archivar)
+            time.sleep(pausa)
+    return resultado
+
+
+def table_stats(model):
+    """(filas, bytes o None) de la tabla del modelo; el tamaño depende del motor de base de datos"""
+    tabla = model._meta.db_table
+    filas = model.objects.count()
+    tamano = None
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [tabla])
+                tamano = cursor.fetchone()[0]
+            elif connection.vendor == 'sqlite':
+                # dbstat solo existe si SQLite se compiló con SQLITE_ENABLE_DBSTAT_VTAB
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [tabla])
+                tamano = cursor.fetchone()[0]
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    'SELECT data_length + index_length FROM information_schema.tables '
+                    'WHERE table_schema = DATABASE() AND table_name = %s',
+                    [tabla],
+                )
+                tamano = cursor.fetchone()[0]
+    except Exception as e:
+        logger.debug(f'No se pudo medir el tamaño de {tabla}: {e}')
+    return filas, tamano
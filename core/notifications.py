@@ -1,10 +1,9 @@
 """
 Sistema de notificaciones por email para Eco Puntos
 """
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from django.conf import settings
+from .email_digest import queue_or_send
 from .models import Usuario, Canje
 import logging
 
@@ -14,31 +13,25 @@ class NotificacionEmail:
     """Clase para manejar notificaciones por email"""
     
     @staticmethod
-    def enviar_email_html(usuario, asunto, template_name, contexto):
+    def enviar_email_html(usuario, asunto, template_name, contexto, resumen=None, urgente=False):
         """
-        Envía un email HTML usando un template
+        Envía un email HTML usando un template. Si el usuario recibe
+        resúmenes y se indica `resumen` (una línea de texto), la notificación
+        se agrega a su próximo resumen sin renderizar el template.
         """
         try:
             if not usuario.notificaciones_email:
                 logger.info(f"Usuario {usuario.username} tiene notificaciones deshabilitadas")
                 return False
-                
-            # Renderizar template HTML
-            html_message = render_to_string(f'emails/{template_name}.html', contexto)
-            plain_message = strip_tags(html_message)
             
-            # Enviar email
-            send_mail(
-                subject=asunto,
-                message=plain_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[usuario.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
+            def render():
+                html_message = render_to_string(f'emails/{template_name}.html', contexto)
+                return strip_tags(html_message), html_message
+            
+            enviado = queue_or_send(usuario, asunto, resumen, render, urgente=urgente or resumen is None)
             
             logger.info(f"Email enviado exitosamente a {usuario.email}")
-            return True
+            return enviado
             
         except Exception as e:
             logger.error(f"Error enviando email a {usuario.email}: {str(e)}")
@@ -61,7 +54,8 @@ class NotificacionEmail:
             usuario=canje.usuario,
             asunto=asunto,
             template_name='canje_solicitado',
-            contexto=contexto
+            contexto=contexto,
+            resumen=f"Recibimos tu solicitud de canje de {canje.peso} kg de {canje.material.nombre}."
         )
 
     @staticmethod
@@ -81,7 +75,8 @@ class NotificacionEmail:
             usuario=canje.usuario,
             asunto=asunto,
             template_name='canje_aprobado',
-            contexto=contexto
+            contexto=contexto,
+            resumen=f"Tu canje de {canje.material.nombre} ({canje.peso} kg) fue aprobado: +{canje.puntos} puntos."
         )
 
     @staticmethod
@@ -100,7 +95,8 @@ class NotificacionEmail:
             usuario=canje.usuario,
             asunto=asunto,
             template_name='canje_rechazado',
-            contexto=contexto
+            contexto=contexto,
+            resumen=f"Tu canje de {canje.material.nombre} no fue aprobado." + (f" Motivo: {motivo}" if motivo else "")
         )
 
     @staticmethod
@@ -118,7 +114,8 @@ class NotificacionEmail:
             usuario=canje.usuario,
             asunto=asunto,
             template_name='canje_en_revision',
-            contexto=contexto
+            contexto=contexto,
+            resumen=f"Tu canje de {canje.material.nombre} está en revisión."
         )
 
     @staticmethod
@@ -137,7 +134,8 @@ class NotificacionEmail:
             usuario=ruta.usuario,
             asunto=asunto,
             template_name='ruta_programada',
-            contexto=contexto
+            contexto=contexto,
+            resumen=f"Programamos tu recolección para el {ruta.fecha_programada.strftime('%d/%m/%Y')} en {ruta.direccion}."
         )
 
     @staticmethod
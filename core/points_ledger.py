@@ -0,0 +1,195 @@
+"""
+Libro mayor de EcoPuntos (solo inserciones) con actualización atómica del saldo.
+
+Todo cambio de Usuario.puntos pasa por apply_points(), que en una sola
+transacción:
+
+1. Aplica el delta con un UPDATE ... SET puntos = puntos + delta, sin leer
+   antes el saldo en Python, de modo que dos aprobaciones concurrentes no se
+   pisan. Los débitos que exigen saldo agregan la condición puntos >= monto
+   al mismo UPDATE.
+2. Lee el saldo resultante (la fila sigue bloqueada por el UPDATE).
+3. Inserta un MovimientoPuntos con tipo, origen, delta y saldo resultante.
+
+Como el UPDATE no pasa por Usuario.save(), tras confirmar la transacción se
+actualizan los tableros de ranking y la versión de los fragmentos del
+usuario. El comando snapshot_points_balances guarda periódicamente el saldo
+de cada usuario (SaldoPuntos) y verifica que coincida con el libro mayor.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+logger = logging.getLogger(__name__)
+
+# Movimientos por página en el historial
+PAGE_SIZE = 20
+
+
+class SaldoInsuficiente(Exception):
+    """El usuario no tiene puntos suficientes para el débito"""
+
+
+class _YaAplicado(Exception):
+    pass
+
+
+def _origin(origen):
+    if origen is None:
+        return '', None
+    return origen._meta.label_lower, origen.pk
+
+
+def _after_commit(usuario_id, saldo):
+    from .fragment_cache import bump_user_version
+    from .leaderboard import get_leaderboard
+
+    bump_user_version(usuario_id)
+    try:
+        get_leaderboard().update('puntos', usuario_id, saldo)
+    except Exception as e:
+        logger.error(f'Error actualizando el ranking de puntos del usuario {usuario_id}: {e}')
+
+
+def apply_points(usuario, delta, tipo, origen=None, descripcion='', realizado_por=None, require_balance=False, once=False):
+    """
+    Suma `delta` (negativo para débitos) al saldo del usuario y registra el
+    movimiento. Retorna el MovimientoPuntos creado.
+
+    - require_balance: lanza SaldoInsuficiente si el saldo no alcanza.
+    - once: si ya existe un movimiento del mismo tipo para `origen` no hace
+      nada y retorna None (p. ej. un canje aprobado dos veces).
+
+    Actualiza usuario.puntos en memoria con el saldo resultante.
+    """
+    from .models import MovimientoPuntos, Usuario
+
+    origen_tipo, origen_id = _origin(origen)
+    try:
+        with transaction.atomic():
+            filas = Usuario.objects.filter(pk=usuario.pk)
+            if require_balance and delta < 0:
+                filas = filas.filter(puntos__gte=-delta)
+            if not filas.update(puntos=F('puntos') + delta):
+                raise SaldoInsuficiente(f'El usuario {usuario.pk} no tiene {-delta} puntos disponibles')
+
+            # El UPDATE ya bloqueó la fila: el chequeo no compite con otra aprobación del mismo origen
+            if once and MovimientoPuntos.objects.filter(tipo=tipo, origen_tipo=origen_tipo, origen_id=origen_id).exists():
+                raise _YaAplicado()
+
+            saldo = Usuario.objects.filter(pk=usuario.pk).values_list('puntos', flat=True).get()
+            movimiento = MovimientoPuntos.objects.create(
+                usuario_id=usuario.pk,
+                tipo=tipo,
+                delta=delta,
+                saldo_resultante=saldo,
+                origen_tipo=origen_tipo,
+                origen_id=origen_id,
+                descripcion=descripcion[:255],
+                realizado_por=realizado_por if getattr(realizado_por, 'pk', None) else None,
+            )
+            transaction.on_commit(lambda: _after_commit(usuario.pk, saldo))
+    except _YaAplicado:
+        logger.debug(f'Movimiento {tipo} de {origen_tipo} {origen_id} ya aplicado')
+        return None
+    except IntegrityError:
+        # Otra transacción registró el mismo origen justo antes (restricción única)
+        if once:
+            return None
+        raise
+
+    usuario.sync_counter('puntos', saldo)
+    return movimiento
+
+
+def credit_canje(canje, realizado_por=None):
+    """Acredita los puntos de un canje aprobado una sola vez"""
+    puntos = canje.puntos_finales or canje.puntos or 0
+    if puntos <= 0:
+        return None
+    return apply_points(
+        canje.usuario, puntos, 'canje', origen=canje,
+        descripcion=f'Canje de {canje.material.nombre}', realizado_por=realizado_por, once=True
+    )
+
+
+def movements_page(usuario, before_id=None, limit=PAGE_SIZE):
+    """
+    Página del historial de movimientos del usuario, del más reciente al
+    más antiguo, paginada por id (índice usuario, -id) en lugar de OFFSET.
+    Retorna (movimientos, id para pedir la página siguiente o None).
+    """
+    from .models import MovimientoPuntos
+
+    movimientos = MovimientoPuntos.objects.filter(usuario_id=usuario.pk)
+    if before_id:
+        movimientos = movimientos.filter(id__lt=before_id)
+    movimientos = list(movimientos.order_by('-id')[:limit + 1])
+    siguiente = movimientos[limit - 1].id if len(movimientos) > limit else None
+    return movimientos[:limit], siguiente
+
+
+def ledger_balance(usuario_id):
+    """
+    Saldo según el libro mayor: la última foto de SaldoPuntos más los
+    movimientos posteriores. Si aún no hay foto, parte del saldo anterior
+    al primer movimiento registrado.
+    """
+    from .models import MovimientoPuntos, SaldoPuntos
+
+    movimientos = MovimientoPuntos.objects.filter(usuario_id=usuario_id)
+    foto = SaldoPuntos.objects.filter(usuario_id=usuario_id).order_by('-id').first()
+    if foto:
+        base, desde = foto.saldo, foto.ultimo_movimiento_id
+    else:
+        primero = movimientos.order_by('id').first()
+        if primero is None:
+            return None
+        base, desde = primero.saldo_resultante - primero.delta, 0
+    return base + (movimientos.filter(id__gt=desde).aggregate(total=Sum('delta'))['total'] or 0)
+
+
+def snapshot_balance(usuario_id):
+    """
+    Guarda una foto del saldo actual. Se toma con la fila del usuario
+    bloqueada para que ningún movimiento quede entre el saldo y el id.
+    Retorna (foto, saldo según el libro mayor antes de la foto).
+    """
+    from .models import MovimientoPuntos, SaldoPuntos, Usuario
+
+    with transaction.atomic():
+        saldo = Usuario.objects.select_for_update().filter(pk=usuario_id).values_list('puntos', flat=True).get()
+        esperado = ledger_balance(usuario_id)
+        ultimo = MovimientoPuntos.objects.filter(usuario_id=usuario_id).order_by('-id').values_list('id', flat=True).first()
+        foto = SaldoPuntos.objects.create(usuario_id=usuario_id, saldo=saldo, ultimo_movimiento_id=ultimo or 0)
+    return foto, esperado
+
+
+def snapshot_balances(todos=False):
+    """
+    Toma fotos del saldo de los usuarios con movimientos posteriores a su
+    última foto (o de todos con todos=True; los que nunca tuvieron foto
+    siempre se incluyen). Retorna (fotos tomadas, lista de diferencias
+    (usuario_id, saldo, esperado) entre Usuario.puntos y el libro mayor).
+    """
+    from django.db.models import Max
+    from .models import MovimientoPuntos, SaldoPuntos, Usuario
+
+    ultimos = dict(
+        MovimientoPuntos.objects.values('usuario_id').annotate(ultimo=Max('id')).values_list('usuario_id', 'ultimo').order_by()
+    )
+    fotos = dict(
+        SaldoPuntos.objects.values('usuario_id').annotate(ultimo=Max('ultimo_movimiento_id')).values_list('usuario_id', 'ultimo').order_by()
+    )
+
+    tomadas, diferencias = 0, []
+    for usuario_id in Usuario.objects.values_list('id', flat=True).order_by('id').iterator():
+        if not todos and usuario_id in fotos and fotos[usuario_id] >= ultimos.get(usuario_id, 0):
+            continue
+        foto, esperado = snapshot_balance(usuario_id)
+        tomadas += 1
+        if esperado is not None and esperado != foto.saldo:
+            logger.warning(f'Saldo del usuario {usuario_id} ({foto.saldo}) no coincide con el libro mayor ({esperado})')
+            diferencias.append((usuario_id, foto.saldo, esperado))
+    return tomadas, diferencias
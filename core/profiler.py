@@ -0,0 +1,211 @@
+"""
+Perfilador de vistas: consultas, tiempo de base de datos, de plantillas y
+latencia total por vista resuelta.
+
+ProfilerMiddleware (PROFILER_ENABLED, desactivado por defecto) mide una
+fracción de las peticiones (PROFILER_SAMPLE_RATE):
+
+- las consultas y su tiempo con connection.execute_wrapper;
+- el render de plantillas con el backend ProfiledDjangoTemplates;
+- las consultas repetidas dentro de la misma petición (posible N+1),
+  agrupadas por su huella: el SQL parametrizado con las listas IN (...)
+  normalizadas.
+
+Las muestras se acumulan en memoria y se vuelcan como máximo cada
+PROFILER_FLUSH_SECONDS al rollup diario PerfilVista (una fila por día y
+vista, con las PROFILER_MAX_FINGERPRINTS huellas más repetidas), que se
+consulta desde el admin.
+"""
+from collections import Counter
+from contextvars import ContextVar
+import logging
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Perfil de la petición en curso (None si no se está midiendo)
+_current = ContextVar('profiler_current', default=None)
+
+_buffer = {}
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_SPACES = re.compile(r'\s+')
+
+
+def is_enabled():
+    return getattr(settings, 'PROFILER_ENABLED', False)
+
+
+def get_sample_rate():
+    return getattr(settings, 'PROFILER_SAMPLE_RATE', 0.1)
+
+
+def get_flush_seconds():
+    return getattr(settings, 'PROFILER_FLUSH_SECONDS', 60)
+
+
+def get_max_fingerprints():
+    return getattr(settings, 'PROFILER_MAX_FINGERPRINTS', 20)
+
+
+def fingerprint(sql):
+    """SQL normalizado: misma huella para la misma consulta con distintos parámetros"""
+    return _SPACES.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()[:1000]
+
+
+class _Profile:
+    __slots__ = ('consultas', 'tiempo_db', 'tiempo_plantillas', 'huellas', 'render_depth')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.tiempo_plantillas = 0.0
+        self.huellas = Counter()
+        self.render_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_db += time.perf_counter() - inicio
+            self.consultas += 1
+            self.huellas[fingerprint(sql)] += 1
+
+
+class ProfiledTemplate(Template):
+    """Plantilla que suma su tiempo de render al perfil de la petición"""
+
+    def render(self, context=None, request=None):
+        perfil = _current.get()
+        if perfil is None:
+            return super().render(context, request)
+        # Solo se mide el render externo: los anidados ya están incluidos
+        perfil.render_depth += 1
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            perfil.render_depth -= 1
+            if not perfil.render_depth:
+                perfil.tiempo_plantillas += time.perf_counter() - inicio
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """Backend DjangoTemplates cuyas plantillas reportan al perfilador"""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
+
+
+def _record(vista, perfil, latencia):
+    duplicadas = {huella: veces for huella, veces in perfil.huellas.items() if veces > 1}
+    with _buffer_lock:
+        datos = _buffer.setdefault(vista, {
+            'peticiones': 0, 'consultas': 0, 'consultas_max': 0, 'tiempo_db': 0.0,
+            'tiempo_plantillas': 0.0, 'latencia': 0.0, 'latencia_max': 0.0, 'duplicadas': {},
+        })
+        datos['peticiones'] += 1
+        datos['consultas'] += perfil.consultas
+        datos['consultas_max'] = max(datos['consultas_max'], perfil.consultas)
+        datos['tiempo_db'] += perfil.tiempo_db * 1000
+        datos['tiempo_plantillas'] += perfil.tiempo_plantillas * 1000
+        datos['latencia'] += latencia * 1000
+        datos['latencia_max'] = max(datos['latencia_max'], latencia * 1000)
+        for huella, veces in duplicadas.items():
+            acumulado = datos['duplicadas'].setdefault(huella, [0, 0])
+            acumulado[0] += veces
+            acumulado[1] += 1
+
+
+def _merge_fingerprints(guardadas, nuevas):
+    """Une las huellas repetidas y conserva las que más se ejecutaron"""
+    for huella, (veces, peticiones) in nuevas.items():
+        actual = guardadas.get(huella, {'veces': 0, 'peticiones': 0})
+        guardadas[huella] = {'veces': actual['veces'] + veces, 'peticiones': actual['peticiones'] + peticiones}
+    mayores = sorted(guardadas.items(), key=lambda item: item[1]['veces'], reverse=True)
+    return dict(mayores[:get_max_fingerprints()])
+
+
+def flush_profiles():
+    """Vuelca las muestras acumuladas al rollup PerfilVista. Retorna las vistas actualizadas."""
+    from .models import PerfilVista
+
+    global _last_flush
+    with _buffer_lock:
+        pendientes = dict(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not pendientes:
+        return 0
+
+    # Las consultas del volcado no deben contarse en el perfil de la petición actual
+    token = _current.set(None)
+    try:
+        hoy = timezone.localdate()
+        for vista, datos in pendientes.items():
+            with transaction.atomic():
+                perfil, _ = PerfilVista.objects.select_for_update().get_or_create(fecha=hoy, vista=vista[:200])
+                PerfilVista.objects.filter(pk=perfil.pk).update(
+                    peticiones=F('peticiones') + datos['peticiones'],
+                    consultas=F('consultas') + datos['consultas'],
+                    consultas_max=Greatest(F('consultas_max'), datos['consultas_max']),
+                    tiempo_db=F('tiempo_db') + datos['tiempo_db'],
+                    tiempo_plantillas=F('tiempo_plantillas') + datos['tiempo_plantillas'],
+                    latencia=F('latencia') + datos['latencia'],
+                    latencia_max=Greatest(F('latencia_max'), datos['latencia_max']),
+                    duplicadas=_merge_fingerprints(perfil.duplicadas, datos['duplicadas']),
+                )
+    finally:
+        _current.reset(token)
+    return len(pendientes)
+
+
+class ProfilerMiddleware:
+    """Mide una muestra de las peticiones por vista (PROFILER_ENABLED)"""
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= get_sample_rate():
+            return self.get_response(request)
+
+        perfil = _Profile()
+        token = _current.set(perfil)
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(perfil):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        latencia = time.perf_counter() - inicio
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            _record(match.view_name, perfil, latencia)
+
+        if time.monotonic() - _last_flush >= get_flush_seconds():
+            try:
+                flush_profiles()
+            except Exception as e:
+                logger.error(f'Error volcando el perfil de vistas: {e}')
+        return response
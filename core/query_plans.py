@@ -0,0 +1,68 @@
+"""
+Planes de ejecución de las consultas más frecuentes.
+
+hot_queries() lista las consultas de las rutas calientes junto con la tabla
+que no debe recorrerse completa. check_hot_queries() obtiene el plan de cada
+una (EXPLAIN QUERY PLAN en SQLite, EXPLAIN en PostgreSQL) y retorna las que
+caen en un recorrido completo de esa tabla; la prueba de core.tests y el
+comando explain_hot_queries fallan si la lista no está vacía.
+
+En PostgreSQL el planificador prefiere Seq Scan en tablas pequeñas aunque
+exista el índice, así que el plan se pide con enable_seqscan desactivado:
+lo que se verifica es que haya un índice utilizable, no el costo.
+"""
+from datetime import timedelta
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+def hot_queries():
+    """{nombre: queryset} de las consultas de las rutas calientes"""
+    from .models import Canje, IntentoAcceso, MensajeChatbot, Notificacion, Recompensa, SesionUsuario
+
+    hace_una_hora = timezone.now() - timedelta(hours=1)
+    return {
+        'historial de canjes del usuario': Canje.objects.filter(usuario_id=1).order_by('-fecha_solicitud')[:20],
+        'canjes por estado': Canje.objects.filter(estado='pendiente').order_by('-fecha_solicitud')[:50],
+        'API de canjes por cursor': Canje.objects.filter(fecha_solicitud__lt=hace_una_hora).order_by('-fecha_solicitud', '-id')[:20],
+        'notificaciones del usuario': Notificacion.objects.filter(usuario_id=1).order_by('-fecha_creacion')[:20],
+        'notificaciones no leídas': Notificacion.objects.filter(usuario_id=1, leida=False),
+        'sesiones activas del usuario': SesionUsuario.objects.filter(usuario_id=1, activa=True),
+        'monitor de sesiones activas': SesionUsuario.objects.filter(activa=True).order_by('-ultima_actividad')[:50],
+        'intentos recientes por IP': IntentoAcceso.objects.filter(ip_address='127.0.0.1', fecha_intento__gte=hace_una_hora),
+        'mensajes de la conversación': MensajeChatbot.objects.filter(conversacion_id=1).order_by('timestamp'),
+        'catálogo por categoría': Recompensa.objects.filter(activa=True, categoria_id=1).order_by('puntos_requeridos'),
+    }
+
+
+def explain(queryset):
+    """Plan de ejecución de la consulta en el motor actual"""
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+    return queryset.explain()
+
+
+def full_scans(plan, tabla):
+    """Líneas del plan que recorren `tabla` completa sin índice"""
+    if connection.vendor == 'postgresql':
+        patron = re.compile(rf'Seq Scan on {re.escape(tabla)}\b')
+    else:
+        # "SCAN tabla" sin índice; "SCAN tabla USING INDEX" es un recorrido ordenado del índice
+        patron = re.compile(rf'\bSCAN {re.escape(tabla)}\b(?! USING (COVERING )?INDEX)')
+    return [linea.strip() for linea in plan.splitlines() if patron.search(linea)]
+
+
+def check_hot_queries():
+    """{nombre: líneas con recorrido completo} de las consultas calientes que no usan índice"""
+    regresiones = {}
+    for nombre, queryset in hot_queries().items():
+        plan = explain(queryset)
+        lineas = full_scans(plan, queryset.model._meta.db_table)
+        if lineas:
+            regresiones[nombre] = lineas
+    return regresiones
@@ -4,8 +4,17 @@ Decoradores y utilidades para Rate Limiting / Throttling
 from functools import wraps
 from django.conf import settings
 from django.http import HttpResponse, JsonResponse
-from django_ratelimit.decorators import ratelimit
-from django_ratelimit.exceptions import Ratelimited
+from .throttle_engine import get_throttle_engine, parse_rate
+
+
+def get_ratelimit_key(request, key):
+    """Identificador del cliente según el tipo de clave ('ip', 'user', 'user_or_ip')"""
+    if key in ('user', 'user_or_ip') and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if key == 'user':
+        # Sin usuario autenticado se limita por IP
+        return f"anon:{get_client_ip(request)}"
+    return f"ip:{get_client_ip(request)}"
 
 
 def smart_ratelimit(key='ip', rate=None, method='ALL', block=True):
@@ -19,6 +28,8 @@ def smart_ratelimit(key='ip', rate=None, method='ALL', block=True):
         block: Si True, bloquea cuando se excede el límite
     """
     def decorator(func):
+        view_name = f"{func.__module__}.{func.__qualname__}"
+
         @wraps(func)
         def wrapper(request, *args, **kwargs):
             # Si rate limiting está deshabilitado, ejecutar función normalmente
@@ -39,28 +50,36 @@ def smart_ratelimit(key='ip', rate=None, method='ALL', block=True):
             else:
                 default_rate = rate
             
-            # Aplicar rate limiting
-            @ratelimit(key=key, rate=default_rate, method=method, block=block)
-            def limited_func(req, *a, **kw):
-                return func(req, *a, **kw)
-            
-            try:
-                return limited_func(request, *args, **kwargs)
-            except Ratelimited:
-                # Manejar cuando se excede el límite
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or \
-                   request.content_type == 'application/json':
-                    return JsonResponse({
-                        'error': 'Límite de solicitudes excedido',
-                        'message': 'Has realizado demasiadas solicitudes. Por favor, intenta más tarde.',
-                        'retry_after': '60'  # segundos
-                    }, status=429)
-                else:
-                    return HttpResponse(
-                        '<h1>Límite de solicitudes excedido</h1>'
-                        '<p>Has realizado demasiadas solicitudes. Por favor, intenta más tarde.</p>',
-                        status=429
-                    )
+            # Solo se limitan los métodos indicados
+            methods = [method] if isinstance(method, str) else list(method)
+            if 'ALL' not in methods and request.method not in methods:
+                return func(request, *args, **kwargs)
+
+            # Aplicar rate limiting con el motor compartido entre workers
+            limit, window = parse_rate(default_rate)
+            client_key = get_ratelimit_key(request, key)
+            result = get_throttle_engine().check(f"{view_name}:{client_key}", limit, window)
+
+            if result.allowed or not block:
+                request.limited = not result.allowed
+                return func(request, *args, **kwargs)
+
+            # Manejar cuando se excede el límite
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or \
+               request.content_type == 'application/json':
+                response = JsonResponse({
+                    'error': 'Límite de solicitudes excedido',
+                    'message': 'Has realizado demasiadas solicitudes. Por favor, intenta más tarde.',
+                    'retry_after': str(result.retry_after)  # segundos
+                }, status=429)
+            else:
+                response = HttpResponse(
+                    '<h1>Límite de solicitudes excedido</h1>'
+                    '<p>Has realizado demasiadas solicitudes. Por favor, intenta más tarde.</p>',
+                    status=429
+                )
+            response['Retry-After'] = str(result.retry_after)
+            return response
         
         return wrapper
     return decorator
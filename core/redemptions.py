@@ -1,7 +1,9 @@
+from django.db import transaction
 from django.http import JsonResponse
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .models import RedencionPuntos, Notificacion
+from .points_ledger import apply_points
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
@@ -27,6 +29,7 @@ def get_pending_redemptions(request):
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
+@transaction.atomic
 def aprobar_redencion(request, redencion_id):
     if request.method == 'POST':
         try:
@@ -122,8 +125,10 @@ def rechazar_redencion(request, redencion_id):
                 })
             
             usuario = redencion.usuario
-            usuario.puntos += redencion.puntos
-            usuario.save()
+            apply_points(
+                usuario, redencion.puntos, 'devolucion_redencion', origen=redencion,
+                descripcion='Redención rechazada', realizado_por=request.user, once=True
+            )
             
             redencion.estado = 'rechazado'
             redencion.fecha_procesamiento = timezone.now()
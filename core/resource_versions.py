@@ -0,0 +1,113 @@
+"""
+Versiones por recurso para responder con 304 a los endpoints que se consultan
+periódicamente (notificaciones, verificación de sesión, monitor de sesiones,
+canjes pendientes, chat directo).
+
+Cada recurso tiene una versión en la caché ('notificaciones:<usuario_id>',
+'canjes', 'sesiones', ...) que cambian las escrituras con bump() después
+del commit; un bump dentro de la transacción permitiría etiquetar con la
+versión nueva datos todavía sin confirmar. Las notificaciones cambian su
+versión al publicarse (notification_push.publish), que ya corre después
+del commit.
+
+conditional_get() calcula el ETag con las versiones de los recursos de la
+vista (una lectura get_many de la caché), el usuario y la URL. Si coincide
+con If-None-Match se responde 304 sin ejecutar la vista: no hay consultas
+ni JSON que generar más allá de la autenticación. La respuesta se marca
+`Cache-Control: private, no-cache` para que el navegador guarde el cuerpo y
+revalide siempre: el JavaScript recibe el 304 como el 200 anterior.
+
+Los recursos que también cambian con el paso del tiempo (p. ej. la
+expiración de una sesión) pasan `max_age`: el ETag incluye la ventana de
+tiempo actual y la vista se vuelve a ejecutar al menos una vez por ventana.
+"""
+from functools import wraps
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+KEY_PREFIX = 'recurso:version'
+
+
+def _key(resource):
+    return f'{KEY_PREFIX}:{resource}'
+
+
+def _new_version():
+    # Basada en tiempo para no repetir versiones si la caché pierde la clave
+    return time.time_ns()
+
+
+def bump_now(*resources):
+    """Cambia la versión de los recursos ya (para usar desde callbacks de on_commit)"""
+    if resources:
+        version = _new_version()
+        cache.set_many({_key(resource): version for resource in resources}, None)
+
+
+def bump(*resources):
+    """Cambia la versión de los recursos cuando se confirme la transacción actual"""
+    if resources:
+        transaction.on_commit(lambda: bump_now(*resources))
+
+
+def user_resources(name, usuario_ids):
+    """Nombres '<name>:<usuario_id>' de varios usuarios (para bump(*...))"""
+    return [f'{name}:{usuario_id}' for usuario_id in set(usuario_ids)]
+
+
+def versions(resources):
+    """Versión actual de cada recurso, creando las que falten"""
+    keys = [_key(resource) for resource in resources]
+    values = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in values}
+    if missing:
+        cache.set_many(missing, None)
+        values.update(missing)
+    return [values[key] for key in keys]
+
+
+def compute_etag(request, resources, max_age=None):
+    user = getattr(request, 'user', None)
+    parts = [
+        request.get_full_path(),
+        request.headers.get('X-Requested-With', ''),
+        getattr(user, 'pk', None),
+        *versions(resources),
+    ]
+    if max_age:
+        parts.append(int(time.time() // max_age))
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def conditional_get(resources, max_age=None):
+    """
+    Decorador de vistas GET: `resources(request)` retorna los recursos de los
+    que depende la respuesta. Debe ir debajo de los decoradores de
+    autenticación para no responder 304 a quien no tiene acceso.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            etag = compute_etag(request, resources(request), max_age)
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                response = HttpResponseNotModified()
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
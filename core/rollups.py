@@ -0,0 +1,417 @@
+"""
+Tablas de hechos diarias pre-agregadas para los reportes de administración.
+
+Los reportes (estadisticasadmin, StatisticsManager, estadísticas del
+chatbot, EstadisticasAPIView) leen filas de Rollup*Diario/Diaria en lugar de
+recorrer todos los canjes, redenciones, sesiones, intentos de acceso y
+mensajes del chatbot en cada visita.
+
+run_rollups() es incremental e idempotente. Para cada fuente:
+
+1. Busca los días afectados por filas nuevas o modificadas desde su
+   watermark (menos un margen para transacciones que se confirmaron tarde)
+   más los días marcados como pendientes por las señales de borrado.
+2. Borra y recalcula esos días completos en una transacción, así que volver
+   a procesar un día nunca duplica cifras.
+3. Avanza el watermark a la hora de inicio de la ejecución.
+
+Canje y RedencionPuntos tienen fecha_actualizacion (auto_now), de modo que
+un canje aprobado o rechazado días después recalcula el día en que se
+solicitó. Las demás fuentes solo agregan filas y usan su fecha de creación
+como watermark; por eso borrar filas antiguas (retención) no altera los
+rollups ya calculados. Además core.security_retention congela los días que
+archiva (freeze_before): esos días ya no se recalculan, ni siquiera con
+full=True, que de otro modo los dejaría en cero.
+
+backfill_rollups() (comando rebuild_rollups, un paso del despliegue después
+de migrate) hace el primer cálculo completo de las fuentes que nunca se
+procesaron y ya tienen filas, fuera de migrate para no bloquearlo con el
+recorrido de todo el historial. Luego el job periódico (rollup_daily_stats
+en el servicio "tareas") los mantiene.
+
+Los reportes leen los días anteriores de los rollups y el día actual en vivo
+(today_rows). Un cambio de estado de un canje o una redención de días
+anteriores se refleja con la siguiente ejecución del job.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Días que se recalculan juntos en una misma consulta
+MAX_SPAN_DAYS = 31
+
+Fuente = namedtuple('Fuente', ['nombre', 'cambios', 'recalcular'])
+
+
+def get_overlap():
+    """Margen hacia atrás del watermark (ROLLUP_OVERLAP_SECONDS)"""
+    return timedelta(seconds=getattr(settings, 'ROLLUP_OVERLAP_SECONDS', 300))
+
+
+def day_bounds(start, end):
+    """Inicio del día start y del día siguiente a end como datetimes locales"""
+    first = timezone.make_aware(datetime.combine(start, time.min))
+    stop = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    return first, stop
+
+
+def _changed_days(queryset, change_field, date_field, since):
+    """Días locales de date_field de las filas con change_field posterior a since"""
+    if since is not None:
+        queryset = queryset.filter(**{f'{change_field}__gt': since})
+    return set(
+        queryset.annotate(dia=TruncDate(date_field))
+        .values_list('dia', flat=True)
+        .order_by()
+        .distinct()
+    )
+
+
+def _in_days(date_field, start, end):
+    first, stop = day_bounds(start, end)
+    return {f'{date_field}__gte': first, f'{date_field}__lt': stop}
+
+
+def _replace(model, start, end, rows):
+    model.objects.filter(fecha__gte=start, fecha__lte=end).delete()
+    model.objects.bulk_create([model(**row) for row in rows], batch_size=500)
+    return len(rows)
+
+
+# Canjes: día de solicitud × material × zona × estado
+
+def _canjes_cambios(since):
+    from .models import Canje
+    return _changed_days(Canje.objects.all(), 'fecha_actualizacion', 'fecha_solicitud', since)
+
+
+def _canjes_filas(start, end):
+    from .models import Canje
+
+    rows = (
+        Canje.objects.filter(**_in_days('fecha_solicitud', start, end))
+        .annotate(
+            dia=TruncDate('fecha_solicitud'),
+            zona_ruta=Coalesce('ruta_asignada__zona', Value('')),
+        )
+        .values('dia', 'material_id', 'zona_ruta', 'estado')
+        # Los puntos de un canje son puntos_finales si el administrador los corrigió (como en el resumen de actividad)
+        .annotate(cantidad=Count('id'), peso_total=Sum('peso'), puntos_total=Sum(Coalesce('puntos_finales', 'puntos')))
+        .order_by()
+    )
+    return [
+        {
+            'fecha': row['dia'],
+            'material_id': row['material_id'],
+            'zona': row['zona_ruta'],
+            'estado': row['estado'],
+            'cantidad': row['cantidad'],
+            'peso_total': row['peso_total'] or 0,
+            'puntos_total': row['puntos_total'] or 0,
+        }
+        for row in rows
+    ]
+
+
+def _canjes_recalcular(start, end):
+    from .models import RollupCanjeDiario
+    return _replace(RollupCanjeDiario, start, end, _canjes_filas(start, end))
+
+
+# Redenciones: día de solicitud × método de pago × estado
+
+def _redenciones_cambios(since):
+    from .models import RedencionPuntos
+    return _changed_days(RedencionPuntos.objects.all(), 'fecha_actualizacion', 'fecha_solicitud', since)
+
+
+def _redenciones_filas(start, end):
+    from .models import RedencionPuntos
+
+    rows = (
+        RedencionPuntos.objects.filter(**_in_days('fecha_solicitud', start, end))
+        .annotate(dia=TruncDate('fecha_solicitud'))
+        .values('dia', 'metodo_pago', 'estado')
+        .annotate(cantidad=Count('id'), puntos_total=Sum('puntos'), valor_total=Sum('valor_cop'))
+        .order_by()
+    )
+    return [
+        {
+            'fecha': row['dia'],
+            'metodo_pago': row['metodo_pago'],
+            'estado': row['estado'],
+            'cantidad': row['cantidad'],
+            'puntos_total': row['puntos_total'] or 0,
+            'valor_total': row['valor_total'] or 0,
+        }
+        for row in rows
+    ]
+
+
+def _redenciones_recalcular(start, end):
+    from .models import RollupRedencionDiaria
+    return _replace(RollupRedencionDiaria, start, end, _redenciones_filas(start, end))
+
+
+# Usuarios: registros y sesiones iniciadas por día × rol
+
+def _usuarios_cambios(since):
+    from .models import SesionUsuario, Usuario
+    return (
+        _changed_days(Usuario.objects.all(), 'fecha_registro', 'fecha_registro', since)
+        | _changed_days(SesionUsuario.objects.all(), 'fecha_creacion', 'fecha_creacion', since)
+    )
+
+
+def _usuarios_filas(start, end):
+    from .models import SesionUsuario, Usuario
+
+    por_dia_rol = {}
+
+    def fila(dia, rol):
+        return por_dia_rol.setdefault((dia, rol), {
+            'fecha': dia, 'rol': rol, 'nuevos_usuarios': 0, 'sesiones': 0, 'usuarios_con_sesion': 0,
+        })
+
+    registros = (
+        Usuario.objects.filter(**_in_days('fecha_registro', start, end))
+        .annotate(dia=TruncDate('fecha_registro'))
+        .values('dia', 'role')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for row in registros:
+        fila(row['dia'], row['role'])['nuevos_usuarios'] = row['total']
+
+    sesiones = (
+        SesionUsuario.objects.filter(**_in_days('fecha_creacion', start, end))
+        .annotate(dia=TruncDate('fecha_creacion'))
+        .values('dia', 'usuario__role')
+        .annotate(total=Count('id'), usuarios=Count('usuario', distinct=True))
+        .order_by()
+    )
+    for row in sesiones:
+        destino = fila(row['dia'], row['usuario__role'])
+        destino['sesiones'] = row['total']
+        destino['usuarios_con_sesion'] = row['usuarios']
+
+    return list(por_dia_rol.values())
+
+
+def _usuarios_recalcular(start, end):
+    from .models import RollupUsuarioDiario
+    return _replace(RollupUsuarioDiario, start, end, _usuarios_filas(start, end))
+
+
+# Seguridad: intentos de acceso no autorizado por día × motivo
+
+def _seguridad_cambios(since):
+    from .models import IntentoAcceso
+    return _changed_days(IntentoAcceso.objects.all(), 'fecha_intento', 'fecha_intento', since)
+
+
+def _seguridad_recalcular(start, end):
+    from .models import IntentoAcceso, RollupSeguridadDiaria
+
+    rows = (
+        IntentoAcceso.objects.filter(**_in_days('fecha_intento', start, end))
+        .annotate(dia=TruncDate('fecha_intento'))
+        .values('dia', 'motivo')
+        .annotate(intentos=Count('id'), ips_distintas=Count('ip_address', distinct=True))
+        .order_by()
+    )
+    return _replace(RollupSeguridadDiaria, start, end, [
+        {
+            'fecha': row['dia'],
+            'motivo': row['motivo'],
+            'intentos': row['intentos'],
+            'ips_distintas': row['ips_distintas'],
+        }
+        for row in rows
+    ])
+
+
+# Chatbot: conversaciones y mensajes por día
+
+def _chatbot_cambios(since):
+    from .models import ConversacionChatbot, MensajeChatbot
+    return (
+        _changed_days(ConversacionChatbot.objects.all(), 'fecha_inicio', 'fecha_inicio', since)
+        | _changed_days(MensajeChatbot.objects.all(), 'timestamp', 'timestamp', since)
+    )
+
+
+def _chatbot_recalcular(start, end):
+    from .models import ConversacionChatbot, MensajeChatbot, RollupChatbotDiario
+
+    por_dia = {}
+
+    def fila(dia):
+        return por_dia.setdefault(dia, {
+            'fecha': dia, 'conversaciones': 0, 'mensajes_usuario': 0, 'mensajes_bot': 0,
+            'respuestas_con_confianza': 0, 'confianza_total': 0,
+        })
+
+    conversaciones = (
+        ConversacionChatbot.objects.filter(**_in_days('fecha_inicio', start, end))
+        .annotate(dia=TruncDate('fecha_inicio'))
+        .values('dia')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for row in conversaciones:
+        fila(row['dia'])['conversaciones'] = row['total']
+
+    con_confianza = Q(es_usuario=False, confidence_score__isnull=False)
+    mensajes = (
+        MensajeChatbot.objects.filter(**_in_days('timestamp', start, end))
+        .annotate(dia=TruncDate('timestamp'))
+        .values('dia')
+        .annotate(
+            mensajes_usuario=Count('id', filter=Q(es_usuario=True)),
+            mensajes_bot=Count('id', filter=Q(es_usuario=False)),
+            respuestas_con_confianza=Count('id', filter=con_confianza),
+            confianza_total=Sum('confidence_score', filter=con_confianza),
+        )
+        .order_by()
+    )
+    for row in mensajes:
+        destino = fila(row['dia'])
+        destino['mensajes_usuario'] = row['mensajes_usuario']
+        destino['mensajes_bot'] = row['mensajes_bot']
+        destino['respuestas_con_confianza'] = row['respuestas_con_confianza']
+        destino['confianza_total'] = row['confianza_total'] or 0
+
+    return _replace(RollupChatbotDiario, start, end, list(por_dia.values()))
+
+
+FUENTES = (
+    Fuente('canjes', _canjes_cambios, _canjes_recalcular),
+    Fuente('redenciones', _redenciones_cambios, _redenciones_recalcular),
+    Fuente('usuarios', _usuarios_cambios, _usuarios_recalcular),
+    Fuente('seguridad', _seguridad_cambios, _seguridad_recalcular),
+    Fuente('chatbot', _chatbot_cambios, _chatbot_recalcular),
+)
+
+
+# Fuentes cuyos reportes leen el día actual en vivo (today_rows)
+FILAS_EN_VIVO = {
+    'canjes': _canjes_filas,
+    'redenciones': _redenciones_filas,
+    'usuarios': _usuarios_filas,
+}
+
+
+def today_rows(nombre, hoy=None):
+    """
+    Filas del día actual calculadas desde las tablas de origen, con la misma
+    forma que las del rollup (no se guardan). Los reportes leen el rollup con
+    fecha < hoy y suman estas filas, así el día en curso no espera al job.
+    """
+    hoy = hoy or timezone.localdate()
+    return FILAS_EN_VIVO[nombre](hoy, hoy)
+
+
+def _spans(days):
+    """Agrupa días ordenados en rangos [inicio, fin] de hasta MAX_SPAN_DAYS días"""
+    spans = []
+    for day in sorted(days):
+        if spans and (day - spans[-1][0]).days < MAX_SPAN_DAYS:
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    return [tuple(span) for span in spans]
+
+
+def mark_day_dirty(fuente, fecha):
+    """Marca un día para recalcular en la próxima ejecución (p. ej. tras un borrado)"""
+    from .models import RollupDiaPendiente
+
+    if isinstance(fecha, datetime):
+        fecha = timezone.localdate(fecha)
+    RollupDiaPendiente.objects.get_or_create(fuente=fuente, fecha=fecha)
+
+
+def _frozen_key(nombre):
+    return f'congelado:{nombre}'
+
+
+def frozen_before(nombre):
+    """Primer día que todavía se recalcula para la fuente (None si no hay días congelados)"""
+    from .models import RollupWatermark
+
+    valor = RollupWatermark.objects.filter(nombre=_frozen_key(nombre)).values_list('valor', flat=True).first()
+    return timezone.localdate(valor) if valor else None
+
+
+def freeze_before(nombre, horizonte):
+    """Deja de recalcular los días de la fuente anteriores a `horizonte` (sus filas se archivaron)"""
+    from .models import RollupWatermark
+
+    congelado, _ = RollupWatermark.objects.get_or_create(nombre=_frozen_key(nombre))
+    # Nunca retrocede: las filas anteriores al horizonte previo ya no existen
+    if congelado.valor is None or horizonte > congelado.valor:
+        congelado.valor = horizonte
+        congelado.save()
+
+
+def run_source(fuente, now=None, full=False):
+    """Procesa una fuente y retorna el número de días recalculados"""
+    from .models import RollupDiaPendiente, RollupWatermark
+
+    now = now or timezone.now()
+    watermark, _ = RollupWatermark.objects.get_or_create(nombre=fuente.nombre)
+    since = None if full or watermark.valor is None else watermark.valor - get_overlap()
+
+    pendientes = list(RollupDiaPendiente.objects.filter(fuente=fuente.nombre))
+    days = fuente.cambios(since) | {pendiente.fecha for pendiente in pendientes}
+    congelado = frozen_before(fuente.nombre)
+    if congelado:
+        days = {day for day in days if day >= congelado}
+
+    for start, end in _spans(days):
+        with transaction.atomic():
+            fuente.recalcular(start, end)
+
+    RollupDiaPendiente.objects.filter(pk__in=[pendiente.pk for pendiente in pendientes]).delete()
+    watermark.valor = now
+    watermark.save()
+    return len(days)
+
+
+def run_rollups(fuentes=None, now=None, full=False):
+    """
+    Ejecuta el job incremental para todas las fuentes (o las indicadas).
+    Retorna {nombre de la fuente: días recalculados}.
+    """
+    now = now or timezone.now()
+    resultado = {}
+    for fuente in FUENTES:
+        if fuentes and fuente.nombre not in fuentes:
+            continue
+        resultado[fuente.nombre] = run_source(fuente, now=now, full=full)
+        logger.info(f'Rollup {fuente.nombre}: {resultado[fuente.nombre]} días recalculados')
+    return resultado
+
+
+def backfill_rollups(now=None):
+    """
+    Primer cálculo de las fuentes sin watermark que ya tienen filas.
+    Retorna {nombre de la fuente: días recalculados} ({} si no hay nada que hacer).
+    """
+    from .models import RollupWatermark
+
+    procesadas = set(RollupWatermark.objects.filter(valor__isnull=False).values_list('nombre', flat=True))
+    # Sin filas no hay nada que calcular: el watermark sigue nulo hasta que las haya
+    pendientes = [fuente.nombre for fuente in FUENTES if fuente.nombre not in procesadas and fuente.cambios(None)]
+    if not pendientes:
+        return {}
+    return run_rollups(fuentes=pendientes, now=now)
@@ -13,4 +13,7 @@ websocket_urlpatterns = [
     re_path(r'ws/notificaciones/(?P<user_id>\w+)/$', consumers.NotificacionConsumer.as_asgi()),
     re_path(r'ws/dashboard/(?P<user_id>\w+)/$', consumers.DashboardConsumer.as_asgi()),
     re_path(r'ws/canjes/(?P<user_id>\w+)/$', consumers.CanjeConsumer.as_asgi()),
+    
+    # Monitor de sesiones de administradores
+    path('ws/monitor-sesiones/', consumers.SessionMonitorConsumer.as_asgi()),
 ]
\ No newline at end of file
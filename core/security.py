@@ -7,6 +7,9 @@ from django.shortcuts import redirect
 from django.contrib.auth import logout
 from django.utils.crypto import get_random_string
 from .models import SesionUsuario, IntentoAcceso
+from .session_guard import get_session_guard
+from .session_heartbeat import record_activity, flush_heartbeats
+from .session_monitor import sessions_changed
 from datetime import timedelta
 import ipaddress
 
@@ -49,7 +52,8 @@ class SecurityManager:
             user_agent = request.META.get('HTTP_USER_AGENT', '')
             
             # Invalidar todas las sesiones activas del usuario (una sesión por usuario)
-            SesionUsuario.objects.filter(usuario=user, activa=True).update(activa=False)
+            SesionUsuario.objects.filter(usuario=user, activa=True).update(activa=False, fecha_actualizacion=timezone.now())
+            sessions_changed([user.pk])
             
             # Expiración de sesión (20 minutos de inactividad)
             expiration = timezone.now() + timedelta(minutes=20)
@@ -97,20 +101,16 @@ class SecurityManager:
         if not secure_token or not device_id:
             return False, "Token de sesión no encontrado"
         
-        try:
-            session = SesionUsuario.objects.get(
-                token_sesion=secure_token,
-                usuario=request.user,
-                activa=True
-            )
-        except SesionUsuario.DoesNotExist:
+        # La sesión se resuelve una sola vez por petición en la guardia compartida
+        session = get_session_guard(request).sesion
+        if session is None:
             SecurityManager.log_access_attempt(request, 'token_invalido')
             return False, "Sesión no válida"
         
         # Verificar expiración
         if session.is_expired():
             session.activa = False
-            session.save()
+            session.save(update_fields=['activa', 'fecha_actualizacion'])
             SecurityManager.log_access_attempt(request, 'sesion_expirada')
             return False, "Sesión expirada"
         
@@ -131,13 +131,13 @@ class SecurityManager:
             )
             # Invalidar la sesión por seguridad
             session.activa = False
-            session.save()
+            session.save(update_fields=['activa', 'fecha_actualizacion'])
             return False, f"Acceso denegado: IP no autorizada. Sesión iniciada desde {session.ip_address}, intento desde {current_ip}"
         
-        # Actualizar última actividad y extender expiración por 20 minutos más
-        session.ultima_actividad = timezone.now()
-        session.fecha_expiracion = timezone.now() + timedelta(minutes=20)
-        session.save()
+        # Actualizar última actividad y extender expiración por 20 minutos más.
+        # Se registra en el buffer de heartbeats y se vuelca en lote a la base de datos
+        now = timezone.now()
+        record_activity(session, now + timedelta(minutes=20), now=now)
         
         return True, "Sesión válida"
     
@@ -173,7 +173,8 @@ class SecurityManager:
     @staticmethod
     def invalidate_all_user_sessions(user):
         """Invalida todas las sesiones activas de un usuario específico"""
-        SesionUsuario.objects.filter(usuario=user, activa=True).update(activa=False)
+        SesionUsuario.objects.filter(usuario=user, activa=True).update(activa=False, fecha_actualizacion=timezone.now())
+        sessions_changed([user.pk])
         return True
     
     @staticmethod
@@ -187,12 +188,16 @@ class SecurityManager:
     @staticmethod
     def cleanup_expired_sessions():
         """Limpia todas las sesiones expiradas"""
+        # Volcar la actividad pendiente para no expirar sesiones que siguen en uso
+        flush_heartbeats()
         expired_sessions = SesionUsuario.objects.filter(
             fecha_expiracion__lt=timezone.now(),
             activa=True
         )
-        expired_sessions.update(activa=False)
-        return expired_sessions.count()
+        usuarios = list(expired_sessions.values_list('usuario_id', flat=True))
+        count = expired_sessions.update(activa=False, fecha_actualizacion=timezone.now())
+        sessions_changed(usuarios)
+        return count
     
     @staticmethod
     def cleanup_inactive_sessions():
@@ -206,6 +211,9 @@ class SecurityManager:
         
         logger = logging.getLogger(__name__)
         
+        # Leer a través del buffer de heartbeats antes de comparar la última actividad
+        flush_heartbeats()
+        
         # Limpiar sesiones de administradores (10 minutos)
         admin_cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'ADMIN_SESSION_TIMEOUT', 600))
         admin_sessions = SesionUsuario.objects.filter(
@@ -214,7 +222,8 @@ class SecurityManager:
             activa=True
         )
         admin_count = admin_sessions.count()
-        admin_sessions.update(activa=False)
+        usuarios = list(admin_sessions.values_list('usuario_id', flat=True))
+        admin_sessions.update(activa=False, fecha_actualizacion=timezone.now())
         
         # Limpiar sesiones de usuarios regulares (15 minutos)
         user_cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'USER_SESSION_TIMEOUT', 900))
@@ -223,7 +232,9 @@ class SecurityManager:
             activa=True
         ).exclude(usuario__role='admin')
         user_count = user_sessions.count()
-        user_sessions.update(activa=False)
+        usuarios += user_sessions.values_list('usuario_id', flat=True)
+        user_sessions.update(activa=False, fecha_actualizacion=timezone.now())
+        sessions_changed(usuarios)
         
         total_count = admin_count + user_count
         logger.info(f'Limpiadas {total_count} sesiones inactivas (Admins: {admin_count}, Usuarios: {user_count})')
@@ -232,6 +243,7 @@ class SecurityManager:
     @staticmethod
     def get_active_sessions_for_monitoring():
         """Obtiene todas las sesiones activas para el monitor de seguridad"""
+        flush_heartbeats()
         return SesionUsuario.objects.filter(
             activa=True
         ).select_related('usuario').order_by('-ultima_actividad')
@@ -253,7 +265,9 @@ class SecurityManager:
         from .models import Notificacion
         Notificacion.objects.create(
             usuario=user,
-            mensaje=message
+            titulo='Alerta de Seguridad',
+            mensaje=message,
+            tipo='seguridad'
         )
 
 def require_secure_session(view_func):
@@ -295,7 +309,7 @@ class TwoFactorManager:
         user.codigo_verificacion = codigo
         user.codigo_verificacion_expira = timezone.now() + timedelta(minutes=10)
         user.intentos_verificacion = 0  # Resetear intentos
-        user.save()
+        user.save(update_fields=['codigo_verificacion', 'codigo_verificacion_expira', 'intentos_verificacion'])
         
         # Preparar email
         subject = f'Verifica tu cuenta en Eco Puntos - Código: {codigo}'
@@ -368,10 +382,10 @@ Si no solicitaste este registro, puedes ignorar este email.
             # Bloquear temporalmente después de 3 intentos fallidos
             if user.intentos_verificacion >= 3:
                 user.verificacion_bloqueada_hasta = timezone.now() + timedelta(minutes=15)
-                user.save()
+                user.save(update_fields=['intentos_verificacion', 'verificacion_bloqueada_hasta'])
                 return False, "Demasiados intentos fallidos. Cuenta bloqueada por 15 minutos."
             
-            user.save()
+            user.save(update_fields=['intentos_verificacion'])
             intentos_restantes = 3 - user.intentos_verificacion
             return False, f"Código incorrecto. Te quedan {intentos_restantes} intentos."
         
@@ -382,7 +396,10 @@ Si no solicitaste este registro, puedes ignorar este email.
         user.codigo_verificacion_expira = None
         user.intentos_verificacion = 0
         user.verificacion_bloqueada_hasta = None
-        user.save()
+        user.save(update_fields=[
+            'email_verificado', 'is_active', 'codigo_verificacion', 'codigo_verificacion_expira',
+            'intentos_verificacion', 'verificacion_bloqueada_hasta',
+        ])
         
         return True, "¡Email verificado correctamente! Ya puedes iniciar sesión."
     
@@ -0,0 +1,148 @@
+"""
+Retención de las tablas de seguridad: SesionUsuario e IntentoAcceso.
+
+cleanup_expired_sessions y cleanup_inactive_sessions solo marcan las sesiones
+como inactivas, así que ambas tablas crecían con cada inicio de sesión y cada
+intento rechazado. archive_security_rows() (comando cleanup_sessions) retira
+de la tabla activa:
+
+- las sesiones inactivas o expiradas creadas antes de SESSION_RETENTION_DAYS;
+- los intentos de acceso anteriores a ACCESS_ATTEMPT_RETENTION_DAYS.
+
+El horizonte se redondea al inicio del día local. Antes de borrar se ponen
+al día los rollups 'usuarios' y 'seguridad' y se congelan los días previos al
+horizonte (rollups.freeze_before): RollupUsuarioDiario y RollupSeguridadDiaria
+conservan los totales de lo archivado.
+
+Las filas se recorren en orden de id por lotes de SECURITY_RETENTION_CHUNK.
+Cada lote, en su propia transacción corta, se guarda en un ArchivoSeguridad
+(JSON por línea comprimido con zlib) y se borra con un DELETE por rango de
+clave primaria, sin cargar modelos ni disparar señales fila por fila.
+read_archive() recupera las filas de un lote.
+"""
+from collections import namedtuple
+from datetime import timedelta
+import json
+import logging
+import time
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .rollups import day_bounds, freeze_before, run_rollups
+from .session_monitor import sessions_changed
+
+logger = logging.getLogger(__name__)
+
+Resultado = namedtuple('Resultado', ['filas', 'lotes', 'segundos'])
+
+
+def get_session_retention_days():
+    return getattr(settings, 'SESSION_RETENTION_DAYS', 90)
+
+
+def get_attempt_retention_days():
+    return getattr(settings, 'ACCESS_ATTEMPT_RETENTION_DAYS', 180)
+
+
+def get_chunk_size():
+    return getattr(settings, 'SECURITY_RETENTION_CHUNK', 1000)
+
+
+def retention_horizon(dias, now=None):
+    """Inicio del día local de hace `dias` días"""
+    fecha = timezone.localdate(now or timezone.now()) - timedelta(days=dias)
+    return day_bounds(fecha, fecha)[0]
+
+
+def _compress(filas):
+    lineas = '\n'.join(json.dumps(fila, cls=DjangoJSONEncoder) for fila in filas)
+    return zlib.compress(lineas.encode(), 9)
+
+
+def read_archive(archivo):
+    """Filas de un ArchivoSeguridad como dicts (las fechas quedan en ISO 8601)"""
+    lineas = zlib.decompress(bytes(archivo.datos)).decode()
+    return [json.loads(linea) for linea in lineas.splitlines()]
+
+
+def _archive(tabla, vencidas, campo_fecha, pausa=0, al_borrar=None):
+    """Archiva y borra por rangos de id las filas de `vencidas`. Retorna un Resultado."""
+    from .models import ArchivoSeguridad
+
+    campos = [campo.attname for campo in vencidas.model._meta.concrete_fields]
+    chunk = get_chunk_size()
+    inicio = time.monotonic()
+    filas_total = lotes = 0
+    ultimo = 0
+    while True:
+        with transaction.atomic():
+            filas = list(vencidas.filter(id__gt=ultimo).order_by('id').values(*campos)[:chunk])
+            if not filas:
+                break
+            primero, ultimo = filas[0]['id'], filas[-1]['id']
+            fechas = [fila[campo_fecha] for fila in filas]
+            ArchivoSeguridad.objects.create(
+                tabla=tabla,
+                primer_id=primero,
+                ultimo_id=ultimo,
+                fecha_desde=min(fechas),
+                fecha_hasta=max(fechas),
+                filas=len(filas),
+                datos=_compress(filas),
+            )
+            # Dentro del rango, el filtro de vencidas deja fuera las filas que se conservan
+            vencidas.filter(id__gte=primero, id__lte=ultimo)._raw_delete(connection.alias)
+            if al_borrar:
+                al_borrar(filas)
+        filas_total += len(filas)
+        lotes += 1
+        # Un lote incompleto es el último: evita recorrer otra vez el resto de la tabla
+        if len(filas) < chunk:
+            break
+        time.sleep(pausa)
+    return Resultado(filas_total, lotes, time.monotonic() - inicio)
+
+
+def archive_sessions(now=None, pausa=0):
+    """Archiva las sesiones inactivas o expiradas anteriores al horizonte de retención"""
+    from .models import SesionUsuario
+
+    now = now or timezone.now()
+    horizonte = retention_horizon(get_session_retention_days(), now)
+    vencidas = SesionUsuario.objects.filter(
+        Q(activa=False) | Q(fecha_expiracion__lt=now),
+        fecha_creacion__lt=horizonte,
+    )
+    run_rollups(fuentes=['usuarios'], now=now)
+    freeze_before('usuarios', horizonte)
+    return _archive(
+        'sesiones', vencidas, 'fecha_creacion', pausa,
+        al_borrar=lambda filas: sessions_changed(fila['usuario_id'] for fila in filas),
+    )
+
+
+def archive_attempts(now=None, pausa=0):
+    """Archiva los intentos de acceso anteriores al horizonte de retención"""
+    from .models import IntentoAcceso
+
+    now = now or timezone.now()
+    horizonte = retention_horizon(get_attempt_retention_days(), now)
+    run_rollups(fuentes=['seguridad'], now=now)
+    freeze_before('seguridad', horizonte)
+    return _archive('intentos', IntentoAcceso.objects.filter(fecha_intento__lt=horizonte), 'fecha_intento', pausa)
+
+
+def archive_security_rows(now=None, pausa=0):
+    """Aplica la retención a ambas tablas. Retorna {'sesiones': Resultado, 'intentos': Resultado}."""
+    resultado = {
+        'sesiones': archive_sessions(now, pausa),
+        'intentos': archive_attempts(now, pausa),
+    }
+    for tabla, datos in resultado.items():
+        logger.info(f'Retención de {tabla}: {datos.filas} filas archivadas en {datos.lotes} lotes ({datos.segundos:.2f} s)')
+    return resultado
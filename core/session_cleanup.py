@@ -1,8 +1,11 @@
 from django.utils import timezone
 from .models import SesionUsuario
+from .session_heartbeat import flush_heartbeats
 
 def cleanup_expired_sessions():
     """Elimina las sesiones expiradas"""
+    # Volcar la actividad pendiente antes de decidir qué sesiones expiraron
+    flush_heartbeats()
     expired_sessions = SesionUsuario.objects.filter(
         fecha_expiracion__lt=timezone.now()
     )
@@ -0,0 +1,141 @@
+"""
+Guardia de sesión unificada.
+
+Resuelve una sola vez por petición la sesión personalizada (SesionUsuario),
+el timeout configurado y el estado del usuario, y lo deja en
+``request.session_guard`` para que todas las verificaciones de sesión
+(timeout dinámico, sesiones cerradas por admin, dispositivo/IP y estado
+del usuario) compartan el mismo resultado en lugar de consultar la base
+de datos cada una por su cuenta.
+"""
+import logging
+
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+# Timeouts por defecto (minutos) si no hay configuración en base de datos
+DEFAULT_ADMIN_TIMEOUT = 10
+DEFAULT_USER_TIMEOUT = 15
+
+
+def path_is_exempt(path, exempt_urls):
+    """
+    Verifica si una ruta está exenta de validación.
+
+    La raíz '/' solo exime a la página de inicio; el resto de prefijos se
+    comparan con startswith. Antes '/' coincidía con todas las rutas y las
+    verificaciones de sesión cerrada, dispositivo/IP y estado nunca corrían.
+    """
+    for url in exempt_urls:
+        if url == '/':
+            if path == '/':
+                return True
+        elif path.startswith(url):
+            return True
+    return False
+
+
+class SessionGuardContext:
+    """Datos de sesión resueltos una sola vez para la petición actual"""
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+
+    @property
+    def token(self):
+        """Token de la sesión segura guardado en la sesión de Django"""
+        return self.request.session.get('secure_token')
+
+    @property
+    def is_suspended(self):
+        return bool(getattr(self.user, 'suspended', False))
+
+    @property
+    def is_active(self):
+        return bool(self.user.is_active)
+
+    @property
+    def is_admin(self):
+        return getattr(self.user, 'role', None) in ['superuser', 'admin']
+
+    @cached_property
+    def sesion(self):
+        """SesionUsuario activa asociada al token, o None si no existe"""
+        from .models import SesionUsuario
+        from .session_heartbeat import apply_buffered_activity
+
+        token = self.token
+        if not token or not self.user.is_authenticated:
+            return None
+        sesion = SesionUsuario.objects.filter(
+            token_sesion=token,
+            usuario_id=self.user.pk,
+            activa=True
+        ).first()
+        # La actividad reciente puede estar aún en el buffer de heartbeats
+        return apply_buffered_activity(sesion)
+
+    @cached_property
+    def timeout_minutes(self):
+        """Timeout de inactividad en minutos según el rol del usuario"""
+        return get_session_timeout(self.user)
+
+
+def get_session_timeout(user):
+    """
+    Obtiene el timeout de sesión (minutos) según el rol del usuario
+    """
+    from .config_registry import config_registry
+
+    is_admin = getattr(user, 'role', None) in ['superuser', 'admin']
+    nombre = 'admin_session_timeout' if is_admin else 'user_session_timeout'
+    default = DEFAULT_ADMIN_TIMEOUT if is_admin else DEFAULT_USER_TIMEOUT
+    return config_registry.get_int(nombre, default)
+
+
+def get_session_guard(request):
+    """Obtiene (o crea) el contexto de guardia compartido de la petición"""
+    guard = getattr(request, 'session_guard', None)
+    if guard is None:
+        guard = SessionGuardContext(request)
+        request.session_guard = guard
+    return guard
+
+
+class SessionGuardMiddleware:
+    """
+    Middleware único que ejecuta, en orden, las verificaciones de sesión:
+
+    1. Timeout dinámico según rol (DynamicSessionTimeoutMiddleware)
+    2. Sesiones cerradas por un administrador (SessionValidationMiddleware)
+    3. Validación de dispositivo/IP y renovación (SecurityMiddleware)
+    4. Usuarios suspendidos o desactivados (UserStatusMiddleware)
+
+    Todas comparten el mismo SessionGuardContext, por lo que la sesión y la
+    configuración se consultan como máximo una vez por petición.
+    """
+
+    def __init__(self, get_response):
+        from .dynamic_session_middleware import DynamicSessionTimeoutMiddleware
+        from .middleware import SecurityMiddleware, UserStatusMiddleware
+        from .session_validation_middleware import SessionValidationMiddleware
+
+        self.get_response = get_response
+        self.checks = [
+            DynamicSessionTimeoutMiddleware(get_response),
+            SessionValidationMiddleware(get_response),
+            SecurityMiddleware(get_response),
+            UserStatusMiddleware(get_response),
+        ]
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            guard = get_session_guard(request)
+            for check in self.checks:
+                response = check.check(request, guard)
+                if response is not None:
+                    return response
+
+        return self.get_response(request)
@@ -0,0 +1,185 @@
+"""
+Buffer de actividad ("heartbeat") para las sesiones seguras.
+
+En lugar de escribir la fila de SesionUsuario en cada petición, la última
+actividad y la nueva fecha de expiración se guardan en la caché y se
+vuelcan a la base de datos en lotes con bulk_update, como máximo una vez
+por intervalo (SESSION_HEARTBEAT_INTERVAL). Las lecturas que dependen de
+la actividad (validación, limpieza y monitoreo) leen a través del buffer.
+
+El volcado solo recorre las sesiones con actividad pendiente: la primera
+actividad de una sesión desde el último volcado deja su id en una lista de
+pendientes en la caché (ranuras numeradas con cache.incr, sin
+leer-modificar-escribir compartido), y flush_heartbeats() lee las ranuras
+nuevas en lugar de todas las sesiones activas. Una ranura se da por leída
+solo cuando ya tiene su id: el volcado se detiene en la primera reservada
+que todavía está vacía y la vuelve a leer en el siguiente.
+"""
+from datetime import datetime, timezone as dt_timezone
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .session_monitor import sessions_changed
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'session_heartbeat'
+FLUSH_LOCK_KEY = f'{KEY_PREFIX}:flush_lock'
+# Lista de pendientes: último número de ranura asignado y último ya volcado
+PENDING_SEQ_KEY = f'{KEY_PREFIX}:pendientes'
+PENDING_DONE_KEY = f'{KEY_PREFIX}:pendientes_volcados'
+# Primera ranura que el volcado anterior encontró reservada pero vacía
+PENDING_GAP_KEY = f'{KEY_PREFIX}:pendientes_hueco'
+
+# Las entradas del buffer sobreviven de sobra a cualquier sesión (20 min)
+BUFFER_TIMEOUT = 60 * 60 * 24
+
+FLUSH_BATCH_SIZE = 500
+
+
+def get_heartbeat_interval():
+    """Segundos mínimos entre escrituras de actividad a la base de datos"""
+    return getattr(settings, 'SESSION_HEARTBEAT_INTERVAL', 60)
+
+
+def _key(sesion_id):
+    return f'{KEY_PREFIX}:{sesion_id}'
+
+
+def _pending_key(sesion_id):
+    return f'{KEY_PREFIX}:pendiente:{sesion_id}'
+
+
+def _slot_key(numero):
+    return f'{KEY_PREFIX}:ranura:{numero}'
+
+
+def _mark_pending(sesion_id):
+    """Agrega la sesión a la lista de pendientes si no está ya desde el último volcado"""
+    # La marca vence con el intervalo: si su ranura se perdió, la sesión vuelve a entrar
+    if not cache.add(_pending_key(sesion_id), 1, get_heartbeat_interval()):
+        return
+    cache.add(PENDING_SEQ_KEY, 0, None)
+    cache.set(_slot_key(cache.incr(PENDING_SEQ_KEY)), sesion_id, BUFFER_TIMEOUT)
+
+
+def _take_pending():
+    """Ids de las sesiones agregadas a la lista de pendientes desde el último volcado"""
+    hasta = cache.get(PENDING_SEQ_KEY) or 0
+    desde = cache.get(PENDING_DONE_KEY) or 0
+    if desde > hasta:
+        # La caché perdió el contador y la numeración volvió a empezar
+        desde = 0
+    hueco_anterior = cache.get(PENDING_GAP_KEY)
+    hueco = None
+    ids = set()
+    consumidas = desde
+    for inicio in range(desde + 1, hasta + 1, FLUSH_BATCH_SIZE):
+        numeros = range(inicio, min(inicio + FLUSH_BATCH_SIZE, hasta + 1))
+        valores = cache.get_many([_slot_key(numero) for numero in numeros])
+        for numero in numeros:
+            valor = valores.get(_slot_key(numero))
+            if valor is None and numero != hueco_anterior:
+                # Ranura reservada con incr pero todavía sin escribir: se vuelve a leer desde
+                # aquí en el próximo volcado. Si sigue vacía entonces, su worker no la escribió
+                # (se cayó) y se salta; la marca de la sesión vence y vuelve a entrar.
+                hueco = numero
+                break
+            if valor is not None:
+                ids.add(valor)
+            consumidas = numero
+        if hueco is not None:
+            break
+    cache.delete_many([_slot_key(numero) for numero in range(desde + 1, consumidas + 1)])
+    cache.set(PENDING_DONE_KEY, consumidas, None)
+    cache.set(PENDING_GAP_KEY, hueco, None)
+    # Sin marca, la próxima actividad de estas sesiones las vuelve a agregar
+    cache.delete_many([_pending_key(sesion_id) for sesion_id in ids])
+    return sorted(ids)
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def record_activity(sesion, fecha_expiracion, now=None):
+    """
+    Registra actividad de una sesión en el buffer y actualiza el objeto en
+    memoria. Dispara un volcado en lote si ya pasó el intervalo desde el
+    último volcado de cualquier worker.
+    """
+    now = now or timezone.now()
+    sesion.ultima_actividad = now
+    sesion.fecha_expiracion = fecha_expiracion
+    cache.set(
+        _key(sesion.pk),
+        (now.timestamp(), fecha_expiracion.timestamp()),
+        BUFFER_TIMEOUT
+    )
+    _mark_pending(sesion.pk)
+
+    # cache.add es atómico: solo un worker por intervalo hace el volcado
+    if cache.add(FLUSH_LOCK_KEY, now.timestamp(), get_heartbeat_interval()):
+        try:
+            flush_heartbeats()
+        except Exception as e:
+            logger.error(f'Error volcando heartbeats de sesión: {e}')
+
+
+def apply_buffered_activity(sesion):
+    """Superpone sobre la sesión la actividad pendiente del buffer, si es más reciente"""
+    if sesion is None:
+        return sesion
+    buffered = cache.get(_key(sesion.pk))
+    if buffered:
+        ultima_actividad = _to_datetime(buffered[0])
+        if ultima_actividad > sesion.ultima_actividad:
+            sesion.ultima_actividad = ultima_actividad
+            sesion.fecha_expiracion = _to_datetime(buffered[1])
+    return sesion
+
+
+def flush_heartbeats():
+    """
+    Vuelca a la base de datos con bulk_update la actividad de las sesiones
+    pendientes. Retorna el número de sesiones actualizadas.
+    """
+    from .models import SesionUsuario
+
+    ids = _take_pending()
+    updated = 0
+    for inicio in range(0, len(ids), FLUSH_BATCH_SIZE):
+        sesiones = SesionUsuario.objects.filter(
+            pk__in=ids[inicio:inicio + FLUSH_BATCH_SIZE], activa=True
+        ).only('id', 'ultima_actividad', 'fecha_expiracion')
+        updated += _flush_batch(list(sesiones))
+
+    if updated:
+        logger.info(f'Heartbeats de sesión volcados: {updated}')
+    return updated
+
+
+def _flush_batch(sesiones):
+    from .models import SesionUsuario
+
+    by_key = {_key(sesion.pk): sesion for sesion in sesiones}
+    buffered = cache.get_many(list(by_key))
+
+    changed = []
+    ahora = timezone.now()
+    for key, (ultima_ts, expiracion_ts) in buffered.items():
+        sesion = by_key[key]
+        ultima_actividad = _to_datetime(ultima_ts)
+        if ultima_actividad > sesion.ultima_actividad:
+            sesion.ultima_actividad = ultima_actividad
+            sesion.fecha_expiracion = _to_datetime(expiracion_ts)
+            sesion.fecha_actualizacion = ahora
+            changed.append(sesion)
+
+    if changed:
+        SesionUsuario.objects.bulk_update(changed, ['ultima_actividad', 'fecha_expiracion', 'fecha_actualizacion'])
+        sessions_changed()
+    return len(changed)
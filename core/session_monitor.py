@@ -0,0 +1,165 @@
+"""
+Monitor de sesiones para administradores basado en cambios.
+
+La página monitor_sesiones muestra las sesiones paginadas en el servidor
+(por defecto solo las activas, sobre el índice parcial de ultima_actividad)
+y luego solo pide lo que cambió: monitor_sesiones_refresh?desde=<cursor>
+retorna las sesiones abiertas, cerradas o actualizadas después del cursor,
+ordenadas por (fecha_actualizacion, id), y el cursor siguiente. El tamaño de
+la respuesta y el costo de la consulta dependen de cuántas sesiones
+cambiaron, no del tamaño de la tabla.
+
+Un cambio confirmado con una fecha_actualizacion anterior a la última leída
+(una transacción lenta) se perdería con un cursor exacto, así que el cursor
+nunca avanza más allá de ahora - SESSION_MONITOR_OVERLAP_SECONDS: los cambios
+de esos últimos segundos se reenvían en la consulta siguiente y el cliente
+los aplica otra vez sobre la misma fila. Si no hubo cambios se devuelve el
+mismo cursor: la URL del refresco no cambia y su ETag puede responder 304.
+
+sessions_changed() se llama en cada escritura de SesionUsuario (señales,
+actualizaciones masivas de SecurityManager y volcado de heartbeats): cambia
+la versión del recurso 'sesiones' (ETag de monitor_sesiones_refresh y
+caché de las estadísticas) y avisa al grupo WebSocket de administradores,
+que en lugar de esperar al siguiente intervalo pide los cambios al momento.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .resource_versions import bump, user_resources, versions
+
+logger = logging.getLogger(__name__)
+
+MONITOR_GROUP = 'monitor_sesiones'
+STATS_TIMEOUT = 300
+
+
+def get_page_size():
+    return getattr(settings, 'SESSION_MONITOR_PAGE_SIZE', 50)
+
+
+def get_changes_limit():
+    return getattr(settings, 'SESSION_MONITOR_CHANGES_LIMIT', 500)
+
+
+def get_overlap_seconds():
+    return getattr(settings, 'SESSION_MONITOR_OVERLAP_SECONDS', 5)
+
+
+def session_payload(sesion):
+    """Fila del monitor para el cliente"""
+    return {
+        'id': sesion.id,
+        'usuario': sesion.usuario.username,
+        'ip': sesion.ip_address,
+        'dispositivo': sesion.dispositivo_id[:8],
+        'fecha_creacion': timezone.localtime(sesion.fecha_creacion).strftime('%d/%m/%Y %H:%M'),
+        'ultima_actividad': timezone.localtime(sesion.ultima_actividad).strftime('%d/%m/%Y %H:%M'),
+        'activa': sesion.activa,
+    }
+
+
+def encode_cursor(fecha, sesion_id):
+    return f'{int(fecha.timestamp() * 1_000_000)}-{sesion_id}'
+
+
+def decode_cursor(cursor):
+    """(fecha, id) del cursor, o None si no es válido"""
+    try:
+        micros, sesion_id = cursor.split('-')
+        fecha = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+        return fecha, int(sesion_id)
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def current_cursor(now=None):
+    """Cursor desde el que una página recién cargada debe pedir cambios"""
+    return encode_cursor((now or timezone.now()) - timedelta(seconds=get_overlap_seconds()), 0)
+
+
+def sessions_page(numero=1, solo_activas=True):
+    """Página de sesiones del monitor (activas por última actividad, o todas por fecha de creación)"""
+    from .models import SesionUsuario
+
+    sesiones = SesionUsuario.objects.select_related('usuario')
+    if solo_activas:
+        sesiones = sesiones.filter(activa=True).order_by('-ultima_actividad')
+    else:
+        sesiones = sesiones.order_by('-id')
+    return Paginator(sesiones, get_page_size()).get_page(numero)
+
+
+def monitor_stats():
+    """Totales del monitor; se recalculan solo cuando cambia alguna sesión"""
+    from .models import SesionUsuario
+
+    def calcular():
+        activas = SesionUsuario.objects.filter(activa=True)
+        total = SesionUsuario.objects.count()
+        sesiones_activas = activas.count()
+        return {
+            'total_sesiones': total,
+            'sesiones_activas': sesiones_activas,
+            'usuarios_conectados': activas.values('usuario').distinct().count(),
+            'sesiones_expiradas': total - sesiones_activas,
+        }
+
+    version, = versions(['sesiones'])
+    return cache.get_or_set(f'{MONITOR_GROUP}:stats:{version}', calcular, STATS_TIMEOUT)
+
+
+def changes_since(cursor, now=None):
+    """
+    Sesiones cambiadas después de `cursor`. Retorna (filas, cursor siguiente,
+    completo); completo es False si hubo más cambios que
+    SESSION_MONITOR_CHANGES_LIMIT y hay que volver a pedir con el cursor nuevo.
+    """
+    from .models import SesionUsuario
+
+    posicion = decode_cursor(cursor)
+    if posicion is None:
+        return [], current_cursor(now), True
+    fecha, sesion_id = posicion
+    limite = get_changes_limit()
+    sesiones = list(
+        SesionUsuario.objects.filter(
+            Q(fecha_actualizacion__gt=fecha) | Q(fecha_actualizacion=fecha, id__gt=sesion_id)
+        ).select_related('usuario').order_by('fecha_actualizacion', 'id')[:limite + 1]
+    )
+    if not sesiones:
+        # Sin cambios el cursor no se mueve: la URL siguiente es la misma y el ETag puede responder 304
+        return [], cursor, True
+    completo = len(sesiones) <= limite
+    sesiones = sesiones[:limite]
+
+    tope = (now or timezone.now()) - timedelta(seconds=get_overlap_seconds())
+    if sesiones and sesiones[-1].fecha_actualizacion <= tope:
+        siguiente = encode_cursor(sesiones[-1].fecha_actualizacion, sesiones[-1].id)
+    else:
+        siguiente = encode_cursor(max(tope, fecha), 0 if tope > fecha else sesion_id)
+    return [session_payload(sesion) for sesion in sesiones], siguiente, completo
+
+
+def _notify_monitor():
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(MONITOR_GROUP, {'type': 'sessions_changed'})
+    except Exception as e:
+        logger.error(f'Error avisando al monitor de sesiones: {e}')
+
+
+def sessions_changed(usuario_ids=()):
+    """Registra que cambiaron sesiones (de `usuario_ids`, si se conocen) y avisa al monitor tras el commit"""
+    bump('sesiones', *user_resources('sesiones', usuario_ids))
+    transaction.on_commit(_notify_monitor)
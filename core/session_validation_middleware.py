@@ -5,7 +5,7 @@ from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.contrib.auth import logout
 from django.contrib import messages
-from .models import SesionUsuario
+from .session_guard import get_session_guard, path_is_exempt
 from django.utils import timezone
 import logging
 
@@ -18,77 +18,74 @@ class SessionValidationMiddleware:
     antes de permitir cualquier petición
     """
     
+    # URLs que no requieren validación de sesión
+    exempt_urls = [
+        '/',
+        '/iniciosesion/',
+        '/inicioadmin/',
+        '/registrate/',
+        '/recuperar-password/',
+        '/reset-password/',
+        '/static/',
+        '/media/',
+        '/admin/',
+        '/usuario-desactivado/',
+        '/usuario-suspendido/',
+        '/cerrar-sesion/',
+        '/logout/',
+        '/verificar-sesion/',  # Permitir el endpoint de verificación
+    ]
+    
     def __init__(self, get_response):
         self.get_response = get_response
     
     def __call__(self, request):
-        # URLs que no requieren validación de sesión
-        exempt_urls = [
-            '/',
-            '/iniciosesion/',
-            '/inicioadmin/',
-            '/registrate/',
-            '/recuperar-password/',
-            '/reset-password/',
-            '/static/',
-            '/media/',
-            '/admin/',
-            '/usuario-desactivado/',
-            '/usuario-suspendido/',
-            '/cerrar-sesion/',
-            '/logout/',
-            '/verificar-sesion/',  # Permitir el endpoint de verificación
-        ]
+        if request.user.is_authenticated:
+            response = self.check(request, get_session_guard(request))
+            if response is not None:
+                return response
         
+        response = self.get_response(request)
+        return response
+    
+    def check(self, request, guard):
+        """Valida la sesión personalizada; retorna una respuesta si fue cerrada o expiró"""
         # Verificar si la URL actual está exenta
-        is_exempt = any(request.path.startswith(url) for url in exempt_urls)
+        if path_is_exempt(request.path, self.exempt_urls):
+            return None
         
-        # Solo verificar si el usuario está autenticado y la URL no está exenta
-        if request.user.is_authenticated and not is_exempt:
-            # Verificar si es una petición AJAX para verificar sesión
-            if request.path == '/verificar-sesion/':
-                # Permitir que pase para que pueda verificar
-                pass
-            else:
-                # Verificar si la sesión personalizada está activa
-                session_token = request.session.get('session_token')
-                
-                if session_token:
-                    try:
-                        sesion = SesionUsuario.objects.get(
-                            token_sesion=session_token,
-                            usuario=request.user,
-                            activa=True
-                        )
-                        
-                        # Verificar si no ha expirado
-                        if sesion.fecha_expiracion < timezone.now():
-                            # Sesión expirada
-                            logout(request)
-                            messages.warning(request, 'Tu sesión ha expirado.')
-                            return self._redirect_to_login(request)
-                            
-                    except SesionUsuario.DoesNotExist:
-                        # La sesión fue cerrada por un administrador
-                        logger.warning(f"🔒 Sesión cerrada detectada para usuario {request.user.username} en {request.path}")
-                        logout(request)
-                        
-                        # Si es una petición AJAX, devolver JSON
-                        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                            logger.info(f"📡 Respondiendo con JSON para petición AJAX de {request.user.username}")
-                            return JsonResponse({
-                                'success': False,
-                                'session_closed': True,
-                                'message': 'Tu sesión ha sido cerrada por un administrador.',
-                                'redirect_url': self._get_login_url(request)
-                            })
-                        
-                        logger.info(f"🔄 Redirigiendo usuario {request.user.username} al login")
-                        messages.warning(request, 'Tu sesión ha sido cerrada por un administrador.')
-                        return self._redirect_to_login(request)
+        # Sin token no hay sesión personalizada que validar
+        if not guard.token:
+            return None
         
-        response = self.get_response(request)
-        return response
+        sesion = guard.sesion
+        if sesion is None:
+            # La sesión fue cerrada por un administrador
+            logger.warning(f"🔒 Sesión cerrada detectada para usuario {request.user.username} en {request.path}")
+            logout(request)
+            
+            # Si es una petición AJAX, devolver JSON
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                logger.info(f"📡 Respondiendo con JSON para petición AJAX de {request.user.username}")
+                return JsonResponse({
+                    'success': False,
+                    'session_closed': True,
+                    'message': 'Tu sesión ha sido cerrada por un administrador.',
+                    'redirect_url': self._get_login_url(request)
+                })
+            
+            logger.info(f"🔄 Redirigiendo usuario {request.user.username} al login")
+            messages.warning(request, 'Tu sesión ha sido cerrada por un administrador.')
+            return self._redirect_to_login(request)
+        
+        # Verificar si no ha expirado
+        if sesion.fecha_expiracion < timezone.now():
+            # Sesión expirada
+            logout(request)
+            messages.warning(request, 'Tu sesión ha expirado.')
+            return self._redirect_to_login(request)
+        
+        return None
     
     def _redirect_to_login(self, request):
         """Redirige al login apropiado según el tipo de usuario"""
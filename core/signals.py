@@ -0,0 +1,208 @@
+"""
+Receptores de señales de la aplicación core
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import activity_summary
+from .config_registry import invalidate_config_registry
+from .fragment_cache import bump_global_version, bump_user_version
+from .leaderboard import get_leaderboard, ranking_fields, sync_resumen, sync_usuario
+from .notification_counter import adjust_unread
+from .notification_push import publish_created, publish_read
+from .resource_versions import bump
+from .rollups import mark_day_dirty
+from .session_monitor import sessions_changed
+from .models import (
+    Canje, Configuracion, ConversacionDirecta, FavoritoRecompensa, Logro, MensajeDirecto, Notificacion,
+    RedencionPuntos, Recompensa, ResumenActividad, SesionUsuario, SolicitudSoporte, Usuario,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Configuracion)
+@receiver(post_delete, sender=Configuracion)
+def configuracion_cambiada(sender, instance, **kwargs):
+    """Invalida el registro de configuración en todos los workers"""
+    # Después del commit: si no, otro worker podría recargar los valores anteriores con la versión nueva y quedarse con ellos
+    transaction.on_commit(lambda: invalidate_config_registry(sender, instance=instance))
+
+
+@receiver(post_init, sender=Canje)
+@receiver(post_init, sender=RedencionPuntos)
+def recordar_estado_original(sender, instance, **kwargs):
+    """Guarda el estado cargado para detectar transiciones al guardar"""
+    # Se lee de __dict__ para no disparar consultas si el campo está diferido
+    instance._estado_original = instance.__dict__.get('estado')
+
+
+@receiver(post_save, sender=Canje)
+def canje_guardado(sender, instance, created, **kwargs):
+    """Actualiza el resumen de actividad del usuario"""
+    try:
+        if created:
+            activity_summary.record_canje_created(instance)
+        else:
+            activity_summary.record_canje_estado(instance, instance._estado_original)
+    except Exception as e:
+        logger.error(f'Error actualizando resumen de actividad del canje {instance.pk}: {e}')
+    instance._estado_original = instance.estado
+
+
+@receiver(post_save, sender=RedencionPuntos)
+def redencion_guardada(sender, instance, created, **kwargs):
+    """Actualiza los puntos redimidos del resumen de actividad"""
+    try:
+        activity_summary.record_redencion(instance, instance._estado_original, created)
+    except Exception as e:
+        logger.error(f'Error actualizando resumen de actividad de la redención {instance.pk}: {e}')
+    instance._estado_original = instance.estado
+
+
+@receiver(post_save, sender=Canje)
+@receiver(post_delete, sender=Canje)
+@receiver(post_save, sender=RedencionPuntos)
+@receiver(post_save, sender=ResumenActividad)
+@receiver(post_save, sender=Logro)
+@receiver(post_delete, sender=Logro)
+@receiver(post_save, sender=FavoritoRecompensa)
+@receiver(post_delete, sender=FavoritoRecompensa)
+def datos_usuario_cambiados(sender, instance, **kwargs):
+    """Invalida los fragmentos cacheados del usuario dueño del objeto"""
+    bump_user_version(instance.usuario_id)
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_guardado(sender, instance, **kwargs):
+    """Los puntos y el perfil del usuario aparecen en sus fragmentos"""
+    bump_user_version(instance.pk)
+
+
+@receiver(post_init, sender=Usuario)
+def recordar_puntajes_originales(sender, instance, **kwargs):
+    """Guarda los puntajes cargados para actualizar los rankings solo si cambian"""
+    instance._ranking_original = ranking_fields(instance)
+
+
+@receiver(post_save, sender=Usuario)
+def puntajes_usuario_guardados(sender, instance, created, **kwargs):
+    """Actualiza los tableros de puntos y de juegos"""
+    actuales = ranking_fields(instance)
+    if created or actuales != instance._ranking_original:
+        try:
+            sync_usuario(instance)
+        except Exception as e:
+            logger.error(f'Error actualizando rankings del usuario {instance.pk}: {e}')
+    instance._ranking_original = actuales
+
+
+@receiver(post_save, sender=ResumenActividad)
+def resumen_actividad_guardado(sender, instance, **kwargs):
+    """Actualiza los tableros de kg y de puntos de la semana y el mes"""
+    try:
+        sync_resumen(instance)
+    except Exception as e:
+        logger.error(f'Error actualizando rankings del usuario {instance.usuario_id}: {e}')
+
+
+@receiver(post_delete, sender=Usuario)
+def usuario_borrado(sender, instance, **kwargs):
+    """Quita al usuario de los rankings (en Redis no hay borrado en cascada)"""
+    try:
+        get_leaderboard().remove(instance.pk)
+    except Exception as e:
+        logger.error(f'Error quitando al usuario {instance.pk} de los rankings: {e}')
+
+
+@receiver(post_save, sender=Recompensa)
+@receiver(post_delete, sender=Recompensa)
+def catalogo_cambiado(sender, instance, **kwargs):
+    """Las recompensas recomendadas dependen del catálogo compartido"""
+    bump_global_version()
+
+
+@receiver(post_delete, sender=Canje)
+@receiver(post_delete, sender=RedencionPuntos)
+@receiver(post_delete, sender=Usuario)
+def fila_de_reporte_borrada(sender, instance, **kwargs):
+    """Un borrado no deja rastro en el watermark: se marca el día para recalcular su rollup"""
+    if sender is Usuario:
+        fuente, fecha = 'usuarios', instance.fecha_registro
+    else:
+        fuente = 'canjes' if sender is Canje else 'redenciones'
+        fecha = instance.fecha_solicitud
+    if fecha:
+        try:
+            mark_day_dirty(fuente, fecha)
+        except Exception as e:
+            logger.error(f'Error marcando día pendiente de rollup {fuente}: {e}')
+
+
+@receiver(post_init, sender=Notificacion)
+def recordar_lectura_original(sender, instance, **kwargs):
+    """Guarda el estado de lectura cargado para publicar solo los cambios"""
+    instance._leida_original = instance.__dict__.get('leida')
+
+
+@receiver(post_save, sender=Notificacion)
+def notificacion_guardada(sender, instance, created, **kwargs):
+    """Actualiza el contador de no leídas y avisa a las pestañas abiertas del usuario"""
+    if created:
+        if not instance.leida:
+            adjust_unread(instance.usuario_id, 1)
+        publish_created(instance)
+    elif instance._leida_original is not None and instance.leida != instance._leida_original:
+        adjust_unread(instance.usuario_id, -1 if instance.leida else 1)
+        if instance.leida:
+            publish_read(instance.usuario_id, [instance.pk])
+    instance._leida_original = instance.leida
+
+
+@receiver(post_delete, sender=Notificacion)
+def notificacion_borrada(sender, instance, **kwargs):
+    """Una notificación no leída que se borra deja de contar en el badge"""
+    if not instance.leida:
+        adjust_unread(instance.usuario_id, -1)
+
+
+@receiver(post_delete, sender=Notificacion)
+def recurso_notificaciones_cambiado(sender, instance, **kwargs):
+    """Invalida el ETag de get_notifications del usuario (crear y leer ya lo hacen al publicarse)"""
+    bump(f'notificaciones:{instance.usuario_id}')
+
+
+@receiver(post_save, sender=Canje)
+@receiver(post_delete, sender=Canje)
+def recurso_canjes_cambiado(sender, instance, **kwargs):
+    """Invalida el ETag de la lista de canjes pendientes del administrador"""
+    bump('canjes')
+
+
+@receiver(post_save, sender=SesionUsuario)
+@receiver(post_delete, sender=SesionUsuario)
+def recurso_sesiones_cambiado(sender, instance, **kwargs):
+    """Invalida el ETag de la verificación de sesión del usuario y avisa al monitor de sesiones"""
+    sessions_changed([instance.usuario_id])
+
+
+@receiver(post_save, sender=SolicitudSoporte)
+@receiver(post_delete, sender=SolicitudSoporte)
+@receiver(post_save, sender=ConversacionDirecta)
+@receiver(post_delete, sender=ConversacionDirecta)
+def recurso_chat_directo_cambiado(sender, instance, **kwargs):
+    """Invalida el ETag de los mensajes del chat directo del usuario"""
+    bump(f'chat_directo:{instance.usuario_id}')
+
+
+@receiver(post_save, sender=MensajeDirecto)
+@receiver(post_delete, sender=MensajeDirecto)
+def mensaje_directo_cambiado(sender, instance, **kwargs):
+    """Un mensaje nuevo o borrado cambia la conversación del usuario"""
+    usuario_id = ConversacionDirecta.objects.filter(pk=instance.conversacion_id).values_list('usuario_id', flat=True).first()
+    if usuario_id:
+        bump(f'chat_directo:{usuario_id}')
+
@@ -1,87 +1,64 @@
 """
 Sistema de throttling personalizado para EcoPuntos
-Funciona sin Redis y es compatible con el desarrollo local
+Los contadores viven en la caché compartida (ver core/throttle_engine.py),
+por lo que el límite es el mismo para todos los workers
 """
-import time
-from collections import defaultdict
-from django.http import HttpResponse
+import logging
+from django.http import JsonResponse
 from django.shortcuts import render
 from functools import wraps
-from django.conf import settings
+from .throttle_engine import get_throttle_engine, parse_rate
 
-# Cache en memoria para desarrollo
-_throttle_cache = defaultdict(list)
-
-def clean_old_entries(key, window_seconds):
-    """Limpia entradas antiguas del cache"""
-    current_time = time.time()
-    _throttle_cache[key] = [
-        timestamp for timestamp in _throttle_cache[key]
-        if current_time - timestamp < window_seconds
-    ]
+logger = logging.getLogger(__name__)
 
 def simple_throttle(rate='5/m', key_func=None):
     """
     Decorador de throttling simple
     rate: '5/m' = 5 por minuto, '10/h' = 10 por hora
     """
+    try:
+        limit, window_seconds = parse_rate(rate)
+    except ValueError:
+        logger.error(f"Tasa de throttling inválida: {rate}")
+        limit = window_seconds = None
+    period = rate.split('/')[-1] if rate else ''
+
     def decorator(view_func):
+        if limit is None:
+            return view_func
+
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            # Parsear rate
-            try:
-                limit, period = rate.split('/')
-                limit = int(limit)
-                
-                if period == 'm':
-                    window_seconds = 60
-                elif period == 'h':
-                    window_seconds = 3600
-                elif period == 'd':
-                    window_seconds = 86400
-                else:
-                    window_seconds = 60
-                    
-            except ValueError:
-                return view_func(request, *args, **kwargs)
-            
             # Determinar key para throttling
             if key_func:
-                cache_key = key_func(request)
+                cache_key = f"{view_func.__name__}:{key_func(request)}"
             else:
                 # Usar IP por defecto
-                ip = get_client_ip(request)
-                cache_key = f"{view_func.__name__}:{ip}"
-            
-            current_time = time.time()
-            
-            # Limpiar entradas antiguas
-            clean_old_entries(cache_key, window_seconds)
-            
-            # Verificar límite
-            if len(_throttle_cache[cache_key]) >= limit:
+                cache_key = f"{view_func.__name__}:ip:{get_client_ip(request)}"
+
+            result = get_throttle_engine().check(cache_key, limit, window_seconds)
+
+            if not result.allowed:
                 # Rate limit exceeded
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     # AJAX request
-                    return HttpResponse(
-                        '{"error": "Rate limit exceeded", "retry_after": 60}',
-                        status=429,
-                        content_type='application/json'
+                    response = JsonResponse(
+                        {'error': 'Rate limit exceeded', 'retry_after': result.retry_after},
+                        status=429
                     )
                 else:
                     # Página normal
-                    return render(request, 'core/ratelimit_error.html', {
-                        'retry_after': 60,
+                    response = render(request, 'core/ratelimit_error.html', {
+                        'retry_after': result.retry_after,
                         'limit': limit,
                         'period': period
                     }, status=429)
-            
-            # Agregar timestamp actual
-            _throttle_cache[cache_key].append(current_time)
-            
+                response['Retry-After'] = str(result.retry_after)
+                return response
+
             # Ejecutar vista normal
             return view_func(request, *args, **kwargs)
-        
+
         return wrapper
     return decorator
 
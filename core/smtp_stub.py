@@ -0,0 +1,96 @@
+"""
+Servidor SMTP mínimo en memoria para pruebas y benchmarks del backend de
+correo. Acepta cualquier remitente y destinatario, no soporta TLS ni AUTH y
+guarda los mensajes recibidos en `mensajes`. `latencia` retrasa el saludo
+inicial para simular el costo de un handshake TLS.
+"""
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.conexiones += 1
+            server.activas.add(self.connection)
+        try:
+            time.sleep(server.latencia)
+            self._reply('220 localhost ESMTP stub')
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                comando = line.decode('utf-8', 'replace').strip().upper()
+                if comando.startswith('EHLO'):
+                    self._reply('250-localhost')
+                    self._reply('250 8BITMIME')
+                elif comando.startswith('HELO'):
+                    self._reply('250 localhost')
+                elif comando.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                    self._reply('250 OK')
+                elif comando == 'DATA':
+                    self._reply('354 Fin con <CRLF>.<CRLF>')
+                    datos = []
+                    for linea in iter(self.rfile.readline, b''):
+                        if linea in (b'.\r\n', b'.\n'):
+                            break
+                        datos.append(linea)
+                    with server.lock:
+                        server.mensajes.append(b''.join(datos))
+                    self._reply('250 OK')
+                elif comando == 'QUIT':
+                    self._reply('221 Adios')
+                    return
+                else:
+                    self._reply('502 Comando no implementado')
+        except OSError:
+            return
+        finally:
+            with server.lock:
+                server.activas.discard(self.connection)
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """Servidor SMTP de prueba en 127.0.0.1 y un puerto libre"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latencia=0):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.latencia = latencia
+        self.lock = threading.Lock()
+        self.conexiones = 0
+        self.activas = set()
+        self.mensajes = []
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.drop_connections()
+        self.shutdown()
+        self.server_close()
+
+    def drop_connections(self):
+        """Cierra del lado del servidor las conexiones abiertas (como un timeout)"""
+        with self.lock:
+            activas = list(self.activas)
+        for sock in activas:
+            try:
+                sock.shutdown(2)
+            except OSError:
+                pass
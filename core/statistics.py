@@ -3,10 +3,17 @@ from django.db.models import Sum, Count, Avg, Q, F
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .models import Usuario, Canje, MaterialTasa, RedencionPuntos, Ruta, SesionUsuario, IntentoAcceso
+from .models import RollupCanjeDiario, RollupRedencionDiaria, RollupSeguridadDiaria, RollupUsuarioDiario
+from .timeseries import bucketed_series, days_window
 import json
 
 class StatisticsManager:
-    """Clase para manejar estadísticas avanzadas conectadas con la base de datos"""
+    """
+    Clase para manejar estadísticas avanzadas conectadas con la base de datos.
+    Los totales históricos se leen de los rollups diarios (core/rollups.py);
+    las cifras del día y las que dependen de estados vivos (sesiones
+    activas, IPs) se consultan sobre las tablas originales.
+    """
     
     @staticmethod
     def get_user_activity_stats(days=30):
@@ -14,38 +21,36 @@ class StatisticsManager:
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
+        first_day, last_day = days_window(days, end_date)
+        
         # Usuarios activos por día
-        daily_active_users = []
-        for i in range(days):
-            date = start_date + timedelta(days=i)
-            active_users = SesionUsuario.objects.filter(
-                fecha_creacion__date=date.date(),
-                activa=True
-            ).values('usuario').distinct().count()
-            
-            daily_active_users.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'active_users': active_users
-            })
+        daily_active_users = [
+            {'date': point['bucket'].strftime('%Y-%m-%d'), 'active_users': point['active_users']}
+            for point in bucketed_series(
+                SesionUsuario.objects.filter(activa=True), 'fecha_creacion', first_day, last_day, 'day',
+                active_users=Count('usuario', distinct=True)
+            )
+        ]
         
         # Usuarios nuevos por día
-        new_users_daily = []
-        for i in range(days):
-            date = start_date + timedelta(days=i)
-            new_users = Usuario.objects.filter(
-                fecha_registro__date=date.date()
-            ).count()
-            
-            new_users_daily.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'new_users': new_users
-            })
+        new_users_daily = [
+            {'date': point['bucket'].strftime('%Y-%m-%d'), 'new_users': point['new_users']}
+            for point in bucketed_series(
+                RollupUsuarioDiario.objects.all(), 'fecha', first_day, last_day, 'day',
+                new_users=Sum('nuevos_usuarios')
+            )
+        ]
+        
+        totals = Usuario.objects.aggregate(
+            total_active_users=Count('id', filter=Q(is_active=True)),
+            total_users=Count('id')
+        )
         
         return {
             'daily_active_users': daily_active_users,
             'new_users_daily': new_users_daily,
-            'total_active_users': Usuario.objects.filter(is_active=True).count(),
-            'total_users': Usuario.objects.count()
+            'total_active_users': totals['total_active_users'],
+            'total_users': totals['total_users']
         }
     
     @staticmethod
@@ -54,35 +59,30 @@ class StatisticsManager:
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
+        canjes_aprobados = RollupCanjeDiario.objects.filter(estado='aprobado')
+        
         # Canjes por material
-        material_stats = Canje.objects.filter(
-            fecha_solicitud__gte=start_date,
-            estado='aprobado'
+        material_stats = canjes_aprobados.filter(
+            fecha__gte=timezone.localdate(start_date)
         ).values('material__nombre').annotate(
-            total_peso=Sum('peso'),
-            total_puntos=Sum('puntos'),
-            total_canjes=Count('id')
+            total_peso=Sum('peso_total'),
+            total_puntos=Sum('puntos_total'),
+            total_canjes=Sum('cantidad')
         ).order_by('-total_peso')
         
         # Canjes por día
-        daily_canjes = []
-        for i in range(days):
-            date = start_date + timedelta(days=i)
-            canjes_count = Canje.objects.filter(
-                fecha_solicitud__date=date.date(),
-                estado='aprobado'
-            ).count()
-            
-            total_peso = Canje.objects.filter(
-                fecha_solicitud__date=date.date(),
-                estado='aprobado'
-            ).aggregate(total=Sum('peso'))['total'] or 0
-            
-            daily_canjes.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'canjes_count': canjes_count,
-                'total_peso': float(total_peso)
-            })
+        first_day, last_day = days_window(days, end_date)
+        daily_canjes = [
+            {
+                'date': point['bucket'].strftime('%Y-%m-%d'),
+                'canjes_count': point['canjes_count'],
+                'total_peso': float(point['total_peso'])
+            }
+            for point in bucketed_series(
+                canjes_aprobados, 'fecha', first_day, last_day, 'day',
+                canjes_count=Sum('cantidad'), total_peso=Sum('peso_total')
+            )
+        ]
         
         # Top usuarios recicladores
         top_recyclers = Usuario.objects.annotate(
@@ -101,9 +101,7 @@ class StatisticsManager:
                 }
                 for user in top_recyclers
             ],
-            'total_recycled_weight': Canje.objects.filter(
-                estado='aprobado'
-            ).aggregate(total=Sum('peso'))['total'] or 0
+            'total_recycled_weight': canjes_aprobados.aggregate(total=Sum('peso_total'))['total'] or 0
         }
     
     @staticmethod
@@ -113,10 +111,10 @@ class StatisticsManager:
         start_date = end_date - timedelta(days=days)
         
         # Intentos de acceso no autorizado por tipo
-        access_attempts_by_type = IntentoAcceso.objects.filter(
-            fecha_intento__gte=start_date
+        access_attempts_by_type = RollupSeguridadDiaria.objects.filter(
+            fecha__gte=timezone.localdate(start_date)
         ).values('motivo').annotate(
-            count=Count('id')
+            count=Sum('intentos')
         ).order_by('-count')
         
         # Intentos por IP
@@ -127,26 +125,20 @@ class StatisticsManager:
         ).order_by('-count')[:10]
         
         # Sesiones activas por día
-        daily_active_sessions = []
-        for i in range(days):
-            date = start_date + timedelta(days=i)
-            active_sessions = SesionUsuario.objects.filter(
-                fecha_creacion__date=date.date(),
-                activa=True
-            ).count()
-            
-            daily_active_sessions.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'active_sessions': active_sessions
-            })
+        first_day, last_day = days_window(days, end_date)
+        daily_active_sessions = [
+            {'date': point['bucket'].strftime('%Y-%m-%d'), 'active_sessions': point['active_sessions']}
+            for point in bucketed_series(
+                SesionUsuario.objects.filter(activa=True), 'fecha_creacion', first_day, last_day, 'day',
+                active_sessions=Count('id')
+            )
+        ]
         
         return {
             'access_attempts_by_type': list(access_attempts_by_type),
             'top_suspicious_ips': list(top_suspicious_ips),
             'daily_active_sessions': daily_active_sessions,
-            'total_access_attempts': IntentoAcceso.objects.filter(
-                fecha_intento__gte=start_date
-            ).count()
+            'total_access_attempts': sum(row['count'] for row in access_attempts_by_type)
         }
     
     @staticmethod
@@ -155,41 +147,34 @@ class StatisticsManager:
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
+        redenciones_completadas = RollupRedencionDiaria.objects.filter(estado='completado')
+        
         # Redenciones por método de pago
-        redemptions_by_method = RedencionPuntos.objects.filter(
-            fecha_solicitud__gte=start_date,
-            estado='completado'
+        redemptions_by_method = redenciones_completadas.filter(
+            fecha__gte=timezone.localdate(start_date)
         ).values('metodo_pago').annotate(
-            total_amount=Sum('valor_cop'),
-            total_redemptions=Count('id')
+            total_amount=Sum('valor_total'),
+            total_redemptions=Sum('cantidad')
         ).order_by('-total_amount')
         
         # Redenciones por día
-        daily_redemptions = []
-        for i in range(days):
-            date = start_date + timedelta(days=i)
-            redemptions_count = RedencionPuntos.objects.filter(
-                fecha_solicitud__date=date.date(),
-                estado='completado'
-            ).count()
-            
-            total_amount = RedencionPuntos.objects.filter(
-                fecha_solicitud__date=date.date(),
-                estado='completado'
-            ).aggregate(total=Sum('valor_cop'))['total'] or 0
-            
-            daily_redemptions.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'redemptions_count': redemptions_count,
-                'total_amount': float(total_amount)
-            })
+        first_day, last_day = days_window(days, end_date)
+        daily_redemptions = [
+            {
+                'date': point['bucket'].strftime('%Y-%m-%d'),
+                'redemptions_count': point['redemptions_count'],
+                'total_amount': float(point['total_amount'])
+            }
+            for point in bucketed_series(
+                redenciones_completadas, 'fecha', first_day, last_day, 'day',
+                redemptions_count=Sum('cantidad'), total_amount=Sum('valor_total')
+            )
+        ]
         
         return {
             'redemptions_by_method': list(redemptions_by_method),
             'daily_redemptions': daily_redemptions,
-            'total_redemptions_amount': RedencionPuntos.objects.filter(
-                estado='completado'
-            ).aggregate(total=Sum('valor_cop'))['total'] or 0
+            'total_redemptions_amount': redenciones_completadas.aggregate(total=Sum('valor_total'))['total'] or 0
         }
     
     @staticmethod
@@ -206,17 +191,14 @@ class StatisticsManager:
         ).order_by('-count')
         
         # Rutas por día
-        daily_routes = []
-        for i in range(days):
-            date = start_date + timedelta(days=i)
-            routes_count = Ruta.objects.filter(
-                fecha=date.date()
-            ).count()
-            
-            daily_routes.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'routes_count': routes_count
-            })
+        first_day, last_day = days_window(days, end_date)
+        daily_routes = [
+            {'date': point['bucket'].strftime('%Y-%m-%d'), 'routes_count': point['routes_count']}
+            for point in bucketed_series(
+                Ruta.objects.all(), 'fecha', first_day, last_day, 'day',
+                routes_count=Count('id')
+            )
+        ]
         
         return {
             'routes_by_neighborhood': list(routes_by_neighborhood),
@@ -232,53 +214,65 @@ class StatisticsManager:
         last_week = today - timedelta(days=7)
         last_month = today - timedelta(days=30)
         
+        # Un agregado condicional por modelo en lugar de una consulta por cifra
+        users = Usuario.objects.aggregate(
+            total=Count('id'),
+            new_today=Count('id', filter=Q(fecha_registro__date=today.date())),
+            new_this_week=Count('id', filter=Q(fecha_registro__gte=last_week))
+        )
+        users['active_today'] = SesionUsuario.objects.filter(
+            fecha_creacion__date=today.date(),
+            activa=True
+        ).values('usuario').distinct().count()
+        
+        # Totales históricos desde los rollups; las cifras de hoy, en vivo
+        recycling = RollupCanjeDiario.objects.filter(estado='aprobado').aggregate(
+            total_canjes=Sum('cantidad'),
+            total_weight=Sum('peso_total')
+        )
+        recycling.update(Canje.objects.filter(
+            estado='aprobado',
+            fecha_solicitud__date=today.date()
+        ).aggregate(
+            canjes_today=Count('id'),
+            weight_today=Sum('peso')
+        ))
+        
+        security = IntentoAcceso.objects.filter(fecha_intento__date=today.date()).aggregate(
+            access_attempts_today=Count('id'),
+            suspicious_ips_today=Count('ip_address', distinct=True)
+        )
+        
+        financial = RollupRedencionDiaria.objects.filter(estado='completado').aggregate(
+            total_redemptions=Sum('cantidad'),
+            total_amount=Sum('valor_total')
+        )
+        financial['redemptions_today'] = RedencionPuntos.objects.filter(
+            estado='completado',
+            fecha_solicitud__date=today.date()
+        ).count()
+        
         return {
             'users': {
-                'total': Usuario.objects.count(),
-                'active_today': SesionUsuario.objects.filter(
-                    fecha_creacion__date=today.date(),
-                    activa=True
-                ).values('usuario').distinct().count(),
-                'new_today': Usuario.objects.filter(
-                    fecha_registro__date=today.date()
-                ).count(),
-                'new_this_week': Usuario.objects.filter(
-                    fecha_registro__gte=last_week
-                ).count()
+                'total': users['total'],
+                'active_today': users['active_today'],
+                'new_today': users['new_today'],
+                'new_this_week': users['new_this_week']
             },
             'recycling': {
-                'total_canjes': Canje.objects.filter(estado='aprobado').count(),
-                'canjes_today': Canje.objects.filter(
-                    fecha_solicitud__date=today.date(),
-                    estado='aprobado'
-                ).count(),
-                'total_weight': Canje.objects.filter(
-                    estado='aprobado'
-                ).aggregate(total=Sum('peso'))['total'] or 0,
-                'weight_today': Canje.objects.filter(
-                    fecha_solicitud__date=today.date(),
-                    estado='aprobado'
-                ).aggregate(total=Sum('peso'))['total'] or 0
+                'total_canjes': recycling['total_canjes'] or 0,
+                'canjes_today': recycling['canjes_today'],
+                'total_weight': recycling['total_weight'] or 0,
+                'weight_today': recycling['weight_today'] or 0
             },
             'security': {
                 'active_sessions': SesionUsuario.objects.filter(activa=True).count(),
-                'access_attempts_today': IntentoAcceso.objects.filter(
-                    fecha_intento__date=today.date()
-                ).count(),
-                'suspicious_ips_today': IntentoAcceso.objects.filter(
-                    fecha_intento__date=today.date()
-                ).values('ip_address').distinct().count()
+                'access_attempts_today': security['access_attempts_today'],
+                'suspicious_ips_today': security['suspicious_ips_today']
             },
             'financial': {
-                'total_redemptions': RedencionPuntos.objects.filter(
-                    estado='completado'
-                ).count(),
-                'redemptions_today': RedencionPuntos.objects.filter(
-                    fecha_solicitud__date=today.date(),
-                    estado='completado'
-                ).count(),
-                'total_amount': RedencionPuntos.objects.filter(
-                    estado='completado'
-                ).aggregate(total=Sum('valor_cop'))['total'] or 0
+                'total_redemptions': financial['total_redemptions'] or 0,
+                'redemptions_today': financial['redemptions_today'],
+                'total_amount': financial['total_amount'] or 0
             }
         } 
\ No newline at end of file
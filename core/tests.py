@@ -1,7 +1,61 @@
 
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib import admin
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.test.utils import CaptureQueriesContext
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
 from django.utils import timezone
-from .models import Usuario, Configuracion
+from .models import Usuario, Configuracion, SesionUsuario, Canje, MaterialTasa, RedencionPuntos, ResumenActividad
+from .models import ArchivoSeguridad, CorreoSaliente, DifusionPendiente, IntentoAcceso, Notificacion, NotificacionArchivada, Ruta, ResumenCorreoPendiente, MovimientoPuntos, PerfilVista, RollupCanjeDiario, RollupSeguridadDiaria, RollupUsuarioDiario, RollupWatermark
+from .admin import CanjeAdmin
+from .activity_summary import current_streak, get_summary, level_progress, rebuild_summary, record_game_points, weekly_points
+from .config_registry import config_registry, parse_value
+from .email_backend import close_pool
+from .email_digest import queue_or_send, send_digests
+from .email_outbox import dispatch_outbox, requeue_failed
+from .fragment_cache import UserFragmentCache
+from .history_analytics import canjes_page, history_totals, material_breakdown, monthly_history
+from .leaderboard import get_leaderboard, reset_leaderboard
+from .notification_broadcast import broadcast, dispatch_queued_broadcasts, target_users
+from .notification_counter import mark_read, reconcile_unread_counters
+from .notification_push import group_name
+from .notification_retention import compact_notifications, expire_notifications
+from .notifications import NotificacionEmail
+from .profiler import ProfilerMiddleware, fingerprint, flush_profiles
+from .resource_versions import bump, versions
+from .query_plans import check_hot_queries, explain, full_scans
+from .points_ledger import SaldoInsuficiente, apply_points, credit_canje, ledger_balance, movements_page, snapshot_balances
+from .rollups import backfill_rollups, run_rollups
+from .routing import websocket_urlpatterns
+from .statistics import StatisticsManager
+from .timeseries import bucketed_series, last_months
+from .security import SecurityManager
+from .security_retention import archive_security_rows, read_archive
+from .session_guard import SessionGuardMiddleware
+from .session_heartbeat import flush_heartbeats, record_activity
+from .session_monitor import MONITOR_GROUP, changes_since, current_cursor
+from .simple_throttle import simple_throttle
+from .smtp_stub import SMTPStub
+from .throttle_engine import CacheThrottleBackend, ThrottleEngine, parse_rate
+from .ws_ratelimit import WebSocketRateLimiter, get_ws_client_ip, slow_down_frame
 
 class UsuarioModelTest(TestCase):
 	def setUp(self):
@@ -40,3 +94,1311 @@ class ConfiguracionModelTest(TestCase):
 	def test_get_configs_by_category(self):
 		configs = Configuracion.get_configs_by_category('general')
 		self.assertIn(self.config, configs)
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SessionGuardMiddlewareTest(TestCase):
+	"""La guardia de sesión debe resolver la sesión una sola vez por petición"""
+
+	# Solo SesionUsuario: el timeout sale del registro de configuración en memoria
+	# y la actividad va al buffer de heartbeats
+	QUERY_BUDGET = 1
+
+	def setUp(self):
+		cache.clear()
+		self.factory = RequestFactory()
+		self.user = Usuario.objects.create_user(
+			username='guardia',
+			email='guardia@example.com',
+			password='testpass123',
+			role='user'
+		)
+		self.device_id = SecurityManager.generate_device_id(self.factory.get('/'))
+		self.sesion = SesionUsuario.objects.create(
+			usuario=self.user,
+			token_sesion='token-guardia',
+			dispositivo_id=self.device_id,
+			ip_address='127.0.0.1',
+			user_agent='',
+			fecha_expiracion=timezone.now() + timedelta(minutes=20)
+		)
+
+	def _request(self, path='/dashusuario/'):
+		request = self.factory.get(path)
+		request.session = SessionStore()
+		request.session['secure_token'] = 'token-guardia'
+		request.session['device_id'] = self.device_id
+		request.user = self.user
+		request._messages = FallbackStorage(request)
+		return request
+
+	def _middleware(self):
+		return SessionGuardMiddleware(lambda request: HttpResponse('ok'))
+
+	def test_query_budget(self):
+		# La primera petición del intervalo puede volcar el buffer de heartbeats
+		self._middleware()(self._request())
+		request = self._request()
+		with self.assertNumQueries(self.QUERY_BUDGET):
+			response = self._middleware()(request)
+		self.assertEqual(response.status_code, 200)
+		self.assertIs(request.session_guard.sesion.pk, self.sesion.pk)
+
+	def test_sesion_cerrada_por_admin(self):
+		SesionUsuario.objects.filter(pk=self.sesion.pk).update(activa=False)
+		response = self._middleware()(self._request())
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(response.url, reverse('iniciosesion'))
+
+	def test_usuario_suspendido(self):
+		self.user.suspended = True
+		self.user.save()
+		response = self._middleware()(self._request())
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(response.url, reverse('usuario_suspendido'))
+
+	def test_login_admin_usa_secure_token(self):
+		Usuario.objects.create_user(username='admintoken', email='admintoken@test.com', password='clave12345', role='admin')
+		self.client.post(reverse('inicioadmin'), {'username': 'admintoken', 'password': 'clave12345'})
+		sesion = SesionUsuario.objects.get(usuario__username='admintoken', activa=True)
+		self.assertEqual(self.client.session['secure_token'], sesion.token_sesion)
+		self.assertNotIn('session_token', self.client.session)
+		response = self.client.get(reverse('verificar_sesion_activa'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+		self.assertTrue(response.json()['activa'])
+
+	def test_pagina_inicio_exenta(self):
+		request = self._request('/')
+		request.session.pop('secure_token')
+		config_registry.all()
+		with self.assertNumQueries(0):
+			response = self._middleware()(request)
+		self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LoginSessionGuardTest(TestCase):
+	"""Las sesiones creadas por los tres inicios de sesión pasan todas las verificaciones de la guardia"""
+
+	def setUp(self):
+		cache.clear()
+
+	def _usuario(self, username, role='user'):
+		return Usuario.objects.create_user(
+			username=username, email=f'{username}@test.com', password='clave12345', role=role, email_verificado=True
+		)
+
+	def _sigue_activa(self, url):
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		self.assertIn('_auth_user_id', self.client.session)
+		self.assertTrue(SesionUsuario.objects.filter(token_sesion=self.client.session['secure_token'], activa=True).exists())
+
+	def test_formulario_de_inicio_de_sesion(self):
+		self._usuario('loginform')
+		response = self.client.post(reverse('iniciosesion'), {'username': 'loginform', 'password': 'clave12345'})
+		self.assertRedirects(response, reverse('dashusuario'), fetch_redirect_response=False)
+		self._sigue_activa(reverse('dashusuario'))
+
+	def test_inicio_de_sesion_ajax(self):
+		self._usuario('loginajax')
+		response = self.client.post(reverse('login_ajax'), {'username': 'loginajax', 'password': 'clave12345'}, content_type='application/json')
+		self.assertTrue(response.json()['success'])
+		self._sigue_activa(reverse('dashusuario'))
+
+	def test_inicio_de_sesion_admin(self):
+		self._usuario('loginadmin', role='admin')
+		response = self.client.post(reverse('inicioadmin'), {'username': 'loginadmin', 'password': 'clave12345'})
+		self.assertRedirects(response, reverse('paneladmin'), fetch_redirect_response=False)
+		self._sigue_activa(reverse('paneladmin'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SESSION_HEARTBEAT_INTERVAL=60)
+class SessionHeartbeatTest(TestCase):
+	"""La actividad de sesión se acumula en caché y se vuelca en lote"""
+
+	def setUp(self):
+		cache.clear()
+		self.user = Usuario.objects.create_user(
+			username='latido',
+			email='latido@example.com',
+			password='testpass123'
+		)
+		self.sesion = SesionUsuario.objects.create(
+			usuario=self.user,
+			token_sesion='token-latido',
+			dispositivo_id='dispositivo',
+			ip_address='127.0.0.1',
+			user_agent='',
+			fecha_expiracion=timezone.now() + timedelta(minutes=20)
+		)
+		# Simular una fila que no se ha escrito desde hace 30 minutos
+		hace_rato = timezone.now() - timedelta(minutes=30)
+		SesionUsuario.objects.filter(pk=self.sesion.pk).update(
+			ultima_actividad=hace_rato,
+			fecha_expiracion=hace_rato + timedelta(minutes=20)
+		)
+		self.sesion.refresh_from_db()
+
+	def test_escrituras_coalescidas(self):
+		now = timezone.now()
+		with self.assertNumQueries(2):
+			# Primer latido del intervalo: SELECT de las sesiones pendientes + bulk_update
+			record_activity(self.sesion, now + timedelta(minutes=20), now=now)
+		with self.assertNumQueries(0):
+			for _ in range(5):
+				record_activity(self.sesion, now + timedelta(minutes=20), now=now)
+
+	def test_limpieza_lee_a_traves_del_buffer(self):
+		cache.add('session_heartbeat:flush_lock', 1, 60)
+		now = timezone.now()
+		record_activity(self.sesion, now + timedelta(minutes=20), now=now)
+		self.sesion.refresh_from_db()
+		self.assertLess(self.sesion.ultima_actividad, now - timedelta(minutes=20))
+
+		SecurityManager.cleanup_inactive_sessions()
+		self.assertEqual(SecurityManager.cleanup_expired_sessions(), 0)
+
+		self.sesion.refresh_from_db()
+		self.assertTrue(self.sesion.activa)
+		self.assertEqual(self.sesion.ultima_actividad, now)
+
+	def test_volcado_solo_de_sesiones_pendientes(self):
+		cache.add('session_heartbeat:flush_lock', 1, 60)
+		now = timezone.now()
+		for _ in range(3):
+			record_activity(self.sesion, now + timedelta(minutes=20), now=now)
+		self.assertEqual(flush_heartbeats(), 1)
+		# Sin actividad nueva no se consulta ninguna sesión
+		with self.assertNumQueries(0):
+			self.assertEqual(flush_heartbeats(), 0)
+
+		record_activity(self.sesion, now + timedelta(minutes=21), now=now + timedelta(minutes=1))
+		self.assertEqual(flush_heartbeats(), 1)
+		self.sesion.refresh_from_db()
+		self.assertEqual(self.sesion.ultima_actividad, now + timedelta(minutes=1))
+
+	def test_ranura_reservada_sin_escribir_se_vuelve_a_leer(self):
+		cache.add('session_heartbeat:flush_lock', 1, 60)
+		now = timezone.now()
+		# Otro worker reservó una ranura con incr y todavía no escribe el id de su sesión
+		cache.add('session_heartbeat:pendientes', 0, None)
+		reservada = cache.incr('session_heartbeat:pendientes')
+		record_activity(self.sesion, now + timedelta(minutes=20), now=now)
+		self.assertEqual(flush_heartbeats(), 0)
+
+		cache.set(f'session_heartbeat:ranura:{reservada}', self.sesion.pk)
+		self.assertEqual(flush_heartbeats(), 1)
+		self.sesion.refresh_from_db()
+		self.assertEqual(self.sesion.ultima_actividad, now)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConfigRegistryTest(TestCase):
+	"""El registro sirve configuraciones tipadas desde memoria"""
+
+	def setUp(self):
+		cache.clear()
+		config_registry.invalidate()
+		Configuracion.objects.create(categoria='sesiones', nombre='user_session_timeout', valor='25')
+		Configuracion.objects.create(categoria='general', nombre='dias_recoleccion', valor='["Lunes", "Viernes"]')
+		Configuracion.objects.create(categoria='general', nombre='email_notifications', valor='True')
+
+	def test_valores_tipados(self):
+		self.assertEqual(config_registry.get('user_session_timeout'), 25)
+		self.assertEqual(config_registry.get_list('dias_recoleccion'), ['Lunes', 'Viernes'])
+		self.assertIs(config_registry.get('email_notifications'), True)
+		self.assertEqual(config_registry.get('no_existe', 'x'), 'x')
+		self.assertEqual(parse_value('0.50'), 0.5)
+		self.assertEqual(parse_value('smtp.gmail.com'), 'smtp.gmail.com')
+
+	def test_lecturas_desde_memoria(self):
+		config_registry.all()
+		with self.assertNumQueries(0):
+			for _ in range(10):
+				config_registry.get_int('user_session_timeout')
+
+	def test_invalidacion_al_guardar(self):
+		self.assertEqual(config_registry.get_int('user_session_timeout'), 25)
+		config = Configuracion.objects.get(nombre='user_session_timeout')
+		config.valor = '30'
+		with self.captureOnCommitCallbacks() as callbacks:
+			config.save()
+		# Hasta el commit se sigue sirviendo el valor confirmado
+		self.assertEqual(config_registry.get_int('user_session_timeout'), 25)
+		callbacks[0]()
+		self.assertEqual(config_registry.get_int('user_session_timeout'), 30)
+		with self.captureOnCommitCallbacks(execute=True):
+			config.delete()
+		self.assertIsNone(config_registry.get('user_session_timeout'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ThrottleEngineTest(TestCase):
+	"""El throttling usa contadores compartidos en la caché"""
+
+	def setUp(self):
+		cache.clear()
+		self.factory = RequestFactory()
+
+	def test_parse_rate(self):
+		self.assertEqual(parse_rate('5/m'), (5, 60))
+		self.assertEqual(parse_rate('10/h'), (10, 3600))
+		self.assertEqual(parse_rate('3/5m'), (3, 300))
+		with self.assertRaises(ValueError):
+			parse_rate('cinco')
+
+	def test_limite_compartido_entre_workers(self):
+		# Dos motores independientes simulan dos workers sobre la misma caché
+		worker_a, worker_b = ThrottleEngine(), ThrottleEngine()
+		now = 1_000_000.0
+		allowed = [
+			(worker_a if i % 2 else worker_b).check('login:ip:1.2.3.4', 5, 60, now=now).allowed
+			for i in range(8)
+		]
+		self.assertEqual(allowed.count(True), 5)
+		result = worker_a.check('login:ip:1.2.3.4', 5, 60, now=now)
+		self.assertFalse(result.allowed)
+		self.assertGreater(result.retry_after, 0)
+
+	def test_intentos_intercalados_en_el_limite(self):
+		# El segundo worker decide mientras el primero todavía no termina su propio check
+		otro = ThrottleEngine()
+		now = 1_000_000.0
+		resultados = []
+
+		class IntercaladoBackend(CacheThrottleBackend):
+			def increment(self, key, timeout):
+				if not resultados:
+					resultados.append(otro.check('intercalado', 5, 60, now=now).allowed)
+				return super().increment(key, timeout)
+
+		for _ in range(4):
+			otro.check('intercalado', 5, 60, now=now)
+		resultados.insert(0, ThrottleEngine(IntercaladoBackend()).check('intercalado', 5, 60, now=now).allowed)
+		self.assertEqual(sorted(resultados), [False, True])
+		self.assertFalse(otro.check('intercalado', 5, 60, now=now).allowed)
+
+	def test_token_bucket_concurrente(self):
+		# Varios hilos sobre el mismo bucket: leer y escribir el TAT es un solo paso
+		engine = ThrottleEngine()
+		now = 1_000_000.0
+		with ThreadPoolExecutor(max_workers=8) as pool:
+			allowed = list(pool.map(lambda _: engine.take('hilos', 5, 60, burst=5, now=now).allowed, range(20)))
+		self.assertEqual(allowed.count(True), 5)
+
+	def test_ventana_deslizante(self):
+		engine = ThrottleEngine()
+		now = 1_000_020.0
+		for _ in range(4):
+			self.assertTrue(engine.check('k', 4, 60, now=now).allowed)
+		self.assertFalse(engine.check('k', 4, 60, now=now + 30).allowed)
+		# Dos ventanas después el contador anterior ya no pesa
+		self.assertTrue(engine.check('k', 4, 60, now=now + 120).allowed)
+
+	def test_decorador_responde_429(self):
+		view = simple_throttle('2/m')(lambda request: HttpResponse('ok'))
+		responses = [
+			view(self.factory.get('/', HTTP_X_REQUESTED_WITH='XMLHttpRequest'))
+			for _ in range(3)
+		]
+		self.assertEqual([r.status_code for r in responses], [200, 200, 429])
+		self.assertIn('Retry-After', responses[-1])
+
+
+WS_LIMITS = {'chat': {'user': '6/m', 'ip': '100/m', 'burst': 3}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, WEBSOCKET_RATELIMITS=WS_LIMITS)
+class WebSocketRateLimitTest(TestCase):
+	"""El token bucket de WebSocket es compartido entre conexiones"""
+
+	def setUp(self):
+		cache.clear()
+		self.usuario = Usuario.objects.create_user(username='wsuser', password='clave12345')
+
+	def _scope(self, ip):
+		return {'user': self.usuario, 'client': (ip, 5000), 'headers': []}
+
+	def test_token_bucket(self):
+		engine = ThrottleEngine()
+		now = 1_000_000.0
+		self.assertEqual([engine.take('b', 6, 60, burst=3, now=now).allowed for _ in range(4)], [True, True, True, False])
+		# Un token se repone cada 10 segundos
+		self.assertTrue(engine.take('b', 6, 60, burst=3, now=now + 10).allowed)
+		self.assertFalse(engine.take('b', 6, 60, burst=3, now=now + 10).allowed)
+
+	def test_varias_conexiones_comparten_cuota(self):
+		# Cada "conexión" usa su propio limitador y otra IP, pero el bucket del usuario es común
+		results = [WebSocketRateLimiter('chat').check(self._scope(f'10.0.0.{i}')) for i in range(4)]
+		self.assertEqual([r.allowed for r in results], [True, True, True, False])
+		frame = slow_down_frame(results[-1], 'chat')
+		self.assertEqual(frame['type'], 'rate_limited')
+		self.assertGreater(frame['retry_after'], 0)
+
+	@override_settings(WEBSOCKET_RATELIMITS={'chat': {'user': '6/m', 'ip': '3/m', 'burst': 3}})
+	def test_rechazo_por_ip_no_gasta_token_del_usuario(self):
+		otro = Usuario.objects.create_user(username='wsotro', email='wsotro@test.com', password='clave12345')
+		limiter = WebSocketRateLimiter('chat')
+		for _ in range(3):
+			self.assertTrue(limiter.check(self._scope('10.0.0.1')).allowed)
+		# La IP ya no tiene tokens: el mensaje de otro usuario desde ella se rechaza...
+		self.assertFalse(limiter.check({'user': otro, 'client': ('10.0.0.1', 5000), 'headers': []}).allowed)
+		# ...sin consumir su propio bucket, que sigue lleno desde otra IP
+		results = [limiter.check({'user': otro, 'client': ('10.0.0.2', 5000), 'headers': []}) for _ in range(4)]
+		self.assertEqual([r.allowed for r in results], [True, True, True, False])
+
+	@override_settings(TRUSTED_PROXIES=['172.18.0.0/16'])
+	def test_x_forwarded_for_solo_desde_proxy_confiable(self):
+		cabecera = [(b'x-forwarded-for', b'1.2.3.4, 200.1.1.7')]
+		# Un cliente directo no puede elegir su IP rotando la cabecera
+		self.assertEqual(get_ws_client_ip({'client': ('200.1.1.7', 5000), 'headers': cabecera}), '200.1.1.7')
+		# Detrás del proxy se toma la última IP que no es un proxy confiable
+		self.assertEqual(get_ws_client_ip({'client': ('172.18.0.5', 5000), 'headers': cabecera}), '200.1.1.7')
+		with self.settings(TRUSTED_PROXIES=[]):
+			self.assertEqual(get_ws_client_ip({'client': ('172.18.0.5', 5000), 'headers': cabecera}), '172.18.0.5')
+
+
+class ActivitySummaryTest(TestCase):
+	"""El resumen de actividad se mantiene al cambiar canjes, juegos y redenciones"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='resumen', email='resumen@test.com', password='clave12345')
+		self.material = MaterialTasa.objects.create(nombre='Plástico', puntos_por_kilo=10)
+
+	def _canje(self, peso='2.00'):
+		return Canje.objects.create(usuario=self.usuario, material=self.material, peso=peso, puntos=0)
+
+	def test_actualizacion_incremental(self):
+		get_summary(self.usuario)
+		canje = self._canje()
+		canje.estado = 'aprobado'
+		canje.save()
+		record_game_points(self.usuario, 5)
+		RedencionPuntos.objects.create(usuario=self.usuario, puntos=8, metodo_pago='nequi', numero_cuenta='300')
+
+		resumen = ResumenActividad.objects.get(usuario=self.usuario)
+		self.assertEqual(resumen.total_canjes, 1)
+		self.assertEqual(resumen.canjes_aprobados, 1)
+		self.assertEqual(weekly_points(resumen), 25)
+		self.assertEqual(float(resumen.total_kg), 2.0)
+		self.assertEqual(resumen.puntos_redimidos, 8)
+		self.assertEqual(current_streak(resumen), 1)
+
+		# Rechazar después de aprobar devuelve los totales
+		canje.estado = 'rechazado'
+		canje.save()
+		resumen.refresh_from_db()
+		self.assertEqual(resumen.canjes_aprobados, 0)
+		self.assertEqual(weekly_points(resumen), 5)
+
+	def test_racha_reconstruida(self):
+		hoy = timezone.localdate()
+		for dias in (1, 2, 4):
+			canje = self._canje()
+			Canje.objects.filter(pk=canje.pk).update(fecha_solicitud=timezone.now() - timedelta(days=dias))
+		resumen = rebuild_summary(self.usuario.pk, hoy=hoy)
+		self.assertEqual(resumen.racha_actual, 2)
+		# Hoy sin canjes: hoy + ayer + anteayer
+		self.assertEqual(current_streak(resumen, hoy=hoy), 3)
+
+	def test_lectura_en_una_consulta(self):
+		self._canje()
+		with self.assertNumQueries(1):
+			get_summary(self.usuario)
+
+	def test_progreso_de_nivel(self):
+		progreso = level_progress(300)
+		self.assertEqual(progreso['current_level'], 'defensor_planeta')
+		self.assertEqual(progreso['next_level_name'], 'heroe_eco')
+		self.assertEqual(progreso['progress_percentage'], 50)
+		self.assertEqual(progreso['points_needed'], 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserFragmentCacheTest(TestCase):
+	"""Los fragmentos se cachean por usuario y se invalidan con eventos de dominio"""
+
+	def setUp(self):
+		cache.clear()
+		self.usuario = Usuario.objects.create_user(username='frag1', email='frag1@test.com', password='clave12345')
+		self.otro = Usuario.objects.create_user(username='frag2', email='frag2@test.com', password='clave12345')
+		self.material = MaterialTasa.objects.create(nombre='Vidrio', puntos_por_kilo=5)
+
+	def test_claves_por_usuario(self):
+		propio = UserFragmentCache(self.usuario).get_or_set('stats', lambda: 'propio')
+		ajeno = UserFragmentCache(self.otro).get_or_set('stats', lambda: 'ajeno')
+		self.assertEqual((propio, ajeno), ('propio', 'ajeno'))
+		self.assertEqual(UserFragmentCache(self.usuario).get_or_set('stats', lambda: 'nuevo'), 'propio')
+
+	def test_invalidacion_por_canje(self):
+		UserFragmentCache(self.usuario).get_or_set('recent', lambda: 'viejo')
+		UserFragmentCache(self.otro).get_or_set('recent', lambda: 'otro')
+		Canje.objects.create(usuario=self.usuario, material=self.material, peso='1.00', puntos=0)
+		self.assertEqual(UserFragmentCache(self.usuario).get_or_set('recent', lambda: 'nuevo'), 'nuevo')
+		# Los fragmentos de otros usuarios no se invalidan
+		self.assertEqual(UserFragmentCache(self.otro).get_or_set('recent', lambda: 'x'), 'otro')
+
+	def test_dashboard_repetido_usa_cache(self):
+		get_summary(self.usuario)
+		self.client.force_login(self.usuario)
+		session = self.client.session
+		session['secure_token'] = None
+		session.save()
+		with self.settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]):
+			self.client.get(reverse('dashusuario'))
+			with CaptureQueriesContext(connection) as primera:
+				self.client.get(reverse('dashusuario'))
+			Canje.objects.create(usuario=self.usuario, material=self.material, peso='1.00', puntos=0)
+			with CaptureQueriesContext(connection) as tras_canje:
+				response = self.client.get(reverse('dashusuario'))
+		self.assertEqual(response.status_code, 200)
+		self.assertLess(len(primera), len(tras_canje))
+
+
+class TimeSeriesTest(TestCase):
+	"""Las series por periodo se calculan en una consulta y rellenan huecos"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='series', email='series@test.com', password='clave12345')
+		self.material = MaterialTasa.objects.create(nombre='Papel', puntos_por_kilo=4)
+		ahora = timezone.now()
+		for dias, peso in ((0, '1.00'), (0, '2.50'), (3, '4.00')):
+			canje = Canje.objects.create(usuario=self.usuario, material=self.material, peso=peso, puntos=0, estado='aprobado')
+			Canje.objects.filter(pk=canje.pk).update(fecha_solicitud=ahora - timedelta(days=dias))
+
+	def test_serie_diaria_con_huecos(self):
+		hoy = timezone.localdate()
+		with self.assertNumQueries(1):
+			serie = bucketed_series(
+				Canje.objects.filter(estado='aprobado'), 'fecha_solicitud', hoy - timedelta(days=6), hoy, 'day',
+				canjes=Count('id'), peso=Sum('peso')
+			)
+		self.assertEqual(len(serie), 7)
+		self.assertEqual(serie[-1]['bucket'], hoy)
+		self.assertEqual(serie[-1]['canjes'], 2)
+		self.assertEqual(float(serie[-1]['peso']), 3.5)
+		self.assertEqual(serie[-4]['canjes'], 1)
+		self.assertEqual(sum(p['canjes'] for p in serie), 3)
+
+	def test_serie_mensual(self):
+		inicio, fin = last_months(12)
+		serie = bucketed_series(Canje.objects.all(), 'fecha_solicitud', inicio, fin, 'month', total=Count('id'))
+		self.assertEqual(len(serie), 12)
+		self.assertTrue(all(p['bucket'].day == 1 for p in serie))
+		self.assertEqual(sum(p['total'] for p in serie), 3)
+
+	def test_estadisticas_sin_bucle_por_dia(self):
+		with self.assertNumQueries(4):
+			stats = StatisticsManager.get_recycling_stats(days=90)
+		self.assertEqual(len(stats['daily_canjes']), 90)
+
+
+class DailyRollupTest(TestCase):
+	"""El job de rollups es incremental, idempotente y sigue los cambios de estado"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='rollup', email='rollup@test.com', password='clave12345')
+		self.material = MaterialTasa.objects.create(nombre='Vidrio', puntos_por_kilo=2)
+		self.hace_cinco = timezone.now() - timedelta(days=5)
+
+	def _canje(self, peso, estado, fecha):
+		canje = Canje.objects.create(usuario=self.usuario, material=self.material, peso=peso, puntos=10, estado=estado)
+		Canje.objects.filter(pk=canje.pk).update(fecha_solicitud=fecha)
+		return Canje.objects.get(pk=canje.pk)
+
+	def _rollup(self, estado):
+		return RollupCanjeDiario.objects.filter(fecha=timezone.localdate(self.hace_cinco), estado=estado).first()
+
+	def test_ejecutar_dos_veces_no_duplica(self):
+		self._canje('2.00', 'aprobado', self.hace_cinco)
+		self._canje('3.00', 'aprobado', self.hace_cinco)
+		run_rollups()
+		run_rollups(full=True)
+		rollup = self._rollup('aprobado')
+		self.assertEqual(rollup.cantidad, 2)
+		self.assertEqual(float(rollup.peso_total), 5.0)
+		self.assertEqual(RollupCanjeDiario.objects.count(), 1)
+		self.assertTrue(RollupWatermark.objects.filter(nombre='canjes', valor__isnull=False).exists())
+
+	def test_aprobacion_retroactiva_recalcula_el_dia(self):
+		canje = self._canje('4.00', 'pendiente', self.hace_cinco)
+		run_rollups()
+		self.assertEqual(self._rollup('pendiente').cantidad, 1)
+
+		canje.estado = 'aprobado'
+		canje.save()
+		resultado = run_rollups(fuentes=['canjes'])
+		self.assertEqual(resultado, {'canjes': 1})
+		self.assertIsNone(self._rollup('pendiente'))
+		self.assertEqual(float(self._rollup('aprobado').peso_total), 4.0)
+
+	def test_borrado_recalcula_el_dia(self):
+		canje = self._canje('1.00', 'aprobado', self.hace_cinco)
+		run_rollups()
+		# Fuera del margen del watermark, el borrado solo se detecta por el día pendiente
+		RollupWatermark.objects.filter(nombre='canjes').update(valor=timezone.now() + timedelta(days=1))
+		canje.delete()
+		self.assertEqual(run_rollups(fuentes=['canjes']), {'canjes': 1})
+		self.assertFalse(RollupCanjeDiario.objects.exists())
+
+	def test_calculo_inicial_de_fuentes_sin_watermark(self):
+		self._canje('2.00', 'aprobado', self.hace_cinco)
+		self.assertFalse(RollupWatermark.objects.filter(nombre='canjes').exists())
+		resultado = backfill_rollups()
+		self.assertEqual(resultado['canjes'], 1)
+		self.assertNotIn('seguridad', resultado)
+		self.assertEqual(self._rollup('aprobado').cantidad, 1)
+		self.assertEqual(backfill_rollups(), {})
+
+	def test_reportes_suman_el_dia_actual_en_vivo(self):
+		canje = self._canje('2.00', 'aprobado', self.hace_cinco)
+		# Puntos corregidos por el administrador
+		canje.puntos_finales = 15
+		canje.save()
+		run_rollups()
+		self.assertEqual(self._rollup('aprobado').puntos_total, 15)
+
+		Canje.objects.create(usuario=self.usuario, material=self.material, peso='3.00', puntos=10, estado='aprobado')
+		self.client.force_login(self.usuario)
+		with self.settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]):
+			antes_del_job = self.client.get(reverse('ranking')).context['total_reciclado']
+			run_rollups()
+			despues_del_job = self.client.get(reverse('ranking')).context['total_reciclado']
+		self.assertEqual((float(antes_del_job), float(despues_del_job)), (5.0, 5.0))
+
+	def test_intentos_por_motivo(self):
+		for ip in ('10.0.0.1', '10.0.0.1', '10.0.0.2'):
+			IntentoAcceso.objects.create(ip_address=ip, user_agent='test', url_intento='http://testserver/', motivo='token_invalido')
+		run_rollups(fuentes=['seguridad'])
+		rollup = RollupSeguridadDiaria.objects.get(fecha=timezone.localdate(), motivo='token_invalido')
+		self.assertEqual(rollup.intentos, 3)
+		self.assertEqual(rollup.ips_distintas, 2)
+		stats = StatisticsManager.get_security_stats(days=30)
+		self.assertEqual(stats['total_access_attempts'], 3)
+
+
+@override_settings(LEADERBOARD_BACKEND='core.leaderboard.DatabaseLeaderboardBackend')
+class LeaderboardTest(TestCase):
+	"""Los tableros se actualizan con cada cambio de puntos y responden posiciones con empates"""
+
+	def setUp(self):
+		reset_leaderboard()
+		self.addCleanup(reset_leaderboard)
+		self.usuarios = [
+			Usuario.objects.create_user(username=f'ranking{i}', email=f'ranking{i}@test.com', password='clave12345', puntos=puntos)
+			for i, puntos in enumerate((50, 300, 120, 120, 10))
+		]
+		self.leaderboard = get_leaderboard()
+
+	def test_top_y_posiciones_con_empates(self):
+		top = self.leaderboard.top('puntos', 4)
+		self.assertEqual([entry['puntaje'] for entry in top], [300, 120, 120, 50])
+		self.assertEqual([entry['posicion'] for entry in top], [1, 2, 2, 4])
+		self.assertEqual(self.leaderboard.rank('puntos', self.usuarios[4].id), 5)
+
+	def test_cambio_de_puntos_actualiza_posicion(self):
+		self.leaderboard.top('puntos')
+		usuario = self.usuarios[4]
+		usuario.puntos = 500
+		usuario.save()
+		with self.assertNumQueries(2):
+			posicion = self.leaderboard.rank('puntos', usuario.id, score=usuario.puntos)
+		self.assertEqual(posicion, 1)
+		self.assertEqual(self.leaderboard.rank('puntos', self.usuarios[1].id), 2)
+
+	def test_vecinos_alrededor_del_usuario(self):
+		vecinos = self.leaderboard.around('puntos', self.usuarios[0].id, k=1)
+		self.assertEqual([entry['puntaje'] for entry in vecinos], [120, 50, 10])
+		self.assertEqual(vecinos[1], {'usuario_id': self.usuarios[0].id, 'puntaje': 50, 'posicion': 4})
+
+	def test_tableros_de_juegos_y_semana(self):
+		usuario = self.usuarios[0]
+		usuario.puntos_juego_papel = 900
+		usuario.save()
+		get_summary(usuario)
+		record_game_points(usuario, 40)
+		self.assertEqual(self.leaderboard.top('juego_papel'), [{'usuario_id': usuario.id, 'puntaje': 900, 'posicion': 1}])
+		self.assertEqual(self.leaderboard.score('semana', usuario.id), 40)
+		self.assertEqual(self.leaderboard.rank('semana', self.usuarios[1].id), 2)
+
+
+class PointsLedgerTest(TestCase):
+	"""Los cambios de puntos se aplican con F() y quedan en el libro mayor"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='ledger', email='ledger@test.com', password='clave12345', puntos=100)
+		self.material = MaterialTasa.objects.create(nombre='Vidrio', puntos_por_kilo=10)
+
+	def test_canje_aprobado_dos_veces_acredita_una_vez(self):
+		canje = Canje.objects.create(usuario=self.usuario, material=self.material, peso=2, estado='aprobado')
+		copia = Canje.objects.get(pk=canje.pk)
+		self.assertIsNotNone(credit_canje(canje))
+		self.assertIsNone(credit_canje(copia))
+
+		self.usuario.refresh_from_db()
+		self.assertEqual(self.usuario.puntos, 120)
+		movimiento = MovimientoPuntos.objects.get(usuario=self.usuario)
+		self.assertEqual((movimiento.delta, movimiento.saldo_resultante, movimiento.origen_id), (20, 120, canje.pk))
+
+	def test_debito_sin_saldo_no_registra_movimiento(self):
+		desactualizado = Usuario.objects.get(pk=self.usuario.pk)
+		apply_points(self.usuario, -80, 'redencion', require_balance=True)
+		with self.assertRaises(SaldoInsuficiente):
+			apply_points(desactualizado, -80, 'redencion', require_balance=True)
+		self.assertEqual(Usuario.objects.get(pk=self.usuario.pk).puntos, 20)
+		self.assertEqual(MovimientoPuntos.objects.count(), 1)
+
+	def test_save_completo_no_pisa_los_puntos(self):
+		desactualizado = Usuario.objects.get(pk=self.usuario.pk)
+		apply_points(Usuario.objects.get(pk=self.usuario.pk), 50, 'ajuste')
+		desactualizado.first_name = 'Ana'
+		desactualizado.save()
+		self.assertEqual(Usuario.objects.get(pk=self.usuario.pk).puntos, 150)
+		self.assertEqual(ledger_balance(self.usuario.id), 150)
+
+	def test_juego_de_plasticos_guarda_su_progreso(self):
+		self.client.force_login(self.usuario)
+		with self.settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]):
+			for _ in range(2):
+				response = self.client.post(reverse('juego_plasticos'), {'puntos': 30})
+		self.assertEqual(response.json()['puntos_juego_totales'], 60)
+		self.assertEqual(Usuario.objects.get(pk=self.usuario.pk).puntos_juego, 60)
+
+	def test_fotos_detectan_saldos_desalineados(self):
+		apply_points(self.usuario, 30, 'ajuste')
+		self.assertEqual(ledger_balance(self.usuario.id), 130)
+		self.assertEqual(snapshot_balances(), (1, []))
+		self.assertEqual(snapshot_balances(), (0, []))
+
+		Usuario.objects.filter(pk=self.usuario.pk).update(puntos=5)
+		apply_points(self.usuario, 1, 'juego')
+		self.assertEqual(snapshot_balances(), (1, [(self.usuario.id, 6, 131)]))
+
+	def test_historial_paginado_por_id(self):
+		for delta in (1, 2, 3):
+			apply_points(self.usuario, delta, 'juego')
+		pagina, siguiente = movements_page(self.usuario, limit=2)
+		self.assertEqual([m.delta for m in pagina], [3, 2])
+		pagina, siguiente = movements_page(self.usuario, before_id=siguiente, limit=2)
+		self.assertEqual(([m.delta for m in pagina], siguiente), ([1], None))
+
+		self.client.force_login(self.usuario)
+		with self.settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]):
+			respuesta = self.client.get(reverse('historial_puntos'), {'antes': pagina[0].id + 1})
+		self.assertEqual([m['saldo'] for m in respuesta.json()['movimientos']], [101])
+
+
+class FailingEmailBackend(BaseEmailBackend):
+	def send_messages(self, email_messages):
+		raise ConnectionRefusedError('SMTP no disponible')
+
+
+@override_settings(
+	EMAIL_BACKEND='core.email_outbox.OutboxEmailBackend',
+	EMAIL_OUTBOX_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+	EMAIL_OUTBOX_BACKOFF_SECONDS=30,
+	EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+)
+class EmailOutboxTest(TestCase):
+	"""Los correos se guardan con la transacción y un worker los entrega con reintentos"""
+
+	def test_correo_sigue_a_la_transaccion(self):
+		from django.core.mail import EmailMultiAlternatives, send_mail
+
+		with self.assertRaises(RuntimeError):
+			with transaction.atomic():
+				send_mail('Descartado', 'cuerpo', None, ['a@test.com'])
+				raise RuntimeError()
+		with transaction.atomic():
+			msg = EmailMultiAlternatives('Canje aprobado', 'texto', None, ['b@test.com'])
+			msg.attach_alternative('<p>html</p>', 'text/html')
+			msg.send()
+
+		self.assertEqual(list(CorreoSaliente.objects.values_list('asunto', flat=True)), ['Canje aprobado'])
+		self.assertEqual(len(mail.outbox), 0)
+
+		self.assertEqual(dispatch_outbox(), {'enviados': 1, 'reintentos': 0, 'fallidos': 0})
+		self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>html</p>')
+		self.assertEqual(CorreoSaliente.objects.get().estado, 'enviado')
+		self.assertEqual(dispatch_outbox(), {'enviados': 0, 'reintentos': 0, 'fallidos': 0})
+
+	@override_settings(EMAIL_OUTBOX_BACKEND='core.tests.FailingEmailBackend')
+	def test_reintentos_con_backoff_y_fallidos(self):
+		from django.core.mail import send_mail
+
+		send_mail('Alerta', 'cuerpo', None, ['c@test.com'])
+		ahora = timezone.now()
+		self.assertEqual(dispatch_outbox(now=ahora)['reintentos'], 1)
+		correo = CorreoSaliente.objects.get()
+		self.assertEqual((correo.intentos, correo.proximo_intento), (1, ahora + timedelta(seconds=30)))
+
+		# Aún no vence el backoff
+		self.assertEqual(dispatch_outbox(now=ahora + timedelta(seconds=10))['reintentos'], 0)
+		self.assertEqual(dispatch_outbox(now=ahora + timedelta(seconds=31))['fallidos'], 1)
+		self.assertEqual(CorreoSaliente.objects.get().estado, 'fallido')
+
+		self.assertEqual(requeue_failed(), 1)
+		self.assertEqual(CorreoSaliente.objects.get().estado, 'pendiente')
+
+
+@override_settings(EMAIL_POOL_SIZE=2, EMAIL_POOL_MAX_MESSAGES=100)
+class PooledEmailBackendTest(TestCase):
+	"""SSLEmailBackend reutiliza conexiones autenticadas entre envíos"""
+
+	def setUp(self):
+		close_pool()
+		self.stub = SMTPStub().start()
+		self.addCleanup(self.stub.stop)
+		self.addCleanup(close_pool)
+
+	def _send(self, *asuntos):
+		from django.core.mail import EmailMessage, get_connection
+
+		backend = get_connection(
+			'core.email_backend.SSLEmailBackend', host='127.0.0.1', port=self.stub.port,
+			username='', password='', use_tls=False, use_ssl=False,
+		)
+		return backend.send_messages([EmailMessage(asunto, 'cuerpo', 'a@test.com', ['b@test.com']) for asunto in asuntos])
+
+	def test_envios_sucesivos_reutilizan_la_conexion(self):
+		for n in range(4):
+			self.assertEqual(self._send(f'correo {n}'), 1)
+		self.assertEqual((self.stub.conexiones, len(self.stub.mensajes)), (1, 4))
+
+	@override_settings(EMAIL_POOL_MAX_MESSAGES=2)
+	def test_maximo_de_correos_por_conexion(self):
+		self.assertEqual(self._send('a', 'b', 'c', 'd', 'e'), 5)
+		self.assertEqual(self.stub.conexiones, 3)
+
+	def test_reconecta_si_el_servidor_corta(self):
+		self._send('antes')
+		self.stub.drop_connections()
+		self.assertEqual(self._send('despues'), 1)
+		self.assertEqual((self.stub.conexiones, len(self.stub.mensajes)), (2, 2))
+
+
+@override_settings(EMAIL_BACKEND='core.email_outbox.OutboxEmailBackend', EMAIL_DIGEST_WINDOW_MINUTES=60)
+class EmailDigestTest(TestCase):
+	"""Las notificaciones de un usuario se agrupan en un solo correo por ventana"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='digest', email='digest@test.com', password='clave12345')
+		self.material = MaterialTasa.objects.create(nombre='Papel', puntos_por_kilo=4)
+
+	def test_resumen_agrupa_notificaciones(self):
+		for peso in (1, 2):
+			canje = Canje.objects.create(usuario=self.usuario, material=self.material, peso=peso)
+			NotificacionEmail.notificar_canje_aprobado(canje)
+		NotificacionEmail.notificar_canje_rechazado(canje, 'Material húmedo')
+		self.assertEqual(ResumenCorreoPendiente.objects.count(), 3)
+		self.assertFalse(CorreoSaliente.objects.exists())
+
+		ahora = timezone.now()
+		self.assertEqual(send_digests(now=ahora), (0, 0))
+		self.assertEqual(send_digests(now=ahora + timedelta(minutes=61)), (1, 3))
+		correo = CorreoSaliente.objects.get()
+		self.assertEqual(correo.asunto, 'Tienes 3 novedades en Eco Puntos')
+		self.assertIn('Material húmedo', correo.html)
+		self.assertFalse(ResumenCorreoPendiente.objects.exists())
+
+	def test_urgentes_y_usuarios_sin_resumen_salen_de_inmediato(self):
+		NotificacionEmail.notificar_bienvenida(self.usuario)
+		self.usuario.resumen_correos = False
+		canje = Canje.objects.create(usuario=self.usuario, material=self.material, peso=1)
+		NotificacionEmail.notificar_canje_en_revision(canje)
+		self.assertEqual(CorreoSaliente.objects.count(), 2)
+		self.assertFalse(ResumenCorreoPendiente.objects.exists())
+
+	def test_sin_correos_no_se_envia_ni_se_agrupa(self):
+		self.usuario.notificaciones_email = False
+		render = lambda: ('texto', None)
+		self.assertFalse(queue_or_send(self.usuario, 'Urgente', None, render, urgente=True))
+		self.assertFalse(queue_or_send(self.usuario, 'Canje', 'Resumen', render))
+		self.assertFalse(CorreoSaliente.objects.exists())
+		self.assertFalse(ResumenCorreoPendiente.objects.exists())
+
+	def test_resumen_que_falla_queda_pendiente(self):
+		queue_or_send(self.usuario, 'Canje', 'Canje aprobado', lambda: ('texto', None))
+		despues = timezone.now() + timedelta(minutes=61)
+		with mock.patch('core.email_digest.render_to_string', side_effect=ValueError('plantilla rota')):
+			with self.assertLogs('core.email_digest', 'ERROR'):
+				self.assertEqual(send_digests(now=despues), (0, 0))
+		self.assertEqual(ResumenCorreoPendiente.objects.count(), 1)
+		self.assertEqual(send_digests(now=despues), (1, 1))
+
+
+class NotificationPushTest(TestCase):
+	"""Las notificaciones y sus lecturas se publican al grupo del usuario tras el commit"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='push', email='push@test.com', password='clave12345')
+		self.layer = get_channel_layer()
+		self.channel = async_to_sync(self.layer.new_channel)()
+		async_to_sync(self.layer.group_add)(group_name(self.usuario.id), self.channel)
+
+	def _receive(self):
+		return async_to_sync(self.layer.receive)(self.channel)
+
+	def test_publica_despues_del_commit(self):
+		with self.captureOnCommitCallbacks() as callbacks:
+			notificacion = Notificacion.objects.create(usuario=self.usuario, titulo='Canje', mensaje='Aprobado', tipo='canje_aprobado')
+		self.assertEqual(len(callbacks), 1)
+		callbacks[0]()
+		evento = self._receive()
+		self.assertEqual(evento['type'], 'notification_message')
+		self.assertEqual(evento['notification']['id'], notificacion.id)
+		self.assertEqual(evento['notification']['tipo'], 'canje')
+
+		with self.captureOnCommitCallbacks(execute=True):
+			notificacion.leida = True
+			notificacion.save()
+			# Guardar de nuevo sin cambiar la lectura no publica nada
+			notificacion.save()
+		self.assertEqual(self._receive(), {'type': 'notification_read', 'ids': [notificacion.id]})
+
+	def test_consumer_solo_acepta_al_propio_usuario(self):
+		otro = Usuario.objects.create_user(username='intruso', email='intruso@test.com', password='clave12345')
+
+		async def conectar(usuario):
+			communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/notificaciones/{self.usuario.id}/')
+			communicator.scope['user'] = usuario
+			connected, _ = await communicator.connect()
+			await communicator.disconnect()
+			return connected
+
+		self.assertFalse(async_to_sync(conectar)(otro))
+		self.assertTrue(async_to_sync(conectar)(self.usuario))
+
+
+class UnreadCounterTest(TestCase):
+	"""El contador de no leídas sigue a las notificaciones sin recontarlas"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='contador', email='contador@test.com', password='clave12345')
+
+	def _contador(self):
+		self.usuario.refresh_from_db(fields=['notificaciones_no_leidas'])
+		return self.usuario.notificaciones_no_leidas
+
+	def test_crear_leer_y_borrar(self):
+		notificaciones = [Notificacion.objects.create(usuario=self.usuario, mensaje=f'Aviso {n}') for n in range(4)]
+		Notificacion.objects.create(usuario=self.usuario, mensaje='Ya leída', leida=True)
+		self.assertEqual(self._contador(), 4)
+
+		notificaciones[0].leida = True
+		notificaciones[0].save()
+		notificaciones[0].save()
+		self.assertEqual(self._contador(), 3)
+
+		notificaciones[1].delete()
+		self.assertEqual(self._contador(), 2)
+
+		self.assertEqual(mark_read(self.usuario.id, Notificacion.objects.filter(pk=notificaciones[2].pk)), 1)
+		self.assertEqual(self._contador(), 1)
+		self.assertEqual(mark_read(self.usuario.id), 1)
+		self.assertEqual(mark_read(self.usuario.id), 0)
+		self.assertEqual(self._contador(), 0)
+
+	def test_reconciliacion_corrige_desvios(self):
+		Notificacion.objects.create(usuario=self.usuario, mensaje='Aviso')
+		Notificacion.objects.create(usuario=self.usuario, mensaje='Otro aviso')
+		# Un .update() directo no pasa por el contador
+		Notificacion.objects.filter(usuario=self.usuario).update(leida=True)
+		Usuario.objects.filter(pk=self.usuario.pk).update(notificaciones_no_leidas=7)
+		otro = Usuario.objects.create_user(username='sin_avisos', email='sin_avisos@test.com', password='clave12345')
+
+		self.assertEqual(reconcile_unread_counters(), 1)
+		self.assertEqual(self._contador(), 0)
+		otro.refresh_from_db()
+		self.assertEqual(otro.notificaciones_no_leidas, 0)
+		self.assertEqual(reconcile_unread_counters(), 0)
+
+	def test_save_completo_no_pisa_el_contador(self):
+		# Instancia leída antes de que llegue la notificación (como request.user)
+		leido = Usuario.objects.get(pk=self.usuario.pk)
+		Notificacion.objects.create(usuario=self.usuario, mensaje='Aviso')
+		leido.terminos_aceptados = True
+		leido.save()
+		self.assertEqual(self._contador(), 1)
+		self.assertTrue(Usuario.objects.get(pk=self.usuario.pk).terminos_aceptados)
+
+
+class NotificationRetentionTest(TestCase):
+	"""Las partidas repetidas se agrupan y las notificaciones vencidas se borran o archivan"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='retencion', email='retencion@test.com', password='clave12345')
+
+	def _crear(self, dias=0, **kwargs):
+		notificacion = Notificacion.objects.create(usuario=self.usuario, mensaje='Aviso', **kwargs)
+		Notificacion.objects.filter(pk=notificacion.pk).update(fecha_creacion=timezone.now() - timedelta(days=dias))
+		return notificacion
+
+	@override_settings(NOTIFICATION_RETENTION_CHUNK=2)
+	def test_agrupa_partidas_repetidas(self):
+		for n in range(5):
+			self._crear(titulo='¡Puntos de juego ganados!', tipo='juego', leida=n != 1)
+		self._crear(titulo='Otra partida', tipo='juego')
+		self._crear(titulo='Canje Aprobado', tipo='canje_aprobado')
+		self._crear(titulo='Canje Aprobado', tipo='canje_aprobado')
+
+		self.assertEqual(compact_notifications(), 4)
+		agrupada = Notificacion.objects.get(titulo='¡Puntos de juego ganados!')
+		self.assertEqual(agrupada.repeticiones, 5)
+		# Una de las agrupadas no estaba leída
+		self.assertFalse(agrupada.leida)
+		self.assertEqual(Notificacion.objects.filter(titulo='Canje Aprobado').count(), 2)
+		self.usuario.refresh_from_db()
+		self.assertEqual(self.usuario.notificaciones_no_leidas, 4)
+
+	@override_settings(NOTIFICATION_RETENTION_CHUNK=2)
+	def test_ttl_por_tipo(self):
+		self._crear(dias=8, tipo='juego')
+		self._crear(dias=8, tipo='juego', leida=True)
+		reciente = self._crear(dias=1, tipo='juego')
+		self._crear(dias=100, tipo='seguridad', titulo='Alerta de Seguridad')
+		seguridad_vigente = self._crear(dias=30, tipo='seguridad')
+		self._crear(dias=200, tipo='sistema')
+		self._crear(dias=200, tipo='canje_aprobado')
+
+		self.assertEqual(expire_notifications(), {'borradas': 3, 'archivadas': 2})
+		self.assertCountEqual(Notificacion.objects.values_list('pk', flat=True), [reciente.pk, seguridad_vigente.pk])
+		self.assertCountEqual(NotificacionArchivada.objects.values_list('tipo', flat=True), ['seguridad', 'canje_aprobado'])
+		self.usuario.refresh_from_db()
+		self.assertEqual(self.usuario.notificaciones_no_leidas, 2)
+
+
+class NotificationBroadcastTest(TestCase):
+	"""La difusión crea una notificación por destinatario en lotes y la publica tras cada commit"""
+
+	def setUp(self):
+		self.conductores = [
+			Usuario.objects.create_user(username=f'conductor{n}', email=f'conductor{n}@test.com', password='clave12345', role='conductor')
+			for n in range(5)
+		]
+		self.usuario = Usuario.objects.create_user(username='vecino', email='vecino@test.com', password='clave12345')
+
+	@override_settings(NOTIFICATION_BROADCAST_CHUNK=2)
+	def test_difusion_por_rol_en_lotes(self):
+		layer = get_channel_layer()
+		channel = async_to_sync(layer.new_channel)()
+		async_to_sync(layer.group_add)(group_name(self.conductores[4].id), channel)
+		avances = []
+
+		with self.captureOnCommitCallbacks(execute=True) as callbacks:
+			resultado = broadcast(
+				'Cambio de horario', 'Las rutas inician a las 6am',
+				usuarios=target_users(roles=['conductor']),
+				progress=lambda enviadas, total, segundos: avances.append((enviadas, total)),
+			)
+		self.assertEqual(resultado['usuarios'], 5)
+		self.assertEqual(resultado['lotes'], 3)
+		self.assertEqual(len(callbacks), 3)
+		self.assertEqual(avances, [(2, 5), (4, 5), (5, 5)])
+		self.assertEqual(Notificacion.objects.filter(titulo='Cambio de horario').count(), 5)
+		self.assertFalse(Notificacion.objects.filter(usuario=self.usuario).exists())
+		self.assertEqual(
+			list(Usuario.objects.filter(role='conductor').values_list('notificaciones_no_leidas', flat=True).distinct()), [1]
+		)
+		evento = async_to_sync(layer.receive)(channel)
+		self.assertEqual(evento['notification']['titulo'], 'Cambio de horario')
+
+	def test_destinatarios_por_zona(self):
+		for _ in range(2):
+			Ruta.objects.create(usuario=self.usuario, fecha=timezone.now().date(), hora='08:00', barrio='Norte', direccion='Calle 1')
+		self.assertEqual(list(target_users(zona='norte')), [self.usuario])
+		self.assertFalse(target_users(zona='Sur').exists())
+
+	def test_alerta_se_difunde_fuera_de_la_peticion(self):
+		admin = Usuario.objects.create_user(username='adminalertas', email='adminalertas@test.com', password='clave12345', role='admin')
+		self.client.force_login(admin)
+		with self.settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]):
+			response = self.client.post(reverse('add_alerta'), {
+				'nombre': 'Cierre de punto', 'descripcion': 'El punto norte cierra hoy', 'notificar': 'on', 'rol': 'conductor',
+			})
+		self.assertEqual(response.json()['status'], 'success')
+		# La petición solo deja la difusión en cola
+		self.assertFalse(Notificacion.objects.filter(titulo='Cierre de punto').exists())
+		difusion = DifusionPendiente.objects.get()
+		self.assertEqual((difusion.estado, difusion.roles), ('pendiente', ['conductor']))
+
+		self.assertEqual(dispatch_queued_broadcasts(), {'enviadas': 1, 'fallidas': 0})
+		self.assertEqual(Notificacion.objects.filter(titulo='Cierre de punto').count(), 5)
+		difusion.refresh_from_db()
+		self.assertEqual((difusion.estado, difusion.usuarios), ('enviada', 5))
+		self.assertEqual(dispatch_queued_broadcasts(), {'enviadas': 0, 'fallidas': 0})
+
+
+class QueryPlanTest(TestCase):
+	"""Las consultas de las rutas calientes deben resolverse con un índice"""
+
+	def test_consultas_frecuentes_usan_indices(self):
+		self.assertEqual(check_hot_queries(), {})
+
+	def test_detecta_recorrido_completo(self):
+		plan = explain(Canje.objects.filter(notas='sin índice'))
+		self.assertTrue(full_scans(plan, Canje._meta.db_table))
+
+
+@override_settings(PROFILER_ENABLED=True, PROFILER_SAMPLE_RATE=1, PROFILER_FLUSH_SECONDS=3600)
+class ProfilerTest(TestCase):
+	"""El perfilador acumula consultas, plantillas y latencia por vista"""
+
+	def test_mide_vista_y_plantillas(self):
+		middleware = [m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]
+		with self.settings(MIDDLEWARE=middleware):
+			self.client.get(reverse('terminos_condiciones'))
+			self.client.get(reverse('terminos_condiciones'))
+		self.assertEqual(flush_profiles(), 1)
+
+		perfil = PerfilVista.objects.get(vista='terminos_condiciones')
+		self.assertEqual(perfil.peticiones, 2)
+		self.assertGreater(perfil.tiempo_plantillas, 0)
+		self.assertGreaterEqual(perfil.latencia, perfil.tiempo_plantillas)
+		self.assertGreaterEqual(perfil.latencia_max * 2, perfil.latencia)
+
+	def test_agrupa_consultas_repetidas(self):
+		self.assertEqual(
+			fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+			fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+		)
+
+		usuarios = [Usuario.objects.create_user(username=f'perfil{i}', email=f'perfil{i}@test.com', password='clave12345') for i in range(3)]
+
+		def vista(request):
+			request.resolver_match = type('Match', (), {'view_name': 'n_mas_uno'})()
+			for usuario in usuarios:
+				list(Notificacion.objects.filter(usuario=usuario))
+			return HttpResponse()
+
+		ProfilerMiddleware(vista)(RequestFactory().get('/'))
+		flush_profiles()
+		perfil = PerfilVista.objects.get(vista='n_mas_uno')
+		self.assertEqual(perfil.consultas, 3)
+		self.assertEqual(list(perfil.duplicadas.values()), [{'veces': 3, 'peticiones': 1}])
+
+
+class HistoryAnalyticsTest(TestCase):
+	"""El historial se agrega en la BD y se pagina por (fecha, id)"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='historial', email='historial@test.com', password='clave12345')
+		vidrio = MaterialTasa.objects.create(nombre='Vidrio', puntos_por_kilo=10)
+		papel = MaterialTasa.objects.create(nombre='Papel', puntos_por_kilo=5)
+		Canje.objects.create(usuario=self.usuario, material=vidrio, peso=2, estado='aprobado')
+		Canje.objects.create(usuario=self.usuario, material=vidrio, peso=1, peso_real=3, puntos_finales=30, estado='aprobado')
+		Canje.objects.create(usuario=self.usuario, material=papel, peso=4, estado='aprobado')
+		Canje.objects.create(usuario=self.usuario, material=papel, peso=9, estado='pendiente')
+
+	def test_totales_y_desglose(self):
+		totales = history_totals(self.usuario)
+		self.assertEqual((totales['canjes'], totales['puntos'], float(totales['peso'])), (3, 70, 9.0))
+		self.assertEqual(material_breakdown(self.usuario), [
+			{'material': 'Papel', 'canjes': 1, 'puntos': 20, 'peso': 4.0},
+			{'material': 'Vidrio', 'canjes': 2, 'puntos': 50, 'peso': 5.0},
+		])
+		mensual = monthly_history(self.usuario)
+		self.assertEqual((len(mensual['meses']), mensual['puntos'][-1], mensual['canjes'][-1]), (12, 70, 3))
+
+		self.client.force_login(self.usuario)
+		with self.settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]):
+			respuesta = self.client.get(reverse('historial'))
+		self.assertEqual(respuesta.context['total_puntos'], 70)
+
+	def test_paginacion_con_fechas_iguales(self):
+		Canje.objects.filter(usuario=self.usuario).update(fecha_solicitud=timezone.now())
+		pagina, siguiente = canjes_page(self.usuario, limit=3)
+		resto, fin = canjes_page(self.usuario, before_id=siguiente, limit=3)
+		ids = [c.id for c in pagina + resto]
+		self.assertIsNone(fin)
+		self.assertEqual(ids, sorted(Canje.objects.filter(usuario=self.usuario).values_list('id', flat=True), reverse=True))
+		with self.assertNumQueries(0):
+			[c.material.nombre for c in pagina]
+
+
+class ConditionalGetTest(TestCase):
+	"""Los endpoints consultados periódicamente responden 304 mientras su recurso no cambie"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='etag', email='etag@test.com', password='clave12345')
+		self.client.force_login(self.usuario)
+		self.middleware = [m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]
+
+	def test_notificaciones_304_hasta_que_cambian(self):
+		with self.settings(MIDDLEWARE=self.middleware):
+			primera = self.client.get(reverse('get_notifications'))
+			etag = primera['ETag']
+			with CaptureQueriesContext(connection) as queries:
+				repetida = self.client.get(reverse('get_notifications'), HTTP_IF_NONE_MATCH=etag)
+			self.assertEqual(repetida.status_code, 304)
+			self.assertFalse([q for q in queries.captured_queries if 'core_notificacion' in q['sql']])
+
+			with self.captureOnCommitCallbacks(execute=True):
+				Notificacion.objects.create(usuario=self.usuario, titulo='Nueva', mensaje='Hola')
+			nueva = self.client.get(reverse('get_notifications'), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(nueva.status_code, 200)
+		self.assertNotEqual(nueva['ETag'], etag)
+		self.assertEqual(nueva.json()['notifications'][0]['titulo'], 'Nueva')
+
+	def test_version_cambia_despues_del_commit(self):
+		antes = versions(['canjes'])
+		with self.captureOnCommitCallbacks() as callbacks:
+			bump('canjes')
+			self.assertEqual(versions(['canjes']), antes)
+		callbacks[0]()
+		self.assertNotEqual(versions(['canjes']), antes)
+
+
+class CanjeAdminTest(TestCase):
+	"""Las acciones en lote del admin de canjes mantienen al día lo que depende de los canjes"""
+
+	def setUp(self):
+		self.admin = Usuario.objects.create_user(username='admincanjes', email='admincanjes@test.com', password='clave12345', is_staff=True)
+		self.usuario = Usuario.objects.create_user(username='reciclador', email='reciclador@test.com', password='clave12345')
+		self.material = MaterialTasa.objects.create(nombre='Cartón', puntos_por_kilo=10)
+		self.canje = Canje.objects.create(usuario=self.usuario, material=self.material, peso=2, puntos=20)
+
+	def _accion(self, nombre):
+		request = RequestFactory().post('/admin/core/canje/')
+		request.user = self.admin
+		request.session = {}
+		request._messages = FallbackStorage(request)
+		with self.captureOnCommitCallbacks(execute=True):
+			getattr(CanjeAdmin(Canje, admin.site), nombre)(request, Canje.objects.filter(pk=self.canje.pk))
+
+	def test_acciones_cambian_la_version_de_canjes(self):
+		for accion in ('marcar_en_revision', 'rechazar_canjes'):
+			antes = versions(['canjes'])
+			self._accion(accion)
+			self.assertNotEqual(versions(['canjes']), antes)
+
+	def test_rechazo_en_lote_descuenta_del_resumen(self):
+		self.canje.estado = 'aprobado'
+		self.canje.save()
+		self.assertEqual(ResumenActividad.objects.get(usuario=self.usuario).canjes_aprobados, 1)
+
+		self._accion('rechazar_canjes')
+		resumen = ResumenActividad.objects.get(usuario=self.usuario)
+		self.assertEqual((resumen.canjes_aprobados, float(resumen.total_kg)), (0, 0.0))
+		self.assertEqual(Canje.objects.get(pk=self.canje.pk).estado, 'rechazado')
+
+
+class SessionMonitorTest(TestCase):
+	"""El monitor de sesiones pide solo las sesiones cambiadas desde su cursor"""
+
+	def setUp(self):
+		self.admin = Usuario.objects.create_user(username='monitor', email='monitor@test.com', password='clave12345', is_staff=True)
+		self.usuario = Usuario.objects.create_user(username='sesiones', email='sesiones@test.com', password='clave12345')
+		self.sesiones = [
+			SesionUsuario.objects.create(
+				usuario=self.usuario if i else self.admin,
+				token_sesion=f'token-monitor-{i}',
+				dispositivo_id=f'dispositivo-{i}',
+				ip_address='127.0.0.1',
+				user_agent='',
+				fecha_expiracion=timezone.now() + timedelta(minutes=20)
+			)
+			for i in range(3)
+		]
+		# update() no toca fecha_actualizacion: las sesiones quedan fuera del cursor actual
+		SesionUsuario.objects.update(fecha_actualizacion=timezone.now() - timedelta(hours=1))
+
+	def test_cambios_desde_el_cursor(self):
+		cambios, cursor, completo = changes_since(current_cursor())
+		self.assertEqual((cambios, completo), ([], True))
+
+		SecurityManager.invalidate_all_user_sessions(self.usuario)
+		ahora = timezone.now() + timedelta(seconds=30)
+		cambios, siguiente, completo = changes_since(cursor, ahora)
+		self.assertTrue(completo)
+		self.assertEqual(sorted(c['id'] for c in cambios), [s.id for s in self.sesiones[1:]])
+		self.assertFalse(any(c['activa'] for c in cambios))
+
+		# El cursor siguiente ya no devuelve las mismas sesiones
+		cambios, _, _ = changes_since(siguiente, ahora)
+		self.assertEqual(cambios, [])
+
+	def test_refresh_sin_cambios_responde_304(self):
+		self.client.force_login(self.admin)
+		url = reverse('monitor_sesiones_refresh')
+		with self.settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'SessionGuard' not in m]):
+			primera = self.client.get(url, {'desde': current_cursor()}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+			# El cliente repite la petición con el cursor recibido
+			segunda = self.client.get(
+				url, {'desde': primera.json()['cursor']}, HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_IF_NONE_MATCH=primera['ETag']
+			)
+		self.assertEqual(primera.json()['cambios'], [])
+		self.assertEqual(segunda.status_code, 304)
+
+	def test_consumer_avisa_solo_a_administradores(self):
+		async def conectar(usuario, recibir=False):
+			communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/monitor-sesiones/')
+			communicator.scope['user'] = usuario
+			connected, _ = await communicator.connect()
+			mensaje = None
+			if connected and recibir:
+				await get_channel_layer().group_send(MONITOR_GROUP, {'type': 'sessions_changed'})
+				mensaje = await communicator.receive_json_from()
+			await communicator.disconnect()
+			return connected, mensaje
+
+		self.assertEqual(async_to_sync(conectar)(self.usuario), (False, None))
+		self.assertEqual(async_to_sync(conectar)(self.admin, recibir=True), (True, {'type': 'sessions_changed'}))
+
+
+class SecurityRetentionTest(TestCase):
+	"""Las sesiones e intentos antiguos se archivan por lotes sin perder los totales de los rollups"""
+
+	def setUp(self):
+		self.usuario = Usuario.objects.create_user(username='retencion', email='retencion@test.com', password='clave12345')
+		self.antes = timezone.now() - timedelta(days=400)
+
+	def _sesion(self, i, activa=False, fecha=None):
+		sesion = SesionUsuario.objects.create(
+			usuario=self.usuario, token_sesion=f'token-retencion-{i}', dispositivo_id='dispositivo', ip_address='127.0.0.1',
+			user_agent='', activa=activa, fecha_expiracion=timezone.now() + timedelta(minutes=20)
+		)
+		SesionUsuario.objects.filter(pk=sesion.pk).update(fecha_creacion=fecha or self.antes)
+		return sesion
+
+	def _intento(self, fecha=None):
+		intento = IntentoAcceso.objects.create(ip_address='10.0.0.1', user_agent='', url_intento='http://test/', motivo='token_invalido')
+		IntentoAcceso.objects.filter(pk=intento.pk).update(fecha_intento=fecha or self.antes)
+		return intento
+
+	def test_archiva_vencidas_y_conserva_rollups(self):
+		vieja = self._sesion(1)
+		activa = self._sesion(2, activa=True)
+		reciente = self._sesion(3, fecha=timezone.now())
+		self._intento()
+		self._intento()
+		self._intento(fecha=timezone.now())
+
+		with self.captureOnCommitCallbacks(execute=True):
+			resultado = archive_security_rows()
+		self.assertEqual((resultado['sesiones'].filas, resultado['intentos'].filas), (1, 2))
+		self.assertEqual(set(SesionUsuario.objects.values_list('id', flat=True)), {activa.id, reciente.id})
+		self.assertEqual(IntentoAcceso.objects.count(), 1)
+		archivo = ArchivoSeguridad.objects.get(tabla='sesiones')
+		self.assertEqual(read_archive(archivo)[0]['token_sesion'], vieja.token_sesion)
+
+		# Los días archivados quedan congelados aunque se recalcule todo
+		run_rollups(full=True)
+		dia = timezone.localdate(self.antes)
+		self.assertEqual(RollupSeguridadDiaria.objects.get(fecha=dia, motivo='token_invalido').intentos, 2)
+		self.assertEqual(RollupUsuarioDiario.objects.get(fecha=dia, rol=self.usuario.role).sesiones, 2)
+
+	def test_lotes_por_rango_de_id_y_ritmo_en_el_comando(self):
+		intentos = [self._intento() for _ in range(5)]
+		salida = StringIO()
+		with self.settings(SECURITY_RETENTION_CHUNK=2):
+			call_command('cleanup_sessions', stdout=salida)
+		lotes = list(ArchivoSeguridad.objects.filter(tabla='intentos').values_list('primer_id', 'ultimo_id', 'filas'))
+		self.assertEqual(lotes, [
+			(intentos[0].id, intentos[1].id, 2), (intentos[2].id, intentos[3].id, 2), (intentos[4].id, intentos[4].id, 1),
+		])
+		self.assertFalse(IntentoAcceso.objects.exists())
+		self.assertIn('Intentos de acceso archivados: 5 filas en 3 lotes', salida.getvalue())
@@ -0,0 +1,281 @@
+"""
+Motor de throttling compartido entre workers.
+
+Implementa el algoritmo de "ventana deslizante por contadores" (sliding
+window counter): por cada clave solo se guardan dos contadores, el de la
+ventana actual y el de la anterior, y la tasa se estima ponderando el
+contador anterior por la fracción de ventana que aún se solapa. Esto usa
+memoria fija por clave (a diferencia de guardar cada timestamp) y los
+contadores expiran solos tras dos ventanas sin actividad. check() incrementa
+primero el contador actual (incr atómico del backend) y decide con el valor
+que retorna; si rechaza, lo vuelve a decrementar. Así dos workers nunca
+admiten el mismo último intento.
+
+Para flujos con ráfagas (mensajes de WebSocket) ofrece además un token
+bucket en su forma GCRA: por clave solo se guarda el instante teórico de
+llegada (TAT) y la entrada expira cuando el bucket vuelve a estar lleno.
+Leer, comparar y escribir el TAT es un solo paso atómico en el backend (un
+script Lua en RedisThrottleBackend, un candado con add en la caché de
+Django), y take_all() consume de varios buckets solo si todos tienen token.
+
+El estado vive en un backend compartido (por defecto la caché de Django
+indicada en RATELIMIT_USE_CACHE, que en producción es Redis), de modo que el
+límite configurado es el mismo para todos los workers de gunicorn. El
+backend se puede cambiar con el setting THROTTLE_BACKEND.
+"""
+from collections import namedtuple
+import math
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+ThrottleResult = namedtuple('ThrottleResult', ['allowed', 'limit', 'remaining', 'retry_after'])
+
+PERIODOS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+}
+
+_RATE_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\w*\s*$')
+
+# Segundos máximos que se espera (y que dura) el candado de un bucket en CacheThrottleBackend
+LOCK_TIMEOUT = 1
+
+
+def gcra(tat, now, interval, burst):
+    """
+    Paso del token bucket GCRA. Retorna (permitido, valor): el TAT nuevo si
+    se permite o, si no, el instante en que volverá a haber un token.
+    """
+    tat = max(tat or now, now)
+    allow_at = tat + interval - burst * interval
+    if now < allow_at:
+        return False, allow_at
+    return True, tat + interval
+
+
+def parse_rate(rate):
+    """
+    Convierte una tasa tipo '5/m', '100/h' o '10/5m' en (limite, ventana_segundos).
+    Lanza ValueError si el formato no es válido.
+    """
+    match = _RATE_RE.match(rate or '')
+    if not match:
+        raise ValueError(f'Tasa de throttling inválida: {rate!r}')
+    limit, multiplier, period = match.groups()
+    return int(limit), int(multiplier or 1) * PERIODOS[period]
+
+
+class CacheThrottleBackend:
+    """Contadores de throttling sobre la caché de Django (locmem, archivos o Redis)"""
+
+    def __init__(self, alias=None):
+        self.alias = alias or getattr(settings, 'RATELIMIT_USE_CACHE', 'default')
+
+    @property
+    def cache(self):
+        # Se resuelve en cada uso para respetar la conexión del hilo actual
+        return caches[self.alias]
+
+    def get_counts(self, keys):
+        values = self.cache.get_many(keys)
+        return [int(values.get(key, 0) or 0) for key in keys]
+
+    def increment(self, key, timeout):
+        # add es atómico: solo crea el contador si no existe
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # El contador expiró entre add e incr
+            self.cache.set(key, 1, timeout)
+            return 1
+
+    def decrement(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            # El contador ya expiró: no hay nada que devolver
+            pass
+
+    def _lock(self, keys):
+        """Toma el candado de cada clave (en orden, para no bloquearse entre procesos)"""
+        token = uuid.uuid4().hex
+        candados = []
+        for key in sorted(keys):
+            candado = f'{key}:lock'
+            limite = time.monotonic() + LOCK_TIMEOUT
+            # add es atómico: solo un proceso crea el candado
+            while not self.cache.add(candado, token, LOCK_TIMEOUT):
+                if time.monotonic() >= limite:
+                    # El dueño no lo liberó a tiempo (proceso caído): el candado ya expiró o está por expirar
+                    self.cache.set(candado, token, LOCK_TIMEOUT)
+                    break
+                time.sleep(0.002)
+            candados.append(candado)
+        return candados
+
+    def take_tokens(self, buckets, now):
+        """
+        Consume un token de cada bucket (clave, intervalo, ráfaga) solo si
+        todos tienen disponible. Retorna (índice del bucket rechazado o None,
+        valores de gcra() por bucket).
+        """
+        keys = [key for key, _, _ in buckets]
+        candados = self._lock(keys)
+        try:
+            tats = self.cache.get_many(keys)
+            valores = []
+            for i, (key, interval, burst) in enumerate(buckets):
+                permitido, valor = gcra(tats.get(key), now, interval, burst)
+                if not permitido:
+                    return i, [valor]
+                valores.append(valor)
+            for (key, _, _), new_tat in zip(buckets, valores):
+                # La entrada desaparece cuando el bucket vuelve a estar lleno
+                self.cache.set(key, new_tat, max(1, math.ceil(new_tat - now)))
+            return None, valores
+        finally:
+            self.cache.delete_many(candados)
+
+
+# Mismo paso que gcra() para todos los buckets dentro de Redis.
+# ARGV[1] = now; ARGV[2i] y ARGV[2i + 1] = intervalo y ráfaga del bucket i.
+# Retorna {0, TAT nuevos...} o {i, instante permitido} si el bucket i no tiene token.
+_GCRA_LUA = """
+local now = tonumber(ARGV[1])
+local nuevos = {}
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local tat = tonumber(redis.call('GET', key) or ARGV[1])
+    if tat < now then tat = now end
+    local allow_at = tat + interval - burst * interval
+    if now < allow_at then return {i, tostring(allow_at)} end
+    nuevos[i] = tat + interval
+end
+local valores = {0}
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, tostring(nuevos[i]), 'PX', math.max(1, math.ceil((nuevos[i] - now) * 1000)))
+    valores[i + 1] = tostring(nuevos[i])
+end
+return valores
+"""
+
+
+class RedisThrottleBackend(CacheThrottleBackend):
+    """Como CacheThrottleBackend, pero el token bucket se resuelve con un script Lua en Redis (django-redis)"""
+
+    def __init__(self, alias=None):
+        super().__init__(alias)
+        self._script = None
+
+    def take_tokens(self, buckets, now):
+        if self._script is None:
+            from django_redis import get_redis_connection
+            self._script = get_redis_connection(self.alias).register_script(_GCRA_LUA)
+        args = [repr(now)]
+        for _, interval, burst in buckets:
+            args += [repr(interval), burst]
+        resultado = self._script(keys=[self.cache.make_key(key) for key, _, _ in buckets], args=args)
+        rechazado = int(resultado[0])
+        valores = [float(valor) for valor in resultado[1:]]
+        return (rechazado - 1 if rechazado else None), valores
+
+
+class ThrottleEngine:
+    """Aplica límites de tasa con ventana deslizante sobre un backend compartido"""
+
+    key_prefix = 'throttle'
+
+    def __init__(self, backend=None):
+        self.backend = backend or CacheThrottleBackend()
+
+    def _keys(self, key, window, now):
+        window_start = int(now // window) * window
+        current = f'{self.key_prefix}:{key}:{window}:{window_start}'
+        previous = f'{self.key_prefix}:{key}:{window}:{window_start - window}'
+        return current, previous, now - window_start
+
+    def check(self, key, limit, window, now=None):
+        """
+        Registra un intento para `key` y retorna un ThrottleResult.
+        Los intentos rechazados no se cuentan.
+        """
+        now = time.time() if now is None else now
+        current_key, previous_key, elapsed = self._keys(key, window, now)
+        # Los contadores viven dos ventanas: la actual y la que la sigue
+        current = self.backend.increment(current_key, window * 2)
+        previous, = self.backend.get_counts([previous_key])
+
+        weight = (window - elapsed) / window
+        estimated = previous * weight + current
+
+        if estimated > limit:
+            # El intento rechazado no cuenta
+            self.backend.decrement(current_key)
+            return ThrottleResult(False, limit, 0, self._retry_after(limit, window, elapsed, current - 1, previous))
+
+        remaining = max(0, int(limit - estimated))
+        return ThrottleResult(True, limit, remaining, 0)
+
+    def _retry_after(self, limit, window, elapsed, current, previous):
+        """Segundos hasta que la tasa estimada vuelva a permitir un intento"""
+        remaining_window = window - elapsed
+        if previous and current + 1 <= limit:
+            # Esperar a que el peso de la ventana anterior baje lo suficiente
+            wait = window * (1 - (limit - 1 - current) / previous) - elapsed
+            return max(1, math.ceil(min(wait, remaining_window)))
+        return max(1, math.ceil(remaining_window))
+
+    def take(self, key, limit, window, burst=1, now=None):
+        """
+        Token bucket (GCRA): se reponen `limit` tokens por `window` segundos
+        con capacidad `burst`. Consume un token para `key` si hay disponible
+        y retorna un ThrottleResult.
+        """
+        return self.take_all([(key, limit, window, burst)], now)[1]
+
+    def take_all(self, buckets, now=None):
+        """
+        Consume un token de cada bucket (key, limit, window, burst) solo si
+        todos tienen disponible. Retorna (índice del bucket agotado o None,
+        ThrottleResult de ese bucket o del primero).
+        """
+        now = time.time() if now is None else now
+        specs = [
+            (f'{self.key_prefix}:bucket:{key}:{limit}:{window}', window / limit, burst)
+            for key, limit, window, burst in buckets
+        ]
+        rechazado, valores = self.backend.take_tokens(specs, now)
+        if rechazado is not None:
+            _, _, burst = specs[rechazado]
+            return rechazado, ThrottleResult(False, burst, 0, max(1, math.ceil(valores[0] - now)))
+
+        _, interval, burst = specs[0]
+        remaining = int((now - (valores[0] - burst * interval)) // interval)
+        return None, ThrottleResult(True, burst, max(0, remaining), 0)
+
+
+_engine = None
+
+
+def get_throttle_engine():
+    """Motor de throttling configurado (THROTTLE_BACKEND) para este proceso"""
+    global _engine
+    if _engine is None:
+        backend_path = getattr(settings, 'THROTTLE_BACKEND', 'core.throttle_engine.CacheThrottleBackend')
+        _engine = ThrottleEngine(import_string(backend_path)())
+    return _engine
+
+
+def reset_throttle_engine():
+    """Descarta el motor del proceso (usado al cambiar settings en pruebas)"""
+    global _engine
+    _engine = None
@@ -26,6 +26,7 @@ urlpatterns = [
     path('canjes/', views.canjes, name='canjes'),  # Show the form
     path('canjes/submit/', views.solicitar_canje, name='solicitar_canje'),  # Handle form submission
     path('historial/', views.historial, name='historial'),
+    path('historial/puntos/', views.historial_puntos, name='historial_puntos'),
     path('logros/', views.logros, name='logros'),
     # Edición AJAX superusuario
     path('superuser/obtener-usuario/<int:user_id>/', views_superuser.obtener_usuario_superuser, name='obtener_usuario_superuser'),
@@ -14,8 +14,9 @@ from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.crypto import get_random_string
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from .models import Usuario, Canje, MaterialTasa, RedencionPuntos, Ruta, Alerta, Categoria, Recompensa, Logro, Notificacion, SesionUsuario, IntentoAcceso, FavoritoRecompensa, RutaRecoleccion, ParadaRuta, SeguimientoRecompensa, HistorialSeguimiento
+from .models import RollupCanjeDiario, RollupRedencionDiaria, RollupUsuarioDiario
 # from supabase import create_client  # Temporalmente deshabilitado
 from django.http import JsonResponse
 from decimal import Decimal
@@ -32,6 +33,21 @@ from django.contrib.auth.forms import PasswordChangeForm
 from .forms import ProfileForm
 from django.views.decorators.csrf import csrf_exempt
 from .security import SecurityManager, require_secure_session
+from .session_heartbeat import flush_heartbeats
+from .config_registry import config_registry
+from .activity_summary import current_streak, get_summary, level_progress, monthly_points, record_game_points, weekly_points
+from .fragment_cache import UserFragmentCache
+from .leaderboard import get_leaderboard
+from .resource_versions import conditional_get
+from .session_monitor import changes_since, current_cursor, monitor_stats, sessions_page
+from .history_analytics import canjes_page, history_totals, material_breakdown, monthly_history, profile_totals
+from .email_digest import queue_or_send
+from .notification_broadcast import queue_broadcast
+from .notification_counter import mark_read
+from .notification_push import notification_payload, publish_cleared
+from .points_ledger import SaldoInsuficiente, apply_points, credit_canje, movements_page
+from .rollups import today_rows
+from .timeseries import bucket_labels, bucket_values, bucketed_series, last_months
 from .statistics import StatisticsManager
 from django.http import JsonResponse
 # from .ratelimit import ratelimit_login, ratelimit_canje, ratelimit_chatbot, smart_ratelimit
@@ -303,7 +319,7 @@ def registrate(request):
             # Configurar cuenta para 2FA - INACTIVA hasta verificar email
             user.is_active = False
             user.email_verificado = False
-            user.save()
+            user.save(update_fields=['is_active', 'email_verificado'])
             
             # Enviar código de verificación 2FA
             from .security import TwoFactorManager
@@ -629,7 +645,7 @@ def perfil(request):
                 from django.utils import timezone
                 user.foto_perfil = request.FILES['foto_perfil']
                 user.last_login = timezone.now()  # Actualizar para forzar cache refresh
-                user.save()
+                user.save(update_fields=['foto_perfil', 'last_login'])
                 
                 # Crear notificación de cambio de foto
                 Notificacion.objects.create(
@@ -651,7 +667,9 @@ def perfil(request):
                     'direccion': getattr(user, 'direccion', ''),
                 }
                 
-                profile_form.save()
+                # Guardar solo los campos del formulario para no pisar los puntos
+                profile_form.save(commit=False)
+                user.save(update_fields=profile_form.Meta.fields)
                 
                 # Verificar cambios específicos
                 if old_data['email'] != user.email:
@@ -701,27 +719,27 @@ def perfil(request):
         profile_form = ProfileForm(instance=user)
         password_form = PasswordChangeForm(user)
 
-    # Obtener estadísticas del usuario
-    canjes = Canje.objects.filter(usuario=user).order_by('-fecha_solicitud')
-    redenciones = RedencionPuntos.objects.filter(usuario=user).order_by('-fecha_solicitud')
-    
-    # Estadísticas básicas
-    total_canjes = canjes.count()
-    total_puntos_canjeados = sum(c.puntos for c in canjes if c.estado in ['aprobado', 'completado'])
-    total_dinero = sum(r.valor_cop for r in redenciones if r.estado == 'completado')
+    # Estadísticas básicas agregadas en la BD
+    totales = profile_totals(user)
+    canjes_recientes, _ = canjes_page(user, limit=3)
     
     # Logros del usuario
     logros_usuario = user.logro_set.all()[:3]
     
+    # Últimos movimientos de puntos (libro mayor)
+    movimientos_puntos, movimientos_siguiente = movements_page(user, limit=5)
+    
     context = {
         'profile_form': profile_form,
         'password_form': password_form,
         'user': user,
-        'total_canjes': total_canjes,
-        'total_puntos_canjeados': total_puntos_canjeados,
-        'total_dinero': total_dinero,
-        'canjes_recientes': canjes[:3],
+        'total_canjes': totales['canjes'],
+        'total_puntos_canjeados': totales['puntos'],
+        'total_dinero': totales['dinero'],
+        'canjes_recientes': canjes_recientes,
         'logros_usuario': logros_usuario,
+        'movimientos_puntos': movimientos_puntos,
+        'movimientos_siguiente': movimientos_siguiente,
     }
     return render(request, 'core/perfil.html', context)
 
@@ -739,12 +757,18 @@ def categorias(request):
 
 @login_required
 def juego_plasticos(request):
-    """Vista para el juego de clasificación de plásticos"""
+    """
+    Vista para el juego de clasificación de plásticos.
+
+    El progreso se guarda en Usuario.puntos_juego (el mismo campo que ordena
+    el ranking 'juego_plasticos'); puntos_juego_plasticos solo es el nombre
+    que usa la plantilla y no existe en el modelo.
+    """
     if request.method == 'POST':
         # Verificar si es una solicitud de canje
         if request.POST.get('canje') == 'true':
             puntos_canje = int(request.POST.get('puntos_canje', 0))
-            puntos_juego_actuales = getattr(request.user, 'puntos_juego_plasticos', 0)
+            puntos_juego_actuales = getattr(request.user, 'puntos_juego', 0)
             
             # Verificar que el usuario tenga suficientes puntos
             if puntos_canje <= puntos_juego_actuales and puntos_canje >= 2:
@@ -752,9 +776,10 @@ def juego_plasticos(request):
                 ecopuntos_ganados = puntos_canje // 2
                 
                 # Actualizar puntos del usuario
-                request.user.puntos_juego_plasticos = puntos_juego_actuales - puntos_canje
-                request.user.puntos += ecopuntos_ganados
-                request.user.save()
+                request.user.puntos_juego = puntos_juego_actuales - puntos_canje
+                request.user.save(update_fields=['puntos_juego'])
+                apply_points(request.user, ecopuntos_ganados, 'juego', descripcion='Canje de puntos del juego de plásticos')
+                record_game_points(request.user, ecopuntos_ganados)
                 
                 # Crear notificación
                 Notificacion.objects.create(
@@ -766,7 +791,7 @@ def juego_plasticos(request):
                 
                 return JsonResponse({
                     'success': True,
-                    'puntos_juego_restantes': request.user.puntos_juego_plasticos,
+                    'puntos_juego_restantes': request.user.puntos_juego,
                     'ecopuntos_totales': request.user.puntos,
                     'ecopuntos_ganados': ecopuntos_ganados
                 })
@@ -784,7 +809,7 @@ def juego_plasticos(request):
         if 0 <= puntos_ganados <= 50:
             # Sistema de conversión: cada 10,000 puntos del juego = 10 puntos canjeables
             # Obtener puntos de juego acumulados del usuario (usando un campo personalizado o sesión)
-            puntos_juego_actuales = getattr(request.user, 'puntos_juego_plasticos', 0)
+            puntos_juego_actuales = getattr(request.user, 'puntos_juego', 0)
             puntos_juego_totales = puntos_juego_actuales + puntos_ganados
             
             # Calcular puntos canjeables
@@ -793,13 +818,14 @@ def juego_plasticos(request):
             puntos_canjeables_ganados = puntos_canjeables_nuevos - puntos_canjeables_anteriores
             
             # Actualizar puntos de juego del usuario
-            request.user.puntos_juego_plasticos = puntos_juego_totales
+            request.user.puntos_juego = puntos_juego_totales
+            request.user.save(update_fields=['puntos_juego'])
             
             # Si se ganaron puntos canjeables, agregarlos
             if puntos_canjeables_ganados > 0:
-                request.user.puntos += puntos_canjeables_ganados
+                apply_points(request.user, puntos_canjeables_ganados, 'juego', descripcion='Puntos del juego de plásticos')
             
-            request.user.save()
+            record_game_points(request.user, puntos_canjeables_ganados)
             
             # Crear notificación apropiada
             if puntos_canjeables_ganados > 0:
@@ -815,7 +841,7 @@ def juego_plasticos(request):
                     usuario=request.user,
                     titulo='¡Puntos de juego ganados!',
                     mensaje=f'Has ganado {puntos_ganados} puntos en el juego. Total: {puntos_juego_totales}. Necesitas {puntos_restantes} puntos más para obtener puntos canjeables.',
-                    tipo='info'
+                    tipo='juego'
                 )
             
             return JsonResponse({
@@ -835,7 +861,7 @@ def juego_plasticos(request):
     context = {
         'user': request.user,
         'puntos_actuales': request.user.puntos,
-        'puntos_juego_plasticos': getattr(request.user, 'puntos_juego_plasticos', 0)
+        'puntos_juego_plasticos': getattr(request.user, 'puntos_juego', 0)
     }
     return render(request, 'core/juego_plasticos.html', context)
 
@@ -855,8 +881,9 @@ def juego_vidrios(request):
                 
                 # Actualizar puntos del usuario
                 request.user.puntos_juego_vidrios = puntos_juego_actuales - puntos_canje
-                request.user.puntos += ecopuntos_ganados
-                request.user.save()
+                request.user.save(update_fields=['puntos_juego_vidrios'])
+                apply_points(request.user, ecopuntos_ganados, 'juego', descripcion='Canje de puntos del juego de vidrios')
+                record_game_points(request.user, ecopuntos_ganados)
                 
                 # Crear notificación
                 Notificacion.objects.create(
@@ -896,12 +923,13 @@ def juego_vidrios(request):
             
             # Actualizar puntos de juego del usuario
             request.user.puntos_juego_vidrios = puntos_juego_totales
+            request.user.save(update_fields=['puntos_juego_vidrios'])
             
             # Si se ganaron puntos canjeables, agregarlos
             if puntos_canjeables_ganados > 0:
-                request.user.puntos += puntos_canjeables_ganados
+                apply_points(request.user, puntos_canjeables_ganados, 'juego', descripcion='Puntos del juego de vidrios')
             
-            request.user.save()
+            record_game_points(request.user, puntos_canjeables_ganados)
             
             # Crear notificación apropiada
             if puntos_canjeables_ganados > 0:
@@ -917,7 +945,7 @@ def juego_vidrios(request):
                     usuario=request.user,
                     titulo='¡Fábrica de vidrio en acción!',
                     mensaje=f'Has procesado {puntos_ganados} cristales. Total: {puntos_juego_totales}. Necesitas {puntos_restantes} cristales más para obtener puntos canjeables. ¡Combo máximo: {combo_maximo}x!',
-                    tipo='info'
+                    tipo='juego'
                 )
             
             return JsonResponse({
@@ -958,8 +986,9 @@ def juego_papel(request):
                 
                 # Actualizar puntos del usuario
                 request.user.puntos_juego_papel = puntos_juego_actuales - puntos_canje
-                request.user.puntos += ecopuntos_ganados
-                request.user.save()
+                request.user.save(update_fields=['puntos_juego_papel'])
+                apply_points(request.user, ecopuntos_ganados, 'juego', descripcion='Canje de puntos del juego de papel')
+                record_game_points(request.user, ecopuntos_ganados)
                 
                 # Crear notificación
                 Notificacion.objects.create(
@@ -998,12 +1027,13 @@ def juego_papel(request):
             
             # Actualizar puntos de juego del usuario
             request.user.puntos_juego_papel = puntos_juego_totales
+            request.user.save(update_fields=['puntos_juego_papel'])
             
             # Si se ganaron puntos canjeables, agregarlos
             if puntos_canjeables_ganados > 0:
-                request.user.puntos += puntos_canjeables_ganados
+                apply_points(request.user, puntos_canjeables_ganados, 'juego', descripcion='Puntos del juego de papel')
             
-            request.user.save()
+            record_game_points(request.user, puntos_canjeables_ganados)
             
             # Crear notificación apropiada
             if puntos_canjeables_ganados > 0:
@@ -1020,7 +1050,7 @@ def juego_papel(request):
                     usuario=request.user,
                     titulo='📄 ¡Fábrica de papel activa!',
                     mensaje=f'Has procesado {puntos_ganados} hojas. Total: {puntos_juego_totales}. Necesitas {puntos_restantes} hojas más para obtener puntos canjeables. ¡Combo máximo: {combo_maximo}x! Árboles salvados: {arboles_salvados}',
-                    tipo='info'
+                    tipo='juego'
                 )
             
             return JsonResponse({
@@ -1063,8 +1093,9 @@ def juego_metales(request):
                 
                 # Actualizar puntos del usuario
                 request.user.puntos_juego_metales = puntos_juego_actuales - puntos_canje
-                request.user.puntos += ecopuntos_ganados
-                request.user.save()
+                request.user.save(update_fields=['puntos_juego_metales'])
+                apply_points(request.user, ecopuntos_ganados, 'juego', descripcion='Canje de puntos del juego de metales')
+                record_game_points(request.user, ecopuntos_ganados)
                 
                 # Crear notificación
                 Notificacion.objects.create(
@@ -1104,12 +1135,13 @@ def juego_metales(request):
             
             # Actualizar puntos de juego del usuario
             request.user.puntos_juego_metales = puntos_juego_totales
+            request.user.save(update_fields=['puntos_juego_metales'])
             
             # Si se ganaron puntos canjeables, agregarlos
             if puntos_canjeables_ganados > 0:
-                request.user.puntos += puntos_canjeables_ganados
+                apply_points(request.user, puntos_canjeables_ganados, 'juego', descripcion='Puntos del juego de metales')
             
-            request.user.save()
+            record_game_points(request.user, puntos_canjeables_ganados)
             
             # Crear notificación apropiada
             if puntos_canjeables_ganados > 0:
@@ -1126,7 +1158,7 @@ def juego_metales(request):
                     usuario=request.user,
                     titulo='🔥 ¡Fundición magnética activa!',
                     mensaje=f'Has fundido {puntos_ganados} metales. Total: {puntos_juego_totales}. Necesitas {puntos_restantes} metales más para obtener puntos canjeables. ¡Combo máximo: {combo_maximo}x! Minería ahorrada: {mineria_ahorrada} toneladas',
-                    tipo='info'
+                    tipo='juego'
                 )
             
             return JsonResponse({
@@ -1154,6 +1186,7 @@ def juego_metales(request):
 
 @login_required
 @throttle_canjes
+@transaction.atomic
 def canjes(request):
     """Vista simplificada para canjes básicos (sin recolección domiciliaria)"""
     from .forms import CanjeSimpleForm
@@ -1181,7 +1214,6 @@ def canjes(request):
             
             # Enviar notificación por email
             try:
-                from django.core.mail import send_mail
                 from django.conf import settings
                 subject = 'Solicitud de Canje Recibida - EcoPuntos'
                 message = f"""
@@ -1200,13 +1232,13 @@ Gracias por reciclar y sumar puntos ecológicos.
 
 Equipo EcoPuntos
 """
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [request.user.email],
-                    fail_silently=False,
-                )
+                # Savepoint propio: un error al encolar no deja rota la transacción de la vista
+                with transaction.atomic():
+                    queue_or_send(
+                        request.user, subject,
+                        f"Recibimos tu solicitud de canje de {peso} kg de {material.nombre}.",
+                        lambda: (message, None)
+                    )
                 print("✅ Email de canje enviado exitosamente")
             except Exception as e:
                 print(f"❌ Error enviando email de canje: {e}")
@@ -1214,11 +1246,12 @@ Equipo EcoPuntos
             # Crear notificación en el sistema
             try:
                 from .views import crear_notificacion
-                crear_notificacion(
-                    request.user,
-                    'Canje Solicitado',
-                    f'Tu solicitud de canje de {peso}kg de {material.nombre} ha sido recibida y está siendo revisada.'
-                )
+                with transaction.atomic():
+                    crear_notificacion(
+                        request.user,
+                        'Canje Solicitado',
+                        f'Tu solicitud de canje de {peso}kg de {material.nombre} ha sido recibida y está siendo revisada.'
+                    )
             except:
                 pass  # Si no funciona la notificación, continuar
             
@@ -1259,91 +1292,82 @@ Equipo EcoPuntos
 def historial(request):
     if not request.user.is_authenticated:
         return redirect('iniciosesion')
-    from .models import Canje, RedencionPuntos
     import json
     
-    # Todos los canjes para mostrar en el historial
-    canjes = Canje.objects.filter(usuario=request.user).order_by('-fecha_solicitud')
-    redenciones = RedencionPuntos.objects.filter(usuario=request.user).order_by('-fecha_solicitud')
-    
-    # Solo canjes aprobados para estadísticas
-    canjes_aprobados = canjes.filter(estado='aprobado')
-    
-    # Estadísticas basadas únicamente en canjes aprobados
-    total_canjes = canjes_aprobados.count()
-    total_puntos = sum(c.puntos_finales or c.puntos for c in canjes_aprobados)
-    total_dinero = sum(r.valor_cop for r in redenciones if r.estado == 'completado')
-    
-    # Calcular peso total reciclado (solo aprobados)
-    total_peso_reciclado = sum(c.peso_real or c.peso for c in canjes_aprobados)
-    
-    # Datos para gráficas (solo canjes aprobados)
-    from collections import defaultdict
-    import datetime
-    puntos_por_mes = defaultdict(int)
-    dinero_por_mes = defaultdict(int)
-    canjes_por_mes = defaultdict(int)
-    materiales_stats = defaultdict(lambda: {'count': 0, 'puntos': 0, 'peso': 0})
-    
-    for c in canjes_aprobados:
-        mes = c.fecha_solicitud.strftime('%Y-%m')
-        mes_nombre = c.fecha_solicitud.strftime('%b')
-        puntos = c.puntos_finales or c.puntos
-        peso = c.peso_real or c.peso
-        
-        puntos_por_mes[mes_nombre] += puntos
-        canjes_por_mes[mes_nombre] += 1
-        
-        # Estadísticas por material
-        material_nombre = c.material.nombre
-        materiales_stats[material_nombre]['count'] += 1
-        materiales_stats[material_nombre]['puntos'] += puntos
-        materiales_stats[material_nombre]['peso'] += float(peso)
-    
-    for r in redenciones:
-        if r.estado == 'completado':
-            mes = r.fecha_solicitud.strftime('%b')
-            dinero_por_mes[mes] += float(r.valor_cop)
-    
-    meses = list({*puntos_por_mes.keys(), *dinero_por_mes.keys(), *canjes_por_mes.keys()})
-    meses.sort(key=lambda m: datetime.datetime.strptime(m, '%b').month)
-    
-    # Preparar datos para gráficas avanzadas
-    materiales_nombres = list(materiales_stats.keys())
-    materiales_counts = [materiales_stats[m]['count'] for m in materiales_nombres]
-    materiales_puntos = [materiales_stats[m]['puntos'] for m in materiales_nombres]
-    materiales_pesos = [round(materiales_stats[m]['peso'], 2) for m in materiales_nombres]
+    # Totales, desglose por material y series mensuales con agregados en la BD
+    totales = history_totals(request.user)
+    materiales = material_breakdown(request.user)
+    mensual = monthly_history(request.user)
+    
+    total_canjes = totales['canjes']
+    total_puntos = totales['puntos']
+    total_peso_reciclado = totales['peso']
     
     # Estadísticas adicionales
     promedio_puntos_por_canje = round(total_puntos / max(total_canjes, 1), 2)
     promedio_peso_por_canje = round(float(total_peso_reciclado) / max(total_canjes, 1), 2)
     
+    # Canjes paginados por fecha (?canjes_antes=<id>)
+    canjes, canjes_siguiente = canjes_page(request.user, _before_id(request, 'canjes_antes'))
+    
+    # Movimientos de puntos paginados por id (?antes=<id>)
+    movimientos_puntos, movimientos_siguiente = movements_page(request.user, _before_id(request))
+    
     context = {
         'canjes': canjes,
-        'redenciones': redenciones,
-        'canjes_aprobados': canjes_aprobados,
+        'canjes_siguiente': canjes_siguiente,
         'total_canjes': total_canjes,
         'total_puntos': total_puntos,
-        'total_dinero': total_dinero,
+        'total_dinero': totales['dinero'],
         'total_peso_reciclado': total_peso_reciclado,
         'promedio_puntos_por_canje': promedio_puntos_por_canje,
         'promedio_peso_por_canje': promedio_peso_por_canje,
         
         # Datos para gráficas básicas
-        'puntos_por_mes_json': json.dumps([puntos_por_mes[m] for m in meses]),
-        'dinero_por_mes_json': json.dumps([dinero_por_mes[m] for m in meses]),
-        'canjes_por_mes_json': json.dumps([canjes_por_mes[m] for m in meses]),
-        'meses_json': json.dumps(meses),
-        'meses': meses,
+        'puntos_por_mes_json': json.dumps(mensual['puntos']),
+        'dinero_por_mes_json': json.dumps(mensual['dinero']),
+        'canjes_por_mes_json': json.dumps(mensual['canjes']),
+        'meses_json': json.dumps(mensual['meses']),
+        'meses': mensual['meses'],
         
         # Datos para gráficas avanzadas
-        'materiales_nombres_json': json.dumps(materiales_nombres),
-        'materiales_counts_json': json.dumps(materiales_counts),
-        'materiales_puntos_json': json.dumps(materiales_puntos),
-        'materiales_pesos_json': json.dumps(materiales_pesos),
+        'materiales_nombres_json': json.dumps([m['material'] for m in materiales]),
+        'materiales_counts_json': json.dumps([m['canjes'] for m in materiales]),
+        'materiales_puntos_json': json.dumps([m['puntos'] for m in materiales]),
+        'materiales_pesos_json': json.dumps([m['peso'] for m in materiales]),
+        
+        # Libro mayor de puntos
+        'movimientos_puntos': movimientos_puntos,
+        'movimientos_siguiente': movimientos_siguiente,
     }
     return render(request, 'core/historial.html', context)
 
+def _before_id(request, param='antes'):
+    try:
+        return int(request.GET.get(param, ''))
+    except ValueError:
+        return None
+
+@login_required
+def historial_puntos(request):
+    """Página JSON de movimientos de puntos del usuario (?antes=<id>)"""
+    movimientos, siguiente = movements_page(request.user, _before_id(request))
+    return JsonResponse({
+        'movimientos': [
+            {
+                'id': movimiento.id,
+                'tipo': movimiento.tipo,
+                'tipo_display': movimiento.get_tipo_display(),
+                'delta': movimiento.delta,
+                'saldo': movimiento.saldo_resultante,
+                'descripcion': movimiento.descripcion,
+                'fecha': movimiento.fecha.isoformat(),
+            }
+            for movimiento in movimientos
+        ],
+        'siguiente': siguiente,
+    })
+
 def logros(request):
     if not request.user.is_authenticated:
         return redirect('iniciosesion')
@@ -1421,36 +1445,47 @@ def recompensas(request):
                 from django.db import transaction
                 from .models import MovimientoStock
                 
-                with transaction.atomic():
-                    # Registrar la redención
-                    redencion = RedencionPuntos.objects.create(
-                        usuario=request.user,
-                        puntos=recompensa.puntos_requeridos,
-                        valor_cop=0,
-                        metodo_pago='nequi',
-                        numero_cuenta='-',
-                        estado='pendiente',
-                    )
+                try:
+                    with transaction.atomic():
+                        # Registrar la redención
+                        redencion = RedencionPuntos.objects.create(
+                            usuario=request.user,
+                            puntos=recompensa.puntos_requeridos,
+                            valor_cop=0,
+                            metodo_pago='nequi',
+                            numero_cuenta='-',
+                            estado='pendiente',
+                        )
                     
-                    # Descontar puntos del usuario
-                    request.user.puntos -= recompensa.puntos_requeridos
-                    request.user.save()
+                        # Descontar puntos del usuario (falla si otro canje ya los gastó)
+                        apply_points(
+                            request.user, -recompensa.puntos_requeridos, 'recompensa', origen=redencion,
+                            descripcion=f'Recompensa {recompensa.nombre}', require_balance=True
+                        )
                     
-                    # Registrar movimiento de stock ANTES de actualizar
-                    stock_anterior = recompensa.stock
-                    MovimientoStock.objects.create(
-                        recompensa=recompensa,
-                        tipo_movimiento='canje',
-                        cantidad_anterior=stock_anterior,
-                        cantidad_nueva=stock_anterior - 1,
-                        cantidad_cambiada=-1,
-                        motivo=f'Canje de recompensa por usuario {request.user.username}',
-                        usuario_responsable=request.user,
-                        canje_relacionado=None  # Podríamos crear un campo para RedencionPuntos si es necesario
-                    )
+                        # Registrar movimiento de stock ANTES de actualizar
+                        stock_anterior = recompensa.stock
+                        MovimientoStock.objects.create(
+                            recompensa=recompensa,
+                            tipo_movimiento='canje',
+                            cantidad_anterior=stock_anterior,
+                            cantidad_nueva=stock_anterior - 1,
+                            cantidad_cambiada=-1,
+                            motivo=f'Canje de recompensa por usuario {request.user.username}',
+                            usuario_responsable=request.user,
+                            canje_relacionado=None  # Podríamos crear un campo para RedencionPuntos si es necesario
+                        )
                     
-                    # Descontar stock
-                    recompensa.stock -= 1
+                        # Descontar stock
+                        recompensa.stock -= 1
+                except SaldoInsuficiente:
+                    Notificacion.objects.create(
+                        usuario=request.user,
+                        titulo='Canje no realizado',
+                        mensaje=f'No tienes puntos suficientes para canjear "{recompensa.nombre}": tu saldo cambió mientras se procesaba la solicitud.',
+                        tipo='sistema'
+                    )
+                    return redirect('recompensas')
                 recompensa.veces_canjeada += 1
                 recompensa.save()
                 
@@ -1960,230 +1995,159 @@ def canjeadmin(request):
     }
     return render(request, 'core/canjeadmin.html', context)
 
-from django.db import connection
-from django.views.decorators.cache import cache_page
-from django.core.cache import cache
-
-@cache_page(60)  # Cache la página por 60 segundos
-def dashusuario(request):
-    if not request.user.is_authenticated:
-        return redirect('iniciosesion')
-    
-    user = request.user
-    # Verificar si el usuario está inactivo o suspendido
-    if not user.is_active:
-        return redirect('usuario_desactivado')
-    elif hasattr(user, 'suspended') and user.suspended:
-        return redirect('usuario_suspendido')
-        
-    # Usar el debugger de Django para ver las consultas SQL
-    connection.queries
-    
-    # Definir los niveles y puntos requeridos
-    levels = {
-        'guardian_verde': 0,
-        'defensor_planeta': 100,
-        'heroe_eco': 500,
-        'embajador_ambiental': 1000,
-        'leyenda_sustentable': 2000,
+def _dashboard_stats(user):
+    """Tarjetas de estadísticas del dashboard desde el resumen de actividad"""
+    try:
+        resumen = get_summary(user)
+    except Exception as e:
+        print(f"✗ Error obteniendo resumen de actividad: {e}")
+        resumen = None
+    return {
+        'resumen': resumen,
+        'canjes_count': resumen.total_canjes if resumen else 0,
+        'weekly_points': weekly_points(resumen) if resumen else 0,
+        'monthly_points': monthly_points(resumen) if resumen else 0,
+        'current_streak': current_streak(resumen) if resumen else 1,
     }
-    
-    current_level = 'guardian_verde'
-    next_level_points = 0
-    next_level_name = 'N/A'
 
-    sorted_levels = sorted(levels.items(), key=lambda item: item[1])
 
-    for i, (name, points_needed) in enumerate(sorted_levels):
-        if user.puntos >= points_needed:
-            current_level = name
-            if i + 1 < len(sorted_levels):
-                next_level_name = sorted_levels[i+1][0]
-                next_level_points = sorted_levels[i+1][1]
-            else:
-                next_level_name = 'Máximo Nivel'
-                next_level_points = user.puntos # Already at max, show current points
-        else:
-            if i > 0:
-                # This is the first level where user.puntos is less than points_needed
-                # So, the previous level is the current level, and this is the next.
-                next_level_name = name
-                next_level_points = points_needed
-            break # Found the level, no need to check further
-    
-    # Calcular progreso para el siguiente nivel
-    progress_from = 0
-    if current_level != 'Máximo Nivel':
-        for name, points_needed in sorted_levels:
-            if name == current_level:
-                progress_from = points_needed
-                break
-
-    # Evitar división por cero si el siguiente nivel es 0 puntos
-    if next_level_points - progress_from > 0:
-        progress_percentage = ((user.puntos - progress_from) / (next_level_points - progress_from)) * 100
-    else:
-        progress_percentage = 100 # Si ya alcanzó o superó el siguiente nivel (o es el nivel inicial sin un siguiente)
-    # Calcular puntos restantes para el siguiente nivel
-    points_needed = max(0, next_level_points - user.puntos) if next_level_name != 'Máximo Nivel' else 0
-    
-    # Obtener estadísticas del usuario
+def _dashboard_recent(user):
+    """Canjes, logros y actividad reciente del dashboard"""
+    from datetime import timedelta
+    from django.utils import timezone
+
     recent_exchanges = []
     logros_usuario = []
-    notificaciones = []
-    recompensas_favoritas = []
-    
+    recent_activities = []
+
     try:
         # Obtener canjes recientes
-        recent_exchanges = Canje.objects.filter(usuario=user).order_by('-fecha_solicitud')[:5]
-        print("✓ Canjes recientes obtenidos correctamente")
+        recent_exchanges = list(
+            Canje.objects.filter(usuario=user).select_related('material').order_by('-fecha_solicitud')[:5]
+        )
     except Exception as e:
         print(f"✗ Error obteniendo canjes recientes: {e}")
-        
+
     try:
         # Obtener logros del usuario
-        logros_usuario = Logro.objects.filter(usuario=user)[:5]
-        print("✓ Logros obtenidos correctamente")
+        logros_usuario = list(Logro.objects.filter(usuario=user)[:5])
     except Exception as e:
         print(f"✗ Error obteniendo logros: {e}")
-        
-    try:
-        # Obtener notificaciones recientes
-        notificaciones = Notificacion.objects.filter(usuario=user, leida=False)[:5]
-        print("✓ Notificaciones obtenidas correctamente")
-    except Exception as e:
-        print(f"✗ Error obteniendo notificaciones: {e}")
-        
-    try:
-        # Obtener recompensas favoritas
-        favoritos_ids = FavoritoRecompensa.objects.filter(usuario=user).values_list('recompensa_id', flat=True)
-        recompensas_favoritas = Recompensa.objects.filter(id__in=favoritos_ids)[:3]
-        print("✓ Recompensas favoritas obtenidas correctamente")
-    except Exception as e:
-        print(f"✗ Error obteniendo recompensas favoritas: {e}")
-    
-    # Obtener categorías activas
-    try:
-        categorias = Categoria.objects.filter(activa=True).exclude(nombre__in=[
-            'Electrónicos',
-            'Hogar Y Jardín',
-            'Deportes Y Fitness',
-            'Alimentación',
-            'Belleza Y Cuidado Personal',
-            'Libros Y Educación',
-        ])
-    except Exception as e:
-        print(f"✗ Error obteniendo categorías: {e}")
-        categorias = []
 
-    # Calcular el número total de canjes
-    canjes_count = recent_exchanges.count() if recent_exchanges else 0
-    
-    # Datos para Centro de Actividad Reciente
     try:
-        from datetime import datetime, timedelta
-        from django.utils import timezone
-        
-        # Actividades recientes (últimos 10 días)
-        recent_activities = []
-        
-        # Agregar canjes recientes
-        recent_canjes = Canje.objects.filter(
-            usuario=user, 
-            fecha_solicitud__gte=timezone.now() - timedelta(days=10)
-        ).order_by('-fecha_solicitud')[:3]
-        
-        for canje in recent_canjes:
+        # Agregar canjes recientes (últimos 10 días)
+        limite_canjes = timezone.now() - timedelta(days=10)
+        for canje in [c for c in recent_exchanges if c.fecha_solicitud >= limite_canjes][:3]:
             recent_activities.append({
                 'tipo': 'canje',
                 'descripcion': f'Canjeaste {canje.peso}kg de {canje.material.nombre}',
                 'fecha': canje.fecha_solicitud,
                 'puntos': canje.puntos,
             })
-        
-        # Agregar logros recientes
-        recent_logros = Logro.objects.filter(
-            usuario=user,
-            fecha_creacion__gte=timezone.now() - timedelta(days=30)
-        ).order_by('-fecha_creacion')[:2]
-        
-        for logro in recent_logros:
+
+        # Agregar logros recientes (últimos 30 días)
+        limite_logros = timezone.now() - timedelta(days=30)
+        for logro in [l for l in logros_usuario if l.fecha_creacion >= limite_logros][:2]:
             recent_activities.append({
                 'tipo': 'logro',
                 'descripcion': f'Desbloqueaste el logro "{logro.descripcion}"',
                 'fecha': logro.fecha_creacion,
                 'puntos': getattr(logro, 'puntos', 0),
             })
-        
+
         # Ordenar actividades por fecha
         recent_activities = sorted(recent_activities, key=lambda x: x['fecha'], reverse=True)[:5]
-        
-        # Estadísticas de la semana
-        week_start = timezone.now() - timedelta(days=7)
-        weekly_canjes = Canje.objects.filter(
-            usuario=user,
-            fecha_solicitud__gte=week_start,
-            estado__in=['aprobado', 'completado']
+    except Exception as e:
+        print(f"✗ Error calculando datos de actividad reciente: {e}")
+        recent_activities = []
+
+    return {
+        'recent_exchanges': recent_exchanges,
+        'logros_usuario': logros_usuario,
+        'recent_activities': recent_activities,
+    }
+
+
+def _dashboard_rewards(user):
+    """Recompensas favoritas y próxima recompensa alcanzable"""
+    recompensas_favoritas = []
+    next_reward = None
+    next_reward_points_remaining = 0
+
+    try:
+        # Obtener recompensas favoritas
+        recompensas_favoritas = list(
+            Recompensa.objects.filter(favoritorecompensa__usuario=user)[:3]
         )
-        weekly_points = sum(canje.puntos for canje in weekly_canjes) or 0
-        
-        # Calcular racha actual (días consecutivos con actividad)
-        current_streak = 1
-        for i in range(1, 30):  # Revisar últimos 30 días
-            date_check = timezone.now().date() - timedelta(days=i)
-            day_activity = Canje.objects.filter(
-                usuario=user,
-                fecha_solicitud__date=date_check
-            ).exists()
-            if day_activity:
-                current_streak += 1
-            else:
-                break
-        
+    except Exception as e:
+        print(f"✗ Error obteniendo recompensas favoritas: {e}")
+
+    try:
         # Próxima recompensa alcanzable
         next_reward = Recompensa.objects.filter(
             puntos_requeridos__gt=user.puntos,
             activa=True
         ).order_by('puntos_requeridos').first()
-        
+
         # Calcular puntos restantes
-        next_reward_points_remaining = 0
         if next_reward:
             next_reward_points_remaining = next_reward.puntos_requeridos - user.puntos
         else:
             # Si no hay próxima recompensa, usar el siguiente nivel
             next_reward_points_remaining = max(0, 1000 - user.puntos)
-        
     except Exception as e:
-        print(f"✗ Error calculando datos de actividad reciente: {e}")
-        recent_activities = []
-        weekly_points = 0
-        current_streak = 1
-        next_reward = None
-        next_reward_points_remaining = 0
-    
-    context = {
-        'user': user,
-        'current_level': current_level,
-        'next_level_name': next_level_name,
-        'next_level_points': next_level_points,
-        'progress_from': progress_from,
-        'progress_percentage': min(100, progress_percentage),
-        'points_needed': points_needed,
-        'levels': levels,
-        'recent_exchanges': recent_exchanges,
-        'logros_usuario': logros_usuario,
-        'notificaciones': notificaciones,
+        print(f"✗ Error obteniendo próxima recompensa: {e}")
+
+    return {
         'recompensas_favoritas': recompensas_favoritas,
-        'categorias': categorias,
-        'canjes_count': canjes_count,
-        # Nuevos datos para Centro de Actividad Reciente
-        'recent_activities': recent_activities,
-        'weekly_points': weekly_points,
-        'current_streak': current_streak,
         'next_reward': next_reward,
         'next_reward_points_remaining': next_reward_points_remaining,
     }
+
+
+def dashusuario(request):
+    if not request.user.is_authenticated:
+        return redirect('iniciosesion')
+    
+    user = request.user
+    # Verificar si el usuario está inactivo o suspendido
+    if not user.is_active:
+        return redirect('usuario_desactivado')
+    elif hasattr(user, 'suspended') and user.suspended:
+        return redirect('usuario_suspendido')
+    
+    # Bloques costosos cacheados por usuario y versión de sus datos
+    fragments = UserFragmentCache(user)
+    context = {
+        'user': user,
+        # Nivel y progreso hacia el siguiente nivel
+        **fragments.get_or_set('level', lambda: level_progress(user.puntos), user.puntos),
+        **fragments.get_or_set('stats', lambda: _dashboard_stats(user)),
+        **fragments.get_or_set('recent', lambda: _dashboard_recent(user)),
+        **fragments.get_or_set('rewards', lambda: _dashboard_rewards(user), user.puntos),
+    }
+    
+    try:
+        # Obtener notificaciones recientes (cambian con frecuencia, no se cachean)
+        context['notificaciones'] = Notificacion.objects.filter(usuario=user, leida=False)[:5]
+    except Exception as e:
+        print(f"✗ Error obteniendo notificaciones: {e}")
+        context['notificaciones'] = []
+    
+    # Obtener categorías activas
+    try:
+        context['categorias'] = Categoria.objects.filter(activa=True).exclude(nombre__in=[
+            'Electrónicos',
+            'Hogar Y Jardín',
+            'Deportes Y Fitness',
+            'Alimentación',
+            'Belleza Y Cuidado Personal',
+            'Libros Y Educación',
+        ])
+    except Exception as e:
+        print(f"✗ Error obteniendo categorías: {e}")
+        context['categorias'] = []
+    
     return render(request, 'core/dashusuario.html', context)
 
 def is_admin(user):
@@ -2272,32 +2236,27 @@ def conductor_graficas(request):
         return JsonResponse({'error': 'No autorizado'}, status=403)
     
     from django.db.models import Count
-    from django.utils import timezone
-    from datetime import timedelta
     
-    # Canjes por estado
-    canjes_pendientes = Canje.objects.filter(estado='pendiente').count()
-    canjes_aprobados = Canje.objects.filter(estado='aprobado').count()
-    canjes_rechazados = Canje.objects.filter(estado='rechazado').count()
+    # Canjes por estado (una sola consulta agrupada)
+    canjes_por_estado = dict(
+        Canje.objects.filter(estado__in=['pendiente', 'aprobado', 'rechazado'])
+        .values_list('estado').annotate(total=Count('id')).order_by()
+    )
     
     # Rutas por mes (últimos 6 meses)
-    hoy = timezone.now()
-    rutas_por_mes = []
-    for i in range(5, -1, -1):
-        mes_inicio = (hoy - timedelta(days=30*i)).replace(day=1)
-        mes_fin = (mes_inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        count = Ruta.objects.filter(
-            fecha__gte=mes_inicio,
-            fecha__lte=mes_fin,
-            estado='reagendada'
-        ).count()
-        rutas_por_mes.append(count)
+    rutas_por_mes = bucket_values(
+        bucketed_series(
+            Ruta.objects.filter(estado='reagendada'), 'fecha', *last_months(6), 'month',
+            total=Count('id')
+        ),
+        'total'
+    )
     
     return JsonResponse({
         'canjes_por_estado': {
-            'pendiente': canjes_pendientes,
-            'aprobado': canjes_aprobados,
-            'rechazado': canjes_rechazados
+            'pendiente': canjes_por_estado.get('pendiente', 0),
+            'aprobado': canjes_por_estado.get('aprobado', 0),
+            'rechazado': canjes_por_estado.get('rechazado', 0)
         },
         'rutas_por_mes': rutas_por_mes
     })
@@ -2326,12 +2285,20 @@ def estadisticasadmin(request):
     import json
     import calendar
     
-    # Obtener estadísticas generales
+    # Obtener estadísticas generales; los días anteriores salen de los rollups diarios y el de hoy, en vivo
+    hoy = timezone.localdate()
+    canjes_aprobados = RollupCanjeDiario.objects.filter(estado='aprobado', fecha__lt=hoy)
+    canjes_hoy = [fila for fila in today_rows('canjes', hoy) if fila['estado'] == 'aprobado']
+    redenciones_hoy = [fila for fila in today_rows('redenciones', hoy) if fila['estado'] == 'completado']
+    redenciones_completadas = RollupRedencionDiaria.objects.filter(estado='completado', fecha__lt=hoy).aggregate(
+        total_puntos=Sum('puntos_total'),
+        total=Sum('cantidad')
+    )
     total_points_assigned = Usuario.objects.aggregate(total=Sum('puntos'))['total'] or 0
-    total_points_redeemed = RedencionPuntos.objects.filter(estado='completado').aggregate(total=Sum('puntos'))['total'] or 0
+    total_points_redeemed = (redenciones_completadas['total_puntos'] or 0) + sum(fila['puntos_total'] for fila in redenciones_hoy)
     total_users = Usuario.objects.count()
-    total_canjes = Canje.objects.filter(estado='aprobado').count()
-    total_redenciones = RedencionPuntos.objects.filter(estado='completado').count()
+    total_canjes = (canjes_aprobados.aggregate(total=Sum('cantidad'))['total'] or 0) + sum(fila['cantidad'] for fila in canjes_hoy)
+    total_redenciones = (redenciones_completadas['total'] or 0) + sum(fila['cantidad'] for fila in redenciones_hoy)
     
     # Estadísticas adicionales de administrador
     # Definir fecha límite para cálculos de tiempo
@@ -2354,7 +2321,9 @@ def estadisticasadmin(request):
         avg_points_per_user = avg_points_per_user / total_users
     
     # Usuarios nuevos (últimos 30 días)
-    usuarios_nuevos = Usuario.objects.filter(date_joined__gte=fecha_limite).count()
+    usuarios_nuevos = (RollupUsuarioDiario.objects.filter(
+        fecha__gte=timezone.localdate(fecha_limite), fecha__lt=hoy
+    ).aggregate(total=Sum('nuevos_usuarios'))['total'] or 0) + sum(fila['nuevos_usuarios'] for fila in today_rows('usuarios', hoy))
     
     # Distribución por género - Campo no disponible en el modelo
     usuarios_masculino = 0
@@ -2370,12 +2339,19 @@ def estadisticasadmin(request):
     redenciones_pendientes = RedencionPuntos.objects.filter(estado='pendiente').count()
     
     # Total de peso reciclado
-    total_peso_reciclado = Canje.objects.filter(estado='aprobado').aggregate(total=Sum('peso'))['total'] or 0
+    total_peso_reciclado = (canjes_aprobados.aggregate(total=Sum('peso_total'))['total'] or 0) + sum(fila['peso_total'] for fila in canjes_hoy)
     
     # Top 5 materiales más canjeados
-    top_materials_raw = Canje.objects.filter(estado='aprobado').values('material__nombre').annotate(
-        total_peso=Sum('peso')
-    ).order_by('-total_peso')[:5]
+    peso_por_material = dict(
+        canjes_aprobados.values('material_id').annotate(total_peso=Sum('peso_total')).values_list('material_id', 'total_peso')
+    )
+    for fila in canjes_hoy:
+        peso_por_material[fila['material_id']] = peso_por_material.get(fila['material_id'], 0) + fila['peso_total']
+    nombres_materiales = dict(MaterialTasa.objects.filter(id__in=peso_por_material).values_list('id', 'nombre'))
+    top_materials_raw = [
+        {'material__nombre': nombres_materiales.get(material_id, ''), 'total_peso': total_peso}
+        for material_id, total_peso in sorted(peso_por_material.items(), key=lambda item: item[1], reverse=True)[:5]
+    ]
     
     # Calcular porcentajes para los materiales
     total_peso_all = sum([m['total_peso'] for m in top_materials_raw]) if top_materials_raw else 1
@@ -2392,43 +2368,28 @@ def estadisticasadmin(request):
     usuarios_activos = Usuario.objects.filter(last_login__gte=fecha_limite).count()
     usuarios_inactivos = total_users - usuarios_activos
     
-    # Datos para gráfico de canjes por mes (últimos 12 meses)
-    canjes_labels = []
-    canjes_data = []
+    # Datos para gráficos por mes (últimos 12 meses), una consulta por serie
+    month_start, month_end = last_months(12)
     
-    for i in range(11, -1, -1):
-        month_date = now - timedelta(days=30*i)
-        month_name = calendar.month_name[month_date.month]
-        year = month_date.year
-        
-        # Contar canjes del mes
-        canjes_count = Canje.objects.filter(
-            estado='aprobado',
-            fecha_solicitud__year=year,
-            fecha_solicitud__month=month_date.month
-        ).aggregate(total_puntos=Sum('puntos'))['total_puntos'] or 0
-        
-        canjes_labels.append(f"{month_name[:3]} {year}")
-        canjes_data.append(canjes_count)
-    
-    # Datos para gráfico de redenciones por mes (últimos 12 meses)
-    redenciones_labels = []
-    redenciones_data = []
+    canjes_series = bucketed_series(
+        canjes_aprobados, 'fecha', month_start, month_end, 'month',
+        total_puntos=Sum('puntos_total')
+    )
+    canjes_labels = [
+        f"{calendar.month_name[point['bucket'].month][:3]} {point['bucket'].year}" for point in canjes_series
+    ]
+    canjes_data = bucket_values(canjes_series, 'total_puntos')
+    canjes_data[-1] += sum(fila['puntos_total'] for fila in canjes_hoy)
     
-    for i in range(11, -1, -1):
-        month_date = now - timedelta(days=30*i)
-        month_name = calendar.month_name[month_date.month]
-        year = month_date.year
-        
-        # Contar redenciones del mes
-        redenciones_count = RedencionPuntos.objects.filter(
-            estado='completado',
-            fecha_solicitud__year=year,
-            fecha_solicitud__month=month_date.month
-        ).aggregate(total_puntos=Sum('puntos'))['total_puntos'] or 0
-        
-        redenciones_labels.append(f"{month_name[:3]} {year}")
-        redenciones_data.append(redenciones_count)
+    redenciones_series = bucketed_series(
+        RollupRedencionDiaria.objects.filter(estado='completado', fecha__lt=hoy), 'fecha', month_start, month_end, 'month',
+        total_puntos=Sum('puntos_total')
+    )
+    redenciones_labels = [
+        f"{calendar.month_name[point['bucket'].month][:3]} {point['bucket'].year}" for point in redenciones_series
+    ]
+    redenciones_data = bucket_values(redenciones_series, 'total_puntos')
+    redenciones_data[-1] += sum(fila['puntos_total'] for fila in redenciones_hoy)
     
     context = {
         'total_points_assigned': total_points_assigned,
@@ -2654,15 +2615,9 @@ def edit_ruta(request, ruta_id):
                     </html>
                     """
                     
-                    # Enviar correo
-                    msg = EmailMultiAlternatives(
-                        subject,
-                        f"Tu recolección ha sido reagendada para el {fecha_formateada} a las {hora_formateada}.",
-                        settings.DEFAULT_FROM_EMAIL,
-                        [usuario.email]
-                    )
-                    msg.attach_alternative(html_content, "text/html")
-                    msg.send()
+                    # Enviar correo (o agregarlo al resumen del usuario)
+                    resumen = f"Tu recolección ha sido reagendada para el {fecha_formateada} a las {hora_formateada}."
+                    queue_or_send(usuario, subject, resumen, lambda: (resumen, html_content))
                     
                     # Crear notificación en el sistema
                     Notificacion.objects.create(
@@ -2703,6 +2658,7 @@ def delete_ruta(request, ruta_id):
 
 @ajax_required_admin
 @throttle_general
+@transaction.atomic
 def confirmar_ruta(request, ruta_id):
     if request.method == 'POST':
         try:
@@ -2852,14 +2808,13 @@ def confirmar_ruta(request, ruta_id):
                 EcoPuntos
                 """
                 
-                email = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[usuario.email]
-                )
-                email.attach_alternative(html_content, "text/html")
-                email.send()
+                # Savepoint propio: un error al encolar no deja rota la transacción de la vista
+                with transaction.atomic():
+                    queue_or_send(
+                        usuario, subject,
+                        f"Tu recolección quedó confirmada para el {fecha_formateada} a las {hora_formateada} en {ruta.direccion}.",
+                        lambda: (text_content, html_content)
+                    )
                 
                 print(f"✅ Email de confirmación enviado a {usuario.email}")
             except Exception as e:
@@ -2867,6 +2822,8 @@ def confirmar_ruta(request, ruta_id):
             
             return JsonResponse({'success': True, 'message': 'Ruta confirmada exitosamente.'})
         except Exception as e:
+            # Deshacer los cambios parciales: el error se captura aquí y no llega a transaction.atomic
+            transaction.set_rollback(True)
             return JsonResponse({'success': False, 'message': f'Error al confirmar la ruta: {str(e)}'})
     return JsonResponse({'success': False, 'message': 'Método no permitido.'})
 
@@ -2886,6 +2843,7 @@ def rechazar_ruta(request, ruta_id):
     return JsonResponse({'success': False, 'message': 'Método no permitido.'})
 
 @ajax_required_admin
+@transaction.atomic
 def reagendar_ruta(request, ruta_id):
     if request.method == 'POST':
         try:
@@ -3009,25 +2967,25 @@ def reagendar_ruta(request, ruta_id):
                 EcoPuntos - Cuidando el planeta juntos 🌍
                 """
                 
-                msg = EmailMultiAlternatives(
-                    subject,
-                    text_content,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [usuario.email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                msg.send()
+                # Savepoint propio: un error al encolar no deja rota la transacción de la vista
+                with transaction.atomic():
+                    queue_or_send(
+                        usuario, subject,
+                        f"Tu ruta de recolección fue reagendada para el {fecha_formateada} a las {hora_formateada}." + (f" Motivo: {notas}" if notas else ""),
+                        lambda: (text_content, html_content)
+                    )
                 print(f"✅ Correo de reagendamiento enviado a {usuario.email}")
                 
                 # Crear notificación en el sistema para el modal
                 from .models import Notificacion
-                Notificacion.objects.create(
-                    usuario=usuario,
-                    titulo="Recolección Reagendada",
-                    mensaje=f"Tu recolección ha sido reagendada para el {fecha_formateada} a las {hora_formateada}. {f'Motivo: {notas}' if notas else ''}",
-                    tipo='sistema',
-                    leida=False  # Importante: debe estar como no leída para que aparezca el modal
-                )
+                with transaction.atomic():
+                    Notificacion.objects.create(
+                        usuario=usuario,
+                        titulo="Recolección Reagendada",
+                        mensaje=f"Tu recolección ha sido reagendada para el {fecha_formateada} a las {hora_formateada}. {f'Motivo: {notas}' if notas else ''}",
+                        tipo='sistema',
+                        leida=False  # Importante: debe estar como no leída para que aparezca el modal
+                    )
                 print(f"✅ Notificación de reagendamiento creada para {usuario.username}")
                 
             except Exception as e:
@@ -3035,10 +2993,13 @@ def reagendar_ruta(request, ruta_id):
             
             return JsonResponse({'success': True, 'message': 'Ruta reagendada exitosamente.'})
         except Exception as e:
+            # Deshacer los cambios parciales: el error se captura aquí y no llega a transaction.atomic
+            transaction.set_rollback(True)
             return JsonResponse({'success': False, 'message': f'Error al reagendar la ruta: {str(e)}'})
     return JsonResponse({'success': False, 'message': 'Método no permitido.'})
 
 @ajax_required_admin
+@transaction.atomic
 def procesar_canje(request, canje_id):
     print(f"🔍 DEBUG: procesar_canje llamado con canje_id={canje_id}")
     if request.method == 'POST':
@@ -3063,8 +3024,7 @@ def procesar_canje(request, canje_id):
                 canje.save()
                 
                 # Sumar puntos al usuario
-                canje.usuario.puntos += canje.puntos
-                canje.usuario.save()
+                credit_canje(canje, realizado_por=request.user)
                 
                 # Crear notificación para el usuario
                 Notificacion.objects.create(
@@ -3077,7 +3037,6 @@ def procesar_canje(request, canje_id):
                 # Enviar correo de confirmación de canje aprobado
                 print(f"🔍 DEBUG: Iniciando envío de correo a {canje.usuario.email}")
                 try:
-                    from django.core.mail import send_mail
                     from django.conf import settings
                     
                     subject = f'¡Canje Aprobado! +{canje.puntos} puntos - EcoPuntos'
@@ -3098,13 +3057,13 @@ Los puntos han sido agregados automáticamente a tu cuenta.
 Equipo EcoPuntos
 """
                     
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [canje.usuario.email],
-                        fail_silently=False,
-                    )
+                    # Savepoint propio: un error al encolar no deja rota la transacción de la vista
+                    with transaction.atomic():
+                        queue_or_send(
+                            canje.usuario, subject,
+                            f"Tu canje de {canje.material.nombre} ({canje.peso} kg) fue aprobado: +{canje.puntos} puntos.",
+                            lambda: (message, None)
+                        )
                     print(f"✅ Email de canje aprobado enviado exitosamente a {canje.usuario.email}")
                 except Exception as e:
                     # Si falla el correo, continuar sin interrumpir el proceso
@@ -3185,16 +3144,13 @@ def inicioadmin(request):
             # Primero autenticar con Django
             user = authenticate(request, username=username, password=password)
             if user is not None and user.role in ['admin', 'superuser', 'conductor']:
-                # Crear sesión segura
+                # Crear sesión segura (guarda secure_token y device_id en la sesión)
                 from .security import SecurityManager
-                session_token = SecurityManager.create_secure_session(request, user)
+                SecurityManager.create_secure_session(request, user)
                 
                 # Hacer login
                 auth_login(request, user)
                 
-                # Guardar token en la sesión
-                request.session['session_token'] = session_token
-                
                 # Redirigir según el rol
                 if user.role == 'superuser':
                     messages.success(request, f'Bienvenido/a Superusuario {user.username}!')
@@ -3310,6 +3266,7 @@ def get_pending_canjes(request):
     })
 
 @ajax_required_admin
+@conditional_get(lambda request: ['canjes'])
 def get_pending_canjes_for_admin(request):
     canjes = Canje.objects.filter(
         estado__in=['pendiente', 'aprobado']
@@ -3347,8 +3304,7 @@ def aprobar_canje(request, canje_id):
         
         # Actualizar puntos del usuario
         usuario = canje.usuario
-        usuario.puntos += canje.puntos
-        usuario.save()
+        credit_canje(canje, realizado_por=request.user)
         
         # Crear notificación para el usuario
         Notificacion.objects.create(
@@ -3369,6 +3325,7 @@ def aprobar_canje(request, canje_id):
 
 @require_POST
 @throttle_general
+@transaction.atomic
 def aprobar_canje_peso_real(request, canje_id):
     """Aprobar canje con peso real ingresado por conductor/admin"""
     # Verificar permisos: staff o conductor
@@ -3416,8 +3373,7 @@ def aprobar_canje_peso_real(request, canje_id):
         
         # Actualizar puntos del usuario
         usuario = canje.usuario
-        usuario.puntos += puntos
-        usuario.save()
+        credit_canje(canje, realizado_por=request.user)
         
         # Crear notificación para el usuario
         Notificacion.objects.create(
@@ -3521,14 +3477,13 @@ def aprobar_canje_peso_real(request, canje_id):
             EcoPuntos - Cuidando el planeta juntos 🌍
             """
             
-            msg = EmailMultiAlternatives(
-                subject,
-                text_content,
-                settings.DEFAULT_FROM_EMAIL,
-                [usuario.email]
-            )
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
+            # Savepoint propio: un error al encolar no deja rota la transacción de la vista
+            with transaction.atomic():
+                queue_or_send(
+                    usuario, subject,
+                    f"Tu canje de {canje.material.nombre} ({peso_real} kg) fue aprobado: +{puntos} puntos.",
+                    lambda: (text_content, html_content)
+                )
             print(f"✅ Correo de aprobación enviado a {usuario.email}")
         except Exception as e:
             print(f"❌ Error enviando correo de aprobación: {e}")
@@ -3546,6 +3501,8 @@ def aprobar_canje_peso_real(request, canje_id):
             'error': 'Canje no encontrado.'
         }, status=404)
     except Exception as e:
+        # Deshacer los cambios parciales: el error se captura aquí y no llega a transaction.atomic
+        transaction.set_rollback(True)
         return JsonResponse({
             'success': False,
             'error': f'Error al aprobar el canje: {str(e)}'
@@ -3670,14 +3627,11 @@ def rechazar_canje_ajax(request, canje_id):
             EcoPuntos - Cuidando el planeta juntos 🌍
             """
             
-            msg = EmailMultiAlternatives(
-                subject,
-                text_content,
-                settings.DEFAULT_FROM_EMAIL,
-                [usuario.email]
+            queue_or_send(
+                usuario, subject,
+                f"Tu canje de {canje.material.nombre} ({canje.cantidad} kg) no fue aprobado.",
+                lambda: (text_content, html_content)
             )
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
             print(f"✅ Correo de rechazo enviado a {usuario.email}")
         except Exception as e:
             print(f"❌ Error enviando correo de rechazo: {e}")
@@ -3715,33 +3669,11 @@ def recuperar_password(request):
 
 # Helper function to get monthly data for charts
 def get_monthly_data(model, date_field, value_field, start_date, end_date):
-    data = {}
-    current_date = start_date
-    while current_date <= end_date:
-        month_key = current_date.strftime('%Y-%m')
-        data[month_key] = 0
-        current_date += timedelta(days=32) # Move to next month
-        current_date = current_date.replace(day=1)
-
-    # Fetch actual data
-    monthly_sums = model.objects.filter(
-        **{f'{date_field}__date__range': (start_date, end_date)}
-    ).extra({'month': "TO_CHAR({}, 'YYYY-MM')".format(date_field)}).values('month').annotate(total=Sum(value_field))
-
-    for item in monthly_sums:
-        data[item['month']] = item['total'] or 0
-
-    labels = []
-    values = []
-    current_date = start_date
-    while current_date <= end_date:
-        month_key = current_date.strftime('%Y-%m')
-        labels.append(current_date.strftime('%b %Y'))
-        values.append(data[month_key])
-        current_date += timedelta(days=32) # Move to next month
-        current_date = current_date.replace(day=1)
-
-    return labels, values
+    series = bucketed_series(
+        model.objects.all(), date_field, start_date, end_date, 'month',
+        total=Sum(value_field)
+    )
+    return bucket_labels(series, '%b %Y'), bucket_values(series, 'total')
 
 
 @ajax_required_admin
@@ -3761,24 +3693,13 @@ def get_dashboard_stats(request):
 
 @ajax_required_admin
 def get_chart_data(request):
-    today = date.today()
-    # Monthly Canjes
-    monthly_canjes_data = []
-    monthly_canjes_labels = []
-    for i in range(6, -1, -1): # Last 7 months including current
-        month_date = today - timedelta(days=30*i) # Approximate month
-        start_of_month = month_date.replace(day=1)
-        if month_date.month == 12:
-            end_of_month = month_date.replace(year=month_date.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            end_of_month = month_date.replace(month=month_date.month + 1, day=1) - timedelta(days=1)
-
-        canjes_count = Canje.objects.filter(
-            fecha_solicitud__range=(start_of_month, end_of_month),
-            estado='aprobado'
-        ).count()
-        monthly_canjes_data.append(canjes_count)
-        monthly_canjes_labels.append(month_date.strftime('%b'))
+    # Monthly Canjes (last 7 months including current, one grouped query)
+    monthly_canjes = bucketed_series(
+        RollupCanjeDiario.objects.filter(estado='aprobado'), 'fecha', *last_months(7), 'month',
+        total=Sum('cantidad')
+    )
+    monthly_canjes_data = bucket_values(monthly_canjes, 'total')
+    monthly_canjes_labels = bucket_labels(monthly_canjes, '%b')
 
     # Popular Rutas (assuming each Ruta has a 'count' or 'usage' field, or we count canjes related to routes)
     # For now, let's assume we count unique Canjes associated with a Ruta, or simply count Ruta objects if they represent usage.
@@ -3802,7 +3723,23 @@ def add_alerta(request):
     if request.method == 'POST':
         nombre = request.POST.get('nombre')
         descripcion = request.POST.get('descripcion')
-        Alerta.objects.create(nombre=nombre, descripcion=descripcion)
+        es_admin = request.user.is_authenticated and request.user.role in ['superuser', 'admin']
+        notificar = es_admin and request.POST.get('notificar') == 'on'
+        with transaction.atomic():
+            Alerta.objects.create(nombre=nombre, descripcion=descripcion)
+            # Difundir la alerta como notificación (solo administradores); la
+            # entrega el worker send_queued_broadcasts cuando se confirma la transacción
+            if notificar:
+                queue_broadcast(
+                    nombre, descripcion,
+                    roles=[request.POST['rol']] if request.POST.get('rol') else None,
+                    zona=request.POST.get('zona'),
+                )
+        if notificar:
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Alerta agregada. La notificación se enviará a los usuarios en unos segundos.',
+            })
         return JsonResponse({'status': 'success', 'message': 'Alerta agregada correctamente.'})
     return JsonResponse({'status': 'error', 'message': 'Método no permitido.'}, status=405)
 
@@ -3939,22 +3876,11 @@ def delete_configuracion(request):
 
 def get_config(nombre, default=None):
     """
-    Obtiene el valor de una configuración por su nombre.
+    Obtiene el valor tipado de una configuración por su nombre.
     Si no existe, retorna el valor por defecto.
+    Los valores se sirven desde el registro en memoria (ver core.config_registry).
     """
-    try:
-        config = Configuracion.objects.get(nombre=nombre)
-        if config.tipo == 'numero':
-            return float(config.valor)
-        elif config.tipo == 'booleano':
-            return config.valor.lower() == 'true'
-        elif config.tipo == 'json':
-            return json.loads(config.valor)
-        return config.valor
-    except Configuracion.DoesNotExist:
-        return default
-    except (ValueError, json.JSONDecodeError):
-        return default
+    return config_registry.get(nombre, default)
 
 # Funciones helper para configuraciones específicas
 def get_config_puntos(nombre, default=None):
@@ -4282,14 +4208,20 @@ def agendar_ruta_usuario(request):
 
 @login_required
 def ranking(request):
-    # Obtener el top 10 usuarios ordenados por puntos
-    top_usuarios = Usuario.objects.all().order_by('-puntos')[:10]
+    # Top 10 por puntos y sus kg reciclados desde los tableros de ranking
+    leaderboard = get_leaderboard()
+    top_puntos = leaderboard.top('puntos', 10)
+    usuarios = Usuario.objects.in_bulk([entry['usuario_id'] for entry in top_puntos])
+    kg_por_usuario = leaderboard.scores('kg', list(usuarios))
 
     # Calcular el máximo reciclado para la barra de progreso
     max_kg = 0
     ranking_data = []
-    for user in top_usuarios:
-        kg_reciclado = Canje.objects.filter(usuario=user, estado='aprobado').aggregate(total_kg=Sum('peso'))['total_kg'] or 0
+    for entry in top_puntos:
+        user = usuarios.get(entry['usuario_id'])
+        if user is None:
+            continue
+        kg_reciclado = kg_por_usuario.get(user.id, 0)
         if kg_reciclado > max_kg:
             max_kg = kg_reciclado
         ranking_data.append({
@@ -4300,6 +4232,7 @@ def ranking(request):
             'level': user.level,
             'role': user.role,
             'puntos': user.puntos,
+            'posicion': entry['posicion'],
             'kg_reciclado': kg_reciclado,
             'foto_perfil': user.foto_perfil.url if user.foto_perfil else None
         })
@@ -4311,41 +4244,42 @@ def ranking(request):
         else:
             user['porcentaje'] = 0
 
-    # Estadísticas generales
+    # Estadísticas generales y gráficas desde los rollups diarios de canjes; el día de hoy se suma en vivo
+    hoy = timezone.localdate()
+    canjes_aprobados = RollupCanjeDiario.objects.filter(estado='aprobado', fecha__lt=hoy)
+    canjes_hoy = [fila for fila in today_rows('canjes', hoy) if fila['estado'] == 'aprobado']
+    kg_hoy = sum(fila['peso_total'] for fila in canjes_hoy)
     total_usuarios = Usuario.objects.count()
-    total_reciclado = Canje.objects.filter(estado='aprobado').aggregate(total_kg=Sum('peso'))['total_kg'] or 0
-    reciclado_mes = Canje.objects.filter(estado='aprobado', fecha_solicitud__month=timezone.now().month).aggregate(total_kg=Sum('peso'))['total_kg'] or 0
+    total_reciclado = (canjes_aprobados.aggregate(total_kg=Sum('peso_total'))['total_kg'] or 0) + kg_hoy
+    reciclado_mes = (canjes_aprobados.filter(fecha__gte=hoy.replace(day=1)).aggregate(total_kg=Sum('peso_total'))['total_kg'] or 0) + kg_hoy
 
     lider_actual = ranking_data[0] if ranking_data else None
 
     # Datos para gráfica mensual (últimos 8 meses)
-    from django.db.models.functions import TruncMonth
-    hoy = timezone.now()
-    meses = [(hoy - timedelta(days=30*i)).replace(day=1) for i in reversed(range(8))]
-    mensual_labels = [m.strftime('%b %Y') for m in meses]
-    mensual_data = []
-    for m in meses:
-        total_mes = Canje.objects.filter(estado='aprobado', fecha_solicitud__year=m.year, fecha_solicitud__month=m.month).aggregate(total_kg=Sum('peso'))['total_kg'] or 0
-        mensual_data.append(float(total_mes))
+    mensual = bucketed_series(canjes_aprobados, 'fecha', *last_months(8, hoy), 'month', total_kg=Sum('peso_total'))
+    mensual_labels = bucket_labels(mensual, '%b %Y')
+    mensual_data = bucket_values(mensual, 'total_kg', float)
+    mensual_data[-1] += float(kg_hoy)
 
     # Datos para gráfica semanal (últimas 8 semanas)
-    from django.db.models.functions import TruncWeek
-    semanas = [(hoy - timedelta(days=7*i)).date() for i in reversed(range(8))]
-    semanal_labels = [s.strftime('Semana %W') for s in semanas]
-    semanal_data = []
-    for s in semanas:
-        inicio_semana = s - timedelta(days=s.weekday())
-        fin_semana = inicio_semana + timedelta(days=6)
-        total_semana = Canje.objects.filter(estado='aprobado', fecha_solicitud__date__gte=inicio_semana, fecha_solicitud__date__lte=fin_semana).aggregate(total_kg=Sum('peso'))['total_kg'] or 0
-        semanal_data.append(float(total_semana))
+    semanal = bucketed_series(canjes_aprobados, 'fecha', hoy - timedelta(days=7 * 7), hoy, 'week', total_kg=Sum('peso_total'))
+    semanal_labels = bucket_labels(semanal, 'Semana %W')
+    semanal_data = bucket_values(semanal, 'total_kg', float)
+    semanal_data[-1] += float(kg_hoy)
 
     # Datos anuales por categoría
     year = hoy.year
+    kg_por_material = dict(
+        canjes_aprobados.filter(fecha__year=year).values('material_id')
+        .annotate(total_kg=Sum('peso_total')).values_list('material_id', 'total_kg')
+    )
+    for fila in canjes_hoy:
+        kg_por_material[fila['material_id']] = (kg_por_material.get(fila['material_id']) or 0) + fila['peso_total']
     categorias = MaterialTasa.objects.filter(activo=True)
     categorias_data = []
     total_kg_anual = 0
     for cat in categorias:
-        kg_cat = Canje.objects.filter(estado='aprobado', material=cat, fecha_solicitud__year=year).aggregate(total_kg=Sum('peso'))['total_kg'] or 0
+        kg_cat = kg_por_material.get(cat.id) or 0
         categorias_data.append({
             'nombre': cat.nombre,
             'kg': float(kg_cat),
@@ -4472,8 +4406,10 @@ def rechazar_redencion(request, redencion_id):
             
             # Devolver los puntos al usuario
             usuario = redencion.usuario
-            usuario.puntos += redencion.puntos
-            usuario.save()
+            apply_points(
+                usuario, redencion.puntos, 'devolucion_redencion', origen=redencion,
+                descripcion='Redención rechazada', realizado_por=request.user, once=True
+            )
             
             # Actualizar estado de la redención
             redencion.estado = 'rechazado'
@@ -4589,56 +4525,41 @@ def security_monitor(request):
 
 @staff_member_required
 def monitor_sesiones(request):
-    """Vista para monitorear sesiones activas"""
+    """Vista para monitorear sesiones activas (paginadas; ?estado=todas incluye las cerradas)"""
     
-    # Obtener todas las sesiones
-    sesiones = SesionUsuario.objects.select_related('usuario').order_by('-fecha_creacion')
+    # Volcar la actividad pendiente para mostrar la última actividad real
+    flush_heartbeats()
     
-    # Calcular estadísticas
-    total_sesiones = sesiones.count()
-    sesiones_activas = sesiones.filter(activa=True).count()
-    usuarios_conectados = sesiones.filter(activa=True).values('usuario').distinct().count()
-    sesiones_expiradas = sesiones.filter(activa=False).count()
+    solo_activas = request.GET.get('estado') != 'todas'
+    sesiones = sessions_page(request.GET.get('pagina', 1), solo_activas=solo_activas)
     
     context = {
         'title': 'Monitor de Sesiones',
         'sesiones': sesiones,
-        'total_sesiones': total_sesiones,
-        'sesiones_activas': sesiones_activas,
-        'usuarios_conectados': usuarios_conectados, 
-        'sesiones_expiradas': sesiones_expiradas
+        'solo_activas': solo_activas,
+        # Desde aquí el cliente solo pide los cambios (monitor_sesiones_refresh?desde=)
+        'cursor': current_cursor(),
+        **monitor_stats(),
     }
     
     return render(request, 'core/monitor_sesiones.html', context)
 
 @staff_member_required
+@conditional_get(lambda request: ['sesiones'])
 def monitor_sesiones_refresh(request):
-    """Vista AJAX para refrescar los datos del monitor de sesiones"""
-    sesiones = SesionUsuario.objects.select_related('usuario').order_by('-fecha_creacion')
-    
-    # Calcular estadísticas
-    stats = {
-        'total_sesiones': sesiones.count(),
-        'sesiones_activas': sesiones.filter(activa=True).count(),
-        'usuarios_conectados': sesiones.filter(activa=True).values('usuario').distinct().count(),
-        'sesiones_expiradas': sesiones.filter(activa=False).count()
-    }
-    
-    sesiones_data = []
-    for sesion in sesiones:
-        sesiones_data.append({
-            'id': sesion.id,
-            'usuario': sesion.usuario.username,
-            'ip': sesion.ip_address,
-            'dispositivo': sesion.user_agent,
-            'fecha_creacion': sesion.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S'),
-            'ultima_actividad': sesion.ultima_actividad.strftime('%Y-%m-%d %H:%M:%S'),
-            'activa': sesion.activa,
-        })
+    """
+    Vista AJAX con las estadísticas y las sesiones que cambiaron desde ?desde=<cursor>.
+    No vuelca el buffer de heartbeats: el middleware ya lo hace una vez por intervalo
+    al registrar la actividad de esta misma petición, antes de comparar el ETag.
+    """
+    cambios, cursor, completo = changes_since(request.GET.get('desde'))
     
     return JsonResponse({
-        'stats': stats,
-        'sesiones': sesiones_data
+        'success': True,
+        'stats': monitor_stats(),
+        'cambios': cambios,
+        'cursor': cursor,
+        'completo': completo,
     })
 
 @staff_member_required
@@ -5049,19 +4970,33 @@ def redimir_puntos(request):
             # Calcular valor en COP
             valor_cop = points * 0.5  # 1 punto = $0.50 COP
             
-            # Crear el registro de redención
-            redencion = RedencionPuntos.objects.create(
-                usuario=request.user,
-                puntos=points,
-                valor_cop=valor_cop,
-                metodo_pago=payment_method,
-                numero_cuenta=phone,
-                estado='pendiente'
-            )
+            from django.db import transaction
             
-            # Descontar los puntos del usuario
-            request.user.puntos -= points
-            request.user.save()
+            try:
+                with transaction.atomic():
+                    # Crear el registro de redención
+                    redencion = RedencionPuntos.objects.create(
+                        usuario=request.user,
+                        puntos=points,
+                        valor_cop=valor_cop,
+                        metodo_pago=payment_method,
+                        numero_cuenta=phone,
+                        estado='pendiente'
+                    )
+                    
+                    # Descontar los puntos del usuario (falla si otra solicitud ya los gastó)
+                    apply_points(
+                        request.user, -points, 'redencion', origen=redencion,
+                        descripcion=f'Retiro por {payment_method}', require_balance=True
+                    )
+            except SaldoInsuficiente:
+                Notificacion.objects.create(
+                    usuario=request.user,
+                    titulo='Retiro no realizado',
+                    mensaje=f'No tienes puntos suficientes para retirar {points} puntos: tu saldo cambió mientras se procesaba la solicitud.',
+                    tipo='sistema'
+                )
+                return redirect('pagos')
             
             # Crear notificación en lugar de messages.success()
             Notificacion.objects.create(
@@ -5087,6 +5022,8 @@ def redimir_puntos(request):
     
     return redirect('pagos')
 
+# La expiración depende también del reloj: se vuelve a verificar al menos una vez por minuto
+@conditional_get(lambda request: [f'sesiones:{request.user.pk}'], max_age=60)
 def verificar_sesion_activa(request):
     """
     Endpoint AJAX para verificar si la sesión del usuario sigue activa
@@ -5106,8 +5043,8 @@ def verificar_sesion_activa(request):
                 })
             
             # Verificar si el usuario tiene una sesión activa en nuestro sistema personalizado
-            session_token = request.session.get('session_token')
-            logger.info(f"Session token encontrado: {'Sí' if session_token else 'No'}")
+            secure_token = request.session.get('secure_token')
+            logger.info(f"Session token encontrado: {'Sí' if secure_token else 'No'}")
             
             from .models import SesionUsuario
             from django.utils import timezone
@@ -5133,8 +5070,9 @@ def verificar_sesion_activa(request):
                 if sesion.fecha_expiracion > timezone.now():
                     logger.info(f"Sesión válida encontrada para {request.user.username}")
                     # Si no hay token en la sesión de Django, actualizarlo
-                    if not session_token:
-                        request.session['session_token'] = sesion.token_sesion
+                    if not secure_token:
+                        request.session['secure_token'] = sesion.token_sesion
+                        request.session['device_id'] = sesion.dispositivo_id
                         logger.info("Token actualizado en sesión de Django")
                     
                     return JsonResponse({
@@ -5170,7 +5108,7 @@ def aceptar_terminos(request):
         usuario = request.user
         usuario.terminos_aceptados = True
         usuario.fecha_aceptacion_terminos = timezone.now()
-        usuario.save()
+        usuario.save(update_fields=['terminos_aceptados', 'fecha_aceptacion_terminos'])
         
         return JsonResponse({
             'success': True,
@@ -5237,11 +5175,10 @@ def marcar_reagendamiento_visto(request):
             
             if ruta_id:
                 # Marcar las notificaciones de reagendamiento como leídas
-                notificaciones_actualizadas = Notificacion.objects.filter(
-                    usuario=request.user,
-                    titulo="Recolección Reagendada",
-                    leida=False
-                ).update(leida=True)
+                notificaciones_actualizadas = mark_read(
+                    request.user.id,
+                    Notificacion.objects.filter(titulo="Recolección Reagendada")
+                )
                 
                 return JsonResponse({
                     'success': True,
@@ -5262,6 +5199,7 @@ def marcar_reagendamiento_visto(request):
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
 @login_required
+@conditional_get(lambda request: [f'notificaciones:{request.user.pk}'])
 def get_notifications(request):
     """Vista para obtener notificaciones del usuario desde el modelo Notificacion"""
     try:
@@ -5273,37 +5211,9 @@ def get_notifications(request):
             usuario=request.user
         ).order_by('-fecha_creacion')[:20]  # Últimas 20 notificaciones
         
-        notifications = []
-        unread_count = 0
-        
-        for notif in notificaciones:
-            # Determinar el tipo basado en el tipo de notificación
-            notif_tipo = 'general'  # default
-            if notif.tipo in ['recompensa_canjeada', 'retiro_enviado', 'redencion_aprobada', 'redencion_pendiente', 'redencion_rechazada']:
-                notif_tipo = 'redencion'
-            elif notif.tipo in ['perfil_actualizado', 'foto_actualizada']:
-                notif_tipo = 'perfil'
-            elif notif.tipo in ['canje_aprobado', 'canje_pendiente', 'canje_rechazado']:
-                notif_tipo = 'canje'
-            elif notif.tipo in ['password_cambiado', 'sistema']:
-                notif_tipo = 'general'
-            
-            notifications.append({
-                'id': notif.id,
-                'tipo': notif_tipo,
-                'titulo': notif.titulo,
-                'mensaje': notif.mensaje,
-                'fecha_creacion': notif.fecha_creacion.isoformat(),
-                'leida': notif.leida,
-                'unread': not notif.leida,
-                'data': {
-                    'notificacion_id': notif.id,
-                    'tipo': notif.tipo
-                }
-            })
-            
-            if not notif.leida:
-                unread_count += 1
+        notifications = [notification_payload(notif) for notif in notificaciones]
+        # Contador desnormalizado: el usuario ya viene cargado por la autenticación
+        unread_count = request.user.notificaciones_no_leidas
         
         return JsonResponse({
             'success': True,
@@ -5325,10 +5235,7 @@ def clear_notifications(request):
     if request.method == 'POST':
         try:
             # Marcar todas las notificaciones como leídas
-            notificaciones_actualizadas = Notificacion.objects.filter(
-                usuario=request.user,
-                leida=False
-            ).update(leida=True)
+            notificaciones_actualizadas = mark_read(request.user.id)
             
             return JsonResponse({
                 'success': True,
@@ -5354,6 +5261,7 @@ def delete_all_notifications(request):
             ).count()
             
             Notificacion.objects.filter(usuario=request.user).delete()
+            publish_cleared(request.user.id)
             
             return JsonResponse({
                 'success': True,
@@ -5416,10 +5324,7 @@ def mark_all_notifications_read(request):
     if request.method == 'POST':
         try:
             # Marcar todas las notificaciones como leídas
-            notificaciones_actualizadas = Notificacion.objects.filter(
-                usuario=request.user,
-                leida=False
-            ).update(leida=True)
+            notificaciones_actualizadas = mark_read(request.user.id)
             
             return JsonResponse({
                 'success': True,
@@ -45,7 +45,7 @@ def editar_usuario_superuser(request, user_id):
         password = data.get('password', None)
         if password:
             user.set_password(password)
-        user.save()
+        user.save(update_fields=['email', 'first_name', 'last_name', 'role', 'is_active', 'suspended', 'is_staff', 'password'])
         return JsonResponse({'success': True, 'message': 'Usuario actualizado correctamente.'})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
@@ -69,21 +69,21 @@ def ajustar_puntos_usuario(request, user_id):
         puntos_anteriores = user.puntos
         
         if action == 'add':
-            user.puntos += cantidad
+            apply_points(user, cantidad, 'ajuste', descripcion=motivo, realizado_por=request.user)
             mensaje = f'Se añadieron {cantidad} puntos'
         elif action == 'subtract':
-            if user.puntos < cantidad:
+            try:
+                apply_points(user, -cantidad, 'ajuste', descripcion=motivo, realizado_por=request.user, require_balance=True)
+            except SaldoInsuficiente:
+                user.refresh_from_db(fields=['puntos'])
                 return JsonResponse({
                     'success': False, 
                     'message': f'El usuario solo tiene {user.puntos} puntos. No se pueden quitar {cantidad} puntos.'
                 })
-            user.puntos -= cantidad
             mensaje = f'Se quitaron {cantidad} puntos'
         else:
             return JsonResponse({'success': False, 'message': 'Acción no válida'})
         
-        user.save()
-        
         # Crear notificación para el usuario
         accion_texto = 'añadido' if action == 'add' else 'quitado'
         notif_mensaje = f'Un administrador ha {accion_texto} {cantidad} puntos a tu cuenta.'
@@ -126,6 +126,7 @@ from django.contrib.auth import get_user_model
 from .models import Usuario, Notificacion, SesionUsuario
 from .permissions import require_superuser, require_superuser_ajax, is_superuser_role
 from .notifications import NotificacionEmail
+from .points_ledger import SaldoInsuficiente, apply_points
 import json
 
 User = get_user_model()
@@ -389,7 +390,7 @@ def cambiar_rol_usuario(request, user_id):
         
         # Actualizar permisos de staff
         user.is_staff = nuevo_rol in ['admin', 'superuser']
-        user.save()
+        user.save(update_fields=['role', 'is_staff'])
         
         # Crear notificación
         Notificacion.objects.create(
@@ -445,7 +446,7 @@ def promover_a_admin(request, user_id):
         
         user.role = 'admin'
         user.is_staff = True
-        user.save()
+        user.save(update_fields=['role', 'is_staff'])
         
         # Crear notificación
         Notificacion.objects.create(
@@ -481,7 +482,7 @@ def degradar_admin(request, user_id):
         
         user.role = 'user'
         user.is_staff = False
-        user.save()
+        user.save(update_fields=['role', 'is_staff'])
         
         # Crear notificación
         Notificacion.objects.create(
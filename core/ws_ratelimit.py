@@ -0,0 +1,127 @@
+"""
+Rate limiting para mensajes de WebSocket.
+
+Cada mensaje consume un token de dos buckets compartidos (por usuario y por
+IP) en el motor de throttling, solo si ambos tienen disponible (un mensaje
+rechazado por un bucket no gasta el token del otro), de modo que abrir varias conexiones o
+repartirlas entre procesos no multiplica la cuota. Cuando se excede el
+límite el consumer envía un frame estructurado 'rate_limited' con el tiempo
+de espera en lugar de descartar el mensaje en silencio.
+
+Los límites se configuran en settings.WEBSOCKET_RATELIMITS. La cabecera
+X-Forwarded-For solo se respeta cuando la conexión llega desde un proxy
+listado en settings.TRUSTED_PROXIES; de lo contrario cualquier cliente podría
+rotarla y obtener un bucket de IP nuevo en cada conexión.
+"""
+import ipaddress
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .throttle_engine import get_throttle_engine, parse_rate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEBSOCKET_RATELIMITS = {
+    'chatbot': {'user': '20/m', 'ip': '60/m', 'burst': 5},
+    'chat': {'user': '30/m', 'ip': '120/m', 'burst': 10},
+}
+
+
+def get_trusted_proxies():
+    """Redes (IPs o CIDR) de los proxies cuyo X-Forwarded-For es confiable"""
+    redes = []
+    for valor in getattr(settings, 'TRUSTED_PROXIES', ()):
+        try:
+            redes.append(ipaddress.ip_network(valor.strip(), strict=False))
+        except ValueError:
+            logger.warning(f'Proxy confiable inválido en TRUSTED_PROXIES: {valor!r}')
+    return redes
+
+
+def _es_proxy_confiable(ip, redes):
+    try:
+        direccion = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(direccion in red for red in redes)
+
+
+def get_ws_client_ip(scope):
+    """
+    Obtiene la IP del cliente desde el scope ASGI.
+
+    Si el par de la conexión es un proxy confiable se recorre X-Forwarded-For
+    de derecha a izquierda y se toma la primera dirección que no sea otro
+    proxy confiable; las entradas más a la izquierda las escribe el cliente.
+    """
+    client = scope.get('client')
+    peer = client[0] if client else 'unknown'
+    redes = get_trusted_proxies()
+    if not redes or not _es_proxy_confiable(peer, redes):
+        return peer
+
+    for name, value in scope.get('headers', []):
+        if name == b'x-forwarded-for':
+            saltos = [ip.strip() for ip in value.decode('latin1').split(',') if ip.strip()]
+            for ip in reversed(saltos):
+                if not _es_proxy_confiable(ip, redes):
+                    return ip
+            return saltos[0] if saltos else peer
+    return peer
+
+
+class WebSocketRateLimiter:
+    """Token bucket por usuario y por IP para un tipo de consumer"""
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def config(self):
+        limits = getattr(settings, 'WEBSOCKET_RATELIMITS', DEFAULT_WEBSOCKET_RATELIMITS)
+        return limits.get(self.name) or DEFAULT_WEBSOCKET_RATELIMITS[self.name]
+
+    def check(self, scope):
+        """
+        Consume un token de los buckets del usuario y de la IP si ambos tienen.
+        Retorna el ThrottleResult del primer bucket agotado o el del usuario.
+        """
+        if not getattr(settings, 'RATELIMIT_ENABLE', True):
+            return None
+
+        config = self.config
+        burst = config.get('burst', 1)
+        engine = get_throttle_engine()
+        user = scope.get('user')
+
+        buckets = [('ip', get_ws_client_ip(scope))]
+        if user is not None and user.is_authenticated:
+            buckets.insert(0, ('user', user.pk))
+
+        rechazado, result = engine.take_all([
+            (f'ws:{self.name}:{kind}:{ident}', *parse_rate(config[kind]), burst)
+            for kind, ident in buckets
+        ])
+        if rechazado is not None:
+            kind, ident = buckets[rechazado]
+            logger.warning(f'Rate limit WebSocket {self.name} excedido para {kind} {ident}')
+        return result
+
+    async def acheck(self, scope):
+        """Versión asíncrona de check() para los consumers"""
+        return await sync_to_async(self.check)(scope)
+
+
+def slow_down_frame(result, name):
+    """Frame que se envía al cliente cuando debe reducir la velocidad"""
+    return {
+        'type': 'rate_limited',
+        'scope': name,
+        'message': f'Estás enviando mensajes muy rápido. Espera {result.retry_after} s antes de continuar.',
+        'retry_after': result.retry_after,
+        'limit': result.limit,
+        'timestamp': timezone.now().isoformat()
+    }
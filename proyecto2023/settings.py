@@ -61,6 +61,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Perfilador por vista (core.profiler); no hace nada si PROFILER_ENABLED es False
+    'core.profiler.ProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Para servir archivos estáticos
     'corsheaders.middleware.CorsMiddleware',  # Para CORS de API
@@ -68,19 +70,19 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'core.dynamic_session_middleware.DynamicSessionTimeoutMiddleware',  # Timeout dinámico según configuración
-    'core.session_validation_middleware.SessionValidationMiddleware',  # Validación de sesiones cerradas por admin
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'core.middleware.SecurityMiddleware',
-    'core.middleware.UserStatusMiddleware',  # Middleware para verificar usuarios desactivados/suspendidos
+    # Guardia de sesión unificada: timeout dinámico, sesiones cerradas por admin,
+    # validación de dispositivo/IP y usuarios desactivados/suspendidos
+    'core.session_guard.SessionGuardMiddleware',
 ]
 
 ROOT_URLCONF = 'proyecto2023.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que reporta el tiempo de render a core.profiler
+        'BACKEND': 'core.profiler.ProfiledDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -198,7 +200,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Paginación por cursor (fecha, id) en lugar de OFFSET; ver api/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.FechaCursorPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -260,13 +263,40 @@ else:
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_AGE = 900  # 15 minutos para usuarios regulares
-SESSION_SAVE_EVERY_REQUEST = True
+# La sesión solo se guarda cuando cambia; la actividad se registra en el buffer de heartbeats
+SESSION_SAVE_EVERY_REQUEST = False
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # Cerrar sesión al cerrar navegador
 
 # Configuración de timeouts diferenciados
 ADMIN_SESSION_TIMEOUT = 600  # 10 minutos para administradores
 USER_SESSION_TIMEOUT = 900   # 15 minutos para usuarios regulares
 
+# Segundos mínimos entre escrituras de actividad de sesión a la base de datos
+SESSION_HEARTBEAT_INTERVAL = config('SESSION_HEARTBEAT_INTERVAL', default=60, cast=int)
+
+# Monitor de sesiones (core.session_monitor): filas por página, máximo de cambios por
+# respuesta y segundos que se reenvían para no perder commits lentos
+SESSION_MONITOR_PAGE_SIZE = 50
+SESSION_MONITOR_CHANGES_LIMIT = 500
+SESSION_MONITOR_OVERLAP_SECONDS = 5
+
+# Segundos entre revisiones de la versión del registro de configuración (core.config_registry)
+CONFIG_REGISTRY_CHECK_INTERVAL = 1.0
+
+# Segundos que se conservan los fragmentos por usuario de los dashboards (core.fragment_cache)
+FRAGMENT_CACHE_TIMEOUT = config('FRAGMENT_CACHE_TIMEOUT', default=300, cast=int)
+
+# Rollups diarios de reportes (core.rollups): ejecutar `manage.py rollup_daily_stats`
+# periódicamente (p. ej. cada 5 minutos). Margen en segundos que se vuelve a revisar
+# antes del watermark para no perder filas de transacciones confirmadas tarde.
+ROLLUP_OVERLAP_SECONDS = config('ROLLUP_OVERLAP_SECONDS', default=300, cast=int)
+
+# Rankings (core.leaderboard): sorted sets de Redis en producción, tabla PuntajeRanking en desarrollo
+LEADERBOARD_BACKEND = (
+    'core.leaderboard.DatabaseLeaderboardBackend' if DEBUG
+    else 'core.leaderboard.RedisLeaderboardBackend'
+)
+
 # Channels Configuration para WebSockets
 ASGI_APPLICATION = 'proyecto2023.asgi.application'
 CHANNEL_LAYERS = {
@@ -406,8 +436,12 @@ USE_L10N = True
 # ====================================
 # CONFIGURACIÓN DE EMAIL
 # ====================================
-# Usar backend personalizado con manejo robusto de SSL/TLS
-EMAIL_BACKEND = 'core.email_backend.SSLEmailBackend'
+# Los correos se guardan en la bandeja de salida (core.email_outbox) y el comando
+# `manage.py send_queued_emails --continuo` los entrega con el backend SMTP personalizado
+EMAIL_BACKEND = 'core.email_outbox.OutboxEmailBackend'
+EMAIL_OUTBOX_BACKEND = 'core.email_backend.SSLEmailBackend'
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=6, cast=int)
+EMAIL_OUTBOX_BACKOFF_SECONDS = config('EMAIL_OUTBOX_BACKOFF_SECONDS', default=30, cast=int)
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
@@ -417,17 +451,58 @@ EMAIL_HOST_PASSWORD = 'eebg bxjq zetx qtdo'  # Contraseña de aplicación de Gma
 DEFAULT_FROM_EMAIL = f'EcoPuntos <{EMAIL_HOST_USER}>'
 EMAIL_TIMEOUT = 30  # Timeout en segundos
 
+# Pool de conexiones SMTP autenticadas de core.email_backend.SSLEmailBackend
+EMAIL_POOL_SIZE = config('EMAIL_POOL_SIZE', default=2, cast=int)  # Conexiones libres por servidor (0 desactiva el pool)
+EMAIL_POOL_MAX_MESSAGES = config('EMAIL_POOL_MAX_MESSAGES', default=100, cast=int)  # Correos por conexión antes de reabrirla
+EMAIL_POOL_KEEPALIVE_SECONDS = 30  # Inactividad tras la que se verifica la conexión con NOOP
+EMAIL_POOL_MAX_IDLE_SECONDS = 240  # Inactividad tras la que se descarta sin probarla
+
+# Resumen de notificaciones por correo (core.email_digest): ejecutar `manage.py send_email_digests`
+# cada pocos minutos. Minutos que se acumulan las notificaciones de un usuario (0 desactiva el resumen)
+EMAIL_DIGEST_WINDOW_MINUTES = config('EMAIL_DIGEST_WINDOW_MINUTES', default=60, cast=int)
+
+# Retención de notificaciones (core.notification_retention): ejecutar `manage.py prune_notifications` a diario.
+# Días que se conserva cada tipo; los demás usan NOTIFICATION_RETENTION_DEFAULT_DAYS
+NOTIFICATION_RETENTION_DAYS = {
+    'juego': 7,
+    'perfil_actualizado': 30,
+    'foto_actualizada': 30,
+    'seguridad': 90,
+}
+NOTIFICATION_RETENTION_DEFAULT_DAYS = config('NOTIFICATION_RETENTION_DEFAULT_DAYS', default=180, cast=int)
+# Tipos que al vencer se mueven a NotificacionArchivada en lugar de borrarse
+NOTIFICATION_ARCHIVE_TYPES = ['canje_aprobado', 'canje_rechazado', 'redencion_aprobada', 'redencion_rechazada', 'seguridad']
+NOTIFICATION_COLLAPSIBLE_TYPES = ['juego']  # Repetidas que se agrupan en una sola fila
+NOTIFICATION_RETENTION_CHUNK = 1000  # Filas por lote (cada lote es una transacción corta)
+NOTIFICATION_BROADCAST_CHUNK = 2000  # Usuarios por lote en las difusiones masivas (core.notification_broadcast)
+
+# Retención de sesiones e intentos de acceso (core.security_retention): la aplica `manage.py cleanup_sessions`.
+# Las filas anteriores al horizonte se mueven a ArchivoSeguridad; los rollups conservan sus totales
+SESSION_RETENTION_DAYS = config('SESSION_RETENTION_DAYS', default=90, cast=int)
+ACCESS_ATTEMPT_RETENTION_DAYS = config('ACCESS_ATTEMPT_RETENTION_DAYS', default=180, cast=int)
+SECURITY_RETENTION_CHUNK = 1000  # Filas por lote (cada lote es una transacción corta)
+
+# Perfilador de vistas (core.profiler): consultas, tiempo de BD, de plantillas y latencia por vista,
+# consultable en el admin (Perfiles de vistas)
+PROFILER_ENABLED = config('PROFILER_ENABLED', default=False, cast=bool)
+PROFILER_SAMPLE_RATE = config('PROFILER_SAMPLE_RATE', default=0.1, cast=float)  # Fracción de peticiones medidas
+PROFILER_FLUSH_SECONDS = 60  # Cada cuánto se vuelcan las muestras a la base de datos
+PROFILER_MAX_FINGERPRINTS = 20  # Consultas repetidas que se conservan por vista y día
+
 # Para desarrollo, mantener SMTP backend para enviar correos reales
 # Solo usar console backend si explícitamente no hay EMAIL_HOST_USER configurado
 # if DEBUG and not EMAIL_HOST_USER:
 #     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Channel Layers para WebSockets (Chat)
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# La capa en memoria solo sirve dentro de un proceso: en producción gunicorn (HTTP) y
+# daphne (WebSocket) corren por separado y los eventos deben pasar por Redis
+if DEBUG:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
     }
-}
 
 # ====================================
 # CONFIGURACIÓN DEL CHATBOT IA
@@ -455,6 +530,23 @@ CHATBOT_ENABLED = config('CHATBOT_ENABLED', default=True, cast=bool)
 RATELIMIT_ENABLE = config('RATELIMIT_ENABLE', default=True, cast=bool)  # ACTIVADO COMPLETAMENTE
 RATELIMIT_USE_CACHE = 'default'  # Usar cache de Django
 
+# Motor de throttling compartido entre workers (core/throttle_engine.py); con Redis el
+# token bucket se resuelve en un script Lua atómico
+THROTTLE_BACKEND = (
+    'core.throttle_engine.CacheThrottleBackend' if DEBUG
+    else 'core.throttle_engine.RedisThrottleBackend'
+)
+
+# Token bucket para mensajes de WebSocket (por usuario y por IP, compartido entre conexiones)
+WEBSOCKET_RATELIMITS = {
+    'chatbot': {'user': '20/m', 'ip': '60/m', 'burst': 5},   # Cada mensaje llama a Gemini
+    'chat': {'user': '30/m', 'ip': '120/m', 'burst': 10},    # Chat global (group_send)
+}
+
+# Proxies (IPs o CIDR) cuyo X-Forwarded-For se respeta en WebSockets, p. ej. el
+# nginx de docker-compose. Vacío: se usa siempre la IP de la conexión.
+TRUSTED_PROXIES = config('TRUSTED_PROXIES', default='', cast=Csv())
+
 # Límites por tipo de operación
 RATELIMIT_RATES = {
     # Autenticación (muy restrictivo)
@@ -46,8 +46,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'core.middleware.SecurityMiddleware',
-    'core.middleware.UserStatusMiddleware',
+    'core.session_guard.SessionGuardMiddleware',
 ]
 
 ROOT_URLCONF = 'proyecto2023.urls'
@@ -165,5 +164,5 @@ CORS_ALLOW_CREDENTIALS = True
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_AGE = 900  # 15 minutos
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
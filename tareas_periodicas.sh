@@ -0,0 +1,31 @@
+#!/bin/sh
+# Tareas periódicas de EcoPuntos (servicio "tareas" de docker-compose.yml).
+# La entrega de correos (send_queued_emails --continuo) corre en su propio servicio.
+#
+# Cada INTERVALO segundos (5 minutos por defecto):
+#   send_email_digests   resúmenes de notificaciones por correo cuya ventana venció
+#   rollup_daily_stats   rollups diarios que leen los reportes de administración
+#   cleanup_sessions     cierra sesiones vencidas y archiva sesiones/intentos antiguos
+# Una vez al día:
+#   prune_notifications        agrupa y borra o archiva notificaciones vencidas
+#   reconcile_unread_counters  corrige contadores de no leídas desviados
+#   snapshot_points_balances   compara los saldos de puntos con el libro mayor
+
+INTERVALO=${INTERVALO:-300}
+ultimo_dia=""
+
+while true; do
+    python manage.py send_email_digests
+    python manage.py rollup_daily_stats
+    python manage.py cleanup_sessions
+
+    hoy=$(date +%F)
+    if [ "$hoy" != "$ultimo_dia" ]; then
+        python manage.py prune_notifications
+        python manage.py reconcile_unread_counters
+        python manage.py snapshot_points_balances
+        ultimo_dia=$hoy
+    fi
+
+    sleep "$INTERVALO"
+done